@@ -0,0 +1,608 @@
+"""
+CQI Brand Registry - Compiled, versioned brand configurations
+
+Loads each brand's CQI settings once from its YAML files, validates them
+and compiles them into immutable BrandConfig objects, instead of
+rebuilding a nested dict on every get_brand_config() call.
+
+Sources, in order (later ones override earlier ones):
+- Built-in defaults below (used when a brand has no YAML, or it is invalid)
+- {AGENT_CONTEXT_PATH}/<brand>/.agents/brand-config.yml
+- {AGENT_CONTEXT_PATH}/<brand>/.agents/context/brand-profile.yml
+  (the per-brand context path described in context-librarian.yml)
+
+Built-in brands keep their built-in scoring_weights even when the YAML
+defines different ones, so scores stay comparable with existing sessions.
+Set CQI_BRAND_YAML_WEIGHTS=true to score with the YAML weights instead.
+
+Each BrandConfig carries a version hash of its compiled settings, plus
+the precomputed weight table and scoring rubric text, so caches can key
+on config.version and the prompt is rendered once per version.
+
+Files are re-checked by mtime at most every CQI_BRAND_RELOAD_INTERVAL
+seconds. reload() forces a refresh, e.g. from a Supabase database
+webhook calling POST /api/cqi/brands/reload.
+
+Environment Variables:
+    AGENT_CONTEXT_PATH: Directory holding <brand>/.agents/ (default: repo projects/)
+    CQI_BRAND_RELOAD_INTERVAL: Seconds between mtime checks (default: 5)
+    CQI_BRAND_YAML_WEIGHTS: Let YAML scoring_weights replace built-in ones (default: false)
+
+Usage:
+    from brand_registry import get_brand_registry
+    config = get_brand_registry().get('sotsvc')
+    config['qualification_threshold'], config.version, config.rubric
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Tuple
+
+import yaml
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BRAND = 'sotsvc'
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_CONTEXT_PATH = os.path.join(REPO_ROOT, 'projects')
+
+BRAND_CONFIG_FILES = (
+    os.path.join('.agents', 'brand-config.yml'),
+    os.path.join('.agents', 'context', 'brand-profile.yml'),
+)
+
+# Fallback configuration for each brand (the original MVP settings)
+BUILTIN_BRANDS: Dict[str, Dict[str, Any]] = {
+    'sotsvc': {
+        'brand_name': 'Sonz of Thunder Services',
+        'qualification_threshold': 70,
+        'scoring_weights': {
+            'budget_alignment': 25,
+            'urgency': 20,
+            'decision_authority': 20,
+            'property_fit': 15,
+            'service_history': 10,
+            'frequency_commitment': 10
+        },
+        'service_types': ['residential_cleaning', 'commercial_cleaning', 'post_construction', 'move_in_out'],
+        'trial_type': 'trial_cleaning',
+        'trial_price': 99.00
+    },
+    'boss_of_clean': {
+        'brand_name': 'Boss of Clean',
+        'qualification_threshold': 60,
+        'scoring_weights': {
+            'budget_alignment': 25,
+            'urgency': 20,
+            'decision_authority': 20,
+            'property_fit': 15,
+            'provider_availability': 10,
+            'location_serviceability': 10
+        },
+        'service_types': ['pressure_washing', 'soft_washing', 'driveway_cleaning', 'roof_cleaning'],
+        'trial_type': 'free_estimate',
+        'trial_price': 0.00
+    },
+    'beatslave': {
+        'brand_name': 'BeatSlave',
+        'qualification_threshold': 50,
+        'scoring_weights': {
+            'budget_alignment': 20,
+            'urgency': 15,
+            'decision_authority': 20,
+            'project_fit': 20,
+            'creative_clarity': 15,
+            'commercial_potential': 10
+        },
+        'service_types': ['beat_production', 'mixing_mastering', 'custom_composition'],
+        'trial_type': 'creative_consultation',
+        'trial_price': 0.00
+    },
+    'temple_builder': {
+        'brand_name': 'Temple Builder',
+        'qualification_threshold': 80,
+        'scoring_weights': {
+            'budget_alignment': 20,
+            'urgency': 15,
+            'decision_authority': 20,
+            'ministry_fit': 20,
+            'spiritual_readiness': 15,
+            'commitment_level': 10
+        },
+        'service_types': ['faith_consulting', 'ministry_development', 'leadership_training'],
+        'trial_type': 'ministry_assessment',
+        'trial_price': 0.00
+    }
+}
+
+# Criterion names that share a guideline in the rubric
+FIT_CRITERIA = ('property_fit', 'project_fit', 'ministry_fit', 'fit_quality', 'portfolio_fit')
+FREQUENCY_CRITERIA = ('frequency_commitment', 'commitment_level')
+
+
+class BrandConfigError(ValueError):
+    """Raised when a brand configuration fails validation"""
+    pass
+
+
+def normalize_brand(brand: str) -> str:
+    """Map a brand id or project directory name to its registry key."""
+    return brand.strip().lower().replace('-', '_')
+
+
+# Scoring guideline per criterion: what earns full, half and zero points.
+# Criteria that aren't listed get DEFAULT_GUIDELINE.
+CRITERION_GUIDELINES: Dict[str, Tuple[str, str, str]] = {
+    'budget_alignment': ('Explicit budget mentioned or implied', 'Vague budget indicators', 'No budget info'),
+    'budget_commitment': (
+        'Stated budget or clear readiness to invest', 'Open to investing, no amount given', 'No budget info or unwilling to invest'
+    ),
+    'urgency': ('"ASAP", "urgent", "this week"', '"Soon", "next month"', '"Flexible", no timeline'),
+    'timeline_realistic': (
+        'Concrete deadline or release date with enough lead time', 'Rough timeline, or a very tight deadline', 'No timeline'
+    ),
+    'decision_authority': (
+        '"I", "me", "my" (likely decision maker)', '"We", "us" (might need approval)', '"For someone else", "exploring"'
+    ),
+    'service_history': ('Has used similar services before', 'First time user', 'Unknown'),
+    'engagement_level': (
+        'Detailed message, asks or answers specific questions', 'Short but genuine message', 'Minimal or generic message'
+    ),
+    'contact_quality': ('Phone and email, both plausible', 'One working contact method', 'Missing or fake-looking contact info'),
+    'project_clarity': ('Clear project type, genre and references', 'General idea of the project', 'Unclear what they want'),
+    'creative_clarity': ('Clear creative direction or references', 'General idea of the sound or style', 'No creative direction'),
+    'commercial_potential': (
+        'Commercial release or monetization planned', 'Possible release or content creation', 'Personal use only or unknown'
+    ),
+    'faith_alignment': (
+        'Faith clearly integrated into their work or calling', 'Mentions faith without tying it to the work', 'No faith context'
+    ),
+    'ministry_readiness': (
+        'Active ministry or business with a defined mission and audience', 'Early stage or still discerning the calling',
+        'No ministry or business yet'
+    ),
+    'spiritual_readiness': (
+        'Describes a clear calling and readiness for the next step', 'Exploring or discerning', 'No spiritual context'
+    ),
+    'growth_desire': ('Specific growth goals or named challenges to solve', 'General wish to grow', 'No growth goals'),
+    'coachability': ('Asks for guidance and is open to change', 'Neutral', 'Resistant, or only wants validation'),
+}
+for _name in FIT_CRITERIA:
+    CRITERION_GUIDELINES[_name] = ('Clear service need matching our offerings', 'Partial match', 'Poor fit or unclear')
+for _name in FREQUENCY_CRITERIA:
+    CRITERION_GUIDELINES[_name] = ('Mentions recurring, ongoing, or long-term', 'One-time project', 'Unknown')
+
+DEFAULT_GUIDELINE = ('Strong, explicit evidence in the lead', 'Some or indirect evidence', 'No evidence')
+
+
+def _weight_table(brand_config: Mapping) -> Tuple[Tuple[str, str, int], ...]:
+    table = getattr(brand_config, 'weight_table', None)
+    if table is not None:
+        return table
+    return tuple(
+        (criterion, criterion.replace('_', ' ').title(), points)
+        for criterion, points in brand_config['scoring_weights'].items()
+    )
+
+
+def render_rubric(brand_config: Mapping) -> str:
+    """
+    Render the static scoring rubric (system prompt) for a brand.
+
+    The criteria, their guidelines and the example output are generated
+    from the brand's weight table, so YAML-defined criteria get guidance
+    and appear in the expected scoring_breakdown.
+
+    Args:
+        brand_config: Brand configuration with scoring weights
+
+    Returns:
+        str: System prompt for Claude
+    """
+    brand_name = brand_config['brand_name']
+    threshold = brand_config['qualification_threshold']
+    table = _weight_table(brand_config)
+
+    prompt = f"""You are a Client Qualification Interview (CQI) agent for {brand_name}.
+
+Your task is to analyze the lead provided by the user and assign a qualification score from 0-100 based on the criteria below.
+
+SCORING CRITERIA (total 100 points):
+"""
+
+    # Add each scoring criterion with its weight
+    for _, display, points in table:
+        prompt += f"\n{points} points - {display}"
+
+    prompt += f"""
+
+QUALIFICATION THRESHOLD: {threshold} points
+
+SCORING GUIDELINES:
+"""
+
+    for number, (criterion, display, points) in enumerate(table, 1):
+        full, half, none = CRITERION_GUIDELINES.get(criterion, DEFAULT_GUIDELINE)
+        prompt += f"""
+{number}. {display} ({points} points):
+   - {full}: {points} points
+   - {half}: {points // 2} points
+   - {none}: 0 points
+"""
+
+    # Example breakdown with the brand's own criteria
+    example = {criterion: points * 3 // 4 for criterion, _, points in table}
+    example_score = sum(example.values())
+    breakdown = ',\n'.join(f'    "{criterion}": {points}' for criterion, points in example.items())
+
+    prompt += f"""
+ADDITIONAL FACTORS:
+- Complete contact info (phone + email): +5 bonus points
+- Professional tone in message: +3 bonus points
+- Detailed, specific request: +3 bonus points
+- Incomplete contact info: -5 penalty points
+- Spam-like message: -10 penalty points
+
+OUTPUT FORMAT:
+Return ONLY a valid JSON object with this structure, with one scoring_breakdown entry per criterion above:
+
+{{
+  "qualification_score": {example_score},
+  "qualified": {'true' if example_score >= threshold else 'false'},
+  "scoring_breakdown": {{
+{breakdown}
+  }},
+  "reasoning": "Brief explanation of the score and key factors",
+  "recommended_action": "trial_booking|nurture_campaign|disqualify",
+  "confidence_level": "high|medium|low"
+}}"""
+
+    return prompt
+
+
+class BrandConfig(Mapping):
+    """
+    Immutable, compiled configuration for one brand.
+
+    Behaves as a read-only mapping with the same keys the original
+    get_brand_config() dicts had, so existing callers keep using
+    config['qualification_threshold']. Derived data is precomputed:
+
+    - version: 16-char hash of the compiled settings and rubric
+    - weight_table: ((criterion, display name, points), ...)
+    - rubric: rendered scoring system prompt
+    """
+
+    __slots__ = (
+        'brand', 'brand_name', 'qualification_threshold', 'scoring_weights', 'service_types',
+        'trial_type', 'trial_price', 'questions', 'sources', 'version', 'weight_table', 'rubric'
+    )
+
+    KEYS = ('brand_name', 'qualification_threshold', 'scoring_weights', 'service_types', 'trial_type', 'trial_price')
+
+    def __init__(self, brand: str, settings: Dict[str, Any], sources: Tuple[str, ...] = ()):
+        """
+        Args:
+            brand: Registry key (e.g. 'boss_of_clean')
+            settings: Validated settings dict (see validate_settings)
+            sources: Files the settings were loaded from
+        """
+        weights = MappingProxyType(dict(settings['scoring_weights']))
+        values = {
+            'brand': brand,
+            'brand_name': settings['brand_name'],
+            'qualification_threshold': settings['qualification_threshold'],
+            'scoring_weights': weights,
+            'service_types': tuple(settings['service_types']),
+            'trial_type': settings['trial_type'],
+            'trial_price': settings['trial_price'],
+            'questions': MappingProxyType(dict(settings.get('questions') or {})),
+            'sources': tuple(sources),
+            'weight_table': tuple(
+                (criterion, criterion.replace('_', ' ').title(), points)
+                for criterion, points in weights.items()
+            )
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+        object.__setattr__(self, 'rubric', render_rubric(self))
+        # The rubric is hashed too, so prompt changes invalidate cached scores
+        object.__setattr__(self, 'version', hashlib.sha256(
+            json.dumps([self.as_dict(), self.rubric], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"BrandConfig is immutable (tried to set '{name}')")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"BrandConfig is immutable (tried to delete '{name}')")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"BrandConfig({self.brand!r}, version={self.version!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return a plain, JSON-serializable copy of the settings."""
+        return {
+            'brand_name': self.brand_name,
+            'qualification_threshold': self.qualification_threshold,
+            'scoring_weights': dict(self.scoring_weights),
+            'service_types': list(self.service_types),
+            'trial_type': self.trial_type,
+            'trial_price': self.trial_price,
+            'questions': {key: value for key, value in self.questions.items()}
+        }
+
+
+def validate_settings(brand: str, settings: Dict[str, Any]) -> None:
+    """
+    Check a merged settings dict before it is compiled.
+
+    Args:
+        brand: Registry key, for error messages
+        settings: Merged settings
+
+    Raises:
+        BrandConfigError: If a field is missing or out of range
+    """
+    for field in ('brand_name', 'qualification_threshold', 'scoring_weights', 'service_types'):
+        if field not in settings:
+            raise BrandConfigError(f"{brand}: missing '{field}'")
+
+    threshold = settings['qualification_threshold']
+    if not isinstance(threshold, int) or isinstance(threshold, bool) or not 0 <= threshold <= 100:
+        raise BrandConfigError(f"{brand}: qualification_threshold must be an integer 0-100, got {threshold!r}")
+
+    weights = settings['scoring_weights']
+    if not isinstance(weights, dict) or not weights:
+        raise BrandConfigError(f"{brand}: scoring_weights must be a non-empty mapping")
+    for criterion, points in weights.items():
+        if not isinstance(points, int) or isinstance(points, bool) or points < 0:
+            raise BrandConfigError(f"{brand}: weight for '{criterion}' must be a non-negative integer")
+    total = sum(weights.values())
+    if total != 100:
+        raise BrandConfigError(f"{brand}: scoring_weights must total 100 points, got {total}")
+
+    if not isinstance(settings['service_types'], (list, tuple)):
+        raise BrandConfigError(f"{brand}: service_types must be a list")
+
+
+def settings_from_yaml(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pick the CQI settings out of a brand-config.yml document.
+
+    Args:
+        document: Parsed YAML
+
+    Returns:
+        dict: Partial settings (only the fields the document defines)
+    """
+    settings: Dict[str, Any] = {}
+    brand = document.get('brand') or {}
+    cqi = document.get('cqi_settings') or {}
+    trial = document.get('trial') or {}
+
+    if brand.get('name'):
+        settings['brand_name'] = brand['name']
+    if 'qualification_threshold' in cqi:
+        settings['qualification_threshold'] = cqi['qualification_threshold']
+    if cqi.get('scoring_weights'):
+        settings['scoring_weights'] = dict(cqi['scoring_weights'])
+    if cqi.get('questions'):
+        settings['questions'] = cqi['questions']
+    if document.get('services'):
+        settings['service_types'] = list(document['services'])
+    if trial.get('type'):
+        settings['trial_type'] = trial['type']
+    if 'price' in trial:
+        settings['trial_price'] = float(trial['price'])
+
+    return settings
+
+
+class BrandRegistry:
+    """
+    Thread-safe registry of compiled brand configs with mtime-based reload.
+    """
+
+    def __init__(
+        self,
+        context_path: Optional[str] = None,
+        reload_interval: float = 5.0,
+        yaml_weights: bool = False
+    ):
+        """
+        Args:
+            context_path: Directory holding <brand>/.agents/ folders
+                (relative paths are resolved from the repo root)
+            reload_interval: Min seconds between file mtime checks
+            yaml_weights: Let YAML scoring_weights replace a built-in
+                brand's weights (brands without built-ins always use YAML)
+        """
+        self.context_path = os.path.abspath(os.path.join(REPO_ROOT, context_path or DEFAULT_CONTEXT_PATH))
+        self.reload_interval = reload_interval
+        self.yaml_weights = yaml_weights
+        self._lock = threading.Lock()
+        self._configs: Dict[str, BrandConfig] = {}
+        self._mtimes: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+        self._last_check = 0.0
+        self.reloads = 0
+        self.reload(force=True)
+
+    def _brand_files(self) -> Dict[str, List[str]]:
+        """Find YAML sources per brand key."""
+        found: Dict[str, List[str]] = {}
+        if not os.path.isdir(self.context_path):
+            return found
+        for entry in sorted(os.listdir(self.context_path)):
+            paths = [
+                os.path.join(self.context_path, entry, name)
+                for name in BRAND_CONFIG_FILES
+                if os.path.isfile(os.path.join(self.context_path, entry, name))
+            ]
+            if paths:
+                found[normalize_brand(entry)] = paths
+        return found
+
+    @staticmethod
+    def _stat(paths: List[str]) -> Tuple[Tuple[str, float], ...]:
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append((path, os.stat(path).st_mtime))
+            except OSError:
+                stamps.append((path, 0.0))
+        return tuple(stamps)
+
+    def _compile(self, brand: str, paths: List[str]) -> BrandConfig:
+        builtin = BUILTIN_BRANDS.get(brand, {})
+        settings = dict(builtin)
+        settings.setdefault('trial_type', 'trial')
+        settings.setdefault('trial_price', 0.0)
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = yaml.safe_load(f) or {}
+            settings.update(settings_from_yaml(document))
+        # Validate the YAML as written, so a broken edit is still rejected
+        validate_settings(brand, settings)
+
+        if 'scoring_weights' in builtin and not self.yaml_weights:
+            if settings['scoring_weights'] != builtin['scoring_weights']:
+                logger.info(
+                    f"{brand}: keeping built-in scoring_weights; YAML weights differ "
+                    f"(set CQI_BRAND_YAML_WEIGHTS=true to use them)"
+                )
+            settings['scoring_weights'] = builtin['scoring_weights']
+        return BrandConfig(brand, settings, tuple(paths))
+
+    def reload(self, brand: Optional[str] = None, force: bool = False) -> List[str]:
+        """
+        Recompile brands whose files changed (or all of them with force).
+
+        A brand whose YAML fails to load or validate keeps its previous
+        config, or the built-in defaults on first load.
+
+        Args:
+            brand: Only reload this brand (default: all)
+            force: Recompile even if mtimes are unchanged
+
+        Returns:
+            list: Brand keys whose version changed
+        """
+        changed = []
+        with self._lock:
+            files = self._brand_files()
+            keys = set(BUILTIN_BRANDS) | set(files)
+            if brand is not None:
+                keys &= {normalize_brand(brand)}
+
+            for key in sorted(keys):
+                paths = files.get(key, [])
+                stamps = self._stat(paths)
+                if not force and key in self._configs and self._mtimes.get(key) == stamps:
+                    continue
+
+                previous = self._configs.get(key)
+                try:
+                    config = self._compile(key, paths)
+                except Exception as e:
+                    logger.error(f"❌ Brand config '{key}' invalid, keeping previous version: {e}")
+                    if previous is None and key in BUILTIN_BRANDS:
+                        config = self._compile(key, [])
+                    else:
+                        # Remember the stamps so a broken file isn't re-parsed on every check
+                        self._mtimes[key] = stamps
+                        continue
+
+                self._configs[key] = config
+                self._mtimes[key] = stamps
+                if previous is None or previous.version != config.version:
+                    changed.append(key)
+                    logger.info(f"✅ Brand config '{key}' loaded (version {config.version})")
+
+            self._last_check = time.monotonic()
+            if changed:
+                self.reloads += 1
+
+        return changed
+
+    def _check_for_changes(self) -> None:
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.reload()
+
+    def get(self, brand: str) -> BrandConfig:
+        """
+        Get the compiled config for a brand.
+
+        Unknown brands fall back to the default brand, as before.
+
+        Args:
+            brand: Brand identifier (sotsvc, boss_of_clean, beatslave, temple_builder)
+
+        Returns:
+            BrandConfig: Immutable brand configuration
+        """
+        self._check_for_changes()
+        config = self._configs.get(normalize_brand(brand))
+        if config is None:
+            logger.warning(f"Unknown brand '{brand}', using {DEFAULT_BRAND.upper()} defaults")
+            return self._configs[DEFAULT_BRAND]
+        return config
+
+    def has_brand(self, brand: str) -> bool:
+        """True if `brand` (any spelling normalize_brand() accepts) is loaded."""
+        self._check_for_changes()
+        return normalize_brand(brand) in self._configs
+
+    def brands(self) -> Dict[str, str]:
+        """Return {brand: version} for every loaded brand."""
+        self._check_for_changes()
+        return {key: config.version for key, config in sorted(self._configs.items())}
+
+
+_registry: Optional[BrandRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_brand_registry() -> BrandRegistry:
+    """
+    Get the process-wide brand registry, configured from the environment.
+
+    Returns:
+        BrandRegistry: Shared registry instance
+    """
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = BrandRegistry(
+                    context_path=os.getenv('AGENT_CONTEXT_PATH') or None,
+                    reload_interval=float(os.getenv('CQI_BRAND_RELOAD_INTERVAL', '5')),
+                    yaml_weights=os.getenv('CQI_BRAND_YAML_WEIGHTS', 'false').lower() in ('1', 'true', 'yes')
+                )
+
+    return _registry
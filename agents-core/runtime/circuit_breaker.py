@@ -0,0 +1,259 @@
+"""
+CQI Circuit Breaker - Fail fast when Claude is erroring or slow
+
+Guards the Claude scoring call. The breaker keeps a rolling window of
+recent calls; when too many of them failed or were slow, it opens and
+callers skip Claude entirely until a cool-down passes. The conductor
+then falls back to a provisional local score and queues the lead for
+re-scoring, so a Claude incident costs seconds per lead instead of the
+full request budget.
+
+States:
+- closed: calls go through; outcomes are recorded
+- open: calls are refused until open_seconds have passed
+- half_open: a few trial calls go through; success closes the breaker,
+  a failure opens it again
+
+The same window of successful-call latencies gives the percentile used
+to time hedged requests (see hedge_delay()).
+
+Environment Variables:
+    CQI_BREAKER_ENABLED: 'false' to always call Claude (default: true)
+    CQI_BREAKER_WINDOW_SECONDS: Rolling window length (default: 60)
+    CQI_BREAKER_MIN_CALLS: Calls in the window before the breaker can open (default: 10)
+    CQI_BREAKER_ERROR_RATE: Failure share that opens the breaker (default: 0.5)
+    CQI_BREAKER_SLOW_SECONDS: Calls slower than this count as slow (default: 20)
+    CQI_BREAKER_SLOW_RATE: Slow-call share that opens the breaker (default: 0.8)
+    CQI_BREAKER_OPEN_SECONDS: Cool-down before trial calls (default: 30)
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker on error and slow-call rates. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        latency_samples: int = 200,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            name: Guarded dependency (for logs and stats)
+            window_seconds: Only calls this recent count toward the rates
+            min_calls: Calls needed in the window before the breaker can open
+            error_rate: Failure share (0-1) that opens the breaker
+            slow_call_seconds: Calls slower than this count as slow
+            slow_rate: Slow-call share (0-1) that opens the breaker
+            open_seconds: How long to refuse calls before trying again
+            half_open_calls: Trial calls allowed while half-open
+            latency_samples: Successful-call latencies kept for percentiles
+            enabled: Set False to let every call through (outcomes still recorded)
+        """
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()  # (time, failed, slow)
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._counters = {'allowed': 0, 'rejected': 0, 'successes': 0, 'failures': 0, 'slow_calls': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == STATE_OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._trials = 0
+            logger.info(f"Circuit '{self.name}' half-open; allowing trial calls")
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may proceed, reserving a trial slot when half-open.
+
+        Returns:
+            bool: False if the call should be skipped
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if not self.enabled or state == STATE_CLOSED:
+                allowed = True
+            elif state == STATE_HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                allowed = True
+            else:
+                allowed = False
+            self._counters['allowed' if allowed else 'rejected'] += 1
+            return allowed
+
+    def record(self, success: bool, elapsed: float) -> None:
+        """
+        Record the outcome of an allowed call.
+
+        Args:
+            success: False for errors and timeouts of the dependency itself
+            elapsed: Call duration in seconds
+        """
+        now = time.monotonic()
+        slow = elapsed >= self.slow_call_seconds
+
+        with self._lock:
+            self._counters['successes' if success else 'failures'] += 1
+            if slow:
+                self._counters['slow_calls'] += 1
+            if success:
+                self._latencies.append(elapsed)
+
+            state = self._current_state(now)
+            if state == STATE_HALF_OPEN:
+                if success and not slow:
+                    self._close()
+                else:
+                    self._open(now, 'trial call failed' if not success else 'trial call slow')
+                return
+
+            self._calls.append((now, not success, slow))
+            while self._calls and now - self._calls[0][0] > self.window_seconds:
+                self._calls.popleft()
+
+            if state == STATE_CLOSED and len(self._calls) >= self.min_calls:
+                total = len(self._calls)
+                failed = sum(1 for _, f, _ in self._calls if f)
+                slow_calls = sum(1 for _, _, s in self._calls if s)
+                if failed / total >= self.error_rate:
+                    self._open(now, f"{failed}/{total} calls failed")
+                elif slow_calls / total >= self.slow_rate:
+                    self._open(now, f"{slow_calls}/{total} calls slower than {self.slow_call_seconds}s")
+
+    def _open(self, now: float, reason: str) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._counters['opened'] += 1
+        logger.error(f"❌ Circuit '{self.name}' opened ({reason}); skipping calls for {self.open_seconds}s")
+
+    def _close(self) -> None:
+        self._state = STATE_CLOSED
+        self._calls.clear()
+        logger.info(f"✅ Circuit '{self.name}' closed")
+
+    def percentile(self, fraction: float, min_samples: int = 20) -> Optional[float]:
+        """
+        Latency percentile of recent successful calls.
+
+        Args:
+            fraction: 0-1, e.g. 0.95
+            min_samples: Return None until this many calls were seen
+
+        Returns:
+            float: Seconds, or None if there isn't enough data
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return state, counters and latency percentiles."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['state'] = self._current_state(time.monotonic())
+            stats['window_calls'] = len(self._calls)
+        for label, fraction in (('p50_seconds', 0.5), ('p95_seconds', 0.95)):
+            value = self.percentile(fraction, min_samples=1)
+            stats[label] = round(value, 4) if value is not None else None
+        return stats
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_scoring_breaker() -> CircuitBreaker:
+    """
+    Get the process-wide breaker for Claude scoring calls.
+
+    Returns:
+        CircuitBreaker: Shared breaker configured from the environment
+    """
+    global _breaker
+
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'claude_scoring',
+                    window_seconds=float(os.getenv('CQI_BREAKER_WINDOW_SECONDS', '60')),
+                    min_calls=int(os.getenv('CQI_BREAKER_MIN_CALLS', '10')),
+                    error_rate=float(os.getenv('CQI_BREAKER_ERROR_RATE', '0.5')),
+                    slow_call_seconds=float(os.getenv('CQI_BREAKER_SLOW_SECONDS', '20')),
+                    slow_rate=float(os.getenv('CQI_BREAKER_SLOW_RATE', '0.8')),
+                    open_seconds=float(os.getenv('CQI_BREAKER_OPEN_SECONDS', '30')),
+                    enabled=os.getenv('CQI_BREAKER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+                )
+
+    return _breaker
+
+
+def hedge_delay(breaker: CircuitBreaker, budget: float) -> Optional[float]:
+    """
+    How long to wait before sending a hedged second request (CQI_HEDGE_*).
+
+    Uses the CQI_HEDGE_PERCENTILE latency of recent successful calls, never
+    less than CQI_HEDGE_MIN_DELAY_SECONDS. Returns None when hedging is off,
+    there isn't enough latency data yet, or the delay would not leave room
+    inside the budget.
+    """
+    if os.getenv('CQI_HEDGE_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    delay = breaker.percentile(float(os.getenv('CQI_HEDGE_PERCENTILE', '0.95')))
+    if delay is None:
+        return None
+    delay = max(delay, float(os.getenv('CQI_HEDGE_MIN_DELAY_SECONDS', '1')))
+    return delay if delay < budget else None
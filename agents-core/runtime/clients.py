@@ -5,19 +5,59 @@ This module provides configured clients for:
 - Anthropic (Claude AI)
 - Supabase (PostgreSQL database)
 
+Both sync and async variants are available. The async clients are used by
+the FastAPI server so that slow Claude calls don't block the event loop.
+
 All clients are initialized with environment variables and include
 retry logic and error handling.
+
+HTTP transport:
+Anthropic and Supabase share one pooled httpx transport per process (sync)
+or per event loop (async), so connections and TLS sessions are reused
+across both services instead of each SDK opening its own pool. Each SDK
+still gets its own httpx.Client: the SDKs set default headers (Supabase's
+service-role key among them) on the client, and those must never go out
+with requests to the other service. Pool size,
+keep-alive and HTTP/2 are configurable, and every request is counted per
+host (see get_transport_stats()). The transports also apply the adaptive
+client-side rate limits from rate_limiter.py to Anthropic and Supabase
+requests, and open a client span per request (tracing.py), so every
+Supabase execute() and Anthropic call shows up in the caller's trace.
+
+Environment Variables:
+    CQI_HTTP_MAX_CONNECTIONS: Max open connections per pool (default: 100)
+    CQI_HTTP_MAX_KEEPALIVE: Max idle connections kept alive (default: 20)
+    CQI_HTTP_KEEPALIVE_EXPIRY: Seconds an idle connection is kept (default: 30)
+    CQI_HTTP2: 'false' to force HTTP/1.1 (default: on when h2 is installed)
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Optional
+import threading
+import importlib.util
+import weakref
+from typing import Optional, Dict, Any
 from functools import lru_cache
 
-from anthropic import Anthropic
-from supabase import create_client, Client
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+from supabase import create_client, Client, acreate_client, AsyncClient
+from supabase import ClientOptions, AsyncClientOptions
 from dotenv import load_dotenv
 
+from brand_registry import BrandConfig, get_brand_registry
+from rate_limiter import (
+    RateLimitTimeout,
+    limiter_for_request,
+    request_costs,
+    get_rate_limit_stats,
+    service_for_host,
+    remaining_time
+)
+from tracing import NOOP_SPAN, current_span, start_span
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -58,6 +98,386 @@ def validate_environment() -> None:
     logger.info("✅ All required environment variables are set")
 
 
+# ================================================================
+# HTTP TRANSPORT
+# ================================================================
+
+def get_transport_settings() -> Dict[str, Any]:
+    """
+    Read HTTP pool settings from the environment.
+
+    Returns:
+        dict: max_connections, max_keepalive_connections, keepalive_expiry, http2
+    """
+    http2_requested = os.getenv('CQI_HTTP2', 'true').lower() not in ('0', 'false', 'no')
+    # httpx only speaks HTTP/2 when the optional h2 package is installed
+    http2_available = importlib.util.find_spec('h2') is not None
+
+    return {
+        'max_connections': int(os.getenv('CQI_HTTP_MAX_CONNECTIONS', '100')),
+        'max_keepalive_connections': int(os.getenv('CQI_HTTP_MAX_KEEPALIVE', '20')),
+        'keepalive_expiry': float(os.getenv('CQI_HTTP_KEEPALIVE_EXPIRY', '30')),
+        'http2': http2_requested and http2_available
+    }
+
+
+class TransportMetrics:
+    """
+    Thread-safe per-host counters for the shared transports.
+
+    new_connections counts TCP connects and tls_handshakes counts TLS
+    negotiations, so requests / new_connections shows how well keep-alive
+    is working. retries counts requests the SDKs sent again after a
+    failed attempt (x-stainless-retry-count > 0).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _host(self, host: str) -> Dict[str, float]:
+        counters = self._hosts.get(host)
+        if counters is None:
+            counters = self._hosts[host] = {
+                'requests': 0, 'errors': 0, 'retries': 0, 'in_flight': 0,
+                'new_connections': 0, 'tls_handshakes': 0, 'total_seconds': 0.0
+            }
+        return counters
+
+    def started(self, host: str, retry: bool = False) -> None:
+        with self._lock:
+            counters = self._host(host)
+            counters['requests'] += 1
+            counters['in_flight'] += 1
+            if retry:
+                counters['retries'] += 1
+
+    def finished(self, host: str, elapsed: float, error: bool) -> None:
+        with self._lock:
+            counters = self._host(host)
+            counters['in_flight'] -= 1
+            counters['total_seconds'] += elapsed
+            if error:
+                counters['errors'] += 1
+
+    def traced(self, host: str, event: str) -> None:
+        """Record an httpcore trace event (only connection setup is counted)."""
+        if event == 'connection.connect_tcp.complete':
+            name = 'new_connections'
+        elif event == 'connection.start_tls.complete':
+            name = 'tls_handshakes'
+        else:
+            return
+        with self._lock:
+            self._host(host)[name] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of the counters with derived reuse/latency figures."""
+        with self._lock:
+            hosts = {host: dict(counters) for host, counters in self._hosts.items()}
+        for counters in hosts.values():
+            requests = counters['requests']
+            counters['connection_reuse_rate'] = (
+                round(1 - counters['new_connections'] / requests, 4) if requests else 0.0
+            )
+            counters['avg_seconds'] = round(counters['total_seconds'] / requests, 4) if requests else 0.0
+            counters['total_seconds'] = round(counters['total_seconds'], 4)
+        return hosts
+
+
+transport_metrics = TransportMetrics()
+
+
+def _rate_limit(request: httpx.Request):
+    """
+    Reserve rate limit capacity for a request.
+
+    The wait is capped by the current call_deadline() and the request's
+    pool timeout; a longer wait raises RateLimitTimeout instead.
+
+    Returns:
+        tuple: (limiter, seconds to wait, reservation)
+    """
+    limiter = limiter_for_request(request.url.host)
+    if limiter is None:
+        return None, 0.0, {}
+    body_size = int(request.headers.get('content-length') or 0)
+    costs = request_costs(limiter.name, request.method, request.url.path, body_size)
+    limits = [t for t in (remaining_time(), (request.extensions.get('timeout') or {}).get('pool')) if t is not None]
+    wait, reserved = limiter.acquire(costs, max_wait=min(limits) if limits else None)
+    return limiter, wait, reserved
+
+
+def _rate_limit_timeout_response(request: httpx.Request, error: RateLimitTimeout) -> httpx.Response:
+    """
+    Answer an Anthropic request that the limiter can't fit in its deadline.
+
+    The Anthropic SDK wraps any exception raised by its transport as an
+    APIConnectionError and retries it, so raising RateLimitTimeout here
+    would wait out the SDK's backoff and queue for the limiter again. The
+    request is not sent. Instead it gets a local 429 marked
+    x-should-retry: false, which surfaces as a RateLimitError that
+    neither the SDK nor conductor's own retry loop retries.
+    """
+    return httpx.Response(
+        429,
+        headers={'x-should-retry': 'false'},
+        json={'type': 'error', 'error': {'type': 'rate_limit_error', 'message': f"Client-side {error}"}},
+        request=request
+    )
+
+
+def _limit_or_refuse(request: httpx.Request):
+    """
+    _rate_limit(), with Anthropic deadline misses turned into a response.
+
+    Returns:
+        tuple: (limiter, seconds to wait, reservation, response or None)
+    """
+    try:
+        return (*_rate_limit(request), None)
+    except RateLimitTimeout as e:
+        # Supabase's client doesn't retry, so the error reaches the caller as-is
+        if service_for_host(request.url.host) != 'anthropic':
+            raise
+        logger.warning(f"⚠️ {e}; not sending {request.method} {request.url.path}")
+        return None, 0.0, {}, _rate_limit_timeout_response(request, e)
+
+
+def _is_retry(request: httpx.Request) -> bool:
+    return request.headers.get('x-stainless-retry-count', '0') not in ('0', '')
+
+
+def _request_span(request: httpx.Request, wait: float):
+    """
+    Client span for one HTTP request, e.g. 'supabase POST cqi_sessions'.
+
+    Only opened inside a trace, so background loops don't start one trace
+    per query. The span ends at the response headers.
+    """
+    if current_span() is None:
+        return NOOP_SPAN
+    host = request.url.host
+    path = request.url.path
+    if path.startswith('/rest/v1/'):
+        path = path[len('/rest/v1/'):]
+    attributes = {'http.method': request.method, 'http.host': host, 'http.path': request.url.path}
+    if wait:
+        attributes['rate_limit.wait_seconds'] = round(wait, 4)
+    if _is_retry(request):
+        attributes['http.retry_count'] = request.headers['x-stainless-retry-count']
+    return start_span(f"{service_for_host(host) or host} {request.method} {path}", 'client', **attributes)
+
+
+class MeteredTransport(httpx.HTTPTransport):
+    """Pooled sync transport that records per-host metrics and applies rate limits."""
+
+    def close(self) -> None:
+        # Shared by several clients: one client closing must not close
+        # the pool under the others. Connections go with the process.
+        pass
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter, wait, reserved, refused = _limit_or_refuse(request)
+        if refused is not None:
+            return refused
+        if wait:
+            try:
+                time.sleep(wait)
+            except BaseException:
+                limiter.refund(reserved)
+                raise
+
+        host = request.url.host
+        previous = request.extensions.get('trace')
+
+        def trace(event, info):
+            transport_metrics.traced(host, event)
+            if previous is not None:
+                previous(event, info)
+
+        request.extensions['trace'] = trace
+        transport_metrics.started(host, _is_retry(request))
+        started = time.perf_counter()
+        error = True
+        try:
+            with _request_span(request, wait) as span:
+                response = super().handle_request(request)
+                span.set_attribute('http.status_code', response.status_code)
+                error = response.status_code >= 500
+                if error:
+                    span.set_error(f"HTTP {response.status_code}")
+            if limiter is not None:
+                limiter.observe(response.status_code, response.headers)
+            return response
+        finally:
+            transport_metrics.finished(host, time.perf_counter() - started, error)
+
+
+class AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+    """Pooled async transport that records per-host metrics and applies rate limits."""
+
+    async def aclose(self) -> None:
+        # Shared by several clients, see MeteredTransport.close()
+        pass
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter, wait, reserved, refused = _limit_or_refuse(request)
+        if refused is not None:
+            return refused
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Cancelled while queued (e.g. the caller's timeout): free the slot
+                limiter.refund(reserved)
+                raise
+
+        host = request.url.host
+        previous = request.extensions.get('trace')
+
+        async def trace(event, info):
+            transport_metrics.traced(host, event)
+            if previous is not None:
+                await previous(event, info)
+
+        request.extensions['trace'] = trace
+        transport_metrics.started(host, _is_retry(request))
+        started = time.perf_counter()
+        error = True
+        try:
+            with _request_span(request, wait) as span:
+                response = await super().handle_async_request(request)
+                span.set_attribute('http.status_code', response.status_code)
+                error = response.status_code >= 500
+                if error:
+                    span.set_error(f"HTTP {response.status_code}")
+            if limiter is not None:
+                limiter.observe(response.status_code, response.headers)
+            return response
+        finally:
+            transport_metrics.finished(host, time.perf_counter() - started, error)
+
+
+def _transport_kwargs() -> Dict[str, Any]:
+    settings = get_transport_settings()
+    return {
+        'limits': httpx.Limits(
+            max_connections=settings['max_connections'],
+            max_keepalive_connections=settings['max_keepalive_connections'],
+            keepalive_expiry=settings['keepalive_expiry']
+        ),
+        'http2': settings['http2'],
+        'retries': 1  # retry failed connects only; the SDKs retry requests
+    }
+
+
+@lru_cache(maxsize=1)
+def get_http_transport() -> MeteredTransport:
+    """
+    Get the process-wide pooled sync transport.
+
+    The transport (connection pool) is thread-safe and holds no headers,
+    so it can be shared; clients can't (see the module docstring).
+
+    Returns:
+        MeteredTransport: Shared transport
+    """
+    transport = MeteredTransport(**_transport_kwargs())
+    logger.info(f"✅ HTTP pool initialized ({get_transport_settings()})")
+    return transport
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Create a sync HTTP client on the shared pool.
+
+    Call once per SDK client: every SDK needs a client of its own.
+
+    Returns:
+        httpx.Client: New client using the shared transport
+    """
+    return httpx.Client(transport=get_http_transport(), timeout=120.0, follow_redirects=True)
+
+
+# Async transports hold connections (and locks) bound to the event loop
+# that created them, so they are cached per loop rather than per process
+_async_http_transports: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _prune_closed_loops() -> None:
+    """Drop clients of finished loops (e.g. earlier asyncio.run() calls).
+
+    Cached clients can keep their loop alive, so the weak keys alone don't
+    release them. Call with _async_clients_lock held.
+    """
+    for cache in (_async_http_transports, _async_anthropic_clients, _async_supabase_clients, _async_supabase_locks):
+        for loop in [loop for loop in cache.keys() if loop.is_closed()]:
+            del cache[loop]
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Create an async HTTP client on the running event loop's pool.
+
+    Each event loop (uvicorn worker, CLI asyncio.run, queue worker thread)
+    gets its own transport, shared by every async Anthropic and Supabase
+    client on that loop. Call once per SDK client, like get_http_client().
+
+    Returns:
+        httpx.AsyncClient: New client using this loop's transport
+    """
+    loop = _current_loop()
+    if loop is None:
+        # Not inside a loop yet; the caller will bind it on first use
+        transport = AsyncMeteredTransport(**_transport_kwargs())
+    else:
+        with _async_clients_lock:
+            transport = _async_http_transports.get(loop)
+            if transport is None:
+                _prune_closed_loops()
+                transport = _async_http_transports[loop] = AsyncMeteredTransport(**_transport_kwargs())
+                logger.info("✅ Async HTTP pool initialized")
+
+    return httpx.AsyncClient(transport=transport, timeout=120.0, follow_redirects=True)
+
+
+def get_transport_stats() -> Dict[str, Any]:
+    """
+    Return pool settings and per-host request/connection counters.
+
+    Returns:
+        dict: settings, async_pools (live event-loop pools), hosts and
+            rate_limits (per-service queue wait and throttling counters)
+    """
+    with _async_clients_lock:
+        async_pools = len(_async_http_transports)
+    return {
+        'settings': get_transport_settings(),
+        'async_pools': async_pools,
+        'hosts': transport_metrics.snapshot(),
+        'rate_limits': get_rate_limit_stats()
+    }
+
+
+def _supabase_options(options_class, http_client):
+    """Build Supabase client options with an HTTP client of its own on the shared pool."""
+    try:
+        return options_class(httpx_client=http_client)
+    except TypeError:
+        # Older supabase-py releases can't take an injected client
+        logger.warning("supabase-py does not accept httpx_client; using its own connection pool")
+        return None
+
+
 @lru_cache(maxsize=1)
 def get_anthropic_client() -> Anthropic:
     """
@@ -87,6 +507,7 @@ def get_anthropic_client() -> Anthropic:
         # Adjust if you need shorter/longer timeouts
         timeout=120.0,  # 2 minutes
         max_retries=3,  # Retry failed requests up to 3 times
+        http_client=get_http_client(),
     )
 
     logger.info("✅ Anthropic client initialized")
@@ -115,6 +536,16 @@ def get_supabase_client() -> Client:
             Get from: Supabase Dashboard → Settings → API
             ⚠️  This key bypasses all RLS policies - keep it secret!
     """
+    url, key = _get_supabase_credentials()
+
+    client = create_client(url, key, options=_supabase_options(ClientOptions, get_http_client()))
+
+    logger.info("✅ Supabase client initialized")
+    return client
+
+
+def _get_supabase_credentials() -> tuple:
+    """Read Supabase URL and service role key, raising if either is missing."""
     url = os.getenv('SUPABASE_URL')
     key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
 
@@ -130,97 +561,109 @@ def get_supabase_client() -> Client:
             "Get from: Supabase Dashboard → Settings → API → service_role key"
         )
 
-    client = create_client(url, key)
+    return url, key
+
+
+_async_anthropic_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_anthropic_client() -> AsyncAnthropic:
+    """
+    Get configured async Anthropic client for Claude API.
+
+    Same settings as get_anthropic_client(), but requests are awaitable so
+    many scoring calls can be in flight on a single event loop. Cached per
+    event loop, on top of that loop's shared HTTP pool.
+
+    Returns:
+        AsyncAnthropic: Configured async Anthropic client
+    """
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+
+    if not api_key:
+        raise EnvironmentError(
+            "ANTHROPIC_API_KEY not found in environment. "
+            "Get your key from: https://console.anthropic.com/settings/keys"
+        )
+
+    loop = _current_loop()
+    if loop is not None:
+        with _async_clients_lock:
+            client = _async_anthropic_clients.get(loop)
+        if client is not None:
+            return client
+
+    client = AsyncAnthropic(
+        api_key=api_key,
+        timeout=120.0,  # 2 minutes
+        max_retries=3,
+        http_client=get_async_http_client(),
+    )
+
+    if loop is not None:
+        with _async_clients_lock:
+            client = _async_anthropic_clients.setdefault(loop, client)
+
+    logger.info("✅ Async Anthropic client initialized")
+    return client
+
+
+_async_supabase_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_supabase_locks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+async def get_async_supabase_client() -> AsyncClient:
+    """
+    Get configured async Supabase client for database operations.
+
+    Creating the async client is itself a coroutine, so it can't be wrapped
+    in lru_cache like the sync client. Instead the instance is cached per
+    event loop and creation is guarded by a lock so concurrent first
+    requests on a loop share one client.
+
+    Returns:
+        AsyncClient: Configured async Supabase client
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _async_supabase_clients.get(loop)
+    if client is not None:
+        return client
+
+    with _async_clients_lock:
+        lock = _async_supabase_locks.get(loop)
+        if lock is None:
+            lock = _async_supabase_locks[loop] = asyncio.Lock()
+
+    async with lock:
+        client = _async_supabase_clients.get(loop)
+        if client is None:
+            url, key = _get_supabase_credentials()
+            options = _supabase_options(AsyncClientOptions, get_async_http_client())
+            client = await acreate_client(url, key, options=options)
+            _async_supabase_clients[loop] = client
+            logger.info("✅ Async Supabase client initialized")
 
-    logger.info("✅ Supabase client initialized")
     return client
 
 
-def get_brand_config(brand: str) -> dict:
+def get_brand_config(brand: str) -> BrandConfig:
     """
     Get brand-specific configuration including scoring weights and thresholds.
 
-    In MVP, this returns hardcoded configs. In production, load from
-    brand-config.yml files or database.
+    Configs are compiled once from the brand YAML files by the brand
+    registry and reloaded when those files change (see brand_registry.py).
 
     Args:
         brand: Brand identifier (sotsvc, boss_of_clean, beatslave, temple_builder)
 
     Returns:
-        dict: Brand configuration including:
+        BrandConfig: Read-only brand configuration including:
             - qualification_threshold: Minimum score to qualify (0-100)
             - scoring_weights: Point values for each criterion
-            - cqi_questions: List of questions to ask
-    """
-    configs = {
-        'sotsvc': {
-            'brand_name': 'Sonz of Thunder Services',
-            'qualification_threshold': 70,
-            'scoring_weights': {
-                'budget_alignment': 25,
-                'urgency': 20,
-                'decision_authority': 20,
-                'property_fit': 15,
-                'service_history': 10,
-                'frequency_commitment': 10
-            },
-            'service_types': ['residential_cleaning', 'commercial_cleaning', 'post_construction', 'move_in_out'],
-            'trial_type': 'trial_cleaning',
-            'trial_price': 99.00
-        },
-        'boss_of_clean': {
-            'brand_name': 'Boss of Clean',
-            'qualification_threshold': 60,
-            'scoring_weights': {
-                'budget_alignment': 25,
-                'urgency': 20,
-                'decision_authority': 20,
-                'property_fit': 15,
-                'provider_availability': 10,
-                'location_serviceability': 10
-            },
-            'service_types': ['pressure_washing', 'soft_washing', 'driveway_cleaning', 'roof_cleaning'],
-            'trial_type': 'free_estimate',
-            'trial_price': 0.00
-        },
-        'beatslave': {
-            'brand_name': 'BeatSlave',
-            'qualification_threshold': 50,
-            'scoring_weights': {
-                'budget_alignment': 20,
-                'urgency': 15,
-                'decision_authority': 20,
-                'project_fit': 20,
-                'creative_clarity': 15,
-                'commercial_potential': 10
-            },
-            'service_types': ['beat_production', 'mixing_mastering', 'custom_composition'],
-            'trial_type': 'creative_consultation',
-            'trial_price': 0.00
-        },
-        'temple_builder': {
-            'brand_name': 'Temple Builder',
-            'qualification_threshold': 80,
-            'scoring_weights': {
-                'budget_alignment': 20,
-                'urgency': 15,
-                'decision_authority': 20,
-                'ministry_fit': 20,
-                'spiritual_readiness': 15,
-                'commitment_level': 10
-            },
-            'service_types': ['faith_consulting', 'ministry_development', 'leadership_training'],
-            'trial_type': 'ministry_assessment',
-            'trial_price': 0.00
-        }
-    }
-
-    if brand not in configs:
-        logger.warning(f"Unknown brand '{brand}', using SOTSVC defaults")
-        return configs['sotsvc']
-
-    logger.info(f"Loaded config for brand: {brand}")
-    return configs[brand]
+            - version: Hash of the compiled settings, for cache keys
+    """
+    return get_brand_registry().get(brand)
 
 
 def test_connections() -> dict:
@@ -13,25 +13,64 @@ Usage:
     from conductor import process_lead
     result = process_lead(lead_id="uuid-here", brand="sotsvc")
 
+    # From async code (e.g. the FastAPI server)
+    from conductor import process_lead_async
+    result = await process_lead_async(lead_id="uuid-here", brand="sotsvc")
+
+    # Many leads at once (bulk fetch, concurrent scoring, bulk insert)
+    from conductor import process_leads
+    summary = process_leads(lead_ids, brand="sotsvc", concurrency=8)
+
     # As a CLI tool
     python conductor.py --lead-id uuid-here --brand sotsvc
+    python conductor.py --batch --ids-file ids.txt --brand sotsvc
+    python conductor.py --batch --brand sotsvc --status new --since 2026-01-01
 """
 
 import os
 import sys
 import json
 import logging
+import time
 import argparse
+import threading
+import asyncio
 from datetime import datetime
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Iterable, Set, Tuple, TYPE_CHECKING
 from uuid import UUID
 
+from anthropic import APIConnectionError, APIStatusError
+
 from clients import (
     get_anthropic_client,
     get_supabase_client,
+    get_async_anthropic_client,
+    get_async_supabase_client,
     get_brand_config,
     validate_environment
 )
+from brand_registry import normalize_brand, render_rubric
+from knowledge_index import get_knowledge_index, get_knowledge_top_k
+from score_cache import get_score_cache, make_key
+from session_cache import invalidate_session
+from kpi_rollups import record_kpi_event
+from workflow_engine import notify_lead_scored, notify_scoring_started
+from prescorer import get_prescorer, provisional_result
+from circuit_breaker import CircuitOpenError, get_scoring_breaker, hedge_delay
+from rate_limiter import call_deadline, parse_retry_after
+from metrics import step_timer, record_claude_call, record_usage, record_scoring_source
+from tracing import current_span, start_span, with_trace_id
+from incremental_json import IncrementalJSONParser, MalformedStreamError
+from scoring_schema import (
+    SCORING_TOOL,
+    SCORING_TOOL_CHOICE,
+    SCORING_TOOL_NAME,
+    validate_scoring_payload
+)
+
+if TYPE_CHECKING:
+    from scorers import Scorer
 
 # Configure logging
 logging.basicConfig(
@@ -40,6 +79,120 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Claude model used for lead scoring
+SCORING_MODEL = "claude-3-5-sonnet-20250131"
+
+# Shortest prefix (tools + system) Anthropic will cache, in tokens. Shorter
+# prefixes marked with cache_control are silently sent uncached.
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_MIN_TOKENS_HAIKU = 2048
+# Rough characters per token, for estimating prefix length before sending
+CHARS_PER_TOKEN = 4
+
+# Attempts per sync Claude scoring call (as the client's max_retries=3)
+SCORING_ATTEMPTS = 4
+
+# Brands already warned about a marked prefix that wasn't cached
+_uncached_warned: Set[Optional[str]] = set()
+
+
+def get_scoring_mode() -> str:
+    """
+    How Claude responses are read (CQI_SCORING_MODE).
+
+    - 'text': wait for the full completion, then parse (default)
+    - 'stream': stream tokens and stop as soon as the JSON object closes
+    - 'tool': force a record_lead_score tool call and validate its input
+      against the compiled schema (no free-text JSON scraping)
+    """
+    return os.getenv('CQI_SCORING_MODE', 'text').lower()
+
+
+def get_scoring_budget() -> float:
+    """
+    Per-lead latency budget in seconds for the Claude call (CQI_SCORING_BUDGET_SECONDS).
+
+    Separate from the client's 120s request timeout: the budget covers the
+    whole call including retries, so one lead can't hold a worker for
+    timeout x retries. Rate limit waits inside the call are bounded by it
+    too (see rate_limiter.call_deadline()).
+    """
+    return float(os.getenv('CQI_SCORING_BUDGET_SECONDS', '45'))
+
+
+# Claude call, parse-failure, hedge and fallback counters per scoring mode
+_scoring_stats: Dict[str, Dict[str, int]] = {}
+_scoring_stats_lock = threading.Lock()
+
+
+def _count_scoring(mode: str, field: str) -> None:
+    with _scoring_stats_lock:
+        stats = _scoring_stats.setdefault(mode, {
+            'claude_calls': 0, 'parse_failures': 0, 'hedged': 0, 'hedge_wins': 0, 'fallbacks': 0
+        })
+        stats[field] += 1
+
+
+def get_scoring_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return Claude call and parse-failure counts per scoring mode.
+
+    'hedged' counts second requests sent by hedging, 'hedge_wins' those
+    that answered first, and 'fallbacks' leads given a provisional score
+    because the scoring circuit was open.
+
+    Returns:
+        dict: {mode: {'claude_calls', 'parse_failures', 'parse_failure_rate',
+            'hedged', 'hedge_wins', 'fallbacks'}}
+    """
+    with _scoring_stats_lock:
+        stats = {mode: dict(counts) for mode, counts in _scoring_stats.items()}
+    for counts in stats.values():
+        calls = counts['claude_calls']
+        counts['parse_failure_rate'] = round(counts['parse_failures'] / calls, 4) if calls else 0.0
+    return stats
+
+
+def _brand_of(brand_config) -> Optional[str]:
+    """Brand id of a BrandConfig, for metric labels."""
+    return getattr(brand_config, 'brand', None)
+
+
+def _record_usage(request: Dict[str, Any], brand_config, usage: Any) -> None:
+    """
+    Count a response's tokens, and check that a prefix marked for prompt
+    caching was actually written to or read from the cache.
+    """
+    brand = _brand_of(brand_config)
+    record_usage(brand, request['model'], usage)
+    if usage is None or 'cache_control' not in request['system'][0]:
+        return
+    cache_tokens = (getattr(usage, 'cache_read_input_tokens', 0) or 0) + \
+        (getattr(usage, 'cache_creation_input_tokens', 0) or 0)
+    if not cache_tokens and brand not in _uncached_warned:
+        _uncached_warned.add(brand)
+        logger.warning(
+            f"⚠️  Scoring prompt for {brand} was marked for caching but not cached "
+            f"(input_tokens={getattr(usage, 'input_tokens', None)}); check PROMPT_CACHE_MIN_TOKENS"
+        )
+
+
+def _record_stream_usage(stream, request: Dict[str, Any], brand_config) -> None:
+    """Count tokens of a stream left early (output is partial; best effort)."""
+    try:
+        _record_usage(request, brand_config, stream.current_message_snapshot.usage)
+    except Exception:
+        pass
+
+
+def _annotate_span(model: str, mode: str, outcome: str) -> None:
+    """Add the Claude call's model, mode and outcome to the current span."""
+    span = current_span()
+    if span is not None:
+        span.set_attribute('claude.model', model)
+        span.set_attribute('claude.mode', mode)
+        span.set_attribute('claude.outcome', outcome)
+
 
 class CQIError(Exception):
     """Base exception for CQI processing errors"""
@@ -56,6 +209,11 @@ class ScoringError(CQIError):
     pass
 
 
+class ScoringParseError(ScoringError):
+    """Raised when Claude's output can't be turned into a valid scoring result"""
+    pass
+
+
 def fetch_lead_data(lead_id: str) -> Dict[str, Any]:
     """
     Fetch lead data from Supabase database.
@@ -90,26 +248,140 @@ def fetch_lead_data(lead_id: str) -> Dict[str, Any]:
         raise CQIError(f"Failed to fetch lead: {e}")
 
 
-def build_scoring_prompt(lead: Dict[str, Any], brand_config: dict) -> str:
+async def fetch_lead_data_async(lead_id: str) -> Dict[str, Any]:
+    """
+    Async version of fetch_lead_data().
+
+    Args:
+        lead_id: UUID of the lead to fetch
+
+    Returns:
+        dict: Lead data including name, email, phone, message, brand
+
+    Raises:
+        LeadNotFoundError: If lead doesn't exist
+    """
+    logger.info(f"Fetching lead data for: {lead_id}")
+
+    supabase = await get_async_supabase_client()
+
+    try:
+        response = await supabase.table('leads').select('*').eq('id', lead_id).execute()
+
+        if not response.data or len(response.data) == 0:
+            raise LeadNotFoundError(f"No lead found with id: {lead_id}")
+
+        lead = response.data[0]
+        logger.info(f"✅ Lead found: {lead.get('name', 'Unknown')} ({lead.get('brand', 'unknown')})")
+        return lead
+
+    except Exception as e:
+        if isinstance(e, LeadNotFoundError):
+            raise
+        logger.error(f"Database error fetching lead: {e}")
+        raise CQIError(f"Failed to fetch lead: {e}")
+
+
+@lru_cache(maxsize=32)
+def _build_brand_system_prompt(config_key: str) -> str:
+    """Render the rubric for a plain-dict brand config. Cached per distinct config."""
+    return render_rubric(json.loads(config_key))
+
+
+def build_brand_system_prompt(brand_config: dict) -> str:
     """
-    Build the prompt for Claude to analyze and score the lead.
+    Build the static, per-brand part of the scoring prompt.
 
-    The prompt includes:
-    - Brand-specific scoring criteria and weights
-    - Lead information (name, email, phone, message)
-    - Instructions for structured JSON output
+    The rubric, guidelines, bonus/penalty rules and JSON schema are the
+    same for every lead of a brand, so the rendered text is computed once
+    per process and sent as the system block (see build_scoring_request
+    for when it is marked for prompt caching).
 
     Args:
-        lead: Lead data from database
         brand_config: Brand configuration with scoring weights
 
     Returns:
-        str: Formatted prompt for Claude
+        str: System prompt for Claude
     """
-    brand_name = brand_config['brand_name']
-    weights = brand_config['scoring_weights']
-    threshold = brand_config['qualification_threshold']
+    # Registry configs carry the rubric precomputed for their version
+    rubric = getattr(brand_config, 'rubric', None)
+    if rubric is not None:
+        return rubric
+    return _build_brand_system_prompt(json.dumps(brand_config, sort_keys=True))
+
+
+def build_knowledge_context(lead: Dict[str, Any], brand_config: dict) -> str:
+    """
+    Pick the knowledge snippets most relevant to a lead's message.
+
+    Returns an empty string when CQI_KNOWLEDGE_TOP_K is 0 (the default),
+    the lead has no message, or the index can't be loaded; enrichment
+    must never fail a scoring call.
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration (its brand's entries are included)
+
+    Returns:
+        str: Bullet list of snippets, or ''
+    """
+    top_k = get_knowledge_top_k()
+    message = lead.get('message')
+    if top_k <= 0 or not message:
+        return ''
+
+    try:
+        results = get_knowledge_index().search(message, brand=getattr(brand_config, 'brand', None), k=top_k)
+    except Exception as e:
+        logger.warning(f"Knowledge lookup failed, scoring without it: {e}")
+        return ''
+
+    return '\n'.join(f"- {result['snippet']}" for result in results)
+
 
+async def build_knowledge_context_async(lead: Dict[str, Any], brand_config: dict) -> str:
+    """Async version of build_knowledge_context(); the index check and search run in a worker thread."""
+    if get_knowledge_top_k() <= 0 or not lead.get('message'):
+        return ''
+    return await asyncio.to_thread(build_knowledge_context, lead, brand_config)
+
+
+def knowledge_version() -> str:
+    """
+    Identify the knowledge context build_knowledge_context() would add.
+
+    The snippets depend only on the lead's message, the brand, top-k and
+    the index contents, so the score cache keys on top-k and the index
+    fingerprint. Returns '' when enrichment is off or the index can't be
+    loaded, the same as an empty context.
+    """
+    top_k = get_knowledge_top_k()
+    if top_k <= 0:
+        return ''
+    try:
+        return f"{get_knowledge_index().fingerprint}:{top_k}"
+    except Exception:
+        return ''
+
+
+async def knowledge_version_async() -> str:
+    """Async version of knowledge_version(); the librarian stat and any index rebuild run in a worker thread."""
+    if get_knowledge_top_k() <= 0:
+        return ''
+    return await asyncio.to_thread(knowledge_version)
+
+
+def build_lead_prompt(lead: Dict[str, Any], knowledge: str = '') -> str:
+    """
+    Build the per-lead part of the scoring prompt.
+
+    Args:
+        lead: Lead data from database
+        knowledge: Relevant knowledge snippets (see build_knowledge_context)
+
+    Returns:
+        str: User message with the lead's fields
+    """
     # Extract lead fields with defaults
     name = lead.get('name', 'Not provided')
     email = lead.get('email', 'Not provided')
@@ -117,279 +389,1044 @@ def build_scoring_prompt(lead: Dict[str, Any], brand_config: dict) -> str:
     message = lead.get('message', 'Not provided')
     source = lead.get('source', 'unknown')
 
-    prompt = f"""You are a Client Qualification Interview (CQI) agent for {brand_name}.
-
-Your task is to analyze this lead and assign a qualification score from 0-100 based on the criteria below.
-
-LEAD INFORMATION:
+    prompt = f"""LEAD INFORMATION:
 - Name: {name}
 - Email: {email}
 - Phone: {phone}
 - Message: {message}
 - Source: {source}
 
-SCORING CRITERIA (total 100 points):
 """
 
-    # Add each scoring criterion with its weight
-    for criterion, points in weights.items():
-        criterion_display = criterion.replace('_', ' ').title()
-        prompt += f"\n{points} points - {criterion_display}"
+    if knowledge:
+        prompt += f"""RELEVANT SALES KNOWLEDGE (background only, not part of the lead):
+{knowledge}
+
+"""
+
+    return prompt + "Analyze the lead now and return the JSON:"
 
-    prompt += f"""
 
-QUALIFICATION THRESHOLD: {threshold} points
+def build_scoring_prompt(lead: Dict[str, Any], brand_config: dict) -> str:
+    """
+    Build the full prompt for Claude as a single string.
 
-SCORING GUIDELINES:
+    The API path sends build_brand_system_prompt() and build_lead_prompt()
+    as separate blocks (see build_scoring_request); this joins them for
+    logging and debugging.
 
-1. Budget Alignment ({weights.get('budget_alignment', 0)} points):
-   - Explicit budget mentioned or implied: {weights.get('budget_alignment', 0)} points
-   - Vague budget indicators: {weights.get('budget_alignment', 0) // 2} points
-   - No budget info: 0 points
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring weights
 
-2. Urgency ({weights.get('urgency', 0)} points):
-   - "ASAP", "urgent", "this week": {weights.get('urgency', 0)} points
-   - "Soon", "next month": {weights.get('urgency', 0) // 2} points
-   - "Flexible", no timeline: 0 points
+    Returns:
+        str: Formatted prompt for Claude
+    """
+    knowledge = build_knowledge_context(lead, brand_config)
+    return build_brand_system_prompt(brand_config) + "\n\n" + build_lead_prompt(lead, knowledge)
 
-3. Decision Authority ({weights.get('decision_authority', 0)} points):
-   - "I", "me", "my": {weights.get('decision_authority', 0)} points (likely decision maker)
-   - "We", "us": {weights.get('decision_authority', 0) // 2} points (might need approval)
-   - "For someone else", "exploring": 0 points
 
-4. Property/Project Fit ({weights.get('property_fit', weights.get('project_fit', 0))} points):
-   - Clear service need matching our offerings: {weights.get('property_fit', weights.get('project_fit', 0))} points
-   - Partial match: {weights.get('property_fit', weights.get('project_fit', 0)) // 2} points
-   - Poor fit or unclear: 0 points
+def prompt_cache_min_tokens(model: str) -> int:
+    """Minimum cacheable prefix length for a model."""
+    return PROMPT_CACHE_MIN_TOKENS_HAIKU if 'haiku' in model else PROMPT_CACHE_MIN_TOKENS
 
-5. Service History ({weights.get('service_history', 0)} points):
-   - Has used similar services before: {weights.get('service_history', 0)} points
-   - First time user: {weights.get('service_history', 0) // 2} points
-   - Unknown: 0 points
 
-6. Frequency/Commitment ({weights.get('frequency_commitment', weights.get('commitment_level', 0))} points):
-   - Mentions recurring, ongoing, or long-term: {weights.get('frequency_commitment', weights.get('commitment_level', 0))} points
-   - One-time project: {weights.get('frequency_commitment', weights.get('commitment_level', 0)) // 2} points
-   - Unknown: 0 points
+def build_scoring_request(
+    lead: Dict[str, Any],
+    brand_config: dict,
+    knowledge: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build the messages.create() parameters for scoring one lead.
+
+    Shared by the direct and Message Batches scorers so every backend
+    sends exactly the same request. The brand rubric goes in the system
+    block and the lead (plus any retrieved knowledge snippets) in the
+    user message. The system block is marked with cache_control only
+    when the estimated prefix (tools + system) reaches the model's
+    caching minimum; the built-in rubrics (about 600 tokens) are below
+    Sonnet's 1024, so they are sent uncached. _record_usage() warns if
+    a marked prefix comes back without cache tokens.
+    In 'tool' scoring mode the record_lead_score tool is attached and
+    forced, so the result arrives as structured tool input.
 
-ADDITIONAL FACTORS:
-- Complete contact info (phone + email): +5 bonus points
-- Professional tone in message: +3 bonus points
-- Detailed, specific request: +3 bonus points
-- Incomplete contact info: -5 penalty points
-- Spam-like message: -10 penalty points
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring weights
+        knowledge: Knowledge snippets already looked up (async callers use
+            build_knowledge_context_async()); default: look them up here
 
-OUTPUT FORMAT:
-Return ONLY a valid JSON object with this structure:
+    Returns:
+        dict: Keyword arguments for anthropic.messages.create()
+    """
+    if knowledge is None:
+        knowledge = build_knowledge_context(lead, brand_config)
+    system = build_brand_system_prompt(brand_config)
+    request = {
+        'model': SCORING_MODEL,
+        'max_tokens': 1024,
+        'temperature': 0.3,  # Lower temperature for more consistent scoring
+        'system': [
+            {
+                "type": "text",
+                "text": system
+            }
+        ],
+        'messages': [
+            {
+                "role": "user",
+                "content": build_lead_prompt(lead, knowledge)
+            }
+        ]
+    }
 
-{{
-  "qualification_score": 75,
-  "qualified": true,
-  "scoring_breakdown": {{
-    "budget_alignment": 20,
-    "urgency": 15,
-    "decision_authority": 20,
-    "property_fit": 12,
-    "service_history": 5,
-    "frequency_commitment": 8
-  }},
-  "reasoning": "Brief explanation of the score and key factors",
-  "recommended_action": "trial_booking|nurture_campaign|disqualify",
-  "confidence_level": "high|medium|low"
-}}
+    prefix_chars = len(system)
+    if get_scoring_mode() == 'tool':
+        request['tools'] = [SCORING_TOOL]
+        request['tool_choice'] = SCORING_TOOL_CHOICE
+        prefix_chars += len(json.dumps(SCORING_TOOL))
 
-Analyze the lead now and return the JSON:"""
+    if prefix_chars // CHARS_PER_TOKEN >= prompt_cache_min_tokens(SCORING_MODEL):
+        request['system'][0]['cache_control'] = {"type": "ephemeral"}
 
-    return prompt
+    return request
 
 
-def score_lead_with_claude(lead: Dict[str, Any], brand_config: dict) -> Dict[str, Any]:
+def parse_scoring_response(response_text: str, brand_config: dict) -> Dict[str, Any]:
     """
-    Use Claude AI to analyze and score the lead.
+    Parse and validate Claude's scoring response.
 
     Args:
-        lead: Lead data from database
-        brand_config: Brand configuration with scoring criteria
+        response_text: Raw text returned by Claude
+        brand_config: Brand configuration with qualification threshold
 
     Returns:
-        dict: Scoring results including:
-            - qualification_score (int): 0-100
-            - qualified (bool): True if score >= threshold
-            - scoring_breakdown (dict): Points per criterion
-            - reasoning (str): Explanation of score
-            - recommended_action (str): Next step
-            - confidence_level (str): How confident Claude is
+        dict: Validated scoring result with 'qualified' set from the threshold
 
     Raises:
-        ScoringError: If Claude API fails or returns invalid data
+        json.JSONDecodeError: If no JSON object can be extracted
+        ScoringParseError: If required fields are missing or the score is invalid
     """
-    logger.info(f"Analyzing lead with Claude AI...")
-
-    anthropic = get_anthropic_client()
-
-    # Build the scoring prompt
-    prompt = build_scoring_prompt(lead, brand_config)
+    response_text = response_text.strip()
 
     try:
-        # Call Claude API
-        response = anthropic.messages.create(
-            model="claude-3-5-sonnet-20250131",
-            max_tokens=1024,
-            temperature=0.3,  # Lower temperature for more consistent scoring
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
+        result = json.loads(response_text)
+    except json.JSONDecodeError:
+        # Sometimes Claude wraps JSON in markdown code blocks
+        if '```json' in response_text:
+            response_text = response_text.split('```json')[1].split('```')[0].strip()
+            result = json.loads(response_text)
+        elif '```' in response_text:
+            response_text = response_text.split('```')[1].split('```')[0].strip()
+            result = json.loads(response_text)
+        else:
+            raise
 
-        # Extract the response text
-        response_text = response.content[0].text.strip()
+    return validate_scoring_result(result, brand_config)
 
-        # Parse JSON response
-        try:
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # Sometimes Claude wraps JSON in markdown code blocks
-            if '```json' in response_text:
-                response_text = response_text.split('```json')[1].split('```')[0].strip()
-                result = json.loads(response_text)
-            elif '```' in response_text:
-                response_text = response_text.split('```')[1].split('```')[0].strip()
-                result = json.loads(response_text)
-            else:
-                raise
 
-        # Validate required fields
-        required_fields = ['qualification_score', 'qualified', 'scoring_breakdown', 'reasoning']
-        missing_fields = [f for f in required_fields if f not in result]
-        if missing_fields:
-            raise ScoringError(f"Missing required fields in response: {missing_fields}")
+def validate_scoring_result(result: Dict[str, Any], brand_config: dict) -> Dict[str, Any]:
+    """
+    Validate a decoded scoring result and set 'qualified' from the threshold.
+
+    Args:
+        result: Decoded JSON object from Claude
+        brand_config: Brand configuration with qualification threshold
 
-        # Validate score is within range
-        score = result['qualification_score']
-        if not isinstance(score, (int, float)) or score < 0 or score > 100:
-            raise ScoringError(f"Invalid qualification_score: {score} (must be 0-100)")
+    Returns:
+        dict: Validated scoring result
 
-        # Ensure qualified boolean matches threshold
-        threshold = brand_config['qualification_threshold']
-        result['qualified'] = score >= threshold
+    Raises:
+        ScoringParseError: If required fields are missing or the score is invalid
+    """
+    # Validate required fields
+    required_fields = ['qualification_score', 'qualified', 'scoring_breakdown', 'reasoning']
+    missing_fields = [f for f in required_fields if f not in result]
+    if missing_fields:
+        raise ScoringParseError(f"Missing required fields in response: {missing_fields}")
+
+    # Validate score is within range
+    score = result['qualification_score']
+    if not isinstance(score, (int, float)) or score < 0 or score > 100:
+        raise ScoringParseError(f"Invalid qualification_score: {score} (must be 0-100)")
+
+    # Ensure qualified boolean matches threshold
+    threshold = brand_config['qualification_threshold']
+    result['qualified'] = score >= threshold
 
-        logger.info(f"✅ Scoring complete: {score}/100 (qualified: {result['qualified']})")
-        return result
+    logger.info(f"✅ Scoring complete: {score}/100 (qualified: {result['qualified']})")
+    return result
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse Claude response as JSON: {e}")
-        logger.error(f"Response text: {response_text[:500]}")
-        raise ScoringError(f"Claude returned invalid JSON: {e}")
 
-    except Exception as e:
-        logger.error(f"Claude API error: {e}")
-        raise ScoringError(f"Failed to score lead with Claude: {e}")
+def response_text_of(message) -> str:
+    """Join the text blocks of a Claude message."""
+    return ''.join(block.text for block in message.content if getattr(block, 'type', 'text') == 'text')
 
 
-def create_cqi_session(
-    lead_id: str,
-    brand: str,
-    scoring_result: Dict[str, Any]
-) -> Dict[str, Any]:
+def extract_scoring_result(message, brand_config: dict) -> Dict[str, Any]:
     """
-    Create CQI session record in Supabase database.
+    Turn a Claude message into a validated scoring result.
+
+    A record_lead_score tool call is validated against the compiled
+    schema; otherwise the text is parsed as JSON.
 
     Args:
-        lead_id: UUID of the lead
-        brand: Brand identifier
-        scoring_result: Results from Claude scoring
+        message: Claude Message (from messages.create or a batch result)
+        brand_config: Brand configuration with qualification threshold
 
     Returns:
-        dict: Created session record including session_id
+        dict: Validated scoring result
 
     Raises:
-        CQIError: If database insert fails
+        json.JSONDecodeError: If text output contains no JSON object
+        ScoringParseError: If the output fails validation
     """
-    logger.info(f"Creating CQI session record...")
+    for block in message.content:
+        if getattr(block, 'type', None) == 'tool_use' and block.name == SCORING_TOOL_NAME:
+            errors = validate_scoring_payload(block.input)
+            if errors:
+                raise ScoringParseError(f"Tool output failed schema validation: {'; '.join(errors)}")
+            return validate_scoring_result(dict(block.input), brand_config)
 
-    supabase = get_supabase_client()
+    return parse_scoring_response(response_text_of(message), brand_config)
 
-    # Prepare session data
-    session_data = {
-        'lead_id': lead_id,
-        'brand': brand,
-        'session_state': 'scored',  # Initial state after scoring
-        'qualification_score': scoring_result['qualification_score'],
-        'session_data': {
-            'scoring_breakdown': scoring_result['scoring_breakdown'],
-            'reasoning': scoring_result['reasoning'],
-            'recommended_action': scoring_result.get('recommended_action', 'unknown'),
-            'confidence_level': scoring_result.get('confidence_level', 'medium'),
-            'scored_at': datetime.utcnow().isoformat(),
-            'model_used': 'claude-3-5-sonnet-20250131'
-        }
-    }
 
-    try:
-        response = supabase.table('cqi_sessions').insert(session_data).execute()
+def score_without_claude(
+    lead: Dict[str, Any],
+    brand_config: dict
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Try to score a lead without calling Claude.
 
-        if not response.data or len(response.data) == 0:
-            raise CQIError("Failed to create session - no data returned")
+    1. The local pre-scorer decides clear spam and clearly qualified leads
+    2. Identical inputs (double submits, retries, re-runs) reuse a cached score
 
-        session = response.data[0]
-        logger.info(f"✅ CQI session created: {session['id']}")
-        return session
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring criteria
 
-    except Exception as e:
-        logger.error(f"Database error creating session: {e}")
-        raise CQIError(f"Failed to create CQI session: {e}")
+    Returns:
+        tuple: (scoring result or None, cache key to store a Claude result under)
+    """
+    result = _prescore(lead, brand_config)
+    if result is not None:
+        return result, None
+    cache_key = make_key(lead, brand_config, SCORING_MODEL, knowledge_version())
+    return _cache_hit(get_score_cache().get(cache_key), brand_config), cache_key
 
 
-def log_system_event(
-    brand: str,
-    event_type: str,
-    event_data: Dict[str, Any],
-    severity: str = 'info'
-) -> None:
-    """
-    Log system event to database for monitoring and debugging.
+async def score_without_claude_async(
+    lead: Dict[str, Any],
+    brand_config: dict
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Async version of score_without_claude(); the knowledge version and shared cache tier are read off the event loop."""
+    result = _prescore(lead, brand_config)
+    if result is not None:
+        return result, None
+    cache_key = make_key(lead, brand_config, SCORING_MODEL, await knowledge_version_async())
+    return _cache_hit(await get_score_cache().get_async(cache_key), brand_config), cache_key
 
-    Args:
-        brand: Brand identifier
-        event_type: Type of event (e.g., 'cqi_session_created', 'lead_qualified')
-        event_data: Event details
-        severity: Event severity (info, warning, error)
-    """
-    supabase = get_supabase_client()
 
-    try:
-        supabase.table('system_events').insert({
-            'brand': brand,
-            'event_type': event_type,
-            'event_data': event_data,
-            'severity': severity
-        }).execute()
-    except Exception as e:
-        # Don't fail the main operation if logging fails
-        logger.warning(f"Failed to log system event: {e}")
+def _prescore(lead: Dict[str, Any], brand_config: dict) -> Optional[Dict[str, Any]]:
+    result = get_prescorer().decide(lead, brand_config)
+    if result is not None:
+        logger.info(f"✅ Decided by pre-scorer: {result['qualification_score']}/100 ({result['recommended_action']})")
+        record_scoring_source(_brand_of(brand_config), 'prescorer')
+    return result
 
 
-def process_lead(lead_id: str, brand: str) -> Dict[str, Any]:
-    """
-    Main function to process a lead through the CQI workflow.
+def _cache_hit(cached: Optional[Dict[str, Any]], brand_config: dict) -> Optional[Dict[str, Any]]:
+    if cached is not None:
+        logger.info(f"✅ Scoring cache hit: {cached['qualification_score']}/100")
+        record_scoring_source(_brand_of(brand_config), 'cache')
+    return cached
 
-    This is the entry point for CQI Conductor agent execution.
 
-    Workflow:
-    1. Validate environment variables
-    2. Fetch lead data from database
-    3. Get brand-specific configuration
-    4. Score lead using Claude AI
-    5. Create CQI session record
-    6. Log system event
-    7. Return results
+def fallback_score(lead: Dict[str, Any], brand_config: dict, allow_fallback: bool = True) -> Dict[str, Any]:
+    """
+    Score a lead locally because the Claude circuit is open.
 
     Args:
-        lead_id: UUID of the lead to process
-        brand: Brand identifier (sotsvc, boss_of_clean, etc.)
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring criteria
+        allow_fallback: If False, raise instead (callers that can simply
+            retry later, like queue workers)
+
+    Returns:
+        dict: Provisional scoring result (provisional=True, never cached)
+
+    Raises:
+        CircuitOpenError: If allow_fallback is False
+    """
+    if not allow_fallback:
+        raise CircuitOpenError("Claude scoring circuit is open")
+
+    _count_scoring(get_scoring_mode(), 'fallbacks')
+    record_scoring_source(_brand_of(brand_config), 'fallback')
+    result = provisional_result(lead, brand_config)
+    logger.warning(f"⚠️  Claude circuit open; provisional local score {result['qualification_score']}/100")
+    return result
+
+
+@lru_cache(maxsize=1)
+def _get_rescore_queue():
+    # Imported lazily: job_queue imports this module inside its workers
+    from job_queue import JobQueue, queue_enabled
+    return JobQueue() if queue_enabled() else None
+
+
+def queue_rescore(lead_id: str, brand: str, session_id: str) -> Optional[str]:
+    """
+    Queue a provisionally scored lead to be scored by Claude later.
+
+    The job updates the existing session in place once the circuit has
+    closed. Jobs run on the CQI queue workers (CQI_QUEUE_ENABLED server
+    workers or `conductor.py --serve`), so CQI_QUEUE_ENABLED must be set
+    wherever leads are scored; without it nothing would ever run the
+    job, so none is queued and the lead keeps its provisional score.
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        session_id: Session holding the provisional score
+
+    Returns:
+        str: Job ID, or None if the job couldn't be queued
+    """
+    try:
+        rescore_queue = _get_rescore_queue()
+        if rescore_queue is None:
+            logger.error(
+                f"❌ Re-score of lead {lead_id} not queued: no queue workers (set CQI_QUEUE_ENABLED=true and run "
+                f"the API server's workers or `conductor.py --serve`); session {session_id} keeps its provisional score"
+            )
+            return None
+        return rescore_queue.enqueue(
+            lead_id, brand,
+            session_id=session_id,
+            delay_seconds=get_scoring_breaker().open_seconds
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue re-score for lead {lead_id}: {e}")
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """The SDK's retry rule: connection errors and timeouts, 408/409/429 and 5xx."""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        should_retry = error.response.headers.get('x-should-retry')
+        if should_retry in ('true', 'false'):
+            return should_retry == 'true'
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _call_within_budget(anthropic, budget: float, attempt):
+    """
+    Run attempt(client, seconds_left) with retries that share one deadline.
+
+    With the SDK's own retries every attempt gets the full timeout, so a
+    call could take (max_retries + 1) x budget. Here the client's retries
+    are turned off, each attempt gets only what is left of the budget,
+    and a retry whose backoff would end past the deadline isn't made.
+    """
+    deadline = time.monotonic() + budget
+    client = anthropic.with_options(max_retries=0)
+
+    for number in range(1, SCORING_ATTEMPTS + 1):
+        remaining = deadline - time.monotonic()
+        try:
+            with call_deadline(remaining):
+                return attempt(client, remaining)
+        except Exception as e:
+            delay = min(0.5 * 2 ** (number - 1), 8.0)
+            if isinstance(e, APIStatusError):
+                delay = parse_retry_after(e.response.headers.get('retry-after')) or delay
+            if number == SCORING_ATTEMPTS or not _is_retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            logger.warning(f"Claude attempt {number} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _stream_scoring_response(
+    anthropic,
+    request: Dict[str, Any],
+    brand_config: dict,
+    budget: float
+) -> Dict[str, Any]:
+    """
+    Stream a scoring call and return as soon as the JSON object closes.
+
+    Leaving the stream context early closes the connection, so tokens
+    after the object (or after a clearly malformed start) aren't read.
+
+    Raises:
+        MalformedStreamError: If the stream can't contain a valid object
+        ScoringError: If the budget runs out or the stream ends early
+    """
+    parser = IncrementalJSONParser()
+    deadline = time.monotonic() + budget
+
+    with anthropic.messages.stream(**request, timeout=budget) as stream:
+        for text in stream.text_stream:
+            result = parser.feed(text)
+            if result is not None:
+                _record_stream_usage(stream, request, brand_config)
+                return validate_scoring_result(result, brand_config)
+            if time.monotonic() > deadline:
+                raise ScoringError(f"Scoring exceeded latency budget of {budget}s")
+
+    raise MalformedStreamError("Stream ended before the JSON object was complete")
+
+
+async def _stream_scoring_response_async(
+    anthropic,
+    request: Dict[str, Any],
+    brand_config: dict
+) -> Dict[str, Any]:
+    """Async version of _stream_scoring_response(); the caller enforces the budget."""
+    parser = IncrementalJSONParser()
+
+    async with anthropic.messages.stream(**request) as stream:
+        async for text in stream.text_stream:
+            result = parser.feed(text)
+            if result is not None:
+                _record_stream_usage(stream, request, brand_config)
+                return validate_scoring_result(result, brand_config)
+
+    raise MalformedStreamError("Stream ended before the JSON object was complete")
+
+
+def score_lead_with_claude(
+    lead: Dict[str, Any],
+    brand_config: dict,
+    allow_fallback: bool = True
+) -> Dict[str, Any]:
+    """
+    Use Claude AI to analyze and score the lead.
+
+    While the scoring circuit breaker is open, Claude is skipped and the
+    lead gets a provisional local score (see fallback_score()).
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring criteria
+        allow_fallback: Raise CircuitOpenError instead of falling back
+
+    Returns:
+        dict: Scoring results including:
+            - qualification_score (int): 0-100
+            - qualified (bool): True if score >= threshold
+            - scoring_breakdown (dict): Points per criterion
+            - reasoning (str): Explanation of score
+            - recommended_action (str): Next step
+            - confidence_level (str): How confident Claude is
+
+    Raises:
+        ScoringError: If Claude API fails or returns invalid data
+        CircuitOpenError: If the circuit is open and allow_fallback is False
+    """
+    result, cache_key = score_without_claude(lead, brand_config)
+    if result is not None:
+        return result
+
+    breaker = get_scoring_breaker()
+    if not breaker.allow():
+        return fallback_score(lead, brand_config, allow_fallback)
+
+    logger.info("Analyzing lead with Claude AI...")
+
+    anthropic = get_anthropic_client()
+    request = build_scoring_request(lead, brand_config)
+    budget = get_scoring_budget()
+    response_text = ''
+
+    mode = get_scoring_mode()
+    _count_scoring(mode, 'claude_calls')
+
+    # Parse failures mean Claude answered, so only API errors and
+    # timeouts count against the breaker
+    claude_answered = False
+    outcome = 'api_error'
+    started = time.monotonic()
+    try:
+        if mode == 'stream':
+            result = _call_within_budget(
+                anthropic, budget,
+                lambda client, left: _stream_scoring_response(client, request, brand_config, left)
+            )
+        else:
+            # Call Claude API; attempts and retries share the budget
+            response = _call_within_budget(
+                anthropic, budget,
+                lambda client, left: client.messages.create(**request, timeout=left)
+            )
+            claude_answered = True
+            _record_usage(request, brand_config, getattr(response, 'usage', None))
+
+            # Extract the response text (or tool input in 'tool' mode)
+            response_text = response_text_of(response)
+            result = extract_scoring_result(response, brand_config)
+
+        claude_answered = True
+        outcome = 'ok'
+        record_scoring_source(_brand_of(brand_config), 'claude')
+        get_score_cache().set(cache_key, result)
+        return result
+
+    except MalformedStreamError as e:
+        claude_answered = True
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Aborted malformed Claude stream: {e}")
+        raise ScoringError(f"Claude returned invalid JSON: {e}")
+
+    except json.JSONDecodeError as e:
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Failed to parse Claude response as JSON: {e}")
+        logger.error(f"Response text: {response_text[:500]}")
+        raise ScoringError(f"Claude returned invalid JSON: {e}")
+
+    except ScoringParseError as e:
+        claude_answered = True
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Invalid scoring result from Claude: {e}")
+        raise
+
+    except Exception as e:
+        if isinstance(e, ScoringError) or 'Timeout' in type(e).__name__:
+            outcome = 'timeout'
+        logger.error(f"Claude API error: {e}")
+        raise ScoringError(f"Failed to score lead with Claude: {e}")
+
+    finally:
+        elapsed = time.monotonic() - started
+        breaker.record(claude_answered, elapsed)
+        record_claude_call(_brand_of(brand_config), request['model'], mode, outcome, elapsed)
+        _annotate_span(request['model'], mode, outcome)
+
+
+async def _hedged(call, delay: Optional[float], mode: str):
+    """
+    Await call(), starting a second identical call if the first hasn't
+    finished after `delay` seconds. The first successful result wins and
+    the other call is cancelled.
+    """
+    primary = asyncio.ensure_future(call())
+    if delay is None:
+        return await primary
+
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logger.info(f"Claude call slower than {delay:.1f}s; sending hedged request")
+            _count_scoring(mode, 'hedged')
+            _count_scoring(mode, 'claude_calls')
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _count_scoring(mode, 'hedge_wins')
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def score_lead_with_claude_async(
+    lead: Dict[str, Any],
+    brand_config: dict,
+    allow_fallback: bool = True
+) -> Dict[str, Any]:
+    """
+    Async version of score_lead_with_claude().
+
+    Awaits the Claude API call so other requests on the same event loop
+    keep running while the lead is being scored. With CQI_HEDGE_ENABLED,
+    a call still running after the recent p95 latency gets a second,
+    hedged request and the faster answer wins.
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring criteria
+        allow_fallback: Raise CircuitOpenError instead of falling back
+
+    Returns:
+        dict: Scoring results (see score_lead_with_claude)
+
+    Raises:
+        ScoringError: If Claude API fails or returns invalid data
+        CircuitOpenError: If the circuit is open and allow_fallback is False
+    """
+    result, cache_key = await score_without_claude_async(lead, brand_config)
+    if result is not None:
+        return result
+
+    breaker = get_scoring_breaker()
+    if not breaker.allow():
+        return fallback_score(lead, brand_config, allow_fallback)
+
+    logger.info("Analyzing lead with Claude AI...")
+
+    anthropic = get_async_anthropic_client()
+    request = build_scoring_request(lead, brand_config, await build_knowledge_context_async(lead, brand_config))
+    budget = get_scoring_budget()
+    response_text = ''
+
+    mode = get_scoring_mode()
+    _count_scoring(mode, 'claude_calls')
+
+    async def call() -> Dict[str, Any]:
+        nonlocal response_text
+        if mode == 'stream':
+            return await _stream_scoring_response_async(anthropic, request, brand_config)
+        response = await anthropic.messages.create(**request)
+        _record_usage(request, brand_config, getattr(response, 'usage', None))
+        response_text = response_text_of(response)
+        return extract_scoring_result(response, brand_config)
+
+    # Parse failures mean Claude answered, so only API errors and
+    # timeouts count against the breaker
+    claude_answered = False
+    outcome = 'api_error'
+    started = time.monotonic()
+    try:
+        # The deadline makes rate limit waits fail fast instead of eating the budget
+        with call_deadline(budget):
+            result = await asyncio.wait_for(_hedged(call, hedge_delay(breaker, budget), mode), timeout=budget)
+        claude_answered = True
+        outcome = 'ok'
+        record_scoring_source(_brand_of(brand_config), 'claude')
+        await get_score_cache().set_async(cache_key, result)
+        return result
+
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+        logger.error(f"Claude scoring exceeded latency budget ({budget}s)")
+        raise ScoringError(f"Scoring exceeded latency budget of {budget}s")
+
+    except MalformedStreamError as e:
+        claude_answered = True
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Aborted malformed Claude stream: {e}")
+        raise ScoringError(f"Claude returned invalid JSON: {e}")
+
+    except json.JSONDecodeError as e:
+        claude_answered = True
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Failed to parse Claude response as JSON: {e}")
+        logger.error(f"Response text: {response_text[:500]}")
+        raise ScoringError(f"Claude returned invalid JSON: {e}")
+
+    except ScoringParseError as e:
+        claude_answered = True
+        outcome = 'parse_error'
+        _count_scoring(mode, 'parse_failures')
+        logger.error(f"Invalid scoring result from Claude: {e}")
+        raise
+
+    except Exception as e:
+        if isinstance(e, ScoringError) or 'Timeout' in type(e).__name__:
+            outcome = 'timeout'
+        logger.error(f"Claude API error: {e}")
+        raise ScoringError(f"Failed to score lead with Claude: {e}")
+
+    finally:
+        elapsed = time.monotonic() - started
+        breaker.record(claude_answered, elapsed)
+        record_claude_call(_brand_of(brand_config), request['model'], mode, outcome, elapsed)
+        _annotate_span(request['model'], mode, outcome)
+
+
+def build_session_record(
+    lead_id: str,
+    brand: str,
+    scoring_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Build the cqi_sessions row for a scored lead.
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        scoring_result: Results from Claude scoring
+
+    Returns:
+        dict: Row ready to insert into cqi_sessions
+    """
+    return {
+        'lead_id': lead_id,
+        'brand': brand,
+        'session_state': 'scored',  # Initial state after scoring
+        'qualification_score': scoring_result['qualification_score'],
+        'session_data': {
+            'scoring_breakdown': scoring_result['scoring_breakdown'],
+            'reasoning': scoring_result['reasoning'],
+            'recommended_action': scoring_result.get('recommended_action', 'unknown'),
+            'confidence_level': scoring_result.get('confidence_level', 'medium'),
+            'scored_at': datetime.utcnow().isoformat(),
+            'model_used': scoring_result.get('model_used', SCORING_MODEL),
+            # Provisional scores are replaced when the queued re-score runs
+            'provisional': bool(scoring_result.get('provisional'))
+        }
+    }
+
+
+def create_cqi_session(
+    lead_id: str,
+    brand: str,
+    scoring_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Create CQI session record in Supabase database.
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        scoring_result: Results from Claude scoring
+
+    Returns:
+        dict: Created session record including session_id
+
+    Raises:
+        CQIError: If database insert fails
+    """
+    logger.info("Creating CQI session record...")
+
+    supabase = get_supabase_client()
+
+    # Prepare session data
+    session_data = build_session_record(lead_id, brand, scoring_result)
+
+    try:
+        response = supabase.table('cqi_sessions').insert(session_data).execute()
+
+        if not response.data or len(response.data) == 0:
+            raise CQIError("Failed to create session - no data returned")
+
+        session = response.data[0]
+        logger.info(f"✅ CQI session created: {session['id']}")
+        return session
+
+    except Exception as e:
+        logger.error(f"Database error creating session: {e}")
+        raise CQIError(f"Failed to create CQI session: {e}")
+
+
+async def create_cqi_session_async(
+    lead_id: str,
+    brand: str,
+    scoring_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Async version of create_cqi_session().
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        scoring_result: Results from Claude scoring
+
+    Returns:
+        dict: Created session record including session_id
+
+    Raises:
+        CQIError: If database insert fails
+    """
+    logger.info("Creating CQI session record...")
+
+    supabase = await get_async_supabase_client()
+
+    session_data = build_session_record(lead_id, brand, scoring_result)
+
+    try:
+        response = await supabase.table('cqi_sessions').insert(session_data).execute()
+
+        if not response.data or len(response.data) == 0:
+            raise CQIError("Failed to create session - no data returned")
+
+        session = response.data[0]
+        logger.info(f"✅ CQI session created: {session['id']}")
+        return session
+
+    except Exception as e:
+        logger.error(f"Database error creating session: {e}")
+        raise CQIError(f"Failed to create CQI session: {e}")
+
+
+async def create_pending_session_async(lead_id: str, brand: str) -> Dict[str, Any]:
+    """
+    Create a cqi_sessions record in the 'initiated' state before scoring.
+
+    Used by the background queue so progress is visible in session_state
+    while the lead waits for (or is undergoing) scoring.
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+
+    Returns:
+        dict: Created session record
+
+    Raises:
+        CQIError: If database insert fails
+    """
+    supabase = await get_async_supabase_client()
+
+    try:
+        response = await supabase.table('cqi_sessions').insert({
+            'lead_id': lead_id,
+            'brand': brand,
+            'session_state': 'initiated'
+        }).execute()
+
+        if not response.data or len(response.data) == 0:
+            raise CQIError("Failed to create session - no data returned")
+
+        return response.data[0]
+
+    except Exception as e:
+        logger.error(f"Database error creating pending session: {e}")
+        raise CQIError(f"Failed to create pending CQI session: {e}")
+
+
+async def update_cqi_session_async(
+    session_id: str,
+    lead_id: str,
+    brand: str,
+    scoring_result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Write scoring results onto an existing (pending) CQI session.
+
+    Args:
+        session_id: UUID of the session created by create_pending_session_async
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        scoring_result: Results from Claude scoring
+
+    Returns:
+        dict: Updated session record
+
+    Raises:
+        CQIError: If database update fails
+    """
+    logger.info(f"Updating CQI session record: {session_id}")
+
+    supabase = await get_async_supabase_client()
+
+    session_data = build_session_record(lead_id, brand, scoring_result)
+
+    try:
+        response = await supabase.table('cqi_sessions').update(session_data).eq('id', session_id).execute()
+        invalidate_session(session_id)
+
+        if not response.data or len(response.data) == 0:
+            raise CQIError(f"Failed to update session - no session with id: {session_id}")
+
+        session = response.data[0]
+        logger.info(f"✅ CQI session scored: {session['id']}")
+        return session
+
+    except Exception as e:
+        logger.error(f"Database error updating session: {e}")
+        raise CQIError(f"Failed to update CQI session: {e}")
+
+
+async def record_session_error_async(session_id: str, error: str, attempt: int = 1, final: bool = False) -> None:
+    """
+    Record a scoring failure on a pending CQI session.
+
+    The session stays in the 'initiated' state so it can be retried,
+    unless the failure is final.
+
+    Args:
+        session_id: UUID of the pending session
+        error: Error message
+        attempt: Attempt number that failed
+        final: No more attempts will be made; move the session to 'failed'
+    """
+    try:
+        supabase = await get_async_supabase_client()
+        update = {
+            'errors': [{
+                'error': error,
+                'attempt': attempt,
+                'failed_at': datetime.utcnow().isoformat()
+            }]
+        }
+        if final:
+            update['session_state'] = 'failed'
+        await supabase.table('cqi_sessions').update(update).eq('id', session_id).execute()
+        invalidate_session(session_id)
+    except Exception as e:
+        # Don't fail the worker if error bookkeeping fails
+        logger.warning(f"Failed to record session error: {e}")
+
+
+def log_system_event(
+    brand: str,
+    event_type: str,
+    event_data: Dict[str, Any],
+    severity: str = 'info'
+) -> None:
+    """
+    Log system event to database for monitoring and debugging.
+
+    The event is also counted toward the dashboard KPI rollups. Inside a
+    trace, event_data gets the trace id ('trace_id').
+
+    Args:
+        brand: Brand identifier
+        event_type: Type of event (e.g., 'cqi_session_created', 'lead_qualified')
+        event_data: Event details
+        severity: Event severity (info, warning, error)
+    """
+    record_kpi_event(brand, event_type, event_data)
+    supabase = get_supabase_client()
+
+    try:
+        supabase.table('system_events').insert({
+            'brand': brand,
+            'event_type': event_type,
+            'event_data': with_trace_id(event_data),
+            'severity': severity
+        }).execute()
+    except Exception as e:
+        # Don't fail the main operation if logging fails
+        logger.warning(f"Failed to log system event: {e}")
+
+
+async def log_system_event_async(
+    brand: str,
+    event_type: str,
+    event_data: Dict[str, Any],
+    severity: str = 'info'
+) -> None:
+    """
+    Async version of log_system_event().
+
+    Args:
+        brand: Brand identifier
+        event_type: Type of event (e.g., 'cqi_session_created', 'lead_qualified')
+        event_data: Event details
+        severity: Event severity (info, warning, error)
+    """
+    record_kpi_event(brand, event_type, event_data)
+    try:
+        supabase = await get_async_supabase_client()
+        await supabase.table('system_events').insert({
+            'brand': brand,
+            'event_type': event_type,
+            'event_data': with_trace_id(event_data),
+            'severity': severity
+        }).execute()
+    except Exception as e:
+        # Don't fail the main operation if logging fails
+        logger.warning(f"Failed to log system event: {e}")
+
+
+def _log_start_banner(lead_id: str, brand: str) -> None:
+    """Log the banner shown when a lead starts processing."""
+    logger.info(f"\n{'='*60}")
+    logger.info("CQI CONDUCTOR - Processing Lead")
+    logger.info(f"{'='*60}")
+    logger.info(f"Lead ID: {lead_id}")
+    logger.info(f"Brand: {brand}")
+    logger.info(f"Started: {datetime.utcnow().isoformat()}")
+    logger.info(f"{'='*60}\n")
+
+
+def _log_failure_banner(error: Exception) -> None:
+    """Log the banner shown when processing a lead fails."""
+    logger.error(f"\n{'='*60}")
+    logger.error("❌ CQI PROCESSING FAILED")
+    logger.error(f"{'='*60}")
+    logger.error(f"Error: {error}")
+    logger.error(f"{'='*60}\n")
+
+
+def _build_process_result(
+    lead_id: str,
+    brand: str,
+    scoring_result: Dict[str, Any],
+    session: Dict[str, Any],
+    log_summary: bool = True
+) -> Dict[str, Any]:
+    """
+    Build the result object returned by process_lead and log the summary.
+
+    Args:
+        lead_id: UUID of the lead
+        brand: Brand identifier
+        scoring_result: Results from Claude scoring
+        session: Created cqi_sessions record
+        log_summary: Log the completion banner (off for batch runs)
+
+    Returns:
+        dict: Processing results (see process_lead)
+    """
+    result = {
+        'success': True,
+        'session_id': session['id'],
+        'lead_id': lead_id,
+        'brand': brand,
+        'qualification_score': scoring_result['qualification_score'],
+        'qualified': scoring_result['qualified'],
+        'reasoning': scoring_result['reasoning'],
+        'recommended_action': scoring_result.get('recommended_action', 'unknown'),
+        'session_state': session['session_state'],
+        'scoring_breakdown': scoring_result['scoring_breakdown'],
+        'provisional': bool(scoring_result.get('provisional'))
+    }
+
+    if not log_summary:
+        return result
+
+    logger.info(f"\n{'='*60}")
+    logger.info("✅ CQI PROCESSING COMPLETE")
+    logger.info(f"{'='*60}")
+    logger.info(f"Session ID: {result['session_id']}")
+    logger.info(f"Score: {result['qualification_score']}/100")
+    logger.info(f"Qualified: {result['qualified']}")
+    logger.info(f"Action: {result['recommended_action']}")
+    logger.info(f"{'='*60}\n")
+
+    return result
+
+
+def process_lead(lead_id: str, brand: str) -> Dict[str, Any]:
+    """
+    Main function to process a lead through the CQI workflow.
+
+    This is the entry point for CQI Conductor agent execution.
+
+    Workflow:
+    1. Validate environment variables
+    2. Fetch lead data from database
+    3. Get brand-specific configuration
+    4. Score lead using Claude AI
+    5. Create CQI session record
+    6. Log system event
+    7. Return results
+
+    Args:
+        lead_id: UUID of the lead to process
+        brand: Brand identifier (sotsvc, boss_of_clean, etc.)
 
     Returns:
         dict: Processing results including:
@@ -401,83 +1438,158 @@ def process_lead(lead_id: str, brand: str) -> Dict[str, Any]:
             - reasoning (str): Explanation from Claude
             - recommended_action (str): Next step
             - session_state (str): Current state of session
+            - provisional (bool): Scored locally because Claude was
+              unavailable; a re-score has been queued
 
     Raises:
         CQIError: If any step in the process fails
     """
-    logger.info(f"\n{'='*60}")
-    logger.info(f"CQI CONDUCTOR - Processing Lead")
-    logger.info(f"{'='*60}")
-    logger.info(f"Lead ID: {lead_id}")
-    logger.info(f"Brand: {brand}")
-    logger.info(f"Started: {datetime.utcnow().isoformat()}")
-    logger.info(f"{'='*60}\n")
+    with start_span('process_lead', lead_id=lead_id, brand=brand):
+        _log_start_banner(lead_id, brand)
 
-    try:
-        # Step 1: Validate environment
-        validate_environment()
+        try:
+            # Step 1: Validate environment
+            validate_environment()
+
+            # Step 2: Fetch lead data
+            with step_timer('fetch_lead_data', brand), start_span('fetch_lead_data', brand=brand):
+                lead = fetch_lead_data(lead_id)
+
+            # Step 3: Get brand configuration
+            with step_timer('get_brand_config', brand), start_span('get_brand_config', brand=brand):
+                brand_config = get_brand_config(brand)
+            logger.info(f"Qualification threshold: {brand_config['qualification_threshold']}")
+
+            # Step 4: Score lead with Claude
+            notify_scoring_started(lead_id, brand)
+            with step_timer('score_lead_with_claude', brand), start_span('score_lead_with_claude', brand=brand):
+                scoring_result = score_lead_with_claude(lead, brand_config)
+
+            # Step 5: Create CQI session
+            with step_timer('create_cqi_session', brand), start_span('create_cqi_session', brand=brand):
+                session = create_cqi_session(lead_id, brand, scoring_result)
+            if scoring_result.get('provisional'):
+                queue_rescore(lead_id, brand, session['id'])
+
+            # Step 6: Log system event
+            with step_timer('log_system_event', brand), start_span('log_system_event', brand=brand):
+                log_system_event(
+                    brand=brand,
+                    event_type='cqi_session_created',
+                    event_data={
+                        'session_id': session['id'],
+                        'lead_id': lead_id,
+                        'qualification_score': scoring_result['qualification_score'],
+                        'qualified': scoring_result['qualified'],
+                        'provisional': bool(scoring_result.get('provisional'))
+                    },
+                    severity='info'
+                )
+            notify_lead_scored(lead_id, brand, scoring_result['qualification_score'],
+                               bool(scoring_result.get('provisional')))
+
+            # Step 7: Build result object
+            return _build_process_result(lead_id, brand, scoring_result, session)
+
+        except Exception as e:
+            _log_failure_banner(e)
+
+            # Log error event
+            try:
+                log_system_event(
+                    brand=brand,
+                    event_type='cqi_processing_error',
+                    event_data={
+                        'lead_id': lead_id,
+                        'error': str(e)
+                    },
+                    severity='error'
+                )
+            except:
+                pass  # Ignore logging errors
 
-        # Step 2: Fetch lead data
-        lead = fetch_lead_data(lead_id)
+            raise
 
-        # Step 3: Get brand configuration
-        brand_config = get_brand_config(brand)
-        logger.info(f"Qualification threshold: {brand_config['qualification_threshold']}")
-
-        # Step 4: Score lead with Claude
-        scoring_result = score_lead_with_claude(lead, brand_config)
-
-        # Step 5: Create CQI session
-        session = create_cqi_session(lead_id, brand, scoring_result)
-
-        # Step 6: Log system event
-        log_system_event(
-            brand=brand,
-            event_type='cqi_session_created',
-            event_data={
-                'session_id': session['id'],
-                'lead_id': lead_id,
-                'qualification_score': scoring_result['qualification_score'],
-                'qualified': scoring_result['qualified']
-            },
-            severity='info'
-        )
 
-        # Step 7: Build result object
-        result = {
-            'success': True,
-            'session_id': session['id'],
-            'lead_id': lead_id,
-            'brand': brand,
-            'qualification_score': scoring_result['qualification_score'],
-            'qualified': scoring_result['qualified'],
-            'reasoning': scoring_result['reasoning'],
-            'recommended_action': scoring_result.get('recommended_action', 'unknown'),
-            'session_state': session['session_state'],
-            'scoring_breakdown': scoring_result['scoring_breakdown']
-        }
+async def process_lead_async(
+    lead_id: str,
+    brand: str,
+    session_id: Optional[str] = None,
+    allow_fallback: bool = True
+) -> Dict[str, Any]:
+    """
+    Async version of process_lead().
 
-        logger.info(f"\n{'='*60}")
-        logger.info(f"✅ CQI PROCESSING COMPLETE")
-        logger.info(f"{'='*60}")
-        logger.info(f"Session ID: {result['session_id']}")
-        logger.info(f"Score: {result['qualification_score']}/100")
-        logger.info(f"Qualified: {result['qualified']}")
-        logger.info(f"Action: {result['recommended_action']}")
-        logger.info(f"{'='*60}\n")
+    Runs the same workflow using the async Anthropic and Supabase clients,
+    so a single server worker can keep many qualifications in flight
+    without one slow Claude call blocking the others.
 
-        return result
+    Args:
+        lead_id: UUID of the lead to process
+        brand: Brand identifier (sotsvc, boss_of_clean, etc.)
+        session_id: Existing pending session to update instead of
+            inserting a new one (used by the background queue)
+        allow_fallback: If False, raise CircuitOpenError while the scoring
+            circuit is open instead of saving a provisional score
 
-    except Exception as e:
-        logger.error(f"\n{'='*60}")
-        logger.error(f"❌ CQI PROCESSING FAILED")
-        logger.error(f"{'='*60}")
-        logger.error(f"Error: {e}")
-        logger.error(f"{'='*60}\n")
+    Returns:
+        dict: Processing results (see process_lead)
+
+    Raises:
+        CQIError: If any step in the process fails
+    """
+    with start_span('process_lead', lead_id=lead_id, brand=brand, queued=bool(session_id)):
+        _log_start_banner(lead_id, brand)
 
-        # Log error event
         try:
-            log_system_event(
+            validate_environment()
+
+            with step_timer('fetch_lead_data', brand), start_span('fetch_lead_data', brand=brand):
+                lead = await fetch_lead_data_async(lead_id)
+
+            with step_timer('get_brand_config', brand), start_span('get_brand_config', brand=brand):
+                brand_config = get_brand_config(brand)
+            logger.info(f"Qualification threshold: {brand_config['qualification_threshold']}")
+
+            notify_scoring_started(lead_id, brand)
+            with step_timer('score_lead_with_claude', brand), start_span('score_lead_with_claude', brand=brand):
+                scoring_result = await score_lead_with_claude_async(lead, brand_config, allow_fallback)
+
+            with step_timer('create_cqi_session', brand), start_span('create_cqi_session', brand=brand):
+                if session_id:
+                    session = await update_cqi_session_async(session_id, lead_id, brand, scoring_result)
+                else:
+                    session = await create_cqi_session_async(lead_id, brand, scoring_result)
+
+            if scoring_result.get('provisional'):
+                await asyncio.to_thread(queue_rescore, lead_id, brand, session['id'])
+
+            with step_timer('log_system_event', brand), start_span('log_system_event', brand=brand):
+                await log_system_event_async(
+                    brand=brand,
+                    event_type='cqi_session_created',
+                    event_data={
+                        'session_id': session['id'],
+                        'lead_id': lead_id,
+                        'qualification_score': scoring_result['qualification_score'],
+                        'qualified': scoring_result['qualified'],
+                        'provisional': bool(scoring_result.get('provisional'))
+                    },
+                    severity='info'
+                )
+            notify_lead_scored(lead_id, brand, scoring_result['qualification_score'],
+                               bool(scoring_result.get('provisional')))
+
+            return _build_process_result(lead_id, brand, scoring_result, session)
+
+        except CircuitOpenError:
+            # Not a failure of this lead; the caller retries once the circuit closes
+            raise
+
+        except Exception as e:
+            _log_failure_banner(e)
+
+            await log_system_event_async(
                 brand=brand,
                 event_type='cqi_processing_error',
                 event_data={
@@ -486,10 +1598,344 @@ def process_lead(lead_id: str, brand: str) -> Dict[str, Any]:
                 },
                 severity='error'
             )
-        except:
-            pass  # Ignore logging errors
 
-        raise
+            raise
+
+
+# ================================================================
+# BATCH PROCESSING
+# ================================================================
+
+# Max ids per `in_` filter, keeps the PostgREST query string short
+FETCH_CHUNK_SIZE = 200
+
+# Rows per multi-row insert into cqi_sessions / system_events
+INSERT_CHUNK_SIZE = 500
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    """Yield successive lists of at most `size` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def fetch_leads_bulk_async(lead_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many leads with a few `in_` queries instead of one query per lead.
+
+    Args:
+        lead_ids: UUIDs of the leads to fetch
+
+    Returns:
+        dict: Lead data keyed by lead id (missing ids are simply absent)
+
+    Raises:
+        CQIError: If a database query fails
+    """
+    supabase = await get_async_supabase_client()
+    leads = {}
+
+    for chunk in _chunks(lead_ids, FETCH_CHUNK_SIZE):
+        try:
+            response = await supabase.table('leads').select('*').in_('id', chunk).execute()
+        except Exception as e:
+            logger.error(f"Database error fetching leads: {e}")
+            raise CQIError(f"Failed to fetch leads: {e}")
+
+        for lead in response.data or []:
+            leads[lead['id']] = lead
+
+    logger.info(f"✅ Fetched {len(leads)}/{len(lead_ids)} leads")
+    return leads
+
+
+async def create_cqi_sessions_bulk_async(
+    brand: str,
+    scored: List[tuple]
+) -> List[Dict[str, Any]]:
+    """
+    Insert many CQI sessions with multi-row inserts.
+
+    Args:
+        brand: Brand identifier
+        scored: List of (lead_id, scoring_result) tuples
+
+    Returns:
+        list: Created session records, in the same order as `scored`
+
+    Raises:
+        CQIError: If a database insert fails
+    """
+    supabase = await get_async_supabase_client()
+    sessions = []
+
+    for chunk in _chunks(scored, INSERT_CHUNK_SIZE):
+        rows = [build_session_record(lead_id, brand, result) for lead_id, result in chunk]
+        try:
+            response = await supabase.table('cqi_sessions').insert(rows).execute()
+        except Exception as e:
+            logger.error(f"Database error creating sessions: {e}")
+            raise CQIError(f"Failed to create CQI sessions: {e}")
+
+        if not response.data or len(response.data) != len(rows):
+            raise CQIError("Failed to create sessions - unexpected insert result")
+        sessions.extend(response.data)
+
+    return sessions
+
+
+async def log_system_events_bulk_async(events: List[Dict[str, Any]], raise_errors: bool = False) -> None:
+    """
+    Insert many system events with multi-row inserts.
+
+    Events that carry their own 'id' are written with ON CONFLICT (id)
+    DO NOTHING, so a caller retrying a failed batch doesn't duplicate
+    the chunks that did go through.
+
+    Args:
+        events: Rows for system_events (brand, event_type, event_data, severity)
+        raise_errors: Raise a failed insert instead of logging it (for
+            callers that keep the events and retry)
+    """
+    for event in events:
+        record_kpi_event(event['brand'], event['event_type'], event['event_data'])
+    if current_span() is not None:
+        events = [{**event, 'event_data': with_trace_id(event['event_data'])} for event in events]
+    try:
+        supabase = await get_async_supabase_client()
+        for chunk in _chunks(events, INSERT_CHUNK_SIZE):
+            if all(event.get('id') for event in chunk):
+                await supabase.table('system_events').upsert(chunk, on_conflict='id', ignore_duplicates=True).execute()
+            else:
+                await supabase.table('system_events').insert(chunk).execute()
+    except Exception as e:
+        if raise_errors:
+            raise
+        # Don't fail the main operation if logging fails
+        logger.warning(f"Failed to log system events: {e}")
+
+
+async def process_leads_async(
+    lead_ids: List[str],
+    brand: str,
+    concurrency: int = 8,
+    scorer: Optional['Scorer'] = None
+) -> Dict[str, Any]:
+    """
+    Process many leads through the CQI workflow in one run.
+
+    Workflow:
+    1. Validate environment once
+    2. Fetch all leads with bulk `in_` queries
+    3. Score leads through the scorer backend (default: concurrent
+       messages.create calls, at most `concurrency` at a time)
+    4. Insert sessions and system events with multi-row inserts as
+       scoring results stream in
+
+    A failure on one lead doesn't stop the batch; it is reported in
+    the returned 'errors' list. Leads that belong to another brand are
+    reported there too rather than scored against this brand's rubric.
+
+    Args:
+        lead_ids: UUIDs of the leads to process
+        brand: Brand identifier (sotsvc, boss_of_clean, etc.)
+        concurrency: Max concurrent Claude scoring calls (default scorer)
+        scorer: Scoring backend, e.g. scorers.MessageBatchScorer() for
+            overnight re-scoring
+
+    Returns:
+        dict: Batch summary including:
+            - total (int): Number of distinct lead ids requested
+            - succeeded (int): Leads scored and saved
+            - failed (int): Leads that failed
+            - results (list): Per-lead results (see process_lead)
+            - errors (list): {'lead_id', 'error'} for each failure
+    """
+    with start_span('process_leads', brand=brand, leads=len(lead_ids)):
+        if scorer is None:
+            # Imported lazily: scorers imports from this module
+            from scorers import MessagesScorer
+            scorer = MessagesScorer(concurrency=concurrency)
+
+        lead_ids = list(dict.fromkeys(lead_ids))  # dedupe, keep order
+        started = datetime.utcnow()
+
+        logger.info(f"CQI CONDUCTOR - Batch processing {len(lead_ids)} leads ({brand}, scorer={scorer.name})")
+
+        validate_environment()
+        brand_config = get_brand_config(brand)
+
+        with step_timer('fetch_leads_bulk', brand), start_span('fetch_leads_bulk', brand=brand):
+            leads = await fetch_leads_bulk_async(lead_ids)
+        errors = [
+            {'lead_id': lead_id, 'error': f"No lead found with id: {lead_id}"}
+            for lead_id in lead_ids if lead_id not in leads
+        ]
+        for lead_id, lead in list(leads.items()):
+            if lead.get('brand') and normalize_brand(lead['brand']) != normalize_brand(brand):
+                errors.append({'lead_id': lead_id, 'error': f"Lead belongs to brand {lead['brand']}, not {brand}"})
+                del leads[lead_id]
+        results = []
+        pending = []
+
+        async def flush():
+            batch = pending[:]
+            pending.clear()
+            try:
+                with step_timer('create_cqi_sessions_bulk', brand), start_span('create_cqi_sessions_bulk', brand=brand):
+                    sessions = await create_cqi_sessions_bulk_async(brand, batch)
+            except CQIError as e:
+                errors.extend({'lead_id': lead_id, 'error': str(e)} for lead_id, _ in batch)
+                return
+
+            new_results = [
+                _build_process_result(lead_id, brand, scoring_result, session, log_summary=False)
+                for (lead_id, scoring_result), session in zip(batch, sessions)
+            ]
+            results.extend(new_results)
+            for r in new_results:
+                if r['provisional']:
+                    await asyncio.to_thread(queue_rescore, r['lead_id'], brand, r['session_id'])
+            with step_timer('log_system_events_bulk', brand), start_span('log_system_events_bulk', brand=brand):
+                await log_system_events_bulk_async([
+                    {
+                        'brand': brand,
+                        'event_type': 'cqi_session_created',
+                        'event_data': {
+                            'session_id': r['session_id'],
+                            'lead_id': r['lead_id'],
+                            'qualification_score': r['qualification_score'],
+                            'qualified': r['qualified'],
+                            'provisional': r['provisional']
+                        },
+                        'severity': 'info'
+                    }
+                    for r in new_results
+                ])
+            for r in new_results:
+                notify_lead_scored(r['lead_id'], brand, r['qualification_score'], r['provisional'])
+
+        to_score = [leads[lead_id] for lead_id in lead_ids if lead_id in leads]
+        for lead in to_score:
+            notify_scoring_started(lead['id'], brand)
+        async for lead_id, scoring_result, error in scorer.score_leads(to_score, brand_config):
+            if error:
+                errors.append({'lead_id': lead_id, 'error': error})
+                continue
+
+            pending.append((lead_id, scoring_result))
+            if len(pending) >= INSERT_CHUNK_SIZE:
+                await flush()
+
+        if pending:
+            await flush()
+
+        await log_system_events_bulk_async([
+            {
+                'brand': brand,
+                'event_type': 'cqi_processing_error',
+                'event_data': e,
+                'severity': 'error'
+            }
+            for e in errors
+        ])
+
+        elapsed = (datetime.utcnow() - started).total_seconds()
+        logger.info(
+            f"✅ Batch complete: {len(results)} succeeded, {len(errors)} failed "
+            f"in {elapsed:.1f}s"
+        )
+
+        return {
+            'total': len(lead_ids),
+            'succeeded': len(results),
+            'failed': len(errors),
+            'results': results,
+            'errors': errors
+        }
+
+
+def process_leads(
+    lead_ids: List[str],
+    brand: str,
+    concurrency: int = 8,
+    scorer: Optional['Scorer'] = None
+) -> Dict[str, Any]:
+    """
+    Synchronous wrapper around process_leads_async() for scripts and the CLI.
+
+    Must not be called from inside a running event loop; await
+    process_leads_async() there instead.
+    """
+    return asyncio.run(process_leads_async(lead_ids, brand, concurrency=concurrency, scorer=scorer))
+
+
+def fetch_lead_ids(
+    brand: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None,
+    page_size: int = 1000
+) -> List[str]:
+    """
+    Select lead ids from the leads table for batch re-scoring.
+
+    Args:
+        brand: Only leads for this brand
+        status: Only leads with this status
+        since: Only leads created at or after this ISO date/time
+        until: Only leads created before this ISO date/time
+        limit: Max number of ids to return
+        page_size: Rows per request when paging through results
+
+    Returns:
+        list: Lead ids ordered by created_at
+    """
+    supabase = get_supabase_client()
+    lead_ids: List[str] = []
+
+    while limit is None or len(lead_ids) < limit:
+        query = supabase.table('leads').select('id')
+        if brand:
+            query = query.eq('brand', brand)
+        if status:
+            query = query.eq('status', status)
+        if since:
+            query = query.gte('created_at', since)
+        if until:
+            query = query.lt('created_at', until)
+
+        start = len(lead_ids)
+        end = start + page_size - 1
+        if limit is not None:
+            end = min(end, limit - 1)
+
+        response = query.order('created_at').order('id').range(start, end).execute()
+        page = [row['id'] for row in response.data or []]
+        lead_ids.extend(page)
+
+        if len(page) < end - start + 1:
+            break
+
+    return lead_ids
+
+
+def read_lead_ids(path: str) -> List[str]:
+    """
+    Read lead ids, one per line, from a file or stdin ('-').
+
+    Blank lines and lines starting with '#' are ignored.
+    """
+    stream = sys.stdin if path == '-' else open(path)
+    try:
+        return [
+            line.strip() for line in stream
+            if line.strip() and not line.strip().startswith('#')
+        ]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
 
 
 def main():
@@ -498,29 +1944,131 @@ def main():
 
     Usage:
         python conductor.py --lead-id uuid-here --brand sotsvc
+        python conductor.py --batch --ids-file ids.txt --brand sotsvc
+        cat ids.txt | python conductor.py --batch --ids-file - --brand sotsvc
+        python conductor.py --batch --brand sotsvc --status new --since 2026-01-01
+        python conductor.py --serve --processes 4 --workers 8 --brand-caps sotsvc=12,beatslave=4
     """
     parser = argparse.ArgumentParser(
         description='CQI Conductor - Process leads through qualification workflow'
     )
-    parser.add_argument(
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
         '--lead-id',
-        required=True,
         help='UUID of the lead to process'
     )
+    mode.add_argument(
+        '--batch',
+        action='store_true',
+        help='Process many leads (from --ids-file, or a leads query using --status/--since/--until)'
+    )
+    mode.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run as a long-lived service draining the CQI job queue'
+    )
     parser.add_argument(
         '--brand',
-        required=True,
         choices=['sotsvc', 'boss_of_clean', 'beatslave', 'temple_builder'],
-        help='Brand identifier'
+        help='Brand identifier (required with --lead-id and --batch)'
     )
     parser.add_argument(
         '--output-json',
         action='store_true',
         help='Output results as JSON (useful for scripting)'
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always call Claude, ignoring cached scores for identical leads'
+    )
+
+    batch = parser.add_argument_group('batch options')
+    batch.add_argument(
+        '--ids-file',
+        help="File with one lead id per line ('-' for stdin); leads of other brands are reported as errors"
+    )
+    batch.add_argument(
+        '--status',
+        help='Only leads with this status (query mode)'
+    )
+    batch.add_argument(
+        '--since',
+        help='Only leads created at or after this ISO date (query mode)'
+    )
+    batch.add_argument(
+        '--until',
+        help='Only leads created before this ISO date (query mode)'
+    )
+    batch.add_argument(
+        '--limit',
+        type=int,
+        help='Max number of leads to process (query mode)'
+    )
+    batch.add_argument(
+        '--concurrency',
+        type=int,
+        default=8,
+        help='Max concurrent Claude scoring calls (default: 8)'
+    )
+    batch.add_argument(
+        '--scorer',
+        choices=['messages', 'batch'],
+        default='messages',
+        help="Scoring backend: 'messages' (concurrent calls) or 'batch' "
+             "(Anthropic Message Batches, cheaper but slower)"
+    )
+    batch.add_argument(
+        '--poll-interval',
+        type=float,
+        default=30.0,
+        help='Seconds between Message Batch status checks (default: 30)'
+    )
+
+    serve = parser.add_argument_group('serve options (defaults from CQI_SERVE_* env vars)')
+    serve.add_argument(
+        '--processes',
+        type=int,
+        help='Worker processes (default: 2)'
+    )
+    serve.add_argument(
+        '--workers',
+        type=int,
+        help='Async scoring workers per process (default: 4)'
+    )
+    serve.add_argument(
+        '--brand-caps',
+        help='Max in-flight jobs per brand, e.g. sotsvc=12,beatslave=4'
+    )
 
     args = parser.parse_args()
 
+    if not args.serve and not args.brand:
+        parser.error('--brand is required with --lead-id and --batch')
+
+    if args.no_cache:
+        get_score_cache().enabled = False
+
+    if args.serve:
+        # Imported lazily: the service pulls in multiprocessing and the job queue
+        from conductor_service import run_service
+        if args.no_cache:
+            # Worker processes are spawned fresh, so pass the setting on by env
+            os.environ['CQI_SCORE_CACHE_ENABLED'] = 'false'
+        try:
+            run_service(
+                processes=args.processes,
+                workers=args.workers,
+                brand_caps=args.brand_caps
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0)
+
+    if args.batch:
+        run_batch(args)
+        return
+
     try:
         result = process_lead(
             lead_id=args.lead_id,
@@ -552,5 +2100,51 @@ def main():
         sys.exit(1)
 
 
+def run_batch(args: argparse.Namespace) -> None:
+    """Run the --batch CLI mode and exit."""
+    try:
+        if args.ids_file:
+            lead_ids = read_lead_ids(args.ids_file)
+        else:
+            lead_ids = fetch_lead_ids(
+                brand=args.brand,
+                status=args.status,
+                since=args.since,
+                until=args.until,
+                limit=args.limit
+            )
+
+        from scorers import get_scorer
+        if args.scorer == 'batch':
+            scorer = get_scorer('batch', poll_interval=args.poll_interval)
+        else:
+            scorer = get_scorer('messages', concurrency=args.concurrency)
+
+        summary = process_leads(lead_ids, args.brand, scorer=scorer)
+
+        if args.output_json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print("\n" + "="*60)
+            print("CQI BATCH RESULTS")
+            print("="*60)
+            print(f"Brand:          {args.brand}")
+            print(f"Leads:          {summary['total']}")
+            print(f"Succeeded:      {summary['succeeded']}")
+            print(f"Failed:         {summary['failed']}")
+            print(f"Qualified:      {sum(1 for r in summary['results'] if r['qualified'])}")
+            for error in summary['errors'][:20]:
+                print(f"  ❌ {error['lead_id']}: {error['error']}")
+            if len(summary['errors']) > 20:
+                print(f"  ... and {len(summary['errors']) - 20} more errors")
+            print("="*60 + "\n")
+
+        sys.exit(0 if summary['failed'] == 0 else 2)
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}\n", file=sys.stderr)
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,451 @@
+"""
+CQI Conductor Service - Long-running multi-process scoring service
+
+Runs the conductor as a service (python conductor.py --serve) instead of
+a one-shot CLI or an in-request import:
+
+    dispatcher (this process)
+        claims jobs from the durable JobQueue (SQLite)
+        → per-process dispatch queue
+        → N worker processes, each running M async scoring workers
+
+The dispatcher is the only place admission decisions are made:
+
+- Global cap: at most processes x workers jobs run at once. A job is
+  claimed only when a worker is free to start it, so its lease starts
+  with the work; everything else stays in SQLite, so memory use is
+  bounded no matter how deep the backlog is.
+- Per-brand caps: a brand at its cap is excluded from claiming, so a
+  spike from one brand's campaign can't take every slot; other brands'
+  jobs keep flowing past it.
+- Backpressure: the dispatcher logs saturation changes, and the API
+  refuses new queued leads with 429 once the backlog passes
+  CQI_QUEUE_HIGH_WATERMARK (see queue_backpressure()).
+
+Each job is sent to a particular process, and the dispatcher tracks
+every slot by job id. Workers report when each job starts and finishes.
+If a worker process dies, all of its jobs free their slots: jobs it had
+not started are released back to the queue at once, jobs it was running
+are claimed again when their leases expire. The process is replaced.
+
+Environment Variables:
+    CQI_SERVE_PROCESSES: Worker processes (default: 2)
+    CQI_SERVE_WORKERS: Async scoring workers per process (default: 4)
+    CQI_SERVE_BRAND_CAPS: Per-brand caps, e.g. "sotsvc=6,beatslave=2"
+    CQI_SERVE_DEFAULT_BRAND_CAP: Cap for brands not listed (default: half the slots)
+    CQI_QUEUE_HIGH_WATERMARK: Queued jobs before intake returns 429 (default: 500)
+
+Usage:
+    python conductor.py --serve
+    python conductor.py --serve --processes 4 --workers 8 --brand-caps sotsvc=12,beatslave=4
+"""
+
+import os
+import queue
+import signal
+import socket
+import asyncio
+import logging
+import threading
+import multiprocessing
+from typing import Optional, Dict, Any, List, Tuple
+
+from job_queue import JobQueue, process_job
+from kpi_rollups import flush_kpi_rollups
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Messages from workers to the dispatcher
+MSG_READY = 'ready'
+MSG_STARTED = 'started'
+MSG_DONE = 'done'
+
+
+def parse_brand_caps(spec: Optional[str]) -> Dict[str, int]:
+    """
+    Parse "brand=cap,brand=cap" into a dict.
+
+    Raises:
+        ValueError: If an item is malformed
+    """
+    caps = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        brand, _, cap = item.partition('=')
+        if not brand or not cap.strip().isdigit():
+            raise ValueError(f"Invalid brand cap '{item}' (expected brand=number)")
+        caps[brand.strip()] = int(cap)
+    return caps
+
+
+def queue_backpressure(job_queue: JobQueue, brand: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Check whether intake should be refused because the backlog is too deep.
+
+    Args:
+        job_queue: Durable job queue
+        brand: Brand of the incoming lead (unused for now; the watermark is global)
+
+    Returns:
+        dict: pending, high_watermark and retry_after seconds if over the
+            watermark, otherwise None
+    """
+    high_watermark = int(os.getenv('CQI_QUEUE_HIGH_WATERMARK', '500'))
+    pending = job_queue.pending_count()
+    if pending < high_watermark:
+        return None
+    # Rough drain estimate: a few seconds per job beyond the watermark, capped
+    retry_after = min(300, 5 + (pending - high_watermark) // 10)
+    return {'pending': pending, 'high_watermark': high_watermark, 'retry_after': retry_after}
+
+
+def _worker_process(
+    index: int,
+    queue_settings: Dict[str, Any],
+    workers: int,
+    dispatch_queue: multiprocessing.Queue,
+    events: multiprocessing.Queue
+) -> None:
+    """Entry point of a worker process: M async workers on one event loop."""
+    # The dispatcher handles Ctrl+C and tells workers to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, queue_settings, workers, dispatch_queue, events))
+    # multiprocessing skips atexit handlers in children
+    flush_kpi_rollups()
+
+
+async def _worker_loop(
+    index: int,
+    queue_settings: Dict[str, Any],
+    workers: int,
+    dispatch_queue: multiprocessing.Queue,
+    events: multiprocessing.Queue
+) -> None:
+    job_queue = JobQueue(**queue_settings)
+    pid = os.getpid()
+    prefix = f"{socket.gethostname()}-{pid}"
+    loop = asyncio.get_running_loop()
+    jobs: asyncio.Queue = asyncio.Queue()
+
+    def read() -> None:
+        # One thread reads the dispatch queue for every slot; blocking reads
+        # in to_thread would each hold a default-executor thread that
+        # process_job needs for lease renewals and completion
+        stops = 0
+        while stops < workers:
+            job = dispatch_queue.get()
+            if job is None:
+                stops += 1
+            loop.call_soon_threadsafe(jobs.put_nowait, job)
+
+    threading.Thread(target=read, name=f'conductor-dispatch-{index}', daemon=True).start()
+
+    async def run(slot: int) -> None:
+        worker_id = f"{prefix}-{slot}"
+        while True:
+            job = await jobs.get()
+            if job is None:
+                return
+            events.put((MSG_STARTED, job['id'], index, None))
+            status = await process_job(job_queue, worker_id, job)
+            events.put((MSG_DONE, job['id'], index, status))
+
+    logger.info(f"✅ Conductor worker process {index} (pid {pid}) running {workers} workers")
+    events.put((MSG_READY, None, index, None))
+    await asyncio.gather(*(run(slot) for slot in range(workers)))
+
+
+class ConductorService:
+    """
+    Dispatcher that feeds a pool of worker processes from the job queue.
+    """
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        processes: int = 2,
+        workers: int = 4,
+        brand_caps: Optional[Dict[str, int]] = None,
+        default_brand_cap: Optional[int] = None,
+        poll_interval: float = 1.0
+    ):
+        """
+        Args:
+            job_queue: Durable queue to drain
+            processes: Worker processes
+            workers: Async scoring workers per process
+            brand_caps: Max in-flight jobs per brand
+            default_brand_cap: Cap for brands not in brand_caps
+            poll_interval: Seconds to wait for events when idle
+        """
+        self.job_queue = job_queue
+        self.processes = max(1, processes)
+        self.workers = max(1, workers)
+        self.slots = self.processes * self.workers
+        self.brand_caps = dict(brand_caps or {})
+        self.default_brand_cap = default_brand_cap or max(1, self.slots // 2)
+        self.poll_interval = poll_interval
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._events = self._ctx.Queue()
+        self._procs: List[Any] = []
+        self._queues: List[Any] = []                    # dispatch queue per process
+        self._in_flight: Dict[str, List[Any]] = {}      # job_id -> [brand, process index, started]
+        self._proc_counts: List[int] = [0] * self.processes
+        self._ready: List[bool] = [False] * self.processes
+        self._brand_counts: Dict[str, int] = {}
+        self._stopping = False
+        self._saturated = False
+        self._capped: Tuple[str, ...] = ()
+        self._counters = {'dispatched': 0, 'succeeded': 0, 'failed': 0, 'requeued': 0, 'lease_lost': 0, 'worker_restarts': 0}
+        self.dispatcher_id = f"{socket.gethostname()}-{os.getpid()}-dispatcher"
+
+    def cap_for(self, brand: str) -> int:
+        """In-flight limit for a brand."""
+        return self.brand_caps.get(brand, self.default_brand_cap)
+
+    # ------------------------------------------------------------
+    # Worker processes
+    # ------------------------------------------------------------
+
+    def _spawn(self, index: int):
+        # A fresh queue, so a replacement never runs a dead process's leftovers
+        dispatch_queue = self._ctx.Queue(maxsize=self.workers)
+        queue_settings = {
+            'path': self.job_queue.path,
+            'lease_seconds': self.job_queue.lease_seconds,
+            'max_attempts': self.job_queue.max_attempts,
+            'retry_delay_seconds': self.job_queue.retry_delay_seconds
+        }
+        proc = self._ctx.Process(
+            target=_worker_process,
+            args=(index, queue_settings, self.workers, dispatch_queue, self._events),
+            name=f"cqi-worker-{index}",
+            daemon=True
+        )
+        proc.start()
+        self._ready[index] = False
+        return proc, dispatch_queue
+
+    def _check_workers(self) -> None:
+        for index, proc in enumerate(self._procs):
+            if proc.is_alive():
+                continue
+            logger.error(f"❌ Worker process {index} (pid {proc.pid}) exited with {proc.exitcode}; restarting")
+            # Pick up its last start/finish reports before freeing its slots
+            self._drain_events(timeout=0.0)
+            released = 0
+            for job_id, (_, owner, started) in list(self._in_flight.items()):
+                if owner != index:
+                    continue
+                if not started:
+                    # Never started: give it back now rather than at lease expiry
+                    self.job_queue.release(job_id, self.dispatcher_id)
+                    released += 1
+                # Jobs it was running are reclaimed when their leases expire
+                self._finish(job_id)
+            if released:
+                logger.info(f"Released {released} jobs worker process {index} never started")
+            self._queues[index].close()
+            self._counters['worker_restarts'] += 1
+            self._procs[index], self._queues[index] = self._spawn(index)
+
+    # ------------------------------------------------------------
+    # Dispatching
+    # ------------------------------------------------------------
+
+    def _finish(self, job_id: str) -> None:
+        slot = self._in_flight.pop(job_id, None)
+        if slot is not None:
+            brand, index, _ = slot
+            self._brand_counts[brand] -= 1
+            self._proc_counts[index] -= 1
+
+    def _handle_event(self, event: Tuple[str, str, int, Optional[str]]) -> None:
+        kind, job_id, index, status = event
+        if kind == MSG_READY:
+            self._ready[index] = True
+            return
+        if kind == MSG_STARTED:
+            slot = self._in_flight.get(job_id)
+            if slot is not None and slot[1] == index:
+                slot[2] = True
+            return
+
+        self._finish(job_id)
+        if status == 'succeeded':
+            self._counters['succeeded'] += 1
+        elif status == 'queued':
+            self._counters['requeued'] += 1
+        elif status == 'running':
+            # Lost its lease; the worker that holds it now reports the outcome
+            self._counters['lease_lost'] += 1
+        else:
+            self._counters['failed'] += 1
+
+    def _drain_events(self, timeout: float) -> int:
+        """Process worker events, waiting up to timeout for the first one."""
+        handled = 0
+        try:
+            self._handle_event(self._events.get(timeout=timeout))
+            handled += 1
+            while True:
+                self._handle_event(self._events.get_nowait())
+                handled += 1
+        except queue.Empty:
+            pass
+        return handled
+
+    def _fill(self) -> int:
+        """Claim a job for each free worker, until the workers or every brand with work is full."""
+        dispatched = 0
+        while True:
+            # Only processes that are up: a lease shouldn't tick while one starts
+            free = [i for i in range(self.processes) if self._ready[i] and self._proc_counts[i] < self.workers]
+            if not free:
+                break
+            index = min(free, key=self._proc_counts.__getitem__)
+            capped = sorted(b for b, n in self._brand_counts.items() if n >= self.cap_for(b))
+            # Excluding our own jobs: one whose lease ran out mid-run must not take a second slot
+            job = self.job_queue.claim(self.dispatcher_id, exclude_brands=capped, exclude_ids=list(self._in_flight))
+            if job is None:
+                break
+
+            brand = job['brand']
+            self._in_flight[job['id']] = [brand, index, False]
+            self._brand_counts[brand] = self._brand_counts.get(brand, 0) + 1
+            self._proc_counts[index] += 1
+            self._queues[index].put(job)
+            self._counters['dispatched'] += 1
+            dispatched += 1
+
+        self._update_capped()
+        return dispatched
+
+    def _update_capped(self) -> None:
+        # Checked once per fill pass (not per claim) so the log follows
+        # sustained pressure rather than every job start/finish
+        capped = tuple(sorted(b for b, n in self._brand_counts.items() if n >= self.cap_for(b)))
+        newly_capped = set(capped) - set(self._capped)
+        if newly_capped:
+            logger.warning(f"⚠️  Brands at concurrency cap: {', '.join(sorted(newly_capped))}")
+        self._capped = capped
+
+    def _update_saturation(self) -> None:
+        saturated = len(self._in_flight) >= self.slots
+        if saturated != self._saturated:
+            if saturated:
+                logger.warning(
+                    f"⚠️  Backpressure: all {self.slots} slots busy "
+                    f"({self.job_queue.pending_count()} jobs waiting in queue)"
+                )
+            else:
+                logger.info("Backpressure cleared")
+            self._saturated = saturated
+
+    def status(self) -> Dict[str, Any]:
+        """Return in-flight counts, caps and counters."""
+        return {
+            'processes': self.processes,
+            'workers_per_process': self.workers,
+            'capacity': self.slots,
+            'in_flight': len(self._in_flight),
+            'in_flight_by_brand': {b: n for b, n in self._brand_counts.items() if n},
+            'brand_caps': {b: self.cap_for(b) for b in self._brand_counts},
+            'saturated': self._saturated,
+            'capped_brands': list(self._capped),
+            **self._counters
+        }
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+
+    def stop(self, *_) -> None:
+        """Ask the dispatcher loop to exit (safe to call from a signal handler)."""
+        self._stopping = True
+
+    def run(self) -> None:
+        """Start worker processes and dispatch until stop() is called."""
+        self._procs, self._queues = (list(x) for x in zip(*(self._spawn(i) for i in range(self.processes))))
+        logger.info(
+            f"✅ Conductor service started: {self.processes} processes x {self.workers} workers, "
+            f"default brand cap {self.default_brand_cap}"
+            + (f", caps {self.brand_caps}" if self.brand_caps else '')
+        )
+
+        try:
+            while not self._stopping:
+                self._check_workers()
+                dispatched = self._fill()
+                self._update_saturation()
+                # Block on worker events when idle so a finished job frees a
+                # slot immediately instead of after a poll interval
+                self._drain_events(timeout=0.0 if dispatched else self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        logger.info("Stopping conductor service...")
+
+        # Give back jobs no worker picked up yet
+        released = 0
+        for dispatch_queue in self._queues:
+            try:
+                while True:
+                    job = dispatch_queue.get_nowait()
+                    self.job_queue.release(job['id'], self.dispatcher_id)
+                    self._finish(job['id'])
+                    released += 1
+            except queue.Empty:
+                pass
+        if released:
+            logger.info(f"Released {released} undispatched jobs back to the queue")
+
+        for dispatch_queue in self._queues:
+            for _ in range(self.workers):
+                dispatch_queue.put(None)
+
+        # Let running jobs finish
+        for proc in self._procs:
+            proc.join()
+            self._drain_events(timeout=0.0)
+
+        logger.info(f"Conductor service stopped: {self.status()}")
+
+
+def run_service(
+    processes: Optional[int] = None,
+    workers: Optional[int] = None,
+    brand_caps: Optional[str] = None,
+    queue_path: Optional[str] = None
+) -> None:
+    """
+    Build a ConductorService from arguments/environment and run it.
+
+    Args:
+        processes: Worker processes (default: CQI_SERVE_PROCESSES)
+        workers: Async workers per process (default: CQI_SERVE_WORKERS)
+        brand_caps: "brand=cap,..." (default: CQI_SERVE_BRAND_CAPS)
+        queue_path: SQLite queue database (default: CQI_QUEUE_PATH)
+    """
+    default_cap = os.getenv('CQI_SERVE_DEFAULT_BRAND_CAP')
+
+    service = ConductorService(
+        JobQueue(path=queue_path),
+        processes=processes or int(os.getenv('CQI_SERVE_PROCESSES', '2')),
+        workers=workers or int(os.getenv('CQI_SERVE_WORKERS', '4')),
+        brand_caps=parse_brand_caps(brand_caps if brand_caps is not None else os.getenv('CQI_SERVE_BRAND_CAPS')),
+        default_brand_cap=int(default_cap) if default_cap else None
+    )
+
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
@@ -0,0 +1,565 @@
+"""
+CQI Context Librarian - Cached brand knowledge store
+
+Runtime side of agents-core/system/context-librarian.yml. Parses the
+brand contexts and the shared psychology corpora once into a flat,
+indexed store:
+
+- backend/knowledge/*.json (decision drivers, emotional triggers, empathy
+  patterns, persuasion strategies), shared by every brand
+- projects/<brand>/.agents/brand-config.yml (services, trial, templates,
+  pricing strategy, objection handlers, ...)
+- projects/<brand>/.agents/context/*.yml when present (faqs, pricing, ...)
+
+Every entry gets an integer id and is indexed by (brand, category) and
+(brand, category, key), so lookups are dict hits rather than scans.
+
+The store is written to a snapshot file (a JSON header with the index
+and entry offsets, followed by the encoded entries). Each process maps
+the snapshot with mmap and decodes only the entries it reads, so
+uvicorn workers share one copy of the data through the page cache
+instead of each re-parsing the sources. The snapshot is rebuilt when
+any source file changes; writers replace it atomically, so readers
+never see a partial file.
+
+Environment Variables:
+    CQI_KNOWLEDGE_PATH: Directory of knowledge JSON files (default: backend/knowledge)
+    CQI_CONTEXT_SNAPSHOT: Snapshot file (default: agents-core/runtime/context_snapshot.bin)
+    CQI_CONTEXT_RELOAD_INTERVAL: Seconds between source change checks (default: 30)
+
+Usage:
+    from context_librarian import get_context_librarian
+    librarian = get_context_librarian()
+    triggers = librarian.get('sotsvc', 'emotional_triggers')
+    service = librarian.lookup('sotsvc', 'services', 'move_in_out')
+"""
+
+import os
+import re
+import json
+import mmap
+import glob
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+
+import yaml
+
+from brand_registry import REPO_ROOT, DEFAULT_CONTEXT_PATH, normalize_brand
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Brand key for knowledge every brand can use
+SHARED_BRAND = 'shared'
+
+DEFAULT_KNOWLEDGE_PATH = os.path.join(REPO_ROOT, 'backend', 'knowledge')
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'context_snapshot.bin')
+
+SNAPSHOT_MAGIC = b'CQICTX1\n'
+SNAPSHOT_VERSION = 1
+_HEADER_LENGTH = struct.Struct('<Q')
+
+# Fields used as an entry's title, in order of preference
+TITLE_FIELDS = ('name', 'title', 'model', 'stage', 'trigger', 'emotion', 'objection', 'technique', 'pattern')
+
+_SLUG = re.compile(r'[^a-z0-9]+')
+
+
+def slugify(text: str) -> str:
+    """Lowercase key for an entry title ('Social Proof' -> 'social_proof')."""
+    return _SLUG.sub('_', str(text).lower()).strip('_')
+
+
+def _title_of(item: Dict[str, Any], fallback: str) -> str:
+    for field in TITLE_FIELDS:
+        value = item.get(field)
+        if isinstance(value, str) and value:
+            return value
+    return fallback
+
+
+def _is_record_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def entries_from_knowledge(category: str, document: Dict[str, Any], source: str) -> List[Dict[str, Any]]:
+    """
+    Flatten a knowledge corpus into entries.
+
+    Lists of records become one entry per record; other sections become
+    one entry each, with any nested record lists split out.
+
+    Args:
+        category: Corpus name (file stem)
+        document: Parsed JSON
+        source: Source file path
+
+    Returns:
+        list: Entries (without brand or id)
+    """
+    root = document.get(category, document)
+    entries = []
+
+    def add(section: str, title: str, data: Any) -> None:
+        entries.append({
+            'category': category,
+            'section': section,
+            'key': slugify(title),
+            'title': title,
+            'source': source,
+            'data': data
+        })
+
+    for section, value in root.items():
+        if _is_record_list(value):
+            for i, item in enumerate(value):
+                add(section, _title_of(item, f"{section} {i + 1}"), item)
+        elif isinstance(value, dict):
+            rest = {}
+            for name, nested in value.items():
+                if _is_record_list(nested):
+                    for i, item in enumerate(nested):
+                        add(f"{section}.{name}", _title_of(item, f"{name} {i + 1}"), item)
+                else:
+                    rest[name] = nested
+            if rest:
+                add(section, section.replace('_', ' ').title(), rest)
+        else:
+            add(section, 'Overview' if section == 'description' else section.replace('_', ' ').title(), value)
+
+    return entries
+
+
+def entries_from_brand_document(category: Optional[str], document: Dict[str, Any], source: str) -> List[Dict[str, Any]]:
+    """
+    Flatten a brand YAML document into entries.
+
+    For brand-config.yml (category None) each top-level section is a
+    category and each of its keys an entry. For context/<name>.yml files
+    the file stem is the category.
+
+    Args:
+        category: Category for the whole document, or None
+        document: Parsed YAML
+        source: Source file path
+
+    Returns:
+        list: Entries (without brand or id)
+    """
+    sections = {category: document} if category else document
+    entries = []
+
+    for section, value in sections.items():
+        if isinstance(value, dict) and value and all(isinstance(v, dict) for v in value.values()):
+            for key, item in value.items():
+                entries.append({
+                    'category': section,
+                    'section': section,
+                    'key': slugify(key),
+                    'title': item.get('name') or key.replace('_', ' ').title(),
+                    'source': source,
+                    'data': item
+                })
+        elif _is_record_list(value):
+            for i, item in enumerate(value):
+                title = _title_of(item, f"{section} {i + 1}")
+                entries.append({
+                    'category': section, 'section': section, 'key': slugify(title),
+                    'title': title, 'source': source, 'data': item
+                })
+        else:
+            entries.append({
+                'category': section,
+                'section': section,
+                'key': slugify(section),
+                'title': section.replace('_', ' ').title(),
+                'source': source,
+                'data': value
+            })
+
+    return entries
+
+
+class ContextSnapshot:
+    """
+    Read-only view of a snapshot file through mmap.
+
+    Only the header (index and offsets) is decoded up front; entries are
+    decoded on first access.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a context snapshot")
+
+        start = len(SNAPSHOT_MAGIC)
+        (header_length,) = _HEADER_LENGTH.unpack_from(self._map, start)
+        start += _HEADER_LENGTH.size
+        header = json.loads(self._map[start:start + header_length])
+        self._payload_start = start + header_length
+
+        self.fingerprint: str = header['fingerprint']
+        self.built_at: str = header['built_at']
+        self._offsets: List[Tuple[int, int]] = [tuple(o) for o in header['offsets']]
+        # Keys are "brand/category" and "brand/category/key" for O(1) lookups
+        self._by_category: Dict[str, Tuple[int, ...]] = {
+            key: tuple(ids) for key, ids in header['by_category'].items()
+        }
+        self._by_key: Dict[str, int] = header['by_key']
+        self._categories: Dict[str, Tuple[str, ...]] = {
+            brand: tuple(names) for brand, names in header['categories'].items()
+        }
+        self.entry = lru_cache(maxsize=4096)(self._decode)
+
+    def _decode(self, entry_id: int) -> Dict[str, Any]:
+        offset, length = self._offsets[entry_id]
+        start = self._payload_start + offset
+        return json.loads(self._map[start:start + length])
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def ids(self, brand: str, category: str) -> Tuple[int, ...]:
+        return self._by_category.get(f"{brand}/{category}", ())
+
+    def id_of(self, brand: str, category: str, key: str) -> Optional[int]:
+        return self._by_key.get(f"{brand}/{category}/{key}")
+
+    def categories(self, brand: str) -> Tuple[str, ...]:
+        return self._categories.get(brand, ())
+
+    def brands(self) -> List[str]:
+        return sorted(self._categories)
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_snapshot(path: str, entries: List[Dict[str, Any]], fingerprint: str) -> None:
+    """
+    Encode entries and their indexes into a snapshot file.
+
+    The file is written next to the target and moved into place, so
+    concurrent readers (and concurrent builders) are safe.
+
+    Args:
+        path: Snapshot file path
+        entries: Entries with brand and id set (id == list position)
+        fingerprint: Hash of the sources the entries came from
+    """
+    payload = []
+    offsets = []
+    by_category: Dict[str, List[int]] = {}
+    by_key: Dict[str, int] = {}
+    categories: Dict[str, List[str]] = {}
+    position = 0
+
+    for entry in entries:
+        blob = json.dumps(entry, separators=(',', ':'), default=str).encode('utf-8')
+        payload.append(blob)
+        offsets.append((position, len(blob)))
+        position += len(blob)
+
+        brand, category = entry['brand'], entry['category']
+        by_category.setdefault(f"{brand}/{category}", []).append(entry['id'])
+        by_key.setdefault(f"{brand}/{category}/{entry['key']}", entry['id'])
+        names = categories.setdefault(brand, [])
+        if category not in names:
+            names.append(category)
+
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'fingerprint': fingerprint,
+        'built_at': datetime.utcnow().isoformat(),
+        'offsets': offsets,
+        'by_category': by_category,
+        'by_key': by_key,
+        'categories': categories
+    }, separators=(',', ':')).encode('utf-8')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.context_snapshot.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for blob in payload:
+                f.write(blob)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class ContextLibrarian:
+    """
+    Brand knowledge store backed by a shared, memory-mapped snapshot.
+    """
+
+    def __init__(
+        self,
+        knowledge_path: Optional[str] = None,
+        context_path: Optional[str] = None,
+        snapshot_path: Optional[str] = None,
+        reload_interval: float = 30.0
+    ):
+        """
+        Args:
+            knowledge_path: Directory of shared knowledge JSON files
+            context_path: Directory holding <brand>/.agents/ folders
+            snapshot_path: Snapshot file shared by all processes
+            reload_interval: Min seconds between source change checks
+        """
+        self.knowledge_path = os.path.abspath(os.path.join(REPO_ROOT, knowledge_path or DEFAULT_KNOWLEDGE_PATH))
+        self.context_path = os.path.abspath(os.path.join(REPO_ROOT, context_path or DEFAULT_CONTEXT_PATH))
+        self.snapshot_path = os.path.abspath(snapshot_path or DEFAULT_SNAPSHOT_PATH)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ContextSnapshot] = None
+        self._last_check = 0.0
+        self._counters = {'lookups': 0, 'snapshot_builds': 0, 'snapshot_loads': 0}
+        self.refresh()
+
+    # ------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------
+
+    def _sources(self) -> List[Tuple[str, Optional[str], str]]:
+        """List (brand, category, path) for every source file."""
+        sources = []
+        for path in sorted(glob.glob(os.path.join(self.knowledge_path, '*.json'))):
+            sources.append((SHARED_BRAND, os.path.splitext(os.path.basename(path))[0], path))
+
+        for config in sorted(glob.glob(os.path.join(self.context_path, '*', '.agents', 'brand-config.yml'))):
+            brand = normalize_brand(config.split(os.sep)[-3])
+            sources.append((brand, None, config))
+            context_dir = os.path.join(os.path.dirname(config), 'context')
+            for path in sorted(glob.glob(os.path.join(context_dir, '*.yml'))):
+                sources.append((brand, os.path.splitext(os.path.basename(path))[0], path))
+
+        return sources
+
+    @staticmethod
+    def _fingerprint(sources: List[Tuple[str, Optional[str], str]]) -> str:
+        digest = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode('utf-8'))
+        for _, _, path in sources:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _parse(self, sources: List[Tuple[str, Optional[str], str]]) -> List[Dict[str, Any]]:
+        entries = []
+        for brand, category, path in sources:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if path.endswith('.json'):
+                        parsed = entries_from_knowledge(category, json.load(f), path)
+                    else:
+                        parsed = entries_from_brand_document(category, yaml.safe_load(f) or {}, path)
+            except Exception as e:
+                logger.error(f"❌ Skipping context source {path}: {e}")
+                continue
+
+            for entry in parsed:
+                entry['brand'] = brand
+                entry['id'] = len(entries)
+                entries.append(entry)
+        return entries
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Make sure the mapped snapshot matches the source files.
+
+        Reuses a snapshot another process already built for the same
+        sources; otherwise parses the sources and writes a new one.
+
+        Args:
+            force: Rebuild the snapshot even if it looks current
+
+        Returns:
+            bool: True if a different snapshot is now mapped
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            sources = self._sources()
+            fingerprint = self._fingerprint(sources)
+
+            if not force and self._snapshot is not None and self._snapshot.fingerprint == fingerprint:
+                return False
+
+            snapshot = None
+            if not force and os.path.exists(self.snapshot_path):
+                try:
+                    snapshot = ContextSnapshot(self.snapshot_path)
+                    if snapshot.fingerprint != fingerprint:
+                        snapshot.close()
+                        snapshot = None
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable context snapshot: {e}")
+                    snapshot = None
+
+            if snapshot is None:
+                entries = self._parse(sources)
+                write_snapshot(self.snapshot_path, entries, fingerprint)
+                snapshot = ContextSnapshot(self.snapshot_path)
+                self._counters['snapshot_builds'] += 1
+                logger.info(f"✅ Context snapshot built ({len(entries)} entries, {len(sources)} sources)")
+            else:
+                self._counters['snapshot_loads'] += 1
+                logger.info(f"✅ Context snapshot mapped ({len(snapshot)} entries)")
+
+            # Entries already returned stay valid; the old mapping is simply
+            # dropped once nothing references it
+            self._snapshot = snapshot
+            return True
+
+    def _current(self) -> ContextSnapshot:
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.refresh()
+        return self._snapshot
+
+    # ------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------
+
+    def get(self, brand: str, category: str) -> List[Dict[str, Any]]:
+        """
+        Get every entry in a category for a brand.
+
+        Shared knowledge categories are visible to every brand.
+
+        Args:
+            brand: Brand identifier
+            category: Category name (e.g. 'services', 'emotional_triggers')
+
+        Returns:
+            list: Entries (brand, category, section, key, title, source, data)
+        """
+        snapshot = self._current()
+        self._counters['lookups'] += 1
+        ids = snapshot.ids(normalize_brand(brand), category) or snapshot.ids(SHARED_BRAND, category)
+        return [snapshot.entry(entry_id) for entry_id in ids]
+
+    def lookup(self, brand: str, category: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a single entry by key (e.g. a service id or strategy name).
+
+        Args:
+            brand: Brand identifier
+            category: Category name
+            key: Entry key or title (slugified before lookup)
+
+        Returns:
+            dict: Entry, or None if not found
+        """
+        snapshot = self._current()
+        self._counters['lookups'] += 1
+        key = slugify(key)
+        entry_id = snapshot.id_of(normalize_brand(brand), category, key)
+        if entry_id is None:
+            entry_id = snapshot.id_of(SHARED_BRAND, category, key)
+        return snapshot.entry(entry_id) if entry_id is not None else None
+
+    def entry(self, entry_id: int) -> Dict[str, Any]:
+        """Get an entry by id."""
+        return self._current().entry(entry_id)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Decode every entry (for building secondary indexes)."""
+        snapshot = self._current()
+        return [snapshot.entry(entry_id) for entry_id in range(len(snapshot))]
+
+    def categories(self, brand: str) -> List[str]:
+        """List the categories available to a brand, including shared ones."""
+        snapshot = self._current()
+        own = snapshot.categories(normalize_brand(brand))
+        return list(own) + [c for c in snapshot.categories(SHARED_BRAND) if c not in own]
+
+    def brands(self) -> List[str]:
+        """List brands with context (excluding the shared pseudo-brand)."""
+        return [brand for brand in self._current().brands() if brand != SHARED_BRAND]
+
+    def load_brand_context(self, brand: str, context_type: str = 'all') -> Dict[str, Any]:
+        """
+        Load a brand's context, as in the load_brand_context action.
+
+        Args:
+            brand: Brand identifier
+            context_type: 'all' or a single category name
+
+        Returns:
+            dict: context ({category: entries}), cached, loaded_at, version
+        """
+        categories = self.categories(brand) if context_type == 'all' else [context_type]
+        snapshot = self._snapshot
+        return {
+            'context': {category: self.get(brand, category) for category in categories},
+            'cached': True,
+            'loaded_at': snapshot.built_at,
+            'version': snapshot.fingerprint
+        }
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the sources behind the current snapshot."""
+        return self._current().fingerprint
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup counters and snapshot details."""
+        stats = dict(self._counters)
+        snapshot = self._snapshot
+        cache = snapshot.entry.cache_info()
+        stats.update({
+            'entries': len(snapshot),
+            'brands': self.brands(),
+            'fingerprint': snapshot.fingerprint,
+            'built_at': snapshot.built_at,
+            'snapshot_path': self.snapshot_path,
+            'decoded_entries': cache.currsize,
+            'decode_hits': cache.hits
+        })
+        return stats
+
+
+_librarian: Optional[ContextLibrarian] = None
+_librarian_lock = threading.Lock()
+
+
+def get_context_librarian() -> ContextLibrarian:
+    """
+    Get the process-wide context librarian, configured from the environment.
+
+    Returns:
+        ContextLibrarian: Shared librarian instance
+    """
+    global _librarian
+
+    if _librarian is None:
+        with _librarian_lock:
+            if _librarian is None:
+                _librarian = ContextLibrarian(
+                    knowledge_path=os.getenv('CQI_KNOWLEDGE_PATH') or None,
+                    context_path=os.getenv('AGENT_CONTEXT_PATH') or None,
+                    snapshot_path=os.getenv('CQI_CONTEXT_SNAPSHOT') or None,
+                    reload_interval=float(os.getenv('CQI_CONTEXT_RELOAD_INTERVAL', '30'))
+                )
+
+    return _librarian
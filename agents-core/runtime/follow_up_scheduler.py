@@ -0,0 +1,574 @@
+"""
+CQI Follow-up Scheduler - Runs follow_up_tasks when they come due
+
+Pending tasks due within the next CQI_FOLLOWUP_HORIZON_SECONDS are kept
+in a TimerWheel (see timer_wheel.py), indexed by task id. Scheduling,
+rescheduling and cancelling a task are O(1) updates to the wheel, and
+each tick only touches the tasks that just came due. The database is
+read in windows as the horizon moves forward; it is never re-scanned.
+
+Several schedulers (API servers, standalone processes) can run against
+the same table. Before a due task runs it is claimed with the
+claim_follow_up_tasks() function. That function leases rows with
+SELECT ... FOR UPDATE SKIP LOCKED, so each task is run by exactly one
+scheduler. A scheduler that dies holding a lease loses it once
+lease_expires_at passes, and another scheduler picks the task up.
+
+At most CQI_FOLLOWUP_CONCURRENCY tasks run at once. Due tasks beyond
+that wait in memory and are not claimed yet, so other schedulers can
+take them. Every CQI_FOLLOWUP_SWEEP_SECONDS a sweep claims any due tasks
+the wheel doesn't know about: rows inserted by other processes into an
+already-loaded window, and tasks whose lease expired.
+
+How a task runs depends on its task_type; see register_task_handler().
+By default an 'automated' task with metadata.workflow_id and
+metadata.workflow_event sends that event to the workflow engine. Every
+other task is handed off as a 'follow_up_due' system event and marked
+'announced', not 'sent': nothing has reached the lead yet. A delivery
+integration registers its own handler for the task type; a task is
+marked 'sent' when that handler returns. Failed tasks are retried after
+CQI_FOLLOWUP_RETRY_SECONDS, up to CQI_FOLLOWUP_MAX_ATTEMPTS attempts,
+and are then marked 'failed'.
+
+Environment Variables:
+    CQI_FOLLOWUPS_ENABLED: 'true' to run the scheduler in the API server (default: false)
+    CQI_FOLLOWUP_CONCURRENCY: Max tasks running at once (default: 8)
+    CQI_FOLLOWUP_LEASE_SECONDS: How long a claimed task stays leased (default: 300)
+    CQI_FOLLOWUP_HORIZON_SECONDS: How far ahead tasks are loaded (default: 3600)
+    CQI_FOLLOWUP_SWEEP_SECONDS: Seconds between sweeps for unknown due tasks (default: 60)
+    CQI_FOLLOWUP_MAX_ATTEMPTS: Attempts before a task is marked failed (default: 3)
+    CQI_FOLLOWUP_RETRY_SECONDS: Delay before a failed task is retried (default: 300)
+
+Usage:
+    # Standalone (run as many as needed)
+    python agents-core/runtime/follow_up_scheduler.py
+
+    # From code running next to a scheduler
+    from follow_up_scheduler import schedule_follow_up_async
+    await schedule_follow_up_async(lead_id, 'email', scheduled_for, message='...')
+"""
+
+import os
+import time
+import socket
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+from clients import get_async_supabase_client
+from timer_wheel import TimerWheel
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TASK_TYPES = ('email', 'sms', 'call', 'automated')
+
+# Task states (follow_up_tasks.status)
+TASK_PENDING = 'pending'
+TASK_ANNOUNCED = 'announced'    # handed off as a system event, not delivered
+TASK_SENT = 'sent'
+TASK_FAILED = 'failed'
+TASK_CANCELLED = 'cancelled'
+
+# Rows per page when loading a window
+LOAD_PAGE_SIZE = 1000
+
+# Returns the status to record (None means TASK_SENT)
+TaskHandler = Callable[[Dict[str, Any]], Awaitable[Optional[str]]]
+
+_handlers: Dict[str, TaskHandler] = {}
+
+
+def followups_enabled() -> bool:
+    """True if CQI_FOLLOWUPS_ENABLED is set."""
+    return os.getenv('CQI_FOLLOWUPS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def register_task_handler(task_type: str, handler: TaskHandler) -> None:
+    """
+    Set how tasks of a type are run.
+
+    Args:
+        task_type: One of TASK_TYPES
+        handler: async fn(task row) -> None (or a status, e.g. TASK_ANNOUNCED);
+            raising marks the attempt failed
+    """
+    if task_type not in TASK_TYPES:
+        raise ValueError(f"Unknown task type '{task_type}' (choose from: {', '.join(TASK_TYPES)})")
+    _handlers[task_type] = handler
+
+
+async def announce_task(task: Dict[str, Any]) -> str:
+    """
+    Default handler: hand the task off as a 'follow_up_due' system event.
+
+    Returns:
+        str: TASK_ANNOUNCED, since nothing was delivered to the lead
+    """
+    # Imported lazily so the scheduler can be imported without the CQI runtime
+    from conductor import fetch_lead_data_async, log_system_event_async
+
+    metadata = task.get('metadata') or {}
+    brand = metadata.get('brand')
+    if not brand:
+        brand = (await fetch_lead_data_async(task['lead_id'])).get('brand')
+
+    await log_system_event_async(
+        brand=brand,
+        event_type='follow_up_due',
+        event_data={
+            'task_id': task['id'],
+            'lead_id': task['lead_id'],
+            'session_id': task.get('session_id'),
+            'trial_id': task.get('trial_id'),
+            'task_type': task['task_type'],
+            'scheduled_for': task['scheduled_for'],
+            'message': task.get('message'),
+            'template_id': task.get('template_id'),
+            'assigned_to': task.get('assigned_to')
+        },
+        severity='info'
+    )
+    return TASK_ANNOUNCED
+
+
+async def run_automated_task(task: Dict[str, Any]) -> Optional[str]:
+    """
+    Default 'automated' handler: send metadata.workflow_event to
+    metadata.workflow_id; tasks without them are announced instead.
+    """
+    metadata = task.get('metadata') or {}
+    if not metadata.get('workflow_id') or not metadata.get('workflow_event'):
+        return await announce_task(task)
+
+    from workflow_engine import get_workflow_engine
+
+    engine = get_workflow_engine()
+    if engine is None:
+        raise RuntimeError('workflow engine is not running in this process')
+    engine.fire(metadata['workflow_id'], metadata['workflow_event'], metadata.get('payload'))
+    return TASK_SENT
+
+
+def get_task_handler(task_type: str) -> TaskHandler:
+    """Handler registered for a task type (default: announce_task)."""
+    return _handlers.get(task_type) or (run_automated_task if task_type == 'automated' else announce_task)
+
+
+def _epoch(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class FollowUpScheduler:
+    """
+    Loads pending follow_up_tasks into a timer wheel and runs them with
+    bounded concurrency, claiming each with a lease first.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        lease_seconds: int = 300,
+        horizon_seconds: float = 3600.0,
+        sweep_seconds: float = 60.0,
+        max_attempts: int = 3,
+        retry_seconds: float = 300.0,
+        tick_seconds: float = 1.0,
+        worker_id: Optional[str] = None
+    ):
+        """
+        Args:
+            concurrency: Max tasks running at once
+            lease_seconds: How long a claimed task stays leased
+            horizon_seconds: How far ahead tasks are loaded into memory
+            sweep_seconds: Seconds between sweeps for due tasks not in memory
+            max_attempts: Attempts before a task is marked failed
+            retry_seconds: Delay before a failed task is retried
+            tick_seconds: Timer resolution
+            worker_id: Lease owner name (default: host-pid)
+        """
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.horizon_seconds = horizon_seconds
+        self.sweep_seconds = sweep_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.tick_seconds = tick_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+        self.wheel = TimerWheel(tick_seconds)
+        self._ready: Dict[str, None] = {}         # due, waiting for a free slot (ordered)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loaded_until: Optional[float] = None
+        self._next_sweep = 0.0
+        self._stopping = asyncio.Event()
+        self._counters = {
+            'loaded': 0, 'claimed': 0, 'claim_conflicts': 0, 'sent': 0, 'announced': 0, 'retried': 0,
+            'failed': 0, 'cancelled': 0, 'swept': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Timer index
+    # ------------------------------------------------------------------
+
+    def schedule(self, task: Dict[str, Any]) -> bool:
+        """
+        Track a pending task (or move it if it's already tracked).
+
+        Tasks beyond the loaded horizon are left for the window load that
+        reaches them.
+
+        Returns:
+            bool: True if the task is now in the wheel
+        """
+        due = _epoch(task['scheduled_for'])
+        if self._loaded_until is not None and due > self._loaded_until:
+            self.cancel(task['id'])
+            return False
+        self._ready.pop(task['id'], None)
+        self.wheel.schedule(task['id'], due)
+        return True
+
+    def cancel(self, task_id: str) -> None:
+        """Stop tracking a task (no-op if it isn't tracked)."""
+        self.wheel.cancel(task_id)
+        self._ready.pop(task_id, None)
+
+    async def load_window(self, until: float) -> int:
+        """
+        Load pending tasks due up to `until` that aren't loaded yet.
+
+        The first load has no lower bound, so overdue tasks are included.
+        After that, each load only reads from the previous horizon onward.
+
+        Returns:
+            int: Tasks added to the wheel
+        """
+        supabase = await get_async_supabase_client()
+        start = self._loaded_until
+        cursor = None
+        loaded = 0
+
+        while True:
+            query = (
+                supabase.table('follow_up_tasks')
+                .select('id, scheduled_for')
+                .eq('status', TASK_PENDING)
+                .lte('scheduled_for', _iso(until))
+            )
+            if start is not None:
+                query = query.gt('scheduled_for', _iso(start))
+            if cursor is not None:
+                query = query.or_(
+                    f'scheduled_for.gt."{cursor[0]}",and(scheduled_for.eq."{cursor[0]}",id.gt."{cursor[1]}")'
+                )
+            response = await query.order('scheduled_for').order('id').limit(LOAD_PAGE_SIZE).execute()
+            rows = response.data or []
+
+            for row in rows:
+                if row['id'] not in self._running:
+                    self.wheel.schedule(row['id'], _epoch(row['scheduled_for']))
+                    loaded += 1
+            if len(rows) < LOAD_PAGE_SIZE:
+                break
+            cursor = (rows[-1]['scheduled_for'], rows[-1]['id'])
+
+        self._loaded_until = until
+        self._counters['loaded'] += loaded
+        return loaded
+
+    # ------------------------------------------------------------------
+    # Claiming and running
+    # ------------------------------------------------------------------
+
+    async def _claim(self, task_ids: Optional[List[str]], limit: int) -> List[Dict[str, Any]]:
+        supabase = await get_async_supabase_client()
+        response = await supabase.rpc('claim_follow_up_tasks', {
+            'p_owner': self.worker_id,
+            'p_lease_seconds': int(self.lease_seconds),
+            'p_limit': limit,
+            'p_ids': task_ids
+        }).execute()
+        return response.data or []
+
+    def _start(self, task: Dict[str, Any]) -> None:
+        self.cancel(task['id'])
+        self._counters['claimed'] += 1
+        self._running[task['id']] = asyncio.create_task(self._execute(task))
+
+    async def dispatch(self, now: Optional[float] = None) -> int:
+        """
+        Move due timers to the ready list and claim as many ready tasks as
+        there are free slots.
+
+        Returns:
+            int: Tasks started
+        """
+        now = time.time() if now is None else now
+        for task_id, _ in self.wheel.advance(now):
+            self._ready[task_id] = None
+
+        free = self.concurrency - len(self._running)
+        if free <= 0 or not self._ready:
+            return 0
+
+        wanted = list(self._ready)[:free]
+        for task_id in wanted:
+            del self._ready[task_id]
+        claimed = await self._claim(wanted, len(wanted))
+
+        # The rest were taken by another scheduler, cancelled or rescheduled
+        self._counters['claim_conflicts'] += len(wanted) - len(claimed)
+        for task in claimed:
+            self._start(task)
+        return len(claimed)
+
+    async def sweep(self) -> int:
+        """
+        Claim due tasks not in this scheduler's wheel: inserted elsewhere
+        into a loaded window, or left behind by a scheduler whose lease
+        expired.
+
+        Returns:
+            int: Tasks started
+        """
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        claimed = await self._claim(None, free)
+        for task in claimed:
+            self._start(task)
+        self._counters['swept'] += len(claimed)
+        return len(claimed)
+
+    async def _execute(self, task: Dict[str, Any]) -> None:
+        task_id = task['id']
+        try:
+            status = await get_task_handler(task['task_type'])(task) or TASK_SENT
+        except Exception as e:
+            await self._record_failure(task, str(e))
+        else:
+            await self._finish(task_id, {
+                'status': status,
+                'executed_at': _iso(time.time()),
+                'last_error': None
+            })
+            self._counters[status] = self._counters.get(status, 0) + 1
+        finally:
+            self._running.pop(task_id, None)
+
+    async def _finish(self, task_id: str, values: Dict[str, Any]) -> None:
+        """Write a task's outcome and release the lease (only if we still hold it)."""
+        values = dict(values, lease_owner=None, lease_expires_at=None)
+        try:
+            supabase = await get_async_supabase_client()
+            await (
+                supabase.table('follow_up_tasks')
+                .update(values)
+                .eq('id', task_id)
+                .eq('lease_owner', self.worker_id)
+                .execute()
+            )
+        except Exception as e:
+            # The lease expires and another scheduler retries the task
+            logger.warning(f"Failed to record follow-up task {task_id}: {e}")
+
+    async def _record_failure(self, task: Dict[str, Any], error: str) -> None:
+        attempts = task.get('attempts') or 1
+        if attempts >= self.max_attempts:
+            await self._finish(task['id'], {'status': TASK_FAILED, 'last_error': error})
+            self._counters['failed'] += 1
+            logger.error(f"❌ Follow-up task {task['id']} failed after {attempts} attempts: {error}")
+            return
+
+        retry_at = time.time() + self.retry_seconds
+        await self._finish(task['id'], {'scheduled_for': _iso(retry_at), 'last_error': error})
+        self.schedule({'id': task['id'], 'scheduled_for': retry_at})
+        self._counters['retried'] += 1
+        logger.warning(f"⚠️  Follow-up task {task['id']} attempt {attempts} failed, retrying: {error}")
+
+    # ------------------------------------------------------------------
+    # Task API
+    # ------------------------------------------------------------------
+
+    async def create_task_async(
+        self,
+        lead_id: str,
+        task_type: str,
+        scheduled_for: Any,
+        **fields
+    ) -> Dict[str, Any]:
+        """
+        Insert a follow-up task and track it.
+
+        Args:
+            lead_id: Lead the task is for
+            task_type: One of TASK_TYPES
+            scheduled_for: When to run it (datetime, ISO string or epoch)
+            **fields: Other follow_up_tasks columns (message, session_id,
+                trial_id, template_id, assigned_to, metadata)
+
+        Returns:
+            dict: Inserted row
+
+        Raises:
+            ValueError: If the task type is unknown
+        """
+        if task_type not in TASK_TYPES:
+            raise ValueError(f"Unknown task type '{task_type}' (choose from: {', '.join(TASK_TYPES)})")
+
+        row = dict(fields, lead_id=lead_id, task_type=task_type,
+                   scheduled_for=_iso(_epoch(scheduled_for)), status=TASK_PENDING)
+        supabase = await get_async_supabase_client()
+        response = await supabase.table('follow_up_tasks').insert(row).execute()
+        task = response.data[0]
+        self.schedule(task)
+        return task
+
+    async def cancel_task_async(self, task_id: str) -> bool:
+        """
+        Cancel a pending task.
+
+        Returns:
+            bool: False if the task was no longer pending
+        """
+        self.cancel(task_id)
+        supabase = await get_async_supabase_client()
+        response = await (
+            supabase.table('follow_up_tasks')
+            .update({'status': TASK_CANCELLED})
+            .eq('id', task_id)
+            .eq('status', TASK_PENDING)
+            .execute()
+        )
+        if response.data:
+            self._counters['cancelled'] += 1
+        return bool(response.data)
+
+    # ------------------------------------------------------------------
+    # Runner
+    # ------------------------------------------------------------------
+
+    async def run(self) -> None:
+        """Load, dispatch and sweep until stop() is called."""
+        self._stopping.clear()
+        logger.info(f"✅ Follow-up scheduler {self.worker_id} started (concurrency {self.concurrency})")
+
+        while not self._stopping.is_set():
+            now = time.time()
+            try:
+                if self._loaded_until is None or now + self.horizon_seconds / 2 >= self._loaded_until:
+                    await self.load_window(now + self.horizon_seconds)
+                await self.dispatch(now)
+                if now >= self._next_sweep:
+                    self._next_sweep = now + self.sweep_seconds
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"Follow-up scheduler error: {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+        logger.info("Follow-up scheduler stopped")
+
+    def stop(self) -> None:
+        """Ask run() to return once running tasks finish."""
+        self._stopping.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters plus tracked, ready and running task counts."""
+        stats = dict(self._counters)
+        stats['tracked'] = len(self.wheel)
+        stats['ready'] = len(self._ready)
+        stats['running'] = len(self._running)
+        stats['loaded_until'] = _iso(self._loaded_until) if self._loaded_until else None
+        return stats
+
+
+_scheduler: Optional[FollowUpScheduler] = None
+
+
+def start_follow_up_scheduler() -> FollowUpScheduler:
+    """
+    Create this process's scheduler from the environment. The caller
+    runs scheduler.run().
+
+    Returns:
+        FollowUpScheduler: The process-wide scheduler
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = FollowUpScheduler(
+            concurrency=int(os.getenv('CQI_FOLLOWUP_CONCURRENCY', '8')),
+            lease_seconds=int(os.getenv('CQI_FOLLOWUP_LEASE_SECONDS', '300')),
+            horizon_seconds=float(os.getenv('CQI_FOLLOWUP_HORIZON_SECONDS', '3600')),
+            sweep_seconds=float(os.getenv('CQI_FOLLOWUP_SWEEP_SECONDS', '60')),
+            max_attempts=int(os.getenv('CQI_FOLLOWUP_MAX_ATTEMPTS', '3')),
+            retry_seconds=float(os.getenv('CQI_FOLLOWUP_RETRY_SECONDS', '300'))
+        )
+    return _scheduler
+
+
+def get_follow_up_scheduler() -> Optional[FollowUpScheduler]:
+    """The scheduler started in this process, or None."""
+    return _scheduler
+
+
+async def schedule_follow_up_async(lead_id: str, task_type: str, scheduled_for: Any, **fields) -> Dict[str, Any]:
+    """
+    Insert a follow-up task. If this process runs a scheduler the task
+    goes straight into its wheel; otherwise the scheduler that owns that
+    window picks it up on its next sweep.
+
+    Returns:
+        dict: Inserted row
+    """
+    return await (get_follow_up_scheduler() or FollowUpScheduler()).create_task_async(
+        lead_id, task_type, scheduled_for, **fields
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run due follow-up tasks')
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Max tasks running at once (default: CQI_FOLLOWUP_CONCURRENCY or 8)'
+    )
+    args = parser.parse_args()
+
+    scheduler = start_follow_up_scheduler()
+    if args.concurrency:
+        scheduler.concurrency = args.concurrency
+
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        print("\nStopping follow-up scheduler...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Incremental JSON object parser for streamed Claude responses
+
+Feeds text chunks as they arrive and returns the first complete
+top-level JSON object as soon as its closing brace is seen, so the
+caller can stop reading the stream instead of waiting for the full
+completion. Leading prose or a ```json fence before the object is
+skipped, within a limit.
+
+The parser only tracks structure (strings, escapes, bracket nesting);
+the finished object is decoded with json.loads. That is enough to spot
+a stream that has clearly gone wrong without validating every token:
+
+- too much text before the first '{'
+- a closing bracket that doesn't match the open one
+- an object that grows past max_object_chars
+
+Usage:
+    parser = IncrementalJSONParser()
+    for chunk in stream:
+        obj = parser.feed(chunk)
+        if obj is not None:
+            break
+"""
+
+import json
+from typing import Optional, Dict, Any, List
+
+
+class MalformedStreamError(ValueError):
+    """Raised when a streamed response can't contain a valid JSON object"""
+    pass
+
+
+class IncrementalJSONParser:
+    """Detects the end of the first top-level JSON object in a text stream."""
+
+    _CLOSERS = {'}': '{', ']': '['}
+
+    def __init__(self, max_prefix_chars: int = 500, max_object_chars: int = 20000):
+        """
+        Args:
+            max_prefix_chars: Text allowed before the object starts
+            max_object_chars: Largest object accepted before giving up
+        """
+        self.max_prefix_chars = max_prefix_chars
+        self.max_object_chars = max_object_chars
+        self._prefix_chars = 0
+        self._buffer: List[str] = []
+        self._size = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """
+        Consume a chunk of streamed text.
+
+        Args:
+            chunk: Next piece of the response
+
+        Returns:
+            dict: The decoded object once it is complete, otherwise None
+
+        Raises:
+            MalformedStreamError: If the stream can no longer yield a valid object
+        """
+        if self.done:
+            return None
+
+        start = 0
+        if not self._stack:
+            # Still looking for the opening brace
+            idx = chunk.find('{')
+            if idx == -1:
+                self._prefix_chars += len(chunk)
+                if self._prefix_chars > self.max_prefix_chars:
+                    raise MalformedStreamError(
+                        f"No JSON object within the first {self.max_prefix_chars} characters"
+                    )
+                return None
+            self._prefix_chars += idx
+            if self._prefix_chars > self.max_prefix_chars:
+                raise MalformedStreamError(
+                    f"No JSON object within the first {self.max_prefix_chars} characters"
+                )
+            start = idx
+
+        for i in range(start, len(chunk)):
+            char = chunk[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append(char)
+            elif char in '}]':
+                if not self._stack or self._stack[-1] != self._CLOSERS[char]:
+                    raise MalformedStreamError(f"Unexpected '{char}' in streamed JSON")
+                self._stack.pop()
+                if not self._stack:
+                    self._append(chunk[start:i + 1])
+                    return self._finish()
+
+        self._append(chunk[start:])
+        return None
+
+    def _append(self, text: str) -> None:
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size > self.max_object_chars:
+            raise MalformedStreamError(f"JSON object exceeds {self.max_object_chars} characters")
+
+    def _finish(self) -> Dict[str, Any]:
+        self.done = True
+        text = ''.join(self._buffer)
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise MalformedStreamError(f"Streamed JSON object is invalid: {e}")
+        if not isinstance(obj, dict):
+            raise MalformedStreamError("Streamed JSON is not an object")
+        return obj
+
+    @property
+    def text(self) -> str:
+        """Object text received so far (for error logging)."""
+        return ''.join(self._buffer)
@@ -0,0 +1,640 @@
+"""
+CQI Job Queue - Durable background qualification queue
+
+Decouples lead intake from Claude scoring. The API inserts the lead,
+enqueues a job and returns immediately; a pool of conductor workers
+drains the queue and writes progress to cqi_sessions.session_state
+('initiated' while waiting/scoring, 'scored' when done, 'failed' once
+the job has used up its attempts).
+
+Jobs are persisted in a local SQLite database so they survive restarts.
+Workers claim jobs with a time-limited lease, so a crashed worker's job
+is picked up again once the lease expires (or marked failed, if that
+was its last attempt). While a job runs, its worker
+renews the lease every third of lease_seconds, so a slow job (Claude
+retries can take several minutes) isn't handed to a second worker.
+Completing, failing or releasing a job only takes effect while the
+caller still holds its lease.
+
+Usage:
+    # As a module
+    from job_queue import JobQueue, QualificationWorkerPool
+    queue = JobQueue()
+    job_id = queue.enqueue(lead_id="uuid-here", brand="sotsvc")
+
+    pool = QualificationWorkerPool(queue, workers=4)
+    await pool.start()
+
+    # As a standalone worker process
+    python job_queue.py --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import argparse
+from typing import Optional, Dict, Any, List, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(__file__), 'cqi_jobs.db')
+
+
+def queue_enabled() -> bool:
+    """Return True if POST /api/lead should enqueue instead of scoring inline."""
+    return os.getenv('CQI_QUEUE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+class JobQueue:
+    """
+    SQLite-backed durable job queue for lead qualification.
+
+    Each operation opens its own short-lived connection, so one instance
+    can be shared by threads and by asyncio.to_thread() calls.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+        retry_delay_seconds: float = 30.0
+    ):
+        """
+        Args:
+            path: SQLite database file (default: CQI_QUEUE_PATH or cqi_jobs.db)
+            lease_seconds: How long a claimed job stays invisible to other workers
+            max_attempts: Attempts before a job is marked failed
+            retry_delay_seconds: Delay before a failed attempt is retried
+        """
+        self.path = path or os.getenv('CQI_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cqi_jobs (
+                    id TEXT PRIMARY KEY,
+                    lead_id TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    session_id TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_cqi_jobs_ready '
+                'ON cqi_jobs(status, available_at)'
+            )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        if job.get('result'):
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def enqueue(
+        self,
+        lead_id: str,
+        brand: str,
+        session_id: Optional[str] = None,
+        delay_seconds: float = 0.0
+    ) -> str:
+        """
+        Add a lead to the qualification queue.
+
+        Args:
+            lead_id: UUID of the lead to score
+            brand: Brand identifier
+            session_id: Existing session to update instead of creating one
+                (used to re-score provisionally scored leads)
+            delay_seconds: Don't run the job before this many seconds
+
+        Returns:
+            str: Job ID
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO cqi_jobs (id, lead_id, brand, session_id, status, available_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, lead_id, brand, session_id, JOB_QUEUED, now + delay_seconds, now, now)
+            )
+        finally:
+            conn.close()
+
+        logger.info(f"Queued CQI job {job_id} for lead {lead_id}")
+        return job_id
+
+    def enqueue_many(self, items: List[Tuple[str, str]]) -> List[str]:
+        """
+        Add many leads to the queue in one transaction.
+
+        Args:
+            items: (lead_id, brand) pairs
+
+        Returns:
+            list: Job IDs, in input order
+        """
+        now = time.time()
+        job_ids = [str(uuid.uuid4()) for _ in items]
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO cqi_jobs (id, lead_id, brand, status, available_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(job_id, lead_id, brand, JOB_QUEUED, now, now, now) for job_id, (lead_id, brand) in zip(job_ids, items)]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"Queued {len(job_ids)} CQI jobs")
+        return job_ids
+
+    def claim(
+        self,
+        worker_id: str,
+        exclude_brands: Optional[List[str]] = None,
+        exclude_ids: Optional[List[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim the oldest ready job.
+
+        A job is ready if it is queued and past its retry delay, or if it is
+        running but its lease has expired (the previous worker died). An
+        expired job that already used max_attempts isn't run again: it is
+        marked failed and returned with status 'failed', so the caller's
+        process_job() can record the failure on its session.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            exclude_brands: Skip jobs for these brands (e.g. brands at their
+                concurrency cap), so other brands' jobs aren't stuck behind them
+            exclude_ids: Skip these jobs (e.g. ones the caller is still running)
+
+        Returns:
+            dict: Claimed (or just failed) job, or None if the queue is empty
+        """
+        now = time.time()
+        filters = ''
+        params: List[Any] = [JOB_QUEUED, now, JOB_RUNNING, now]
+        if exclude_brands:
+            filters = f" AND brand NOT IN ({', '.join('?' * len(exclude_brands))})"
+            params.extend(exclude_brands)
+        if exclude_ids:
+            filters += f" AND id NOT IN ({', '.join('?' * len(exclude_ids))})"
+            params.extend(exclude_ids)
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id, status, attempts FROM cqi_jobs '
+                'WHERE ((status = ? AND available_at <= ?) '
+                '   OR (status = ? AND lease_expires_at < ?))'
+                f'{filters} '
+                'ORDER BY available_at LIMIT 1',
+                params
+            ).fetchone()
+
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+
+            if row['status'] == JOB_RUNNING and row['attempts'] >= self.max_attempts:
+                conn.execute(
+                    'UPDATE cqi_jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL, '
+                    'updated_at = ? WHERE id = ?',
+                    (JOB_FAILED, f"Lease expired on attempt {row['attempts']} of {self.max_attempts}", now, row['id'])
+                )
+            else:
+                conn.execute(
+                    'UPDATE cqi_jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, '
+                    'lease_expires_at = ?, updated_at = ? WHERE id = ?',
+                    (JOB_RUNNING, worker_id, now + self.lease_seconds, now, row['id'])
+                )
+            job = conn.execute('SELECT * FROM cqi_jobs WHERE id = ?', (row['id'],)).fetchone()
+            conn.execute('COMMIT')
+            return self._row_to_job(job)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """
+        Extend the lease on a running job by lease_seconds.
+
+        Args:
+            job_id: Claimed job
+            owner: lease_owner the job was claimed with
+
+        Returns:
+            bool: False if the lease was lost (expired and claimed by someone else)
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'UPDATE cqi_jobs SET lease_expires_at = ?, updated_at = ? '
+                'WHERE id = ? AND status = ? AND lease_owner = ?',
+                (now + self.lease_seconds, now, job_id, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def set_session(self, job_id: str, session_id: str) -> None:
+        """Record the pending cqi_sessions row created for a job."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE cqi_jobs SET session_id = ?, updated_at = ? WHERE id = ?',
+                (session_id, time.time(), job_id)
+            )
+        finally:
+            conn.close()
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        """
+        Mark a job as succeeded and store the conductor result.
+
+        Args:
+            job_id: Claimed job
+            owner: lease_owner the job was claimed with
+            result: Conductor result
+
+        Returns:
+            bool: False if the caller's lease had expired or been taken (nothing changed)
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'UPDATE cqi_jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, '
+                'lease_expires_at = NULL, updated_at = ? '
+                'WHERE id = ? AND status = ? AND lease_owner = ? AND lease_expires_at >= ?',
+                (JOB_SUCCEEDED, json.dumps(result, default=str), now, job_id, JOB_RUNNING, owner, now)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def fail(self, job_id: str, owner: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt.
+
+        The job is re-queued after retry_delay_seconds until max_attempts is
+        reached, after which it is marked failed.
+
+        Args:
+            job_id: Claimed job
+            owner: lease_owner the job was claimed with
+            error: Error message
+
+        Returns:
+            str: New job status, or None if the caller's lease had expired
+                or been taken (nothing changed)
+        """
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute(
+                'UPDATE cqi_jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                'error = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? '
+                'WHERE id = ? AND status = ? AND lease_owner = ? AND lease_expires_at >= ?',
+                (self.max_attempts, JOB_FAILED, JOB_QUEUED, error, now + self.retry_delay_seconds, now,
+                 job_id, JOB_RUNNING, owner, now)
+            )
+            status = None
+            if cursor.rowcount == 1:
+                status = conn.execute('SELECT status FROM cqi_jobs WHERE id = ?', (job_id,)).fetchone()['status']
+            conn.execute('COMMIT')
+            return status
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def release(self, job_id: str, owner: str, delay_seconds: float = 0.0) -> bool:
+        """
+        Return a claimed job to the queue without counting the attempt.
+
+        Used when a dispatcher shuts down with jobs it claimed but never
+        started, and to defer jobs while the scoring circuit is open.
+
+        Args:
+            job_id: Claimed job
+            owner: lease_owner the job was claimed with
+            delay_seconds: Keep the job invisible for this long
+
+        Returns:
+            bool: False if the job is no longer held by owner
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'UPDATE cqi_jobs SET status = ?, attempts = MAX(attempts - 1, 0), available_at = ?, '
+                'lease_owner = NULL, lease_expires_at = NULL, updated_at = ? '
+                'WHERE id = ? AND status = ? AND lease_owner = ?',
+                (JOB_QUEUED, now + delay_seconds, now, job_id, JOB_RUNNING, owner)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def pending_count(self, brand: Optional[str] = None) -> int:
+        """
+        Count jobs waiting to be claimed (queued, including retry delays).
+
+        Args:
+            brand: Only count this brand's jobs
+
+        Returns:
+            int: Number of queued jobs
+        """
+        conn = self._connect()
+        try:
+            if brand is None:
+                row = conn.execute('SELECT COUNT(*) AS n FROM cqi_jobs WHERE status = ?', (JOB_QUEUED,)).fetchone()
+            else:
+                row = conn.execute(
+                    'SELECT COUNT(*) AS n FROM cqi_jobs WHERE status = ? AND brand = ?',
+                    (JOB_QUEUED, brand)
+                ).fetchone()
+            return row['n']
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a job by ID."""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM cqi_jobs WHERE id = ?', (job_id,)).fetchone()
+            return self._row_to_job(row)
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return job counts per status."""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) AS n FROM cqi_jobs GROUP BY status').fetchall()
+            return {row['status']: row['n'] for row in rows}
+        finally:
+            conn.close()
+
+
+class QualificationWorkerPool:
+    """
+    Pool of async conductor workers draining a JobQueue.
+
+    Each worker claims a job, creates a pending ('initiated') CQI session,
+    runs process_lead_async() against it and marks the job done.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = 4,
+        poll_interval: float = 1.0
+    ):
+        """
+        Args:
+            queue: Job queue to drain
+            workers: Number of concurrent worker tasks
+            poll_interval: Seconds to sleep when the queue is empty
+        """
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        self._worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def start(self) -> None:
+        """Start worker tasks on the running event loop."""
+        self._stopping.clear()
+        for i in range(self.workers):
+            worker_id = f"{self._worker_prefix}-{i}"
+            self._tasks.append(asyncio.create_task(self._run(worker_id)))
+        logger.info(f"✅ Started {self.workers} CQI queue workers")
+
+    async def stop(self) -> None:
+        """Signal workers to stop and wait for in-flight jobs to finish."""
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("CQI queue workers stopped")
+
+    async def run_forever(self) -> None:
+        """Start workers and block until they exit."""
+        await self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def _run(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(self.queue.claim, worker_id)
+            except Exception as e:
+                logger.error(f"[{worker_id}] Failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await process_job(self.queue, worker_id, job)
+
+
+async def _keep_leased(queue: JobQueue, job_id: str, owner: str, worker_id: str) -> None:
+    """Renew a job's lease every third of lease_seconds until cancelled."""
+    interval = queue.lease_seconds / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await asyncio.to_thread(queue.renew, job_id, owner):
+                logger.warning(f"[{worker_id}] Lost the lease on job {job_id}; its result won't be recorded")
+                return
+        except Exception as e:
+            # Try again next interval; the lease has two more to go
+            logger.warning(f"[{worker_id}] Failed to renew lease on job {job_id}: {e}")
+
+
+async def process_job(queue: JobQueue, worker_id: str, job: Dict[str, Any]) -> str:
+    """
+    Run one claimed job through the conductor and record the outcome.
+
+    Creates a pending ('initiated') CQI session, runs process_lead_async()
+    against it and marks the job done or failed. While the scoring circuit
+    is open the job is put back without using up an attempt. The lease
+    is renewed while the job runs; if it is lost anyway, the outcome is
+    left to the worker that now holds it. When the job fails for good
+    (including a job claim() gave up on), its session is marked 'failed'.
+
+    Args:
+        queue: Queue the job was claimed from
+        worker_id: Identifier of the worker (for logs)
+        job: Claimed job
+
+    Returns:
+        str: Final job status (succeeded, or queued/failed after an error),
+            or running if the lease was lost
+    """
+    # Imported lazily so job_queue can be imported without the CQI runtime
+    from conductor import (
+        process_lead_async,
+        create_pending_session_async,
+        record_session_error_async
+    )
+    from circuit_breaker import CircuitOpenError, get_scoring_breaker
+
+    job_id = job['id']
+    owner = job['lease_owner']
+    session_id = job.get('session_id')
+    if job['status'] == JOB_FAILED:
+        logger.error(f"[{worker_id}] Job {job_id} failed: {job['error']}")
+        if session_id:
+            await record_session_error_async(session_id, job['error'], attempt=job['attempts'], final=True)
+        return JOB_FAILED
+
+    logger.info(f"[{worker_id}] Processing job {job_id} (attempt {job['attempts']})")
+    heartbeat = asyncio.create_task(_keep_leased(queue, job_id, owner, worker_id))
+
+    try:
+        if not session_id:
+            session = await create_pending_session_async(job['lead_id'], job['brand'])
+            session_id = session['id']
+            await asyncio.to_thread(queue.set_session, job_id, session_id)
+
+        result = await process_lead_async(
+            lead_id=job['lead_id'],
+            brand=job['brand'],
+            session_id=session_id,
+            allow_fallback=False
+        )
+        if not await asyncio.to_thread(queue.complete, job_id, owner, result):
+            logger.warning(f"[{worker_id}] Job {job_id} finished after losing its lease; result not recorded")
+            return JOB_RUNNING
+        return JOB_SUCCEEDED
+
+    except CircuitOpenError:
+        delay = get_scoring_breaker().open_seconds
+        await asyncio.to_thread(queue.release, job_id, owner, delay)
+        logger.warning(f"[{worker_id}] Scoring circuit open; job {job_id} deferred {delay:.0f}s")
+        return JOB_QUEUED
+
+    except Exception as e:
+        status = await asyncio.to_thread(queue.fail, job_id, owner, str(e))
+        if status is None:
+            logger.warning(f"[{worker_id}] Job {job_id} failed after losing its lease: {e}")
+            return JOB_RUNNING
+        logger.error(f"[{worker_id}] Job {job_id} failed ({status}): {e}")
+        if session_id:
+            await record_session_error_async(session_id, str(e), attempt=job['attempts'], final=status == JOB_FAILED)
+        return status
+
+    finally:
+        heartbeat.cancel()
+
+
+def main():
+    """
+    CLI entry point for running queue workers outside the API server.
+
+    Usage:
+        python job_queue.py --workers 4
+    """
+    parser = argparse.ArgumentParser(
+        description='CQI Job Queue - Drain queued leads through the conductor'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.getenv('CQI_QUEUE_WORKERS', '4')),
+        help='Number of concurrent workers'
+    )
+    parser.add_argument(
+        '--queue-path',
+        default=None,
+        help='SQLite queue database (default: CQI_QUEUE_PATH or cqi_jobs.db)'
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Print job counts per status and exit'
+    )
+
+    args = parser.parse_args()
+    queue = JobQueue(path=args.queue_path)
+
+    if args.stats:
+        print(json.dumps(queue.stats(), indent=2))
+        sys.exit(0)
+
+    pool = QualificationWorkerPool(queue, workers=args.workers)
+
+    try:
+        asyncio.run(pool.run_forever())
+    except KeyboardInterrupt:
+        print("\nStopping workers...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+CQI Knowledge Index - BM25 retrieval over the context librarian's entries
+
+Lets prompts carry only the few knowledge snippets relevant to a lead
+(e.g. the "Pain Avoidance" trigger for a lead describing an urgent mess)
+instead of the whole backend/knowledge corpus, so prompt size stays flat
+as the knowledge base grows.
+
+The index is built offline from ContextLibrarian entries and saved as
+JSON: an inverted index (term -> [(entry, term frequency), ...]), entry
+lengths, precomputed IDF and a short snippet per entry. A query touches
+only the postings of its own terms, which keeps lookups well under a
+millisecond for a corpus of this size. The index records the librarian
+fingerprint it was built from and is rebuilt when the sources change.
+
+Environment Variables:
+    CQI_KNOWLEDGE_INDEX: Index file (default: agents-core/runtime/knowledge_index.json)
+    CQI_KNOWLEDGE_TOP_K: Snippets added to each scoring prompt (default: 0, off)
+
+Usage:
+    python agents-core/runtime/knowledge_index.py --build
+    python agents-core/runtime/knowledge_index.py --query "need it cleaned asap before inspection"
+
+    from knowledge_index import get_knowledge_index
+    snippets = get_knowledge_index().search(lead['message'], brand='sotsvc', k=3)
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import logging
+import tempfile
+import threading
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
+
+from context_librarian import SHARED_BRAND, ContextLibrarian, get_context_librarian
+from brand_registry import normalize_brand
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), 'knowledge_index.json')
+INDEX_FORMAT = 1
+
+# Entry categories that hold persuasion/empathy knowledge (not brand settings)
+INDEXED_BRAND_CATEGORIES = ('objection_handlers', 'faqs', 'services')
+
+SNIPPET_CHARS = 320
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before being but by can could did do does
+for from had has have how i if in into is it its just me more most my no not of on or our out
+so some such than that the their them then there these they this those to too us very was we
+were what when where which while who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, drop stopwords and fold simple plurals."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def flatten_text(value: Any) -> str:
+    """Join every string in a nested entry into one block of text."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return ' '.join(flatten_text(v) for v in value.values())
+    if isinstance(value, list):
+        return ' '.join(flatten_text(v) for v in value)
+    return ''
+
+
+def make_snippet(entry: Dict[str, Any]) -> str:
+    """Short prompt-ready text for an entry."""
+    text = ' '.join(flatten_text(entry['data']).split())
+    if text.startswith(entry['title']):
+        text = text[len(entry['title']):].lstrip()
+    if len(text) > SNIPPET_CHARS:
+        text = text[:SNIPPET_CHARS].rsplit(' ', 1)[0] + '...'
+    return f"{entry['title']}: {text}"
+
+
+class KnowledgeIndex:
+    """
+    BM25 index over knowledge entries.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Args:
+            data: Index contents as produced by build() / stored on disk
+        """
+        self.fingerprint: str = data['fingerprint']
+        self.k1: float = data['k1']
+        self.b: float = data['b']
+        self.avg_length: float = data['avg_length']
+        self.lengths: List[int] = data['lengths']
+        self.docs: List[Dict[str, Any]] = data['docs']
+        self.idf: Dict[str, float] = data['idf']
+        self.postings: Dict[str, List[Tuple[int, int]]] = data['postings']
+        # Precompute the per-document length normalization once
+        self._norms = [
+            self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for length in self.lengths
+        ]
+
+    @classmethod
+    def build(
+        cls,
+        librarian: ContextLibrarian,
+        k1: float = 1.5,
+        b: float = 0.75
+    ) -> 'KnowledgeIndex':
+        """
+        Build the index from the librarian's entries.
+
+        Indexes the shared knowledge corpora plus each brand's
+        INDEXED_BRAND_CATEGORIES.
+
+        Args:
+            librarian: Source of entries
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+
+        Returns:
+            KnowledgeIndex: New index
+        """
+        docs = []
+        lengths = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+
+        for entry in librarian.entries():
+            if entry['brand'] != SHARED_BRAND and entry['category'] not in INDEXED_BRAND_CATEGORIES:
+                continue
+
+            tokens = tokenize(entry['title'] + ' ' + flatten_text(entry['data']))
+            if not tokens:
+                continue
+
+            doc_id = len(docs)
+            docs.append({
+                'entry_id': entry['id'],
+                'brand': entry['brand'],
+                'category': entry['category'],
+                'title': entry['title'],
+                'snippet': make_snippet(entry)
+            })
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, count))
+
+        total = len(docs)
+        idf = {
+            term: math.log(1 + (total - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+        return cls({
+            'format': INDEX_FORMAT,
+            'fingerprint': librarian.fingerprint,
+            'k1': k1,
+            'b': b,
+            'avg_length': sum(lengths) / total if total else 0.0,
+            'lengths': lengths,
+            'docs': docs,
+            'idf': idf,
+            'postings': postings
+        })
+
+    def save(self, path: str) -> None:
+        """Write the index to disk atomically."""
+        payload = {
+            'format': INDEX_FORMAT,
+            'fingerprint': self.fingerprint,
+            'k1': self.k1,
+            'b': self.b,
+            'avg_length': self.avg_length,
+            'lengths': self.lengths,
+            'docs': self.docs,
+            'idf': self.idf,
+            'postings': self.postings
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.knowledge_index.', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'KnowledgeIndex':
+        """
+        Read an index from disk.
+
+        Raises:
+            ValueError: If the file was written by an incompatible version
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported knowledge index format: {data.get('format')}")
+        return cls(data)
+
+    def search(
+        self,
+        query: str,
+        brand: Optional[str] = None,
+        k: int = 3,
+        categories: Optional[Tuple[str, ...]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the top-k entries for a query.
+
+        Args:
+            query: Free text (typically the lead's message)
+            brand: Also include this brand's entries (shared ones are always included)
+            k: Max results
+            categories: Only return entries from these categories
+
+        Returns:
+            list: Results (entry_id, brand, category, title, snippet, score), best first
+        """
+        brands = {SHARED_BRAND}
+        if brand:
+            brands.add(normalize_brand(brand))
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in plist:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self._norms[doc_id])
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            doc = self.docs[doc_id]
+            if doc['brand'] not in brands:
+                continue
+            if categories and doc['category'] not in categories:
+                continue
+            results.append(dict(doc, score=round(score, 4)))
+            if len(results) >= k:
+                break
+        return results
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+def build_index(path: Optional[str] = None, librarian: Optional[ContextLibrarian] = None) -> KnowledgeIndex:
+    """
+    Build the index from the librarian and save it.
+
+    Args:
+        path: Index file (default: CQI_KNOWLEDGE_INDEX)
+        librarian: Entry source (default: the process-wide librarian)
+
+    Returns:
+        KnowledgeIndex: The new index
+    """
+    path = path or os.getenv('CQI_KNOWLEDGE_INDEX') or DEFAULT_INDEX_PATH
+    index = KnowledgeIndex.build(librarian or get_context_librarian())
+    index.save(path)
+    logger.info(f"✅ Knowledge index built ({len(index)} entries, {len(index.postings)} terms) → {path}")
+    return index
+
+
+_index: Optional[KnowledgeIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """
+    Get the process-wide knowledge index.
+
+    Loads the index file if it matches the current knowledge sources,
+    otherwise rebuilds it (and saves it for other processes).
+
+    Returns:
+        KnowledgeIndex: Shared index
+    """
+    global _index
+
+    librarian = get_context_librarian()
+    index = _index
+    if index is not None and index.fingerprint == librarian.fingerprint:
+        return index
+
+    with _index_lock:
+        if _index is not None and _index.fingerprint == librarian.fingerprint:
+            return _index
+
+        path = os.getenv('CQI_KNOWLEDGE_INDEX') or DEFAULT_INDEX_PATH
+        index = None
+        if os.path.exists(path):
+            try:
+                index = KnowledgeIndex.load(path)
+                if index.fingerprint != librarian.fingerprint:
+                    index = None
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable knowledge index: {e}")
+                index = None
+
+        if index is None:
+            index = build_index(path, librarian)
+
+        _index = index
+
+    return _index
+
+
+def get_knowledge_top_k() -> int:
+    """Snippets added to each scoring prompt (CQI_KNOWLEDGE_TOP_K, 0 = off)."""
+    return int(os.getenv('CQI_KNOWLEDGE_TOP_K', '0'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the CQI knowledge index')
+    parser.add_argument('--build', action='store_true', help='Build the index and save it')
+    parser.add_argument('--query', help='Print the top results for this text')
+    parser.add_argument('--brand', help='Include this brand\'s entries in results')
+    parser.add_argument('--top-k', type=int, default=5, help='Number of results (default: 5)')
+    args = parser.parse_args()
+
+    if not args.build and not args.query:
+        parser.error('Pass --build and/or --query')
+
+    index = build_index() if args.build else get_knowledge_index()
+
+    if args.query:
+        started = time.perf_counter()
+        results = index.search(args.query, brand=args.brand, k=args.top_k)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for result in results:
+            print(f"{result['score']:8.3f}  [{result['category']}] {result['snippet']}")
+        print(f"\n{len(results)} results in {elapsed_ms:.3f} ms")
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
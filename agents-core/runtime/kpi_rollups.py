@@ -0,0 +1,555 @@
+"""
+CQI KPI Rollups - Incrementally maintained per-brand, per-day KPI counters
+
+The dashboard KPIs (agents-core/utils/dashboard.yml) are rolling 7/30-day
+ratios. Computing them from cqi_sessions and trials means scanning every
+row in the window. Instead, every CQI event logged through the conductor
+(log_system_event and friends) adds to per-(brand, day) counters in
+kpi_daily_rollups, and KPIs are read back by summing at most 30 rows per
+brand.
+
+Counter updates are buffered in memory and flushed every
+CQI_KPI_FLUSH_SECONDS with one atomic increment_kpi_rollups() call, so
+logging an event costs no extra round trip. Failed flushes are retried on
+the next tick with the same batch and flush id; the function records
+applied flush ids, so a retry of a write that did commit (e.g. the
+response was lost) is skipped rather than counted twice.
+
+Events counted:
+- cqi_session_created: sessions, qualified, score_sum (provisional
+  fallback scores only count as 'provisional'; the re-score that
+  replaces them logs the final event)
+- trial_booked / trial_completed / trial_converted: trial counters.
+  The workflow engine reports them through observe_workflow_stage()
+  when a lead-to-trial instance reaches trial_confirmed and a
+  trial-to-paid instance starts (trial_completed) or reaches
+  onboarding_start (payment collected)
+
+Environment Variables:
+    CQI_KPI_ROLLUPS_ENABLED: 'false' to stop recording events (default: true)
+    CQI_KPI_FLUSH_SECONDS: Seconds between counter flushes (default: 5)
+    CQI_DASHBOARD_CONFIG: KPI definitions, relative to the repo root
+        (default: agents-core/utils/dashboard.yml)
+
+Usage:
+    python agents-core/runtime/kpi_rollups.py --show --brand sotsvc
+    python agents-core/runtime/kpi_rollups.py --rebuild --since 2026-01-01
+
+A rebuild replaces whole days, so it only covers days before today
+(UTC): live flushes for today would be overwritten.
+"""
+
+import os
+import re
+import sys
+import json
+import atexit
+import asyncio
+import logging
+import argparse
+import threading
+from uuid import uuid4
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+
+import yaml
+
+from clients import get_supabase_client, get_async_supabase_client
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_DASHBOARD_CONFIG = os.path.join(REPO_ROOT, 'agents-core', 'utils', 'dashboard.yml')
+
+COUNTERS = (
+    'sessions', 'qualified', 'provisional', 'score_sum',
+    'trials_booked', 'trials_completed', 'paid_conversions'
+)
+
+# KPI name → (numerator, denominator, scale), in rollup counters.
+# total_leads / qualified_leads in dashboard.yml are scored sessions.
+KPI_RATIOS = {
+    'qualification_rate': ('qualified', 'sessions', 100),
+    'trial_booking_rate': ('trials_booked', 'qualified', 100),
+    'trial_to_paid_rate': ('paid_conversions', 'trials_completed', 100),
+    'lead_to_paid_rate': ('paid_conversions', 'sessions', 100),
+    'avg_qualification_score': ('score_sum', 'sessions', 1),
+}
+
+TRIAL_EVENTS = {
+    'trial_booked': 'trials_booked',
+    'trial_completed': 'trials_completed',
+    'trial_converted': 'paid_conversions',
+}
+
+# (workflow_type, stage name) → trial event counted when an instance enters it
+WORKFLOW_TRIAL_EVENTS = {
+    ('lead_to_trial', 'trial_confirmed'): 'trial_booked',
+    ('trial_to_paid', 'trial_completed'): 'trial_completed',
+    ('trial_to_paid', 'onboarding_start'): 'trial_converted',
+}
+
+Key = Tuple[str, date]
+
+
+def event_deltas(event_type: str, event_data: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """
+    Counter increments for a logged system event.
+
+    Args:
+        event_type: system_events.event_type
+        event_data: system_events.event_data
+
+    Returns:
+        dict: {counter: increment}, or None if the event isn't counted
+    """
+    if event_type == 'cqi_session_created':
+        if event_data.get('provisional'):
+            return {'provisional': 1}
+        return {
+            'sessions': 1,
+            'qualified': 1 if event_data.get('qualified') else 0,
+            'score_sum': int(event_data.get('qualification_score') or 0)
+        }
+    if event_type in TRIAL_EVENTS:
+        return {TRIAL_EVENTS[event_type]: 1}
+    return None
+
+
+def _window_days(calculation: Any) -> Optional[int]:
+    """'rolling_30_day' → 30; anything else (e.g. all_time) → None."""
+    match = re.fullmatch(r'rolling_(\d+)_day', str(calculation or ''))
+    return int(match.group(1)) if match else None
+
+
+def _target(value: Any) -> Optional[float]:
+    """'60%' → 60.0, 65 → 65.0; targets with units or words → None."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*%?\s*', str(value))
+    return float(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=4)
+def load_kpi_definitions(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the KPI section of dashboard.yml.
+
+    Args:
+        path: Config file (default: CQI_DASHBOARD_CONFIG or dashboard.yml)
+
+    Returns:
+        dict: {kpi_name: {'tier', 'formula', 'target', 'window_days'}}
+    """
+    path = path or os.getenv('CQI_DASHBOARD_CONFIG') or DEFAULT_DASHBOARD_CONFIG
+    if not os.path.isabs(path):
+        path = os.path.join(REPO_ROOT, path)
+    with open(path, 'r', encoding='utf-8') as f:
+        document = yaml.safe_load(f) or {}
+
+    definitions = {}
+    for tier, kpis in (document.get('kpis') or {}).items():
+        for name, spec in (kpis or {}).items():
+            spec = spec or {}
+            definitions[name] = {
+                'tier': tier,
+                'formula': spec.get('formula'),
+                'target': _target(spec.get('target')),
+                'window_days': _window_days(spec.get('calculation'))
+            }
+    return definitions
+
+
+class KPIRollups:
+    """
+    Buffers counter increments per (brand, day) and flushes them in batches.
+    Thread-safe.
+    """
+
+    def __init__(self, flush_seconds: float = 5.0, enabled: bool = True):
+        """
+        Args:
+            flush_seconds: Seconds between background flushes
+            enabled: Set False to ignore events
+        """
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        self._pending: Dict[Key, Dict[str, int]] = {}
+        # Batch whose flush failed, kept with its flush id until it goes through
+        self._unsent: Optional[Tuple[str, List[Dict[str, Any]]]] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counters = {'events': 0, 'flushes': 0, 'flush_failures': 0, 'rows_flushed': 0}
+
+    def record(self, brand: str, event_type: str, event_data: Dict[str, Any], day: Optional[date] = None) -> None:
+        """
+        Count a logged event. Never raises.
+
+        Args:
+            brand: Brand identifier
+            event_type: system_events.event_type
+            event_data: system_events.event_data
+            day: Day to count it on (default: today, UTC)
+        """
+        if not self.enabled:
+            return
+        try:
+            deltas = event_deltas(event_type, event_data or {})
+            if not deltas:
+                return
+            key = (brand, day or datetime.utcnow().date())
+            with self._lock:
+                counters = self._pending.setdefault(key, {})
+                for name, amount in deltas.items():
+                    counters[name] = counters.get(name, 0) + amount
+                self._counters['events'] += 1
+            self._ensure_thread()
+        except Exception as e:
+            logger.warning(f"Failed to record KPI event: {e}")
+
+    def flush(self) -> int:
+        """
+        Write buffered increments to kpi_daily_rollups.
+
+        A batch whose write failed is retried unchanged, under the same
+        flush id, before anything newer is sent.
+
+        Returns:
+            int: (brand, day) rows updated; a failed write counts none (its
+                increments are kept for the next flush)
+        """
+        with self._flush_lock:
+            flushed = 0
+            # A retried batch, then whatever was recorded since
+            for _ in range(2):
+                if self._unsent is None:
+                    with self._lock:
+                        pending, self._pending = self._pending, {}
+                    if not pending:
+                        return flushed
+                    self._unsent = (str(uuid4()), [
+                        {'brand': brand, 'day': day.isoformat(), **counters}
+                        for (brand, day), counters in pending.items()
+                    ])
+
+                flush_id, deltas = self._unsent
+                try:
+                    get_supabase_client().rpc(
+                        'increment_kpi_rollups', {'deltas': deltas, 'flush_id': flush_id}
+                    ).execute()
+                except Exception as e:
+                    with self._lock:
+                        self._counters['flush_failures'] += 1
+                    logger.warning(f"KPI rollup flush failed ({len(deltas)} rows kept for retry): {e}")
+                    return flushed
+
+                self._unsent = None
+                with self._lock:
+                    self._counters['flushes'] += 1
+                    self._counters['rows_flushed'] += len(deltas)
+                flushed += len(deltas)
+            return flushed
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='kpi-rollups', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the background thread and flush what's left."""
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return event/flush counters and the number of pending rows."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending_rows'] = len(self._pending)
+        unsent = self._unsent
+        stats['unsent_rows'] = len(unsent[1]) if unsent else 0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+_rollups: Optional[KPIRollups] = None
+_rollups_lock = threading.Lock()
+
+
+def get_kpi_rollups() -> KPIRollups:
+    """
+    Get the process-wide KPI rollup buffer, configured from the environment.
+
+    Returns:
+        KPIRollups: Shared instance
+    """
+    global _rollups
+
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                _rollups = KPIRollups(
+                    flush_seconds=float(os.getenv('CQI_KPI_FLUSH_SECONDS', '5')),
+                    enabled=os.getenv('CQI_KPI_ROLLUPS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+                )
+
+    return _rollups
+
+
+def record_kpi_event(brand: str, event_type: str, event_data: Dict[str, Any]) -> None:
+    """Count a logged system event toward the KPI rollups."""
+    get_kpi_rollups().record(brand, event_type, event_data)
+
+
+def observe_workflow_stage(
+    workflow_type: str,
+    instance_id: str,
+    brand: str,
+    stage_name: str,
+    entered_at: float,
+    replay: bool = False
+) -> None:
+    """
+    Workflow engine listener that counts trial bookings, completions and
+    conversions (see WORKFLOW_TRIAL_EVENTS). Replayed history was counted
+    when it happened, so it is skipped. Never raises.
+    """
+    event_type = WORKFLOW_TRIAL_EVENTS.get((workflow_type, stage_name))
+    if event_type is None or replay:
+        return
+    day = datetime.utcfromtimestamp(entered_at).date()
+    get_kpi_rollups().record(brand, event_type, {'workflow_id': instance_id}, day=day)
+
+
+def flush_kpi_rollups() -> int:
+    """Flush buffered KPI increments now (e.g. on shutdown)."""
+    if _rollups is None:
+        return 0
+    return _rollups.flush()
+
+
+def _sum_rows(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    totals = {name: 0 for name in COUNTERS}
+    for row in rows:
+        for name in COUNTERS:
+            totals[name] += row.get(name) or 0
+    return totals
+
+
+def compute_kpis(
+    rows: List[Dict[str, Any]],
+    as_of: date,
+    definitions: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compute the dashboard KPIs from daily rollup rows.
+
+    Args:
+        rows: kpi_daily_rollups rows covering the longest KPI window
+        as_of: Last day of every rolling window
+        definitions: KPI definitions (default: load_kpi_definitions())
+
+    Returns:
+        dict: {kpi_name: {'value', 'target', 'window_days', 'numerator',
+            'denominator'}}; value is None for KPIs the rollups can't
+            answer (no counters for them yet, or no data in the window)
+    """
+    definitions = definitions if definitions is not None else load_kpi_definitions()
+    kpis = {}
+
+    for name, spec in definitions.items():
+        window = spec['window_days']
+        entry = {'value': None, 'target': spec['target'], 'window_days': window}
+        ratio = KPI_RATIOS.get(name)
+        if ratio and window:
+            start = as_of - timedelta(days=window - 1)
+            totals = _sum_rows([
+                row for row in rows
+                if start <= date.fromisoformat(str(row['day'])[:10]) <= as_of
+            ])
+            numerator, denominator, scale = ratio
+            entry['numerator'] = totals[numerator]
+            entry['denominator'] = totals[denominator]
+            if totals[denominator]:
+                entry['value'] = round(totals[numerator] / totals[denominator] * scale, 2)
+        kpis[name] = entry
+
+    return kpis
+
+
+async def get_kpis_async(brand: Optional[str] = None, as_of: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Read the dashboard KPIs from the daily rollups.
+
+    Args:
+        brand: Only this brand (default: all brands)
+        as_of: Last day of the rolling windows (default: today, UTC)
+
+    Returns:
+        dict: {'brand', 'as_of', 'kpis', 'today'} where 'today' holds the
+            raw counters for as_of
+    """
+    as_of = as_of or datetime.utcnow().date()
+    definitions = load_kpi_definitions()
+    longest = max((spec['window_days'] or 1 for spec in definitions.values()), default=1)
+    start = as_of - timedelta(days=longest - 1)
+
+    supabase = await get_async_supabase_client()
+    query = supabase.table('kpi_daily_rollups').select('*').gte('day', start.isoformat()).lte('day', as_of.isoformat())
+    if brand:
+        query = query.eq('brand', brand)
+    response = await query.execute()
+    rows = response.data or []
+
+    return {
+        'brand': brand or 'all',
+        'as_of': as_of.isoformat(),
+        'kpis': compute_kpis(rows, as_of, definitions),
+        'today': _sum_rows([row for row in rows if str(row['day'])[:10] == as_of.isoformat()])
+    }
+
+
+async def _iter_trials_async(since: date, until: date, brand: Optional[str], page_size: int = 1000):
+    """Yield trials booked or completed in [since, until), paging by id."""
+    supabase = await get_async_supabase_client()
+    last_id = None
+    window = (
+        f"and(created_at.gte.{since.isoformat()},created_at.lt.{until.isoformat()}),"
+        f"and(completed_at.gte.{since.isoformat()},completed_at.lt.{until.isoformat()})"
+    )
+    while True:
+        query = supabase.table('trials').select('id, brand, status, outcome, created_at, completed_at').or_(window)
+        if brand:
+            query = query.eq('brand', brand)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        response = await query.order('id').limit(page_size).execute()
+        rows = response.data or []
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+async def rebuild_rollups_async(since: date, until: date, brand: Optional[str] = None) -> int:
+    """
+    Recompute rollups for [since, until) from cqi_sessions and trials.
+
+    Backfills history and repairs drift (e.g. increments lost when a
+    process was killed before flushing). Days are deleted and rewritten,
+    so today (UTC), which live flushes are still adding to, can't be
+    rebuilt.
+
+    Args:
+        since: First day to rebuild
+        until: Day after the last one to rebuild (at most today)
+        brand: Only this brand (default: all brands)
+
+    Returns:
+        int: Rollup rows written
+
+    Raises:
+        ValueError: If the range includes today or a later day
+    """
+    from session_export import iter_session_pages_async
+
+    today = datetime.utcnow().date()
+    if until > today:
+        raise ValueError(f"Can't rebuild {today} or later while events are still being counted; use --until {today - timedelta(days=1)}")
+
+    totals: Dict[Key, Dict[str, int]] = {}
+
+    def add(row_brand: str, day: date, deltas: Dict[str, int]) -> None:
+        counters = totals.setdefault((row_brand, day), {name: 0 for name in COUNTERS})
+        for name, amount in deltas.items():
+            counters[name] += amount
+
+    async for page in iter_session_pages_async(
+        brand=brand,
+        since=since.isoformat(),
+        until=until.isoformat(),
+        min_score=0
+    ):
+        for session in page:
+            add(session['brand'], date.fromisoformat(str(session['created_at'])[:10]), event_deltas(
+                'cqi_session_created',
+                {
+                    'qualified': session['qualified'],
+                    'qualification_score': session['qualification_score'],
+                    'provisional': session['provisional']
+                }
+            ))
+
+    async for trial in _iter_trials_async(since, until, brand):
+        booked = date.fromisoformat(str(trial['created_at'])[:10])
+        if since <= booked < until:
+            add(trial['brand'], booked, {'trials_booked': 1})
+        if trial.get('completed_at'):
+            completed = date.fromisoformat(str(trial['completed_at'])[:10])
+            if since <= completed < until:
+                add(trial['brand'], completed, {
+                    'trials_completed': 1 if trial.get('status') == 'completed' else 0,
+                    'paid_conversions': 1 if trial.get('outcome') == 'converted' else 0
+                })
+
+    supabase = await get_async_supabase_client()
+    delete = supabase.table('kpi_daily_rollups').delete().gte('day', since.isoformat()).lt('day', until.isoformat())
+    if brand:
+        delete = delete.eq('brand', brand)
+    await delete.execute()
+
+    rows = [
+        {'brand': row_brand, 'day': day.isoformat(), **counters}
+        for (row_brand, day), counters in sorted(totals.items())
+    ]
+    for start in range(0, len(rows), 500):
+        await supabase.table('kpi_daily_rollups').upsert(rows[start:start + 500]).execute()
+
+    logger.info(f"✅ Rebuilt {len(rows)} KPI rollup rows for {since} to {until}")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dashboard KPI rollups')
+    parser.add_argument('--show', action='store_true', help='Print current KPIs as JSON')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute rollups from cqi_sessions and trials')
+    parser.add_argument('--brand', help='Only this brand')
+    parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD; default: 30 days ago)')
+    parser.add_argument('--until', help='Last day to rebuild (YYYY-MM-DD; default: yesterday)')
+    args = parser.parse_args()
+
+    if not args.show and not args.rebuild:
+        parser.error('choose --show or --rebuild')
+
+    try:
+        if args.rebuild:
+            today = datetime.utcnow().date()
+            since = date.fromisoformat(args.since) if args.since else today - timedelta(days=30)
+            until = date.fromisoformat(args.until) if args.until else today - timedelta(days=1)
+            asyncio.run(rebuild_rollups_async(since, until + timedelta(days=1), args.brand))
+        if args.show:
+            print(json.dumps(asyncio.run(get_kpis_async(args.brand)), indent=2))
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}\n", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+CQI Lead I/O - Streaming bulk import of leads
+
+Ad platform imports and CSV exports arrive as thousands of leads. This
+module reads them from a byte stream one row at a time and writes them
+with chunked multi-row inserts, so memory stays flat however large the
+upload is:
+
+- iter_rows() parses NDJSON (one object per line) or a JSON array
+  incrementally; only the row being decoded is buffered
+- insert_leads_bulk_async() inserts a chunk in one request and falls
+  back to row-by-row inserts if the chunk is rejected, so one bad row
+  doesn't fail its neighbours. Each row gets its id before the first
+  attempt and is written with ON CONFLICT (id) DO NOTHING, so a retry
+  after an ambiguous failure never duplicates a lead
+
+Environment Variables:
+    CQI_BULK_CHUNK_SIZE: Rows per multi-row insert (default: 500)
+    CQI_BULK_MAX_ROW_BYTES: Largest accepted row (default: 65536)
+
+Usage:
+    async for index, row, error in iter_rows(request.stream(), 'application/x-ndjson'):
+        ...
+    outcomes = await insert_leads_bulk_async(records)
+"""
+
+import os
+import json
+import uuid
+import codecs
+import logging
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
+
+from clients import get_async_supabase_client
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines')
+
+# (row index, parsed row or None, error message or None)
+RowOutcome = Tuple[int, Optional[Any], Optional[str]]
+
+
+class RowStreamError(ValueError):
+    """Raised when the upload can't be parsed any further"""
+    pass
+
+
+def get_bulk_chunk_size() -> int:
+    """Rows per multi-row insert (CQI_BULK_CHUNK_SIZE)."""
+    return max(1, int(os.getenv('CQI_BULK_CHUNK_SIZE', '500')))
+
+
+def get_max_row_bytes() -> int:
+    """Largest accepted row in bytes (CQI_BULK_MAX_ROW_BYTES)."""
+    return int(os.getenv('CQI_BULK_MAX_ROW_BYTES', '65536'))
+
+
+def is_ndjson(content_type: Optional[str]) -> bool:
+    """True if the Content-Type names a newline-delimited JSON format."""
+    return (content_type or '').split(';')[0].strip().lower() in NDJSON_TYPES
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes], max_row_bytes: int) -> AsyncIterator[RowOutcome]:
+    """
+    Yield one outcome per non-blank line of an NDJSON byte stream.
+
+    A line that isn't valid JSON is reported as that row's error and
+    parsing continues with the next line.
+
+    Raises:
+        RowStreamError: If a line exceeds max_row_bytes
+    """
+    buffer = b''
+    index = 0
+
+    def parse(line: bytes) -> RowOutcome:
+        try:
+            return index, json.loads(line), None
+        except (ValueError, UnicodeDecodeError) as e:
+            return index, None, f"Invalid JSON: {e}"
+
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse(line)
+                index += 1
+        if len(buffer) > max_row_bytes:
+            raise RowStreamError(f"Row {index} is larger than {max_row_bytes} bytes")
+
+    if buffer.strip():
+        yield parse(buffer)
+
+
+async def iter_json_array_rows(chunks: AsyncIterator[bytes], max_row_bytes: int) -> AsyncIterator[RowOutcome]:
+    """
+    Yield one outcome per element of a JSON array byte stream.
+
+    Elements are decoded with raw_decode as soon as they are complete, so
+    only the current element is held in memory.
+
+    Raises:
+        RowStreamError: If the body isn't a JSON array or an element is
+            malformed or larger than max_row_bytes (the rest of an array
+            can't be recovered after a syntax error)
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    index = 0
+    state = 'start'  # start → value → separator → value ... → end
+    finished = False
+
+    async def more() -> bool:
+        nonlocal buffer, pos, finished
+        if finished:
+            return False
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+            pos = 0
+            finished = True
+            return False
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos >= len(buffer):
+            if await more():
+                continue
+            if state == 'end':
+                return
+            raise RowStreamError("Unexpected end of JSON array")
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise RowStreamError("Expected a JSON array (or send Content-Type: application/x-ndjson)")
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'value'):
+            if state == 'first' and char == ']':
+                pos += 1
+                state = 'end'
+                continue
+            try:
+                row, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if len(buffer) - pos > max_row_bytes:
+                    raise RowStreamError(f"Row {index} is larger than {max_row_bytes} bytes")
+                if await more():
+                    continue
+                raise RowStreamError(f"Invalid JSON in row {index}: {e.msg}")
+            if end == len(buffer) and isinstance(row, (int, float)) and await more():
+                # A number at the end of the buffer may continue in the next chunk
+                continue
+            yield index, row, None
+            index += 1
+            pos = end
+            state = 'separator'
+        elif state == 'separator':
+            if char == ',':
+                state = 'value'
+            elif char == ']':
+                state = 'end'
+            else:
+                raise RowStreamError(f"Expected ',' or ']' after row {index - 1}")
+            pos += 1
+        else:
+            raise RowStreamError("Unexpected data after the JSON array")
+
+
+def iter_rows(chunks: AsyncIterator[bytes], content_type: Optional[str]) -> AsyncIterator[RowOutcome]:
+    """
+    Parse an upload as NDJSON or a JSON array, chosen by Content-Type.
+
+    Args:
+        chunks: Request body stream
+        content_type: Request Content-Type header
+
+    Returns:
+        Async iterator of (row index, row, error)
+    """
+    max_row_bytes = get_max_row_bytes()
+    if is_ndjson(content_type):
+        return iter_ndjson_rows(chunks, max_row_bytes)
+    return iter_json_array_rows(chunks.__aiter__(), max_row_bytes)
+
+
+async def insert_leads_bulk_async(records: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Insert lead rows with one multi-row insert.
+
+    Rows without an id are given one up front; it is the idempotency key
+    for the upsert (on_conflict='id', ignore_duplicates=True). If the
+    chunk fails (a constraint violation, or a timeout that may or may not
+    have committed), the rows are retried one at a time with the same
+    ids, so rows that already landed are skipped instead of duplicated.
+
+    Args:
+        records: Rows for the leads table
+
+    Returns:
+        list: (lead_id, error) per record, in input order
+    """
+    if not records:
+        return []
+
+    records = [record if record.get('id') else {**record, 'id': str(uuid.uuid4())} for record in records]
+    supabase = await get_async_supabase_client()
+
+    try:
+        await supabase.table('leads').upsert(records, on_conflict='id', ignore_duplicates=True).execute()
+        return [(record['id'], None) for record in records]
+    except Exception as e:
+        logger.warning(f"Bulk insert of {len(records)} leads failed ({e}); retrying one by one")
+
+    outcomes = []
+    for record in records:
+        try:
+            await supabase.table('leads').upsert(record, on_conflict='id', ignore_duplicates=True).execute()
+            outcomes.append((record['id'], None))
+        except Exception as e:
+            outcomes.append((None, str(e)))
+    return outcomes
@@ -0,0 +1,452 @@
+"""
+CQI Metrics - Counters and histograms exposed in Prometheus text format
+
+A small in-process registry for hot-path instrumentation. Recording a
+value is one dict lookup and a few additions under a lock, cheap enough
+to leave on in production. Nothing is formatted until /metrics is
+scraped.
+
+Two kinds of metrics:
+- Families recorded as things happen: Counter and LabeledHistogram,
+  with fixed label names (e.g. step, brand, model). Brand labels go
+  through brand_label(), so a brand the registry doesn't know is
+  counted as 'other' instead of growing a new series per request.
+- Collectors: functions called at scrape time that turn existing
+  stats() dicts (breaker, caches, queues, workflow engine) into gauges
+  and counters, so those components need no extra bookkeeping.
+
+Environment Variables:
+    CQI_METRICS_ENABLED: 'false' to stop recording (default: true)
+
+Usage:
+    from metrics import get_metrics_registry, step_timer
+    with step_timer('fetch_lead', brand):
+        lead = fetch_lead_data(lead_id)
+
+    text = get_metrics_registry().render()
+"""
+
+import os
+import re
+import time
+import bisect
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Conductor step latency buckets in seconds (1ms to 2 minutes)
+STEP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 120)
+
+# Stage latency buckets in seconds (1s to 14 days)
+LATENCY_BUCKETS = (
+    1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400,
+    28800, 86400, 172800, 259200, 604800, 1209600
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (name, type, help, label names, {label values: value})
+Sample = Tuple[str, str, str, Tuple[str, ...], Dict[Tuple[str, ...], float]]
+
+_NAME_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def metrics_enabled() -> bool:
+    """False if CQI_METRICS_ENABLED is turned off."""
+    return os.getenv('CQI_METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+def metric_name(*parts: str) -> str:
+    """Join parts into a valid metric name ('cqi', 'api.anthropic.com' → 'cqi_api_anthropic_com')."""
+    return _NAME_INVALID.sub('_', '_'.join(parts))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is O(log buckets)."""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return float(self.bounds[-1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'avg': round(self.sum / self.count, 3) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {str(bound): n for bound, n in zip(self.bounds + ('+Inf',), self.counts)}
+        }
+
+    def render(self, name: str, labelnames: Tuple[str, ...], values: Tuple[Any, ...]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += n
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{name}_bucket{_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, values)} {_number(self.sum)}")
+        lines.append(f"{name}_count{_labels(labelnames, values)} {self.count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter family with fixed label names."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        """Add to the counter for a tuple of label values (in labelnames order)."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values)
+        return lines
+
+
+class LabeledHistogram:
+    """Histogram family with fixed label names."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = STEP_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        """Record a value for a tuple of label values (in labelnames order)."""
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get(self, labels: Tuple[str, ...]) -> Optional[Histogram]:
+        return self._histograms.get(labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, histogram in sorted(self._histograms.items()):
+                lines.extend(histogram.render(self.name, self.labelnames, labels))
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and scrape-time collectors."""
+
+    def __init__(self):
+        self._families: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter family."""
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = Counter(name, help_text, labelnames)
+        return family
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = STEP_BUCKETS) -> LabeledHistogram:
+        """Get or create a histogram family."""
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = LabeledHistogram(name, help_text, labelnames, buckets)
+        return family
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Add a function called on every scrape. It yields
+        (name, 'gauge'|'counter', help, label names, {label values: value}).
+        Registering the same function twice has no effect.
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every family and collector in Prometheus text format."""
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for family in families:
+            lines.extend(family.render())
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help_text, labelnames, values in samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(
+                    f"{name}{_labels(labelnames, labels)} {_number(value)}"
+                    for labels, value in sorted(values.items())
+                    if isinstance(value, (int, float))
+                )
+        return '\n'.join(lines) + '\n'
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Get the process-wide metrics registry.
+
+    Returns:
+        MetricsRegistry: Shared registry
+    """
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry()
+
+    return _registry
+
+
+def brand_label(brand: Optional[str]) -> str:
+    """Brand label value: the registry key, 'unknown' if unset, 'other' if not a registered brand."""
+    if not brand:
+        return 'unknown'
+    from brand_registry import get_brand_registry, normalize_brand
+    return normalize_brand(brand) if get_brand_registry().has_brand(brand) else 'other'
+
+
+class step_timer:
+    """
+    Time a block into cqi_conductor_step_seconds{step, brand}; failures
+    also count into cqi_conductor_step_errors_total.
+
+    A class rather than @contextmanager: no generator per use.
+    """
+
+    __slots__ = ('step', 'brand', 'started')
+
+    def __init__(self, step: str, brand: Optional[str]):
+        self.step = step
+        self.brand = brand_label(brand) if _enabled else brand
+
+    def __enter__(self) -> 'step_timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if _enabled:
+            elapsed = time.perf_counter() - self.started
+            STEP_SECONDS.observe((self.step, self.brand), elapsed)
+            if exc_type is not None:
+                STEP_ERRORS.inc((self.step, self.brand))
+        return False
+
+
+_enabled = metrics_enabled()
+
+# Conductor hot-path metrics
+STEP_SECONDS = get_metrics_registry().histogram(
+    'cqi_conductor_step_seconds', 'Time spent in each conductor step', ('step', 'brand'), STEP_BUCKETS
+)
+STEP_ERRORS = get_metrics_registry().counter(
+    'cqi_conductor_step_errors_total', 'Conductor steps that raised', ('step', 'brand')
+)
+CLAUDE_SECONDS = get_metrics_registry().histogram(
+    'cqi_claude_call_seconds', 'Claude scoring call latency, including SDK retries and hedging',
+    ('brand', 'model', 'mode'), STEP_BUCKETS
+)
+CLAUDE_CALLS = get_metrics_registry().counter(
+    'cqi_claude_calls_total', 'Claude scoring calls by outcome (ok, parse_error, api_error, timeout)',
+    ('brand', 'model', 'mode', 'outcome')
+)
+CLAUDE_TOKENS = get_metrics_registry().counter(
+    'cqi_claude_tokens_total', 'Tokens reported by Claude responses (input, output, cache_read, cache_creation)',
+    ('brand', 'model', 'type')
+)
+SCORING_SOURCE = get_metrics_registry().counter(
+    'cqi_scoring_results_total', 'Scoring results by source (prescorer, cache, claude, fallback)',
+    ('brand', 'source')
+)
+
+
+def record_claude_call(brand: Optional[str], model: str, mode: str, outcome: str, elapsed: float) -> None:
+    """Record one Claude scoring call and its latency."""
+    if _enabled:
+        brand = brand_label(brand)
+        CLAUDE_CALLS.inc((brand, model, mode, outcome))
+        CLAUDE_SECONDS.observe((brand, model, mode), elapsed)
+
+
+def record_usage(brand: Optional[str], model: str, usage: Any) -> None:
+    """Count the token usage of a Claude response (anything with *_tokens attributes)."""
+    if not _enabled or usage is None:
+        return
+    brand = brand_label(brand)
+    for kind in ('input', 'output', 'cache_read_input', 'cache_creation_input'):
+        tokens = getattr(usage, f'{kind}_tokens', None)
+        if tokens:
+            CLAUDE_TOKENS.inc((brand, model, kind.replace('_input', '')), tokens)
+
+
+def record_scoring_source(brand: Optional[str], source: str) -> None:
+    """Count where a scoring result came from."""
+    if _enabled:
+        SCORING_SOURCE.inc((brand_label(brand), source))
+
+
+def flatten_stats(prefix: str, stats: Dict[str, Any], help_text: str,
+                  labelnames: Tuple[str, ...] = (), labels: Tuple[str, ...] = ()) -> List[Sample]:
+    """
+    Turn a stats() dict into gauge samples: each numeric field becomes
+    `<prefix>_<field>`; nested dicts are skipped.
+    """
+    samples = []
+    for field, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            samples.append((metric_name(prefix, field), 'gauge', f"{help_text} ({field})", labelnames, {labels: value}))
+    return samples
+
+
+def merge_samples(samples: Iterable[Sample]) -> List[Sample]:
+    """Merge samples with the same name (e.g. one per label set) into one family."""
+    merged: Dict[str, Sample] = {}
+    for name, kind, help_text, labelnames, values in samples:
+        if name in merged:
+            merged[name][4].update(values)
+        else:
+            merged[name] = (name, kind, help_text, labelnames, dict(values))
+    return list(merged.values())
+
+
+def _component_samples(prefix: str, stats: Dict[str, Any], help_text: str) -> List[Sample]:
+    samples = flatten_stats(prefix, stats, help_text)
+    state = stats.get('state')
+    if isinstance(state, str):
+        samples.append((metric_name(prefix, 'state'), 'gauge', f"{help_text} (1 for the current state)",
+                        ('state',), {(state,): 1}))
+    return samples
+
+
+def runtime_samples() -> List[Sample]:
+    """
+    Collector for the runtime's existing stats(): scoring counters,
+    per-host HTTP transport counters, rate limiters, the scoring breaker,
+    caches and the workflow components that are running.
+
+    Modules are imported here rather than at the top: they import this one.
+    """
+    from conductor import get_scoring_stats
+    from clients import get_transport_stats
+    from circuit_breaker import get_scoring_breaker
+    from prescorer import get_prescorer
+    from score_cache import get_score_cache
+    from session_cache import get_session_cache_stats
+    from kpi_rollups import get_kpi_rollups
+    from workflow_engine import get_workflow_engine
+    from workflow_monitor import get_workflow_monitor
+    from follow_up_scheduler import get_follow_up_scheduler
+
+    samples: List[Sample] = []
+
+    for mode, counts in get_scoring_stats().items():
+        for field in ('claude_calls', 'parse_failures', 'hedged', 'hedge_wins', 'fallbacks'):
+            samples.append((f'cqi_scoring_{field}_total', 'counter',
+                            f"Scoring {field.replace('_', ' ')} per scoring mode", ('mode',), {(mode,): counts[field]}))
+
+    transport = get_transport_stats()
+    for host, counters in transport['hosts'].items():
+        for field in ('requests', 'errors', 'retries', 'new_connections', 'tls_handshakes'):
+            samples.append((f'cqi_http_{field}_total', 'counter',
+                            f"HTTP {field.replace('_', ' ')} per host", ('host',), {(host,): counters[field]}))
+        samples.append(('cqi_http_request_seconds_total', 'counter', 'Time spent in HTTP requests per host',
+                        ('host',), {(host,): counters['total_seconds']}))
+        samples.append(('cqi_http_in_flight', 'gauge', 'HTTP requests in flight per host',
+                        ('host',), {(host,): counters['in_flight']}))
+    for service, stats in transport['rate_limits'].items():
+        samples.extend(flatten_stats('cqi_rate_limit', stats, 'Rate limiter', ('service',), (service,)))
+
+    samples.extend(_component_samples('cqi_scoring_breaker', get_scoring_breaker().stats(), 'Scoring circuit breaker'))
+    samples.extend(flatten_stats('cqi_prescorer', get_prescorer().stats(), 'Pre-scorer'))
+    samples.extend(flatten_stats('cqi_score_cache', get_score_cache().stats(), 'Scoring cache'))
+    samples.extend(flatten_stats('cqi_session_cache', get_session_cache_stats(), 'Session cache'))
+    samples.extend(flatten_stats('cqi_kpi_rollups', get_kpi_rollups().stats(), 'KPI rollups'))
+
+    for prefix, component, help_text in (
+        ('cqi_workflow_engine', get_workflow_engine(), 'Workflow engine'),
+        ('cqi_workflow_monitor', get_workflow_monitor(), 'Workflow monitor'),
+        ('cqi_follow_ups', get_follow_up_scheduler(), 'Follow-up scheduler')
+    ):
+        if component is not None:
+            samples.extend(flatten_stats(prefix, component.stats(), help_text))
+
+    return merge_samples(samples)
+
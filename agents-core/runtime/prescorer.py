@@ -0,0 +1,342 @@
+"""
+CQI Pre-Scorer - Deterministic local scoring for obvious leads
+
+Applies the same keyword rules the Claude prompt describes (urgency
+phrases, decision authority, contact completeness, spam penalties) to the
+brand's scoring weights from get_brand_config(), producing a provisional
+scoring_breakdown in microseconds.
+
+Because keyword rules can't see everything Claude can, each lead gets a
+score range: the points the rules found, plus the points for criteria
+where no signal was found either way. Only leads whose whole range sits
+clearly on one side of the threshold are decided locally:
+
+- Spam whose best case is still `band` points below the threshold
+- Leads whose worst case is already `band` points above the threshold
+
+Everything in between goes to Claude.
+
+Decision authority only counts explicit phrases ("I'm the owner", "my
+business", "I make the decisions"); a bare "I" or "my" says nothing
+about who approves the purchase, so it is left to Claude.
+
+Local decisions are opt-in: until the rules have been checked against
+Claude's scores for a brand's real traffic, every lead goes to Claude.
+The rules still produce the provisional score used while the Claude
+circuit is open.
+
+Environment Variables:
+    CQI_PRESCORE_ENABLED: 'true' to decide clear-cut leads locally (default: false)
+    CQI_PRESCORE_BAND: Confidence band in points around the threshold (default: 15)
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Optional, Dict, Any, List
+
+from brand_registry import FIT_CRITERIA, FREQUENCY_CRITERIA
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PRESCORER_MODEL = 'local-prescorer-v1'
+
+
+def _pattern(*phrases: str) -> re.Pattern:
+    return re.compile(r'\b(?:' + '|'.join(phrases) + r')\b', re.IGNORECASE)
+
+
+# Signals taken from the SCORING GUIDELINES section of the Claude prompt.
+# Each criterion maps to (full-points pattern, half-points pattern).
+# "budget" alone isn't a signal ("no budget", "budget is tight"), so full
+# points need an amount or a phrase saying the money is there.
+BUDGET_NONE = _pattern(r'no budget', r'(?:not|isn\'t|aren\'t) (?:in|within) (?:the |our |my )?budget',
+                       r'budget (?:is|was|\'s) (?:tight|limited|small|low|an issue|a concern)',
+                       r'(?:tight|limited|small|low|no real) budget', r'(?:can\'t|cannot|can not) afford')
+BUDGET_FULL = re.compile(r'\$\s?\d|\b\d+\s?(?:dollars|usd|k)\b', re.IGNORECASE)
+BUDGET_READY = _pattern(r'budget(?:ed)? (?:of|for|is|around|about|up to) \$?\d', r'(?:have|has|got) (?:a |the )?budget',
+                        r'budget (?:is )?(?:approved|set aside|ready)', 'budgeted', r'money (?:is )?set aside')
+BUDGET_HALF = _pattern('price', 'pricing', 'quote', 'cost', 'rates?', 'affordable', 'estimate')
+
+URGENCY_FULL = _pattern('asap', 'urgent', 'urgently', 'this week', 'today', 'tomorrow', 'emergency', 'immediately')
+URGENCY_HALF = _pattern('soon', 'next week', 'next month', 'this month', 'upcoming')
+
+AUTHORITY_NONE = _pattern('for someone else', 'for a friend', 'for my boss', 'exploring', 'just looking', 'just curious')
+AUTHORITY_FULL = _pattern(r"i(?:'m| am) (?:the |a )?(?:owner|homeowner|business owner|landlord|property manager|"
+                          r"decision[- ]maker|ceo|founder|artist|producer)",
+                          r'i own (?:the|my|a|this)', r'i (?:make|approve) (?:the |all the )?(?:decisions?|calls?)',
+                          r"i(?:'ll| will) be (?:the one )?(?:paying|signing)",
+                          r'my (?:own )?(?:home|house|apartment|condo|business|company|property|office|studio|label)')
+AUTHORITY_HALF = _pattern(r'we own', r'our (?:home|house|apartment|condo|business|company|property|office|studio|band|label)',
+                          r'(?:my|our) (?:wife|husband|partner|spouse|co-?founder)', r'(?:check|run it) (?:with|by) my')
+
+HISTORY_FULL = _pattern('before', 'previous', 'previously', 'used to', 'last time', 'again', 'switching')
+HISTORY_HALF = _pattern('first time', 'never had', 'never used')
+
+FREQUENCY_FULL = _pattern('weekly', 'bi-weekly', 'biweekly', 'monthly', 'recurring', 'ongoing', 'regular', 'regularly',
+                          'long-term', 'every week', 'every month', 'daily', 'contract', r'\d+x per week')
+FREQUENCY_HALF = _pattern('one-time', 'one time', 'once', 'single')
+
+SPAM_KEYWORDS = _pattern('seo', 'backlinks?', 'guest post', 'crypto', 'bitcoin', 'casino', 'viagra', 'loan offer',
+                         'rank your (?:website|site)', 'web traffic', 'increase your sales', 'click here',
+                         'unsubscribe', 'marketing services', 'lead generation services')
+URL = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+
+def _fit_keywords(brand_config: dict) -> re.Pattern:
+    """Build a pattern of service words from the brand's service_types."""
+    words = set()
+    for service_type in brand_config.get('service_types', []):
+        for word in service_type.split('_'):
+            if len(word) > 3:
+                words.add(re.escape(word))
+    return _pattern(*sorted(words)) if words else re.compile(r'(?!x)x')
+
+
+def _grade(text: str, full: re.Pattern, half: Optional[re.Pattern], points: int) -> Optional[int]:
+    """Return full/half points if a pattern matches, else None (no signal)."""
+    if full.search(text):
+        return points
+    if half is not None and half.search(text):
+        return points // 2
+    return None
+
+
+def _grade_budget(text: str, points: int) -> Optional[int]:
+    """Grade budget alignment; a stated lack of budget scores zero."""
+    if BUDGET_NONE.search(text):
+        return 0
+    if BUDGET_READY.search(text):
+        return points
+    return _grade(text, BUDGET_FULL, BUDGET_HALF, points)
+
+
+def is_spam(lead: Dict[str, Any]) -> bool:
+    """Return True if the lead message looks like spam."""
+    message = lead.get('message') or ''
+    if SPAM_KEYWORDS.search(message):
+        return True
+    if len(URL.findall(message)) >= 2:
+        return True
+    return False
+
+
+def prescore(lead: Dict[str, Any], brand_config: dict) -> Dict[str, Any]:
+    """
+    Compute a provisional score for a lead from keyword rules.
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring weights
+
+    Returns:
+        dict: Provisional result including:
+            - scoring_breakdown (dict): Points per criterion found by rules
+            - score (int): Points found plus bonuses/penalties (clamped 0-100)
+            - max_score (int): Best case if every unknown criterion scored full
+            - unknown_criteria (list): Criteria with no signal either way
+            - spam (bool): Whether the message looks like spam
+            - adjustments (list): Bonus/penalty notes
+    """
+    weights = brand_config['scoring_weights']
+    message = lead.get('message') or ''
+    text = message.lower()
+
+    breakdown: Dict[str, int] = {}
+    unknown: List[str] = []
+
+    for criterion, points in weights.items():
+        if criterion == 'budget_alignment':
+            grade = _grade_budget(text, points)
+        elif criterion == 'urgency':
+            grade = _grade(text, URGENCY_FULL, URGENCY_HALF, points)
+        elif criterion == 'decision_authority':
+            grade = 0 if AUTHORITY_NONE.search(text) else _grade(text, AUTHORITY_FULL, AUTHORITY_HALF, points)
+        elif criterion in FIT_CRITERIA:
+            grade = _grade(text, _fit_keywords(brand_config), None, points)
+        elif criterion == 'service_history':
+            grade = _grade(text, HISTORY_FULL, HISTORY_HALF, points)
+        elif criterion in FREQUENCY_CRITERIA:
+            grade = _grade(text, FREQUENCY_FULL, FREQUENCY_HALF, points)
+        else:
+            # Brand-specific criteria the rules can't judge
+            grade = None
+
+        if grade is None:
+            breakdown[criterion] = 0
+            unknown.append(criterion)
+        else:
+            breakdown[criterion] = grade
+
+    # ADDITIONAL FACTORS from the prompt
+    adjustments = []
+    bonus = 0
+    has_email = bool(lead.get('email'))
+    has_phone = bool(lead.get('phone'))
+
+    if has_email and has_phone:
+        bonus += 5
+        adjustments.append('complete contact info (+5)')
+    else:
+        bonus -= 5
+        adjustments.append('incomplete contact info (-5)')
+
+    if len(message.split()) >= 25:
+        bonus += 3
+        adjustments.append('detailed request (+3)')
+
+    spam = is_spam(lead)
+    if spam:
+        bonus -= 10
+        adjustments.append('spam-like message (-10)')
+
+    found = sum(breakdown.values())
+    # A spam message carries no genuine need, so criteria without a signal
+    # can't be expected to score
+    unknown_points = 0 if spam else sum(weights[c] for c in unknown)
+    # Professional tone (+3) is a judgement call, so it only widens the range
+    score = max(0, min(100, found + bonus))
+    max_score = max(0, min(100, found + unknown_points + bonus + 3))
+
+    return {
+        'scoring_breakdown': breakdown,
+        'score': score,
+        'max_score': max_score,
+        'unknown_criteria': unknown,
+        'spam': spam,
+        'adjustments': adjustments
+    }
+
+
+class PreScorer:
+    """
+    Decides obvious leads locally and counts how many Claude calls it saved.
+    """
+
+    def __init__(self, band: int = 15, enabled: bool = True):
+        """
+        Args:
+            band: Points a lead's score range must clear the threshold by
+            enabled: Set False to send every lead to Claude
+        """
+        self.band = band
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {'evaluated': 0, 'decided_qualified': 0, 'decided_spam': 0, 'deferred': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def decide(self, lead: Dict[str, Any], brand_config: dict) -> Optional[Dict[str, Any]]:
+        """
+        Return a final scoring result if the lead is clear-cut, else None.
+
+        The returned dict has the same shape as score_lead_with_claude().
+
+        Args:
+            lead: Lead data from database
+            brand_config: Brand configuration with scoring weights
+
+        Returns:
+            dict: Scoring result, or None if Claude should score the lead
+        """
+        if not self.enabled:
+            return None
+
+        threshold = brand_config['qualification_threshold']
+        provisional = prescore(lead, brand_config)
+        self._count('evaluated')
+
+        if provisional['spam'] and provisional['max_score'] < threshold - self.band:
+            self._count('decided_spam')
+            return self._result(provisional, threshold, 'disqualify', 'Spam-like message')
+
+        if not provisional['spam'] and provisional['score'] >= threshold + self.band:
+            self._count('decided_qualified')
+            return self._result(provisional, threshold, 'trial_booking', 'Strong explicit signals')
+
+        self._count('deferred')
+        return None
+
+    @staticmethod
+    def _result(provisional: Dict[str, Any], threshold: int, action: str, summary: str) -> Dict[str, Any]:
+        score = provisional['score']
+        found = [c for c, points in provisional['scoring_breakdown'].items() if points]
+        reasoning = (
+            f"{summary}; decided by local pre-scorer. "
+            f"Signals: {', '.join(found) or 'none'}. "
+            f"Adjustments: {', '.join(provisional['adjustments']) or 'none'}."
+        )
+        return {
+            'qualification_score': score,
+            'qualified': score >= threshold,
+            'scoring_breakdown': provisional['scoring_breakdown'],
+            'reasoning': reasoning,
+            'recommended_action': action,
+            'confidence_level': 'high',
+            'model_used': PRESCORER_MODEL
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return decision counters and the skip rate."""
+        with self._lock:
+            stats = dict(self._counters)
+        decided = stats['decided_qualified'] + stats['decided_spam']
+        stats['skip_rate'] = round(decided / stats['evaluated'], 4) if stats['evaluated'] else 0.0
+        stats['band'] = self.band
+        stats['enabled'] = self.enabled
+        return stats
+
+
+def provisional_result(lead: Dict[str, Any], brand_config: dict) -> Dict[str, Any]:
+    """
+    Best-effort local score for when Claude can't be reached.
+
+    Unlike PreScorer.decide() this always returns a result, so it is
+    marked provisional (low confidence) for the caller to re-score later.
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration with scoring weights
+
+    Returns:
+        dict: Scoring result (same shape as score_lead_with_claude) with provisional=True
+    """
+    threshold = brand_config['qualification_threshold']
+    provisional = prescore(lead, brand_config)
+    action = 'trial_booking' if provisional['score'] >= threshold else 'nurture_campaign'
+    result = PreScorer._result(provisional, threshold, action, 'Provisional score while Claude is unavailable')
+    result['confidence_level'] = 'low'
+    result['provisional'] = True
+    return result
+
+
+_prescorer: Optional[PreScorer] = None
+_prescorer_lock = threading.Lock()
+
+
+def get_prescorer() -> PreScorer:
+    """
+    Get the process-wide pre-scorer, configured from the environment.
+
+    Returns:
+        PreScorer: Shared pre-scorer instance
+    """
+    global _prescorer
+
+    if _prescorer is None:
+        with _prescorer_lock:
+            if _prescorer is None:
+                _prescorer = PreScorer(
+                    band=int(os.getenv('CQI_PRESCORE_BAND', '15')),
+                    enabled=os.getenv('CQI_PRESCORE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+                )
+
+    return _prescorer
@@ -0,0 +1,472 @@
+"""
+CQI Rate Limiter - Adaptive client-side limits for Anthropic and Supabase
+
+Without a client-side limiter, a burst of qualifications runs straight
+into the provider's rate limit. Every worker then gets a 429 at the same
+moment and the SDK retries all of them together.
+
+This module keeps one RateLimiter per service per process. All threads
+and event loops share it, and the pooled HTTP transports in clients.py
+call it around every request, so it covers Anthropic's messages.create()
+and Supabase's execute() without touching call sites.
+
+- Token buckets (GCRA-style reservations) for requests/minute and, for
+  Anthropic, input tokens/minute. Each caller reserves a slot and
+  sleeps until that slot comes up. Callers are therefore spread out
+  rather than released together.
+- Adaptive: a 429/529 blocks the whole service for its retry-after and
+  halves the request rate. The rate then climbs back toward the
+  configured value as requests succeed.
+- Header-aware: Anthropic's anthropic-ratelimit-*-remaining headers
+  drain the local bucket to what the server reports. When a quota is
+  exhausted, the limiter waits for its -reset time. Unless a limit is
+  set explicitly, the -limit headers set the rate (the account tier),
+  up or down; the first requests use the tier 1 limits.
+- Bounded waits: a caller never waits past its deadline (call_deadline())
+  or its request's pool timeout. If the wait would be longer, it gets
+  RateLimitTimeout at once and its reservation is refunded. Anthropic
+  calls get a non-retryable 429 RateLimitError instead, because the SDK
+  retries any exception its transport raises (see clients.py).
+  Reservations are also refunded when a waiting call is cancelled.
+
+Limits are per process. When running several processes (e.g.
+conductor.py --serve --processes 4), divide your account quota between
+them.
+
+Environment Variables:
+    CQI_RATE_LIMIT_ENABLED: 'true' to enable client-side limiting (default: false)
+    CQI_ANTHROPIC_RPM: Anthropic requests per minute (default: from headers, starting at 50)
+    CQI_ANTHROPIC_ITPM: Anthropic input tokens per minute (default: from headers, starting at 30000)
+    CQI_RATE_LIMIT_BURST_SECONDS: Seconds of quota that may be used at once (default: 10)
+    CQI_SUPABASE_RPS: Supabase requests per second (default: 0, only react to 429s)
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, Mapping, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "slow down" (529 is Anthropic's overloaded error)
+THROTTLE_STATUSES = (429, 529)
+
+# Backoff when a throttle response carries no retry-after
+DEFAULT_RETRY_AFTER = 2.0
+
+# Anthropic rate limit header prefixes → our bucket names
+ANTHROPIC_QUOTAS = {
+    'anthropic-ratelimit-requests': 'requests',
+    'anthropic-ratelimit-input-tokens': 'input_tokens',
+    'anthropic-ratelimit-output-tokens': 'output_tokens',
+    'anthropic-ratelimit-tokens': 'tokens',
+}
+
+# Rough size of a token in request-body bytes, used to estimate input tokens
+BYTES_PER_TOKEN = 4
+
+# Anthropic tier 1 limits, used until response headers report the real ones
+DEFAULT_ANTHROPIC_RPM = 50
+DEFAULT_ANTHROPIC_ITPM = 30000
+
+# Monotonic deadline of the current call (see call_deadline())
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('cqi_call_deadline', default=None)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when waiting for rate limit capacity would outlast the caller's deadline"""
+    pass
+
+
+@contextmanager
+def call_deadline(seconds: float):
+    """
+    Bound everything in the block to `seconds` from now: rate limit
+    waits fail fast rather than sleep past it. Nested deadlines keep the
+    earlier one.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current call_deadline(), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def get_burst_seconds() -> float:
+    """Seconds of quota a bucket lets through at once (CQI_RATE_LIMIT_BURST_SECONDS)."""
+    return max(0.0, float(os.getenv('CQI_RATE_LIMIT_BURST_SECONDS', '10')))
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket (generic cell rate algorithm).
+
+    Tracks a theoretical arrival time instead of a token count. Each
+    reservation pushes it forward by amount / rate, and the caller waits
+    until the bucket would have had room. Not thread-safe on its own; the
+    owning RateLimiter holds the lock.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None, follow_server: bool = False):
+        """
+        Args:
+            per_minute: Sustained rate
+            burst: Units available at once (default: CQI_RATE_LIMIT_BURST_SECONDS' worth, min 1)
+            follow_server: Take the server's limit even if it is higher
+                (per_minute is only a starting point)
+        """
+        self.ceiling = per_minute / 60.0
+        self.rate = self.ceiling
+        self.fixed_burst = burst
+        self.burst = burst if burst is not None else self._default_burst()
+        self.follow_server = follow_server
+        self._tat = 0.0
+
+    def _default_burst(self) -> float:
+        return max(1.0, self.ceiling * get_burst_seconds())
+
+    def reserve(self, amount: float, now: float, not_before: float) -> float:
+        """Reserve amount units. Returns seconds to wait before using them."""
+        tat = max(self._tat, now, not_before)
+        self._tat = tat + amount / self.rate
+        allowed_at = self._tat - self.burst / self.rate
+        return max(0.0, allowed_at - now, not_before - now)
+
+    def refund(self, amount: float, now: float) -> None:
+        """Give back a reservation that won't be used."""
+        self._tat = max(now - self.burst / self.rate, self._tat - amount / self.rate)
+
+    def available(self, now: float) -> float:
+        """Units that could be reserved right now without waiting."""
+        return max(0.0, (now - self._tat) * self.rate + self.burst)
+
+    def drain_to(self, remaining: float, now: float) -> None:
+        """Lower the local balance to what the server says is left."""
+        if remaining < self.available(now):
+            self._tat = now + (self.burst - max(0.0, remaining)) / self.rate
+
+    def empty_at(self, when: float) -> None:
+        """Start from an empty bucket at `when`, so a backlog resumes spaced out."""
+        self._tat = max(self._tat, when + self.burst / self.rate)
+
+    def set_ceiling(self, per_minute: float) -> None:
+        """
+        Adopt the server's limit: always with follow_server, otherwise
+        only if it is below the configured one.
+        """
+        ceiling = per_minute / 60.0
+        if ceiling <= 0 or ceiling == self.ceiling:
+            return
+        if ceiling < self.ceiling:
+            self.ceiling = ceiling
+            self.rate = min(self.rate, ceiling)
+        elif self.follow_server:
+            # Keep an adaptive slowdown in proportion
+            self.rate = ceiling * self.rate / self.ceiling
+            self.ceiling = ceiling
+        else:
+            return
+        if self.fixed_burst is None:
+            self.burst = self._default_burst()
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Parse a retry-after header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse an RFC 3339 reset header into seconds from now."""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return max(0.0, reset.timestamp() - time.time())
+
+
+class RateLimiter:
+    """
+    Adaptive limiter for one service, shared by every thread and event loop.
+
+    Callers use it in two steps: acquire() before sending (returns how
+    long to sleep; the sleep itself is left to the caller so sync and
+    async code can share one limiter) and observe() with the response.
+    A caller that gives up while waiting hands its reservation back with
+    refund().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        buckets: Optional[Dict[str, TokenBucket]] = None,
+        min_rate_fraction: float = 0.1,
+        recovery_fraction: float = 0.05
+    ):
+        """
+        Args:
+            name: Service name (for logs and stats)
+            buckets: Quotas to enforce, keyed by name ('requests', 'input_tokens', ...)
+            min_rate_fraction: Floor for the adaptive request rate, as a fraction of the ceiling
+            recovery_fraction: Share of the ceiling regained per successful request
+        """
+        self.name = name
+        self.buckets = dict(buckets or {})
+        self.min_rate_fraction = min_rate_fraction
+        self.recovery_fraction = recovery_fraction
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._counters = {
+            'requests': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+            'throttled': 0, 'quota_exhausted': 0, 'timed_out': 0, 'refunded': 0
+        }
+
+    def acquire(
+        self,
+        costs: Optional[Mapping[str, float]] = None,
+        max_wait: Optional[float] = None
+    ) -> Tuple[float, Dict[str, float]]:
+        """
+        Reserve capacity for one request.
+
+        Args:
+            costs: Units per bucket beyond the request itself (e.g. {'input_tokens': 1200})
+            max_wait: Longest the caller can wait; longer waits aren't reserved
+
+        Returns:
+            tuple: (seconds the caller must wait before sending,
+                reservation to pass to refund() if the request isn't sent)
+
+        Raises:
+            RateLimitTimeout: If the wait would exceed max_wait
+        """
+        now = time.monotonic()
+        reserved: Dict[str, float] = {}
+        with self._lock:
+            delay = max(0.0, self._blocked_until - now)
+            for name, bucket in self.buckets.items():
+                amount = 1.0 if name == 'requests' else (costs or {}).get(name, 0.0)
+                if amount:
+                    delay = max(delay, bucket.reserve(amount, now, self._blocked_until))
+                    reserved[name] = amount
+
+            if max_wait is not None and delay > max_wait:
+                self._refund(reserved, now)
+                self._counters['timed_out'] += 1
+                raise RateLimitTimeout(
+                    f"{self.name} rate limit wait of {delay:.1f}s exceeds the {max_wait:.1f}s left"
+                )
+
+            self._counters['requests'] += 1
+            if delay > 0:
+                self._counters['waited'] += 1
+                self._counters['wait_seconds'] += delay
+                self._counters['max_wait_seconds'] = max(self._counters['max_wait_seconds'], delay)
+        return delay, reserved
+
+    def refund(self, reserved: Mapping[str, float]) -> None:
+        """Return a reservation from acquire() whose request won't be sent."""
+        with self._lock:
+            self._refund(reserved, time.monotonic())
+            self._counters['refunded'] += 1
+
+    def _refund(self, reserved: Mapping[str, float], now: float) -> None:
+        for name, amount in reserved.items():
+            bucket = self.buckets.get(name)
+            if bucket is not None:
+                bucket.refund(amount, now)
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """
+        Adapt to a response: back off on throttling, follow quota headers.
+
+        Args:
+            status_code: HTTP status
+            headers: Response headers (case-insensitive mapping)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if status_code in THROTTLE_STATUSES:
+                retry_after = parse_retry_after(headers.get('retry-after')) or DEFAULT_RETRY_AFTER
+                self._block(now + retry_after)
+                self._counters['throttled'] += 1
+                requests = self.buckets.get('requests')
+                if requests is not None:
+                    requests.rate = max(requests.ceiling * self.min_rate_fraction, requests.rate / 2)
+                logger.warning(
+                    f"⚠️  {self.name} throttled ({status_code}); pausing {retry_after:.1f}s"
+                    + (f", rate now {requests.rate * 60:.0f}/min" if requests is not None else '')
+                )
+            else:
+                requests = self.buckets.get('requests')
+                if requests is not None and requests.rate < requests.ceiling:
+                    requests.rate = min(requests.ceiling, requests.rate + requests.ceiling * self.recovery_fraction)
+
+            self._follow_quota_headers(headers, now)
+
+    def _follow_quota_headers(self, headers: Mapping[str, str], now: float) -> None:
+        for prefix, name in ANTHROPIC_QUOTAS.items():
+            remaining = headers.get(f'{prefix}-remaining')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+
+            bucket = self.buckets.get(name)
+            if bucket is not None:
+                limit = headers.get(f'{prefix}-limit')
+                if limit:
+                    try:
+                        bucket.set_ceiling(float(limit))
+                    except ValueError:
+                        pass
+                bucket.drain_to(remaining, now)
+
+            if remaining <= 0:
+                reset_in = parse_reset(headers.get(f'{prefix}-reset'))
+                if reset_in:
+                    self._counters['quota_exhausted'] += 1
+                    self._block(now + reset_in)
+                    logger.warning(f"⚠️  {self.name} {name} quota exhausted; waiting {reset_in:.1f}s for reset")
+
+    def _block(self, until: float) -> None:
+        """Hold every caller until `until`, then resume from empty buckets. Lock held."""
+        if until <= self._blocked_until:
+            return
+        self._blocked_until = until
+        for bucket in self.buckets.values():
+            bucket.empty_at(until)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters, current rates and remaining block time."""
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._counters)
+            stats['wait_seconds'] = round(stats['wait_seconds'], 4)
+            stats['max_wait_seconds'] = round(stats['max_wait_seconds'], 4)
+            stats['avg_wait_seconds'] = round(stats['wait_seconds'] / stats['requests'], 4) if stats['requests'] else 0.0
+            stats['blocked_for_seconds'] = round(max(0.0, self._blocked_until - now), 3)
+            stats['rates_per_minute'] = {
+                name: {'current': round(b.rate * 60, 2), 'ceiling': round(b.ceiling * 60, 2)}
+                for name, b in self.buckets.items()
+            }
+        return stats
+
+
+def rate_limiting_enabled() -> bool:
+    """Check CQI_RATE_LIMIT_ENABLED."""
+    return os.getenv('CQI_RATE_LIMIT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _build_limiter(service: str) -> RateLimiter:
+    buckets = {}
+    if service == 'anthropic':
+        # Explicit limits are caps; otherwise follow the account's headers
+        rpm_setting = os.getenv('CQI_ANTHROPIC_RPM')
+        itpm_setting = os.getenv('CQI_ANTHROPIC_ITPM')
+        rpm = float(rpm_setting or DEFAULT_ANTHROPIC_RPM)
+        itpm = float(itpm_setting or DEFAULT_ANTHROPIC_ITPM)
+        if rpm > 0:
+            buckets['requests'] = TokenBucket(rpm, follow_server=not rpm_setting)
+        if itpm > 0:
+            # Allow at least one large prompt through at once
+            buckets['input_tokens'] = TokenBucket(
+                itpm, burst=max(itpm / 60.0 * get_burst_seconds(), 8000.0), follow_server=not itpm_setting
+            )
+    elif service == 'supabase':
+        rps = float(os.getenv('CQI_SUPABASE_RPS', '0'))
+        if rps > 0:
+            buckets['requests'] = TokenBucket(rps * 60)
+    return RateLimiter(service, buckets)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def service_for_host(host: str) -> Optional[str]:
+    """Map a request host to 'anthropic', 'supabase' or None (not limited)."""
+    if host.endswith('anthropic.com'):
+        return 'anthropic'
+    supabase_host = urlparse(os.getenv('SUPABASE_URL', '')).hostname
+    if host == supabase_host or host.endswith('.supabase.co'):
+        return 'supabase'
+    return None
+
+
+def get_rate_limiter(service: str) -> RateLimiter:
+    """
+    Get the process-wide limiter for a service.
+
+    Args:
+        service: 'anthropic' or 'supabase'
+
+    Returns:
+        RateLimiter: Shared limiter
+    """
+    limiter = _limiters.get(service)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(service)
+            if limiter is None:
+                limiter = _limiters[service] = _build_limiter(service)
+    return limiter
+
+
+def limiter_for_request(host: str) -> Optional[RateLimiter]:
+    """Limiter for a request host, or None if limiting is off or the host is unknown."""
+    if not rate_limiting_enabled():
+        return None
+    service = service_for_host(host)
+    return get_rate_limiter(service) if service else None
+
+
+def request_costs(service: str, method: str, path: str, body_size: int) -> Dict[str, float]:
+    """
+    Estimate the quota cost of a request beyond its request count.
+
+    Only Anthropic message creation counts input tokens; the estimate is
+    the body size over BYTES_PER_TOKEN, which errs high because of JSON
+    overhead (a safe direction for a limiter).
+    """
+    if service == 'anthropic' and method == 'POST' and path.endswith('/messages'):
+        return {'input_tokens': body_size / BYTES_PER_TOKEN}
+    return {}
+
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """Return stats for every limiter created in this process."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
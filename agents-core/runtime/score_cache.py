@@ -0,0 +1,338 @@
+"""
+CQI Score Cache - Content-addressed cache for Claude scoring results
+
+Duplicate submissions (double clicks, on_cqi_submit retries, manual CLI
+re-runs) would otherwise each cost a Claude call. Results are cached
+under a hash of the normalized lead fields, the brand config version and
+the model, so identical inputs return in milliseconds.
+
+Tiers:
+- Memory: in-process LRU with TTL (always on when the cache is enabled)
+- SQLite: optional shared tier so several workers/processes on one host
+  share results (set CQI_SCORE_CACHE_PATH)
+
+Async callers use get_async()/set_async(), which check the memory tier
+inline and run SQLite reads and writes in a worker thread, so a busy
+database file never blocks the event loop.
+
+Environment Variables:
+    CQI_SCORE_CACHE_ENABLED: 'false' to disable caching (default: true)
+    CQI_SCORE_CACHE_TTL: Entry lifetime in seconds (default: 86400)
+    CQI_SCORE_CACHE_SIZE: Max entries in the memory tier (default: 1024)
+    CQI_SCORE_CACHE_PATH: SQLite file for the shared tier (default: off)
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Lead fields that feed the scoring prompt
+KEY_FIELDS = ('name', 'email', 'phone', 'message', 'source')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize(field: str, value: Any) -> str:
+    """Normalize a lead field so trivially different submissions share a key."""
+    if value is None:
+        return ''
+    text = _WHITESPACE.sub(' ', str(value)).strip()
+    if field == 'email':
+        text = text.lower()
+    elif field == 'phone':
+        text = re.sub(r'[^\d+]', '', text)
+    return text
+
+
+def config_version(brand_config: dict) -> str:
+    """Short hash identifying a brand configuration."""
+    # Registry configs are already versioned
+    version = getattr(brand_config, 'version', None)
+    if version is not None:
+        return version
+    payload = json.dumps(brand_config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def make_key(lead: Dict[str, Any], brand_config: dict, model: str, knowledge: str = '') -> str:
+    """
+    Build the cache key for a scoring request.
+
+    Args:
+        lead: Lead data from database
+        brand_config: Brand configuration used for scoring
+        model: Claude model name
+        knowledge: Version of the knowledge context added to the prompt
+            ('' when enrichment is off)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    fields = {
+        'lead': {field: _normalize(field, lead.get(field)) for field in KEY_FIELDS},
+        'config': config_version(brand_config),
+        'model': model
+    }
+    if knowledge:
+        fields['knowledge'] = knowledge
+    payload = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteTier:
+    """Shared on-disk tier so several processes reuse each other's results."""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS score_cache ('
+                '  key TEXT PRIMARY KEY,'
+                '  value TEXT NOT NULL,'
+                '  expires_at REAL NOT NULL'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_score_cache_expires ON score_cache(expires_at)')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT value FROM score_cache WHERE key = ? AND expires_at >= ?',
+                (key, time.time())
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO score_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, default=str), now + self.ttl)
+            )
+            # Opportunistic cleanup keeps the file from growing without bound
+            conn.execute('DELETE FROM score_cache WHERE expires_at < ?', (now,))
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM score_cache')
+        finally:
+            conn.close()
+
+
+class ScoreCache:
+    """
+    Two-tier scoring result cache with hit/miss counters.
+
+    Lookups try memory first, then the shared tier (promoting hits into
+    memory). Errors in the shared tier are logged and treated as misses,
+    so the cache can never fail a scoring call.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400.0,
+        maxsize: int = 1024,
+        shared_path: Optional[str] = None,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            ttl: Entry lifetime in seconds
+            maxsize: Max entries kept in memory
+            shared_path: SQLite file for the shared tier (None to disable)
+            enabled: Set False to bypass the cache entirely
+        """
+        self.enabled = enabled
+        self.memory = MemoryTier(maxsize, ttl)
+        self.shared = SQLiteTier(shared_path, ttl) if shared_path else None
+        self._lock = threading.Lock()
+        self._counters = {'hits_memory': 0, 'hits_shared': 0, 'misses': 0, 'sets': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None on a miss."""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is None and self.shared is not None:
+            value = self._get_shared(key)
+        if value is None:
+            self._count('misses')
+        return value
+
+    async def get_async(self, key: str) -> Optional[Dict[str, Any]]:
+        """get() for the event loop: the shared tier is read in a worker thread."""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is None and self.shared is not None:
+            value = await asyncio.to_thread(self._get_shared, key)
+        if value is None:
+            self._count('misses')
+        return value
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None:
+            return None
+        self._count('hits_memory')
+        return dict(value)
+
+    def _get_shared(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            logger.warning(f"Score cache shared tier read failed: {e}")
+            return None
+        if value is None:
+            return None
+        self.memory.set(key, value)
+        self._count('hits_shared')
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a scoring result in every tier."""
+        if not self.enabled:
+            return
+        value = self._set_memory(key, value)
+        if self.shared is not None:
+            self._set_shared(key, value)
+
+    async def set_async(self, key: str, value: Dict[str, Any]) -> None:
+        """set() for the event loop: the shared tier is written in a worker thread."""
+        if not self.enabled:
+            return
+        value = self._set_memory(key, value)
+        if self.shared is not None:
+            await asyncio.to_thread(self._set_shared, key, value)
+
+    def _set_memory(self, key: str, value: Dict[str, Any]) -> Dict[str, Any]:
+        value = dict(value)
+        self.memory.set(key, value)
+        self._count('sets')
+        return value
+
+    def _set_shared(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            self.shared.set(key, value)
+        except Exception as e:
+            logger.warning(f"Score cache shared tier write failed: {e}")
+
+    def clear(self) -> None:
+        """Drop all entries from every tier."""
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+        hits = stats['hits_memory'] + stats['hits_shared']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        stats['evictions'] = self.memory.evictions
+        stats['enabled'] = self.enabled
+        return stats
+
+
+_score_cache: Optional[ScoreCache] = None
+_score_cache_lock = threading.Lock()
+
+
+def get_score_cache() -> ScoreCache:
+    """
+    Get the process-wide score cache, configured from the environment.
+
+    Returns:
+        ScoreCache: Shared cache instance
+    """
+    global _score_cache
+
+    if _score_cache is None:
+        with _score_cache_lock:
+            if _score_cache is None:
+                _score_cache = ScoreCache(
+                    ttl=float(os.getenv('CQI_SCORE_CACHE_TTL', '86400')),
+                    maxsize=int(os.getenv('CQI_SCORE_CACHE_SIZE', '1024')),
+                    shared_path=os.getenv('CQI_SCORE_CACHE_PATH') or None,
+                    enabled=os.getenv('CQI_SCORE_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+                )
+
+    return _score_cache
@@ -0,0 +1,271 @@
+"""
+CQI Scorers - Swappable backends for scoring many leads
+
+A scorer takes a list of leads and streams back one result per lead.
+process_leads_async() consumes that stream and writes sessions as
+results arrive, so the backend can be swapped without touching the
+rest of the batch workflow.
+
+Backends:
+- MessagesScorer: one messages.create() call per lead, run concurrently.
+  Lowest latency; used for interactive and small batch runs.
+- MessageBatchScorer: submits all prompts as Anthropic Message Batches
+  and polls until they finish. Batch requests are billed at a discount
+  and use a handful of connections, at the cost of minutes-to-hours
+  latency. Meant for overnight re-qualification runs.
+
+Usage:
+    from scorers import get_scorer
+    scorer = get_scorer('batch', poll_interval=60)
+    summary = await process_leads_async(lead_ids, 'sotsvc', scorer=scorer)
+"""
+
+import json
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
+
+from clients import get_async_anthropic_client
+from conductor import (
+    build_scoring_request,
+    extract_scoring_result,
+    score_lead_with_claude_async,
+    score_without_claude_async
+)
+from score_cache import get_score_cache
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# (lead_id, scoring_result or None, error message or None)
+ScoreOutcome = Tuple[str, Optional[Dict[str, Any]], Optional[str]]
+
+
+class Scorer(ABC):
+    """Base class for lead scoring backends."""
+
+    name = 'base'
+
+    @abstractmethod
+    def score_leads(
+        self,
+        leads: List[Dict[str, Any]],
+        brand_config: dict
+    ) -> AsyncIterator[ScoreOutcome]:
+        """
+        Score leads and yield (lead_id, result, error) as results arrive.
+
+        Exactly one outcome is yielded per lead. Results may arrive in any
+        order; failures are yielded with result=None rather than raised.
+
+        Args:
+            leads: Lead records from the database
+            brand_config: Brand configuration with scoring criteria
+        """
+
+
+class MessagesScorer(Scorer):
+    """Score each lead with its own messages.create() call, concurrently."""
+
+    name = 'messages'
+
+    def __init__(self, concurrency: int = 8):
+        """
+        Args:
+            concurrency: Max concurrent Claude calls
+        """
+        self.concurrency = max(1, concurrency)
+
+    async def score_leads(
+        self,
+        leads: List[Dict[str, Any]],
+        brand_config: dict
+    ) -> AsyncIterator[ScoreOutcome]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def score_one(lead: Dict[str, Any]) -> ScoreOutcome:
+            async with semaphore:
+                try:
+                    return lead['id'], await score_lead_with_claude_async(lead, brand_config), None
+                except Exception as e:
+                    return lead['id'], None, str(e)
+
+        for task in asyncio.as_completed([score_one(lead) for lead in leads]):
+            yield await task
+
+
+def _batch_entry_error(result: Any) -> str:
+    """Error message for a batch entry that didn't succeed (errored, canceled, expired)."""
+    # errored entries carry the API error body: result.error.error.{type, message}
+    error = getattr(getattr(result, 'error', None), 'error', None)
+    if error is not None:
+        return f"Batch request {result.type}: {error.type}: {error.message}"
+    return f"Batch request {result.type}"
+
+
+class MessageBatchScorer(Scorer):
+    """
+    Score leads through the Anthropic Message Batches API.
+
+    Prompts are built with the same build_scoring_request() used by the
+    direct scorer, submitted in batches of up to max_batch_size, and
+    polled until processing ends. Results are streamed back as each
+    batch finishes. Leads decided by the pre-scorer or with a cached
+    score are answered immediately and never submitted.
+    """
+
+    name = 'batch'
+
+    def __init__(
+        self,
+        poll_interval: float = 30.0,
+        max_batch_size: int = 10000,
+        timeout: float = 24 * 60 * 60
+    ):
+        """
+        Args:
+            poll_interval: Seconds between status checks
+            max_batch_size: Requests per submitted batch (API max is 100,000)
+            timeout: Give up waiting on a batch after this many seconds
+        """
+        self.poll_interval = poll_interval
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+
+    async def _submit(self, leads: List[Dict[str, Any]], brand_config: dict) -> Tuple[str, Dict[str, str]]:
+        """Submit one batch. Returns (batch_id, custom_id → lead_id)."""
+        anthropic = get_async_anthropic_client()
+
+        # custom_id must match ^[a-zA-Z0-9_-]{1,64}$, so map by position
+        # instead of relying on the lead id format
+        id_map = {f"lead-{i}": lead['id'] for i, lead in enumerate(leads)}
+        # In a worker thread: knowledge lookups may stat files or rebuild the index
+        requests = await asyncio.to_thread(lambda: [
+            {
+                'custom_id': custom_id,
+                'params': build_scoring_request(lead, brand_config)
+            }
+            for (custom_id, _), lead in zip(id_map.items(), leads)
+        ])
+
+        batch = await anthropic.messages.batches.create(requests=requests)
+        logger.info(f"✅ Submitted message batch {batch.id} ({len(requests)} leads)")
+        return batch.id, id_map
+
+    async def _wait(self, batch_id: str) -> None:
+        """Poll a batch until processing has ended."""
+        anthropic = get_async_anthropic_client()
+        started = datetime.utcnow()
+
+        while True:
+            batch = await anthropic.messages.batches.retrieve(batch_id)
+            if batch.processing_status == 'ended':
+                return
+
+            if (datetime.utcnow() - started).total_seconds() > self.timeout:
+                raise TimeoutError(f"Message batch {batch_id} did not finish within {self.timeout}s")
+
+            counts = batch.request_counts
+            logger.info(
+                f"Batch {batch_id}: {batch.processing_status} "
+                f"({counts.succeeded} succeeded, {counts.errored} errored, {counts.processing} processing)"
+            )
+            await asyncio.sleep(self.poll_interval)
+
+    async def score_leads(
+        self,
+        leads: List[Dict[str, Any]],
+        brand_config: dict
+    ) -> AsyncIterator[ScoreOutcome]:
+        anthropic = get_async_anthropic_client()
+        cache = get_score_cache()
+
+        cache_keys = {}
+        uncached = []
+        for lead in leads:
+            local, key = await score_without_claude_async(lead, brand_config)
+            if local is not None:
+                yield lead['id'], local, None
+            else:
+                cache_keys[lead['id']] = key
+                uncached.append(lead)
+        leads = uncached
+
+        # Submit every batch up front so they process in parallel server-side
+        submitted = []
+        for i in range(0, len(leads), self.max_batch_size):
+            chunk = leads[i:i + self.max_batch_size]
+            try:
+                submitted.append((await self._submit(chunk, brand_config), chunk))
+            except Exception as e:
+                logger.error(f"Failed to submit message batch: {e}")
+                for lead in chunk:
+                    yield lead['id'], None, f"Failed to submit message batch: {e}"
+
+        for (batch_id, id_map), chunk in submitted:
+            try:
+                await self._wait(batch_id)
+                results = await anthropic.messages.batches.results(batch_id)
+            except Exception as e:
+                logger.error(f"Message batch {batch_id} failed: {e}")
+                for lead in chunk:
+                    yield lead['id'], None, str(e)
+                continue
+
+            seen = set()
+            async for entry in results:
+                lead_id = id_map.get(entry.custom_id)
+                if lead_id is None:
+                    continue
+                seen.add(lead_id)
+
+                if entry.result.type != 'succeeded':
+                    yield lead_id, None, _batch_entry_error(entry.result)
+                    continue
+
+                try:
+                    result = extract_scoring_result(entry.result.message, brand_config)
+                except json.JSONDecodeError as e:
+                    yield lead_id, None, f"Claude returned invalid JSON: {e}"
+                    continue
+                except Exception as e:
+                    yield lead_id, None, str(e)
+                    continue
+
+                await cache.set_async(cache_keys[lead_id], result)
+                yield lead_id, result, None
+
+            for lead_id in id_map.values():
+                if lead_id not in seen:
+                    yield lead_id, None, f"No result returned in batch {batch_id}"
+
+
+SCORERS = {
+    MessagesScorer.name: MessagesScorer,
+    MessageBatchScorer.name: MessageBatchScorer,
+}
+
+
+def get_scorer(name: str = 'messages', **kwargs) -> Scorer:
+    """
+    Build a scorer by name.
+
+    Args:
+        name: 'messages' or 'batch'
+        **kwargs: Passed to the scorer constructor
+
+    Returns:
+        Scorer: Configured scorer
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer '{name}' (choose from: {', '.join(SCORERS)})")
+    return SCORERS[name](**kwargs)
@@ -0,0 +1,185 @@
+"""
+CQI Scoring Schema - Structured output definition for Claude scoring
+
+Defines the qualification result as a JSON Schema, exposes it as a
+Claude tool (record_lead_score) for forced tool use, and compiles it
+into a fast validator.
+
+The validator supports the subset of JSON Schema used here (type,
+properties, required, additionalProperties, enum, minimum, maximum,
+minLength). It is compiled once at import into nested closures, so
+validating a result is a handful of function calls rather than a walk
+over the schema dict.
+
+Usage:
+    from scoring_schema import SCORING_TOOL, validate_scoring_payload
+    errors = validate_scoring_payload(tool_input)
+"""
+
+from typing import Any, Callable, Dict, List
+
+SCORING_TOOL_NAME = 'record_lead_score'
+
+SCORING_SCHEMA: Dict[str, Any] = {
+    'type': 'object',
+    'properties': {
+        'qualification_score': {
+            'type': 'integer',
+            'minimum': 0,
+            'maximum': 100,
+            'description': 'Total qualification score (0-100) including bonuses and penalties'
+        },
+        'qualified': {
+            'type': 'boolean',
+            'description': 'True if the score meets the qualification threshold'
+        },
+        'scoring_breakdown': {
+            'type': 'object',
+            'additionalProperties': {'type': 'integer', 'minimum': 0},
+            'description': 'Points awarded per scoring criterion'
+        },
+        'reasoning': {
+            'type': 'string',
+            'minLength': 1,
+            'description': 'Brief explanation of the score and key factors'
+        },
+        'recommended_action': {
+            'type': 'string',
+            'enum': ['trial_booking', 'nurture_campaign', 'disqualify']
+        },
+        'confidence_level': {
+            'type': 'string',
+            'enum': ['high', 'medium', 'low']
+        }
+    },
+    'required': ['qualification_score', 'qualified', 'scoring_breakdown', 'reasoning']
+}
+
+SCORING_TOOL: Dict[str, Any] = {
+    'name': SCORING_TOOL_NAME,
+    'description': 'Record the qualification score for the lead. Always call this tool exactly once.',
+    'input_schema': SCORING_SCHEMA
+}
+
+SCORING_TOOL_CHOICE: Dict[str, Any] = {'type': 'tool', 'name': SCORING_TOOL_NAME}
+
+Validator = Callable[[Any, str, List[str]], None]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'boolean': lambda v: isinstance(v, bool),
+    # bool is a subclass of int, so exclude it explicitly
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+}
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """
+    Compile a JSON Schema (supported subset) into a validator function.
+
+    The returned function takes (value, path, errors) and appends a
+    message to `errors` for each violation.
+
+    Args:
+        schema: JSON Schema dict
+
+    Returns:
+        callable: Validator for values of this schema
+    """
+    checks: List[Validator] = []
+
+    if 'type' in schema:
+        type_name = schema['type']
+        type_check = _TYPE_CHECKS[type_name]
+
+        def check_type(value, path, errors):
+            if not type_check(value):
+                errors.append(f"{path}: expected {type_name}, got {type(value).__name__}")
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        allowed = frozenset(schema['enum'])
+
+        def check_enum(value, path, errors):
+            if isinstance(value, str) and value not in allowed:
+                errors.append(f"{path}: {value!r} is not one of {sorted(allowed)}")
+        checks.append(check_enum)
+
+    if 'minimum' in schema or 'maximum' in schema:
+        minimum = schema.get('minimum')
+        maximum = schema.get('maximum')
+
+        def check_range(value, path, errors):
+            if not _TYPE_CHECKS['number'](value):
+                return
+            if minimum is not None and value < minimum:
+                errors.append(f"{path}: {value} is below minimum {minimum}")
+            if maximum is not None and value > maximum:
+                errors.append(f"{path}: {value} is above maximum {maximum}")
+        checks.append(check_range)
+
+    if 'minLength' in schema:
+        min_length = schema['minLength']
+
+        def check_length(value, path, errors):
+            if isinstance(value, str) and len(value) < min_length:
+                errors.append(f"{path}: shorter than {min_length} characters")
+        checks.append(check_length)
+
+    if 'required' in schema:
+        required = tuple(schema['required'])
+
+        def check_required(value, path, errors):
+            if isinstance(value, dict):
+                for key in required:
+                    if key not in value:
+                        errors.append(f"{path}: missing required field '{key}'")
+        checks.append(check_required)
+
+    if 'properties' in schema:
+        properties = {key: compile_schema(sub) for key, sub in schema['properties'].items()}
+
+        def check_properties(value, path, errors):
+            if isinstance(value, dict):
+                for key, validator in properties.items():
+                    if key in value:
+                        validator(value[key], f"{path}.{key}", errors)
+        checks.append(check_properties)
+
+    if isinstance(schema.get('additionalProperties'), dict):
+        known = frozenset(schema.get('properties', {}))
+        extra = compile_schema(schema['additionalProperties'])
+
+        def check_additional(value, path, errors):
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    if key not in known:
+                        extra(item, f"{path}.{key}", errors)
+        checks.append(check_additional)
+
+    def validate(value, path, errors):
+        for check in checks:
+            check(value, path, errors)
+
+    return validate
+
+
+_validate_scoring = compile_schema(SCORING_SCHEMA)
+
+
+def validate_scoring_payload(payload: Any) -> List[str]:
+    """
+    Validate a scoring result against SCORING_SCHEMA.
+
+    Args:
+        payload: Decoded tool input or JSON object
+
+    Returns:
+        list: Error messages (empty if valid)
+    """
+    errors: List[str] = []
+    _validate_scoring(payload, '$', errors)
+    return errors
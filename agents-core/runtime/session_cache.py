@@ -0,0 +1,214 @@
+"""
+CQI Session Cache - Read-through cache for CQI session lookups
+
+The dashboard polls the same sessions over and over. Lookups go through
+an in-process LRU with TTL, so repeat reads skip Supabase, and misses
+for many ids are fetched together with a single in_() query that
+selects only the columns the API returns.
+
+Freshness:
+- Scoring writes in this process (conductor session updates, queue
+  workers) invalidate the session's entry right away
+- Sessions still 'initiated' (being scored, possibly by another
+  process such as `conductor.py --serve`) are cached only briefly, so
+  polling picks up the score within CQI_SESSION_CACHE_PENDING_TTL
+- Provisional scores are replaced by a re-score that usually runs in
+  another process, which can't invalidate this cache, so they expire
+  after CQI_SESSION_CACHE_PROVISIONAL_TTL
+- Everything else expires after CQI_SESSION_CACHE_TTL
+
+Ids that aren't UUIDs are never sent to Supabase (one would fail the
+whole in_() query); they are simply not found.
+
+Environment Variables:
+    CQI_SESSION_CACHE_ENABLED: 'false' to always read Supabase (default: true)
+    CQI_SESSION_CACHE_TTL: Lifetime of settled sessions in seconds (default: 300)
+    CQI_SESSION_CACHE_PENDING_TTL: Lifetime of 'initiated' sessions (default: 2)
+    CQI_SESSION_CACHE_PROVISIONAL_TTL: Lifetime of provisionally scored sessions (default: 15)
+    CQI_SESSION_CACHE_SIZE: Max cached sessions (default: 4096)
+
+Usage:
+    from session_cache import get_sessions_async, invalidate_session
+    sessions = await get_sessions_async([session_id, ...])
+"""
+
+import os
+import logging
+import threading
+from uuid import UUID
+from typing import Optional, Dict, Any, List
+
+from clients import get_async_supabase_client
+from score_cache import MemoryTier
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Columns used by the session API responses
+SESSION_COLUMNS = 'id, lead_id, brand, qualification_score, session_state, session_data'
+
+PENDING_STATES = ('initiated',)
+
+# Ids per in_() query (keeps the PostgREST URL well under length limits)
+FETCH_CHUNK_SIZE = 100
+
+
+class SessionCache:
+    """
+    In-process cache of cqi_sessions rows with hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        pending_ttl: float = 2.0,
+        provisional_ttl: float = 15.0,
+        maxsize: int = 4096,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            ttl: Lifetime of settled sessions in seconds
+            pending_ttl: Lifetime of sessions still being scored
+            provisional_ttl: Lifetime of sessions holding a provisional score
+            maxsize: Max cached sessions
+            enabled: Set False to bypass the cache entirely
+        """
+        self.enabled = enabled
+        self.pending_ttl = pending_ttl
+        self.provisional_ttl = provisional_ttl
+        self.memory = MemoryTier(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'fetches': 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def get_many(self, session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return {session_id: row} for the ids that are cached."""
+        if not self.enabled:
+            return {}
+        found = {}
+        for session_id in session_ids:
+            row = self.memory.get(session_id)
+            if row is not None:
+                found[session_id] = row
+        self._count('hits', len(found))
+        self._count('misses', len(set(session_ids)) - len(found))
+        return found
+
+    def set(self, row: Dict[str, Any]) -> None:
+        """Cache a session row (briefly if it is still being scored or provisional)."""
+        if not self.enabled:
+            return
+        if row.get('session_state') in PENDING_STATES:
+            ttl = self.pending_ttl
+        elif (row.get('session_data') or {}).get('provisional'):
+            ttl = self.provisional_ttl
+        else:
+            ttl = None
+        self.memory.set(row['id'], row, ttl)
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop a session after it was written."""
+        if self.memory.delete(session_id):
+            self._count('invalidations')
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and size."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['entries'] = len(self.memory)
+        stats['evictions'] = self.memory.evictions
+        stats['enabled'] = self.enabled
+        return stats
+
+
+_session_cache: Optional[SessionCache] = None
+_session_cache_lock = threading.Lock()
+
+
+def get_session_cache() -> SessionCache:
+    """
+    Get the process-wide session cache, configured from the environment.
+
+    Returns:
+        SessionCache: Shared cache instance
+    """
+    global _session_cache
+
+    if _session_cache is None:
+        with _session_cache_lock:
+            if _session_cache is None:
+                _session_cache = SessionCache(
+                    ttl=float(os.getenv('CQI_SESSION_CACHE_TTL', '300')),
+                    pending_ttl=float(os.getenv('CQI_SESSION_CACHE_PENDING_TTL', '2')),
+                    provisional_ttl=float(os.getenv('CQI_SESSION_CACHE_PROVISIONAL_TTL', '15')),
+                    maxsize=int(os.getenv('CQI_SESSION_CACHE_SIZE', '4096')),
+                    enabled=os.getenv('CQI_SESSION_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+                )
+
+    return _session_cache
+
+
+def invalidate_session(session_id: Optional[str]) -> None:
+    """Drop a session from the cache after writing it (no-op for None)."""
+    if session_id and _session_cache is not None:
+        _session_cache.invalidate(session_id)
+
+
+def is_session_id(value: str) -> bool:
+    """Return True if value is a UUID Supabase will accept as a session id."""
+    try:
+        UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+
+async def get_sessions_async(session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up CQI sessions, reading through the cache.
+
+    Cached ids are answered from memory; the rest are fetched with one
+    in_() query per FETCH_CHUNK_SIZE ids and cached.
+
+    Args:
+        session_ids: Session UUIDs (duplicates are fine)
+
+    Returns:
+        dict: {session_id: row with SESSION_COLUMNS}; unknown and malformed
+            ids are absent
+    """
+    cache = get_session_cache()
+    wanted = [session_id for session_id in dict.fromkeys(session_ids) if is_session_id(session_id)]
+    found = cache.get_many(wanted)
+    missing = [session_id for session_id in wanted if session_id not in found]
+    if not missing:
+        return found
+
+    supabase = await get_async_supabase_client()
+    for start in range(0, len(missing), FETCH_CHUNK_SIZE):
+        chunk = missing[start:start + FETCH_CHUNK_SIZE]
+        response = await supabase.table('cqi_sessions').select(SESSION_COLUMNS).in_('id', chunk).execute()
+        cache._count('fetches')
+        for row in response.data or []:
+            cache.set(row)
+            found[row['id']] = row
+
+    return found
+
+
+def get_session_cache_stats() -> Dict[str, Any]:
+    """Return session cache stats (for monitoring)."""
+    return get_session_cache().stats()
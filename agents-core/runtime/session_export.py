@@ -0,0 +1,301 @@
+"""
+CQI Session Export - Stream scored sessions out as NDJSON or CSV
+
+Exports cqi_sessions joined with their leads for analysis. Rows are read
+with keyset pagination on (created_at, id), so every page is an index
+range scan no matter how deep into the export it is (OFFSET paging
+re-reads every skipped row), and rows are encoded and written page by
+page, so memory use stays constant for exports of any size.
+
+Used by GET /api/cqi/sessions/export and by the CLI below.
+
+Environment Variables:
+    CQI_EXPORT_PAGE_SIZE: Rows fetched per request (default: 1000, the
+        PostgREST max-rows default)
+
+Usage:
+    python agents-core/runtime/session_export.py --brand sotsvc --since 2026-01-01 \\
+        --state scored --min-score 70 --format csv --output sessions.csv
+
+    from session_export import export_sessions_async
+    async for block in export_sessions_async('ndjson', brand='sotsvc'):
+        ...
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import asyncio
+import argparse
+import logging
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+from clients import get_async_supabase_client, get_brand_config
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_COLUMNS = [
+    'session_id', 'created_at', 'brand', 'session_state',
+    'qualification_score', 'qualified', 'recommended_action', 'confidence_level',
+    'model_used', 'provisional', 'scored_at',
+    'lead_id', 'lead_name', 'lead_email', 'lead_phone', 'lead_source', 'lead_status', 'lead_message',
+    'reasoning', 'scoring_breakdown'
+]
+
+SESSION_SELECT = '*, leads(name, email, phone, source, status, message)'
+
+
+def get_export_page_size() -> int:
+    """Rows fetched per request (CQI_EXPORT_PAGE_SIZE)."""
+    return max(1, int(os.getenv('CQI_EXPORT_PAGE_SIZE', '1000')))
+
+
+def _quote(value: str) -> str:
+    """Quote a value for a PostgREST or=() filter (timestamps contain ':' and '+')."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def flatten_session(session: Dict[str, Any], threshold: Optional[int]) -> Dict[str, Any]:
+    """
+    Flatten a cqi_sessions row with its embedded lead into EXPORT_COLUMNS.
+
+    Args:
+        session: Row from cqi_sessions with a 'leads' object
+        threshold: Brand qualification threshold (None if unknown)
+
+    Returns:
+        dict: One export row
+    """
+    data = session.get('session_data') or {}
+    lead = session.get('leads') or {}
+    score = session.get('qualification_score')
+    return {
+        'session_id': session['id'],
+        'created_at': session.get('created_at'),
+        'brand': session.get('brand'),
+        'session_state': session.get('session_state'),
+        'qualification_score': score,
+        'qualified': score >= threshold if score is not None and threshold is not None else None,
+        'recommended_action': data.get('recommended_action'),
+        'confidence_level': data.get('confidence_level'),
+        'model_used': data.get('model_used'),
+        'provisional': data.get('provisional', False),
+        'scored_at': data.get('scored_at'),
+        'lead_id': session.get('lead_id'),
+        'lead_name': lead.get('name'),
+        'lead_email': lead.get('email'),
+        'lead_phone': lead.get('phone'),
+        'lead_source': lead.get('source'),
+        'lead_status': lead.get('status'),
+        'lead_message': lead.get('message'),
+        'reasoning': data.get('reasoning'),
+        'scoring_breakdown': data.get('scoring_breakdown') or session.get('score_breakdown')
+    }
+
+
+async def iter_session_pages_async(
+    brand: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    states: Optional[List[str]] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    limit: Optional[int] = None,
+    page_size: Optional[int] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield pages of flattened sessions ordered by (created_at, id).
+
+    Each page continues after the last (created_at, id) of the previous
+    one instead of using an offset, with created_at >= the last value as
+    the range bound. Sessions without a created_at are exported after
+    the dated ones, as a second keyset pass ordered by id (a since/until
+    window excludes them).
+
+    Args:
+        brand: Only this brand
+        since: Sessions created at or after this ISO date/time
+        until: Sessions created before this ISO date/time
+        states: Only these session states
+        min_score: Minimum qualification score (inclusive)
+        max_score: Maximum qualification score (inclusive)
+        limit: Stop after this many rows
+        page_size: Rows per request (default: CQI_EXPORT_PAGE_SIZE)
+
+    Yields:
+        list: Export rows (see flatten_session)
+    """
+    page_size = page_size or get_export_page_size()
+    supabase = await get_async_supabase_client()
+    thresholds: Dict[str, Optional[int]] = {}
+    cursor = None
+    undated = False
+    exported = 0
+
+    while limit is None or exported < limit:
+        query = supabase.table('cqi_sessions').select(SESSION_SELECT)
+        if brand:
+            query = query.eq('brand', brand)
+        if since:
+            query = query.gte('created_at', since)
+        if until:
+            query = query.lt('created_at', until)
+        if states:
+            query = query.in_('session_state', states)
+        if min_score is not None:
+            query = query.gte('qualification_score', min_score)
+        if max_score is not None:
+            query = query.lte('qualification_score', max_score)
+        if undated:
+            query = query.is_('created_at', 'null')
+            if cursor is not None:
+                query = query.gt('id', cursor)
+            query = query.order('id')
+        else:
+            query = query.not_.is_('created_at', 'null')
+            if cursor is not None:
+                created_at, session_id = cursor
+                # gte is the index range bound; the or_ skips rows already sent at created_at
+                query = query.gte('created_at', created_at).or_(
+                    f"created_at.gt.{_quote(created_at)},"
+                    f"and(created_at.eq.{_quote(created_at)},id.gt.{_quote(session_id)})"
+                )
+            query = query.order('created_at').order('id')
+
+        size = page_size if limit is None else min(page_size, limit - exported)
+        response = await query.limit(size).execute()
+        rows = response.data or []
+
+        page = []
+        for session in rows:
+            row_brand = session.get('brand')
+            if row_brand not in thresholds:
+                try:
+                    thresholds[row_brand] = get_brand_config(row_brand)['qualification_threshold']
+                except Exception:
+                    thresholds[row_brand] = None
+            page.append(flatten_session(session, thresholds[row_brand]))
+
+        if page:
+            exported += len(page)
+            yield page
+
+        if len(rows) < size:
+            if undated or since or until:
+                return
+            # Dated rows are done; page through the undated ones by id
+            undated, cursor = True, None
+            continue
+        cursor = rows[-1]['id'] if undated else (rows[-1]['created_at'], rows[-1]['id'])
+
+
+def encode_ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    """Encode export rows as NDJSON."""
+    return ''.join(json.dumps(row, default=str) + '\n' for row in rows).encode()
+
+
+class CSVEncoder:
+    """Encodes export rows as CSV, one page at a time, header first."""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._header_written = False
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if not self._header_written:
+            self._writer.writerow(EXPORT_COLUMNS)
+            self._header_written = True
+        for row in rows:
+            self._writer.writerow([
+                json.dumps(value) if isinstance(value, (dict, list)) else ('' if value is None else value)
+                for value in (row.get(column) for column in EXPORT_COLUMNS)
+            ])
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+        return data
+
+
+async def export_sessions_async(fmt: str = 'ndjson', **filters) -> AsyncIterator[bytes]:
+    """
+    Stream an export as encoded blocks (one per page).
+
+    Args:
+        fmt: 'ndjson' or 'csv'
+        **filters: Passed to iter_session_pages_async()
+
+    Yields:
+        bytes: Encoded rows (the CSV header comes with the first block,
+            and is sent even if no rows match)
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (choose from: {', '.join(EXPORT_FORMATS)})")
+
+    encoder = CSVEncoder() if fmt == 'csv' else None
+    total = 0
+    async for page in iter_session_pages_async(**filters):
+        total += len(page)
+        yield encoder.encode(page) if encoder else encode_ndjson(page)
+
+    if encoder and total == 0:
+        yield encoder.encode([])
+    logger.info(f"✅ Exported {total} CQI sessions ({fmt})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export CQI sessions with their leads as NDJSON or CSV')
+    parser.add_argument('--brand', help='Only this brand')
+    parser.add_argument('--since', help='Sessions created at or after this ISO date')
+    parser.add_argument('--until', help='Sessions created before this ISO date')
+    parser.add_argument('--state', action='append', dest='states', help='Session state (repeatable)')
+    parser.add_argument('--min-score', type=int, help='Minimum qualification score')
+    parser.add_argument('--max-score', type=int, help='Maximum qualification score')
+    parser.add_argument('--limit', type=int, help='Max rows to export')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Output format (default: ndjson)')
+    parser.add_argument('--output', help='Output file (default: stdout)')
+    parser.add_argument('--page-size', type=int, help='Rows per request (default: CQI_EXPORT_PAGE_SIZE)')
+    args = parser.parse_args()
+
+    async def run(out) -> None:
+        async for block in export_sessions_async(
+            args.format,
+            brand=args.brand,
+            since=args.since,
+            until=args.until,
+            states=args.states,
+            min_score=args.min_score,
+            max_score=args.max_score,
+            limit=args.limit,
+            page_size=args.page_size
+        ):
+            out.write(block)
+
+    try:
+        if args.output:
+            with open(args.output, 'wb') as out:
+                asyncio.run(run(out))
+        else:
+            asyncio.run(run(sys.stdout.buffer))
+            sys.stdout.flush()
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}\n", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+CQI Timer Wheel - Hashed timing wheel for large numbers of timeouts
+
+Workflow stage timeouts ("retry in 2 hours", "timeout: 24 hours") are
+kept in a hashed timing wheel instead of being found by polling every
+row:
+
+- schedule() and cancel() are O(1): a timer goes into the bucket for its
+  deadline tick, and an index maps its key to that bucket
+- advance() only visits the buckets for the ticks that passed, so the
+  cost of a tick grows with the timers in one bucket, not with all
+  pending timers
+
+Timers further out than one turn of the wheel (slots × tick seconds)
+share buckets with nearer ones and are skipped until their own turn
+comes round.
+
+Usage:
+    wheel = TimerWheel(tick_seconds=1.0)
+    wheel.schedule('workflow-123', time.time() + 7200, payload)
+    for key, payload in wheel.advance(time.time()):
+        ...
+"""
+
+import math
+import time
+from typing import Optional, Dict, Any, List, Tuple, Hashable
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel keyed by timer id (one timer per key). Not
+    thread-safe; callers serialize access.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 4096, now: Optional[float] = None):
+        """
+        Args:
+            tick_seconds: Timer resolution; timers fire on the first
+                advance() at or after their deadline, rounded up to a tick
+            slots: Buckets in the wheel (one turn = slots × tick_seconds)
+            now: Start time (default: time.time())
+        """
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self._buckets: List[Dict[Hashable, Tuple[int, float, Any]]] = [{} for _ in range(slots)]
+        self._index: Dict[Hashable, int] = {}
+        self._tick = math.floor((time.time() if now is None else now) / tick_seconds)
+
+    def schedule(self, key: Hashable, deadline: float, payload: Any = None) -> None:
+        """
+        Set the timer for a key, replacing any timer it already has.
+
+        Args:
+            key: Timer id (e.g. a workflow instance id)
+            deadline: Epoch seconds to fire at
+            payload: Returned with the key when the timer fires
+        """
+        self.cancel(key)
+        deadline_tick = max(math.ceil(deadline / self.tick_seconds), self._tick + 1)
+        slot = deadline_tick % self.slots
+        self._buckets[slot][key] = (deadline_tick, deadline, payload)
+        self._index[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove a key's timer. Returns False if it had none."""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        del self._buckets[slot][key]
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Deadline of a key's timer, or None."""
+        slot = self._index.get(key)
+        return None if slot is None else self._buckets[slot][key][1]
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, Any]]:
+        """
+        Move the wheel to `now` and pop every timer that is due.
+
+        Args:
+            now: Current epoch seconds (default: time.time())
+
+        Returns:
+            list: (key, payload) of fired timers, earliest deadline first
+        """
+        target = math.floor((time.time() if now is None else now) / self.tick_seconds)
+        if target <= self._tick:
+            return []
+
+        due = []
+        # After a long pause every bucket is visited once, not once per tick
+        for tick in range(self._tick + 1, self._tick + 1 + min(target - self._tick, self.slots)):
+            bucket = self._buckets[tick % self.slots]
+            if not bucket:
+                continue
+            for key in [k for k, entry in bucket.items() if entry[0] <= target]:
+                deadline_tick, deadline, payload = bucket.pop(key)
+                del self._index[key]
+                due.append((deadline, key, payload))
+        self._tick = target
+
+        due.sort(key=lambda entry: entry[0])
+        return [(key, payload) for _, key, payload in due]
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
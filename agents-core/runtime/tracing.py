@@ -0,0 +1,439 @@
+"""
+CQI Tracing - OpenTelemetry-style spans with a JSON file exporter
+
+Shows where the time of one request goes. The API opens a server span
+per request, the conductor a child span per step, and the shared HTTP
+transports (clients.py) a client span per Supabase or Anthropic request.
+All spans of a request share one trace id. That id is also written into
+system_events.event_data, so an event can be matched to its trace.
+
+The current span lives in a contextvar. It follows the code into
+awaited coroutines, asyncio tasks and asyncio.to_thread(), so nothing
+has to pass spans around. Incoming W3C `traceparent` headers are
+continued, and responses carry the header back.
+
+Finished spans are buffered. When their local root span ends, a
+background writer thread appends them to a JSON Lines file (one span per
+line, OTLP-like field names), so the event loop never waits on the disk.
+opentelemetry is not a dependency. Any object with export(spans) and
+flush() can replace the file exporter (set_span_exporter()).
+
+Environment Variables:
+    CQI_TRACING_ENABLED: 'true' to record spans (default: false)
+    CQI_TRACE_FILE: JSON Lines output file (default: agents-core/runtime/cqi_traces.jsonl)
+    CQI_TRACE_SAMPLE_RATE: Fraction of new traces recorded, 0-1 (default: 1.0)
+
+Usage:
+    from tracing import start_span, current_trace_id
+    with start_span('fetch_lead_data', brand=brand):
+        lead = fetch_lead_data(lead_id)
+
+    python agents-core/runtime/tracing.py --last 5
+    python agents-core/runtime/tracing.py --trace 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+
+import os
+import sys
+import atexit
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import contextvars
+from typing import Optional, Dict, Any, List
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = os.path.join(os.path.dirname(__file__), 'cqi_traces.jsonl')
+
+# Spans buffered before a write even if their root is still open
+MAX_BUFFERED_SPANS = 512
+
+_current: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('cqi_current_span', default=None)
+
+
+def tracing_enabled() -> bool:
+    """Check CQI_TRACING_ENABLED."""
+    return os.getenv('CQI_TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_sample_rate() -> float:
+    """Fraction of new traces that are recorded (CQI_TRACE_SAMPLE_RATE)."""
+    return min(1.0, max(0.0, float(os.getenv('CQI_TRACE_SAMPLE_RATE', '1.0'))))
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse a W3C traceparent header ('00-<trace id>-<span id>-<flags>').
+
+    Returns:
+        dict: trace_id, span_id and sampled, or None if absent or malformed
+    """
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return {'trace_id': parts[1], 'span_id': parts[2], 'sampled': bool(flags & 1)}
+
+
+class Span:
+    """
+    One timed operation. Use as a context manager: entering makes it the
+    current span, leaving ends it and restores the previous one. An
+    exception leaving the block marks the span as an error.
+    """
+
+    __slots__ = (
+        'name', 'kind', 'trace_id', 'span_id', 'parent_id', 'sampled',
+        'attributes', 'start_ns', 'end_ns', 'status', 'error', '_token'
+    )
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 sampled: bool, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = 'UNSET'
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: Any) -> None:
+        self.status = 'ERROR'
+        self.error = str(error)[:500]
+
+    def traceparent(self) -> str:
+        """W3C traceparent header value pointing at this span."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.status == 'UNSET':
+            self.status = 'OK'
+        if self.sampled:
+            _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end_ns = self.end_ns or time.time_ns()
+        status = {'code': self.status}
+        if self.error:
+            status['message'] = self.error
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': end_ns,
+            'duration_ms': round((end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'status': status
+        }
+
+    def __enter__(self) -> 'Span':
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            self.set_error(exc or exc_type.__name__)
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited in another context (e.g. a generator resumed elsewhere)
+            _current.set(None)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is off."""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: Any) -> None:
+        pass
+
+    def traceparent(self) -> Optional[str]:
+        return None
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_enabled = tracing_enabled()
+
+
+def start_span(name: str, kind: str = 'internal', traceparent: Optional[str] = None, **attributes):
+    """
+    Create a span under the current span (or a new trace).
+
+    Args:
+        name: Operation name, e.g. 'score_lead_with_claude'
+        kind: 'server', 'client' or 'internal'
+        traceparent: Incoming W3C header to continue (ignored under a current span)
+        **attributes: Span attributes
+
+    Returns:
+        Span: Use in a `with` block (a no-op span when tracing is off)
+    """
+    if not _enabled:
+        return NOOP_SPAN
+
+    parent = _current.get()
+    if parent is not None:
+        return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        return Span(name, kind, remote['trace_id'], remote['span_id'], remote['sampled'], attributes)
+
+    sampled = random.random() < get_sample_rate()
+    return Span(name, kind, '%032x' % random.getrandbits(128), None, sampled, attributes)
+
+
+def current_span() -> Optional[Span]:
+    """The span of the running code, or None."""
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the running code, or None outside a trace."""
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def with_trace_id(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return event_data with the current trace id added as 'trace_id'
+    (unchanged outside a trace or if it already has one).
+    """
+    span = _current.get()
+    if span is None or 'trace_id' in event_data:
+        return event_data
+    return {**event_data, 'trace_id': span.trace_id}
+
+
+class JSONFileExporter:
+    """
+    Appends finished spans to a JSON Lines file.
+
+    Spans are buffered. A trace is written when its local root span ends,
+    or when MAX_BUFFERED_SPANS are waiting, so a request costs one write.
+    export() only buffers: spans end on the event loop, so the write is
+    done by a background thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        # Held across a write, so batches reach the file in order
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._counters = {'spans': 0, 'writes': 0, 'write_failures': 0}
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            self._counters['spans'] += 1
+            full = len(self._buffer) >= MAX_BUFFERED_SPANS
+        if span.parent_id is None or span.kind == 'server' or full:
+            self._ensure_thread()
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Write buffered spans to the file. Blocks on file I/O."""
+        with self._write_lock:
+            with self._lock:
+                spans, self._buffer = self._buffer, []
+            if not spans:
+                return
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans))
+                with self._lock:
+                    self._counters['writes'] += 1
+            except OSError as e:
+                with self._lock:
+                    self._counters['write_failures'] += 1
+                logger.warning(f"Failed to write {len(spans)} spans to {self.path}: {e}")
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='span-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the writer thread and write what's left."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['buffered'] = len(self._buffer)
+        stats['path'] = self.path
+        return stats
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_span_exporter():
+    """
+    Get the process-wide span exporter (a JSONFileExporter on
+    CQI_TRACE_FILE unless replaced with set_span_exporter()).
+    """
+    global _exporter
+
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = JSONFileExporter(os.getenv('CQI_TRACE_FILE') or DEFAULT_TRACE_FILE)
+                logger.info(f"✅ Tracing to {_exporter.path}")
+
+    return _exporter
+
+
+def set_span_exporter(exporter) -> None:
+    """Replace the span exporter (anything with export(span) and flush())."""
+    global _exporter
+    with _exporter_lock:
+        _exporter = exporter
+
+
+def _export(span: Span) -> None:
+    try:
+        get_span_exporter().export(span)
+    except Exception as e:
+        logger.warning(f"Span export failed: {e}")
+
+
+def flush_spans() -> None:
+    """
+    Write out any buffered spans (e.g. at shutdown). Blocks on file I/O,
+    so async code should call it with asyncio.to_thread().
+    """
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def load_traces(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a trace file into {trace id: [span dicts]} in file order."""
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                span = json.loads(line)
+                traces.setdefault(span['trace_id'], []).append(span)
+    return traces
+
+
+def format_trace(spans: List[Dict[str, Any]]) -> str:
+    """Render one trace as an indented tree with durations."""
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {span['span_id'] for span in spans}
+    for span in spans:
+        parent = span['parent_span_id'] if span['parent_span_id'] in ids else None
+        children.setdefault(parent, []).append(span)
+
+    lines = []
+
+    def walk(parent: Optional[str], depth: int) -> None:
+        for span in sorted(children.get(parent, []), key=lambda s: s['start_time_unix_nano']):
+            status = '' if span['status']['code'] != 'ERROR' else f"  ❌ {span['status'].get('message', '')}"
+            lines.append(f"{'  ' * depth}{span['name']}  {span['duration_ms']:.1f}ms{status}")
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+    return '\n'.join(lines)
+
+
+def main():
+    """Print traces from the trace file."""
+    parser = argparse.ArgumentParser(description='Show CQI traces')
+    parser.add_argument('--file', default=os.getenv('CQI_TRACE_FILE') or DEFAULT_TRACE_FILE,
+                        help='Trace file (default: CQI_TRACE_FILE)')
+    parser.add_argument('--trace', help='Show one trace id')
+    parser.add_argument('--last', type=int, default=10, help='Show the last N traces (default: 10)')
+    args = parser.parse_args()
+
+    try:
+        traces = load_traces(args.file)
+    except (OSError, ValueError) as e:
+        print(f"❌ ERROR: Cannot read {args.file}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.trace:
+        if args.trace not in traces:
+            print(f"❌ ERROR: Trace {args.trace} not found", file=sys.stderr)
+            sys.exit(1)
+        selected = [args.trace]
+    else:
+        selected = list(traces)[-args.last:]
+
+    for trace_id in selected:
+        print(f"trace {trace_id}")
+        print(format_trace(traces[trace_id]))
+        print()
+
+
+if __name__ == '__main__':
+    main()
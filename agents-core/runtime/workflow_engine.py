@@ -0,0 +1,1172 @@
+"""
+CQI Workflow Engine - Runs the lead-to-trial and trial-to-paid workflows
+
+Compiles agents-core/workflows/*.yml into transition tables and moves
+workflow instances through them in memory:
+
+- Each stage's `transitions:` become an event → target table, so firing
+  an event is a dict lookup. Score guards ("score >= 70", "score 40-69")
+  are checked when the 'scored' event arrives.
+- Stage timeouts, retry backoff ("exponential backoff: 1s, 5s, 15s") and
+  delays ("retry in 2 hours") are timers in a TimerWheel (see
+  timer_wheel.py), so only instances whose timer is due get looked at.
+- Fallback stages work as the YAML describes. `exit: workflow_complete
+  (...)` finishes the workflow with that outcome. Retry and recovery
+  stages (max_retries / max_attempts) resume the stage that failed,
+  up to the limit, and go to exit_on_failure after that. `exit: resume`
+  stages wait for a 'resume' event or their delay.
+- A timeout with no 'timeout' or 'failure' transition marks the instance
+  'stuck' for the workflow monitor.
+
+Instance state and transitions are written to workflow_instances and
+workflow_stage_transitions in batches, every CQI_WORKFLOW_FLUSH_SECONDS
+or when CQI_WORKFLOW_BATCH_SIZE transitions are pending. Only the
+latest state of each instance is upserted, and transitions carry a
+client-generated id, so retrying a batch never duplicates rows. A batch
+the database rejects is retried row by row and the offending rows are
+dropped (logged and counted as rows_rejected) so one bad row can't stall
+persistence. On startup, active instances are loaded back and their
+timers rescheduled from stage_history.
+
+The engine runs in the API server (enable with CQI_WORKFLOWS_ENABLED).
+Leads created in that process start a lead-to-trial instance in
+lead_captured, move to cqi_started when scoring begins, and are walked
+through to the score guards when the score arrives (the pipeline has no
+separate signal for cqi_in_progress / cqi_completed). Other events (booked, declined,
+trial_completed, ...) come in through POST /api/workflows/{id}/events.
+
+Environment Variables:
+    CQI_WORKFLOWS_ENABLED: 'true' to run workflows in the API server (default: false)
+    CQI_WORKFLOW_PATH: Workflow YAML directory, relative to the repo root
+        (default: agents-core/workflows)
+    CQI_WORKFLOW_TICK_SECONDS: Timer resolution (default: 1)
+    CQI_WORKFLOW_FLUSH_SECONDS: Max seconds between batched writes (default: 1)
+    CQI_WORKFLOW_BATCH_SIZE: Rows per multi-row write (default: 500)
+
+Usage:
+    python agents-core/runtime/workflow_engine.py --check
+    python agents-core/runtime/workflow_engine.py --benchmark 10000
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Callable
+
+import yaml
+
+from postgrest.exceptions import APIError
+
+from clients import get_supabase_client
+from timer_wheel import TimerWheel
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_WORKFLOW_PATH = os.path.join(REPO_ROOT, 'agents-core', 'workflows')
+
+LEAD_TO_TRIAL = 'lead-to-trial'
+
+STATUS_ACTIVE = 'active'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+STATUS_STUCK = 'stuck'
+
+# Events fired by the engine itself
+EVENT_START = 'start'
+EVENT_SCORED = 'scored'
+EVENT_RESUME = 'resume'
+EVENT_TIMEOUT = 'timeout'
+EVENT_FAILURE = 'failure'
+EVENT_RETRIES_EXHAUSTED = 'retries_exhausted'
+
+FAILURE_EVENTS = (EVENT_FAILURE, EVENT_TIMEOUT, EVENT_RETRIES_EXHAUSTED)
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)\s*(seconds?|secs?|s|minutes?|mins?|m|hours?|h|days?|d)\b', re.IGNORECASE)
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# listener(workflow_type, instance_id, brand, stage_name, entered_at, replay);
+# replay is True for history replayed by load_active(), not a new transition
+TransitionListener = Callable[[str, str, str, str, float, bool], None]
+
+_TARGET = re.compile(r'^\s*(stage_\w+)\s*(?:\((.*)\))?')
+_SCORE_GUARD = re.compile(r'^\s*score\s*(?:(>=|>|<=|<)\s*(\d+)|(\d+)\s*-\s*(\d+))\s*$')
+
+
+class WorkflowError(Exception):
+    """Base exception for workflow engine errors"""
+    pass
+
+
+class WorkflowDefinitionError(WorkflowError):
+    """Raised when a workflow YAML can't be compiled"""
+    pass
+
+
+class InvalidTransitionError(WorkflowError):
+    """Raised when an event isn't allowed in the instance's current stage"""
+    pass
+
+
+def parse_durations(text: Any) -> List[float]:
+    """All durations in a string, in seconds ('1s, 5s, 15s' → [1, 5, 15])."""
+    return [
+        float(amount) * _UNITS[unit[0].lower()]
+        for amount, unit in _DURATION.findall(str(text or ''))
+    ]
+
+
+def parse_duration(text: Any) -> Optional[float]:
+    """
+    First duration in a string, in seconds.
+
+    '5 minutes' → 300, '15 minutes (for chat/phone), 24 hours (for email)'
+    → 900, 'N/A (terminal state)' → None.
+    """
+    durations = parse_durations(text)
+    return durations[0] if durations else None
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _epoch(value: str) -> float:
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class Transition:
+    """One compiled transition: event (or score range) → target stage."""
+
+    __slots__ = ('event', 'target', 'max_attempts', 'delay_seconds', 'min_score', 'max_score')
+
+    def __init__(self, event: str, target: str, max_attempts: Optional[int] = None,
+                 delay_seconds: Optional[float] = None):
+        self.event = event
+        self.target = target
+        self.max_attempts = max_attempts
+        self.delay_seconds = delay_seconds
+        self.min_score: Optional[int] = None
+        self.max_score: Optional[int] = None
+
+    def matches_score(self, score: int) -> bool:
+        return ((self.min_score is None or score >= self.min_score)
+                and (self.max_score is None or score <= self.max_score))
+
+
+class Stage:
+    """One compiled workflow stage."""
+
+    __slots__ = (
+        'key', 'name', 'agent', 'timeout_seconds', 'transitions', 'score_guards',
+        'terminal_status', 'outcome', 'resume_to', 'resumes_paused',
+        'max_attempts', 'exit_on_failure', 'backoff'
+    )
+
+    def __init__(self, key: str, name: str):
+        self.key = key
+        self.name = name
+        self.agent: Optional[str] = None
+        self.timeout_seconds: Optional[float] = None
+        self.transitions: Dict[str, Transition] = {}
+        self.score_guards: List[Transition] = []
+        self.terminal_status: Optional[str] = None   # completed / failed for end stages
+        self.outcome: Optional[str] = None           # e.g. 'nurture', 'declined'
+        self.resume_to: Optional[str] = None         # fixed stage a 'resume' returns to
+        self.resumes_paused = False                  # 'resume' returns to the stage that led here
+        self.max_attempts: Optional[int] = None
+        self.exit_on_failure: Optional[str] = None
+        self.backoff: List[float] = []
+
+    @property
+    def is_retry(self) -> bool:
+        return self.max_attempts is not None
+
+
+class WorkflowDefinition:
+    """A compiled workflow: stages keyed by YAML stage key, plus lookups."""
+
+    def __init__(self, name: str, version: str, first_stage: str, stages: Dict[str, Stage]):
+        self.name = name
+        self.version = version
+        # workflow_instances.workflow_type spells names with underscores
+        self.workflow_type = name.replace('-', '_')
+        self.first_stage = first_stage
+        self.stages = stages
+        self.by_name = {stage.name: stage.key for stage in stages.values()}
+        self.pre_scoring = self._pre_scoring_stages()
+
+    def _pre_scoring_stages(self) -> Tuple[str, ...]:
+        """Stages on the 'success' path from the first stage to the scoring stage."""
+        path = []
+        key = self.first_stage
+        while key and key not in path:
+            path.append(key)
+            stage = self.stages[key]
+            if stage.score_guards:
+                return tuple(path)
+            transition = stage.transitions.get('success')
+            key = transition.target if transition else None
+        return ()
+
+    def table(self) -> Dict[str, Dict[str, str]]:
+        """{stage key: {event: target}} for inspection."""
+        table = {}
+        for key, stage in self.stages.items():
+            row = {event: t.target for event, t in stage.transitions.items()}
+            for t in stage.score_guards:
+                row[t.event] = t.target
+            if stage.resume_to or stage.resumes_paused:
+                row[EVENT_RESUME] = stage.resume_to or '(paused stage)'
+            if stage.exit_on_failure:
+                row.setdefault(EVENT_FAILURE, stage.exit_on_failure)
+            if stage.terminal_status:
+                row['(end)'] = stage.terminal_status + (f" ({stage.outcome})" if stage.outcome else '')
+            table[key] = row
+        return table
+
+
+def _compile_stage(key: str, spec: Dict[str, Any]) -> Stage:
+    stage = Stage(key, spec.get('name') or key)
+    stage.agent = spec.get('agent')
+
+    for event, value in (spec.get('transitions') or {}).items():
+        match = _TARGET.match(str(value))
+        if not match:
+            logger.warning(f"Stage {key}: can't read transition '{event}: {value}', skipping")
+            continue
+        target, note = match.group(1), match.group(2) or ''
+        attempts = re.search(r'\bmax\s+(\d+)', note)
+        delay = parse_duration(note) if re.search(r'\b(?:retry|resume|wait)\s+in\b', note) else None
+        transition = Transition(str(event), target, int(attempts.group(1)) if attempts else None, delay)
+
+        guard = _SCORE_GUARD.match(str(event))
+        if guard:
+            op, bound, low, high = guard.groups()
+            if op:
+                bound = int(bound)
+                if op == '>=':
+                    transition.min_score = bound
+                elif op == '>':
+                    transition.min_score = bound + 1
+                elif op == '<=':
+                    transition.max_score = bound
+                else:
+                    transition.max_score = bound - 1
+            else:
+                transition.min_score, transition.max_score = int(low), int(high)
+            stage.score_guards.append(transition)
+        else:
+            stage.transitions[str(event)] = transition
+
+    attempts = spec.get('max_retries', spec.get('max_attempts'))
+    if attempts is not None:
+        stage.max_attempts = int(attempts)
+        stage.resumes_paused = True
+    if spec.get('exit_on_failure'):
+        match = _TARGET.match(str(spec['exit_on_failure']))
+        stage.exit_on_failure = match.group(1) if match else None
+    for action in spec.get('actions') or []:
+        if 'backoff' in str(action):
+            stage.backoff = parse_durations(str(action).split('backoff', 1)[1])
+
+    exit_spec = str(spec.get('exit') or '').strip()
+    if exit_spec.startswith('resume'):
+        target = re.search(r'\b(stage_\w+)', exit_spec)
+        if target:
+            stage.resume_to = target.group(1)
+        else:
+            stage.resumes_paused = True
+    elif exit_spec.startswith('workflow_complete'):
+        stage.terminal_status = STATUS_COMPLETED
+        outcome = re.search(r'\((?:\s*with)?\s*(\w+)\s+status', exit_spec)
+        stage.outcome = outcome.group(1) if outcome else None
+    elif not stage.transitions and not stage.score_guards and not stage.is_retry:
+        stage.terminal_status = STATUS_FAILED if 'fail' in key or 'fail' in stage.name else STATUS_COMPLETED
+
+    if not stage.terminal_status:
+        stage.timeout_seconds = parse_duration(spec.get('timeout'))
+    return stage
+
+
+def compile_workflow(document: Dict[str, Any], source: str = '') -> WorkflowDefinition:
+    """
+    Compile a workflow YAML document into transition tables.
+
+    Transitions to stages the document doesn't define are dropped with a
+    warning (the engine can't enter them).
+
+    Args:
+        document: Parsed YAML (name, workflow_stages, fallback_stages)
+        source: File name, for messages
+
+    Returns:
+        WorkflowDefinition: Compiled workflow
+
+    Raises:
+        WorkflowDefinitionError: If the document has no name or stages
+    """
+    name = document.get('name')
+    main_stages = document.get('workflow_stages') or {}
+    if not name or not main_stages:
+        raise WorkflowDefinitionError(f"{source or 'workflow'}: needs a name and workflow_stages")
+
+    specs = dict(main_stages)
+    specs.update(document.get('fallback_stages') or {})
+    stages = {key: _compile_stage(key, spec or {}) for key, spec in specs.items()}
+
+    for stage in stages.values():
+        for event, transition in list(stage.transitions.items()):
+            if transition.target not in stages:
+                logger.warning(f"{name}: {stage.key}.{event} → undefined {transition.target}, skipping")
+                del stage.transitions[event]
+        stage.score_guards = [t for t in stage.score_guards if t.target in stages]
+        if stage.resume_to not in (None, *stages):
+            logger.warning(f"{name}: {stage.key} resumes undefined {stage.resume_to}")
+            stage.resume_to = None
+        if stage.exit_on_failure not in (None, *stages):
+            logger.warning(f"{name}: {stage.key} exits to undefined {stage.exit_on_failure}")
+            stage.exit_on_failure = None
+
+    return WorkflowDefinition(name, str(document.get('version', '')), next(iter(main_stages)), stages)
+
+
+def load_workflow_definitions(path: Optional[str] = None) -> Dict[str, WorkflowDefinition]:
+    """
+    Compile every *.yml in the workflow directory.
+
+    Args:
+        path: Directory (default: CQI_WORKFLOW_PATH or agents-core/workflows)
+
+    Returns:
+        dict: {workflow name: WorkflowDefinition}
+    """
+    path = path or os.getenv('CQI_WORKFLOW_PATH') or DEFAULT_WORKFLOW_PATH
+    if not os.path.isabs(path):
+        path = os.path.join(REPO_ROOT, path)
+
+    definitions = {}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(('.yml', '.yaml')):
+            continue
+        with open(os.path.join(path, filename), 'r', encoding='utf-8') as f:
+            document = yaml.safe_load(f) or {}
+        if document.get('type') not in (None, 'workflow'):
+            continue
+        definition = compile_workflow(document, filename)
+        definitions[definition.name] = definition
+        logger.info(f"✅ Workflow '{definition.name}' compiled ({len(definition.stages)} stages)")
+    return definitions
+
+
+class WorkflowInstance:
+    """In-memory state of one workflow run."""
+
+    __slots__ = (
+        'id', 'definition', 'lead_id', 'brand', 'trial_id', 'stage', 'status', 'outcome',
+        'started_at', 'entered_at', 'completed_at', 'history', 'paused', 'attempts',
+        'error_log', 'seq'
+    )
+
+    def __init__(self, instance_id: str, definition: WorkflowDefinition, lead_id: str, brand: str,
+                 trial_id: Optional[str], now: float):
+        self.id = instance_id
+        self.definition = definition
+        self.lead_id = lead_id
+        self.brand = brand
+        self.trial_id = trial_id
+        self.stage: Optional[str] = None
+        self.status = STATUS_ACTIVE
+        self.outcome: Optional[str] = None
+        self.started_at = now
+        self.entered_at = now
+        self.completed_at: Optional[float] = None
+        self.history: List[Dict[str, Any]] = []
+        self.paused: Optional[str] = None
+        self.attempts: Dict[str, int] = {}
+        self.error_log: List[Dict[str, Any]] = []
+        self.seq = 0
+
+    @property
+    def current(self) -> Stage:
+        return self.definition.stages[self.stage]
+
+    def row(self) -> Dict[str, Any]:
+        """Row for workflow_instances."""
+        return {
+            'id': self.id,
+            'workflow_type': self.definition.workflow_type,
+            'lead_id': self.lead_id,
+            'trial_id': self.trial_id,
+            'brand': self.brand,
+            'status': self.status,
+            'current_stage': self.current.name,
+            'stage_history': list(self.history),
+            'started_at': _iso(self.started_at),
+            'completed_at': _iso(self.completed_at) if self.completed_at else None,
+            'duration_seconds': int(self.completed_at - self.started_at) if self.completed_at else None,
+            'error_log': list(self.error_log) or None
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """API view of the instance."""
+        row = self.row()
+        row['workflow'] = self.definition.name
+        row['stage_key'] = self.stage
+        row['outcome'] = self.outcome
+        row['events'] = sorted(self.current.transitions) if self.status in (STATUS_ACTIVE, STATUS_STUCK) else []
+        return row
+
+
+def _require_uuid(field: str, value: str) -> None:
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        raise WorkflowError(f"{field} must be a UUID: {value!r}")
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class WorkflowEngine:
+    """
+    Runs workflow instances against compiled definitions. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        definitions: Dict[str, WorkflowDefinition],
+        tick_seconds: float = 1.0,
+        flush_seconds: float = 1.0,
+        batch_size: int = 500,
+        persist: bool = True
+    ):
+        """
+        Args:
+            definitions: Compiled workflows by name
+            tick_seconds: Timer resolution
+            flush_seconds: Max seconds between batched writes
+            batch_size: Rows per multi-row write; also flushes early
+                when this many transitions are pending
+            persist: Set False to keep everything in memory (benchmarks)
+        """
+        self.definitions = definitions
+        self.by_type = {d.workflow_type: d for d in definitions.values()}
+        self.tick_seconds = tick_seconds
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.persist = persist
+        self.wheel = TimerWheel(tick_seconds)
+
+        self._instances: Dict[str, WorkflowInstance] = {}
+        self._by_lead: Dict[Tuple[str, str], str] = {}
+        self._dirty: set = set()
+        self._finished: set = set()
+        self._transitions: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._listeners: List[TransitionListener] = []
+        self._counters = {
+            'started': 0, 'transitions': 0, 'timeouts': 0, 'resumes': 0, 'completed': 0,
+            'failed': 0, 'stuck': 0, 'flushes': 0, 'flush_failures': 0, 'rows_written': 0,
+            'rows_rejected': 0, 'timer_errors': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Transitions
+    # ------------------------------------------------------------------
+
+    def add_listener(self, listener: TransitionListener) -> None:
+        """
+        Call `listener` every time an instance enters a stage, and for
+        each stage in the history of instances restored by load_active()
+        (with replay=True). Listeners run under the engine lock and must
+        be quick. Adding a listener twice has no effect.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, instance: 'WorkflowInstance', stage_name: str, at: float, replay: bool = False) -> None:
+        for listener in self._listeners:
+            try:
+                listener(instance.definition.workflow_type, instance.id, instance.brand, stage_name, at, replay)
+            except Exception as e:
+                logger.warning(f"Workflow listener failed: {e}")
+
+    def _enter(self, instance: WorkflowInstance, key: str, event: str, now: float,
+               transition: Optional[Transition] = None, error: Optional[str] = None) -> None:
+        """Move an instance into a stage, record it, and arm the stage's timer."""
+        definition = instance.definition
+        stage = definition.stages[key]
+        previous = instance.current if instance.stage else None
+
+        entry = {'stage': stage.name, 'entered_at': _iso(now), 'event': event}
+        if previous is not None:
+            self._transitions.append({
+                'id': str(uuid.uuid4()),
+                'workflow_id': instance.id,
+                'from_stage': previous.name,
+                'to_stage': stage.name,
+                'transitioned_at': _iso(now),
+                'duration_in_stage': int(now - instance.entered_at),
+                'agent': stage.agent,
+                'success': event not in FAILURE_EVENTS,
+                'error': error
+            })
+            self._counters['transitions'] += 1
+        if error:
+            instance.error_log.append({'stage': previous.name if previous else stage.name, 'error': error, 'at': _iso(now)})
+
+        instance.stage = key
+        instance.entered_at = now
+        instance.seq += 1
+        instance.history.append(entry)
+        self.wheel.cancel(instance.id)
+        self._dirty.add(instance.id)
+        self._notify(instance, stage.name, now)
+
+        if stage.terminal_status:
+            self._finish(instance, stage, now)
+            return
+
+        if stage.is_retry or stage.resumes_paused:
+            # Remember where to go back to (unless re-entering from itself)
+            if previous is not None and previous.key != key:
+                instance.paused = previous.key
+            entry['paused'] = definition.stages[instance.paused].name if instance.paused else None
+
+        if stage.is_retry:
+            counter = f"{key}:{instance.paused}"
+            attempts = instance.attempts.get(counter, 0) + 1
+            instance.attempts[counter] = attempts
+            limit = stage.max_attempts
+            if transition is not None and transition.max_attempts is not None:
+                limit = min(limit, transition.max_attempts)
+            if attempts > limit or instance.paused is None:
+                if stage.exit_on_failure:
+                    self._enter(instance, stage.exit_on_failure, EVENT_RETRIES_EXHAUSTED, now,
+                                error=f"{stage.name}: gave up after {attempts - 1} attempts")
+                else:
+                    self._mark_stuck(instance, now, f"{stage.name}: no attempts left")
+                return
+            if stage.backoff:
+                delay = stage.backoff[min(attempts, len(stage.backoff)) - 1]
+                self._schedule_resume(instance, entry, now + delay)
+                return
+
+        if stage.resumes_paused and transition is not None and transition.delay_seconds:
+            self._schedule_resume(instance, entry, now + transition.delay_seconds)
+            return
+
+        if stage.timeout_seconds:
+            self.wheel.schedule(instance.id, now + stage.timeout_seconds, (EVENT_TIMEOUT, instance.seq))
+
+    def _schedule_resume(self, instance: WorkflowInstance, entry: Dict[str, Any], at: float) -> None:
+        entry['resume_at'] = _iso(at)
+        self.wheel.schedule(instance.id, at, (EVENT_RESUME, instance.seq))
+
+    def _finish(self, instance: WorkflowInstance, stage: Stage, now: float) -> None:
+        instance.status = stage.terminal_status
+        instance.outcome = stage.outcome
+        instance.completed_at = now
+        self._by_lead.pop((instance.definition.name, instance.lead_id), None)
+        self._finished.add(instance.id)
+        self._counters['completed' if stage.terminal_status == STATUS_COMPLETED else 'failed'] += 1
+
+    def _mark_stuck(self, instance: WorkflowInstance, now: float, reason: str) -> None:
+        instance.status = STATUS_STUCK
+        instance.error_log.append({'stage': instance.current.name, 'error': reason, 'at': _iso(now)})
+        self._dirty.add(instance.id)
+        self._counters['stuck'] += 1
+        logger.warning(f"⚠️  Workflow {instance.id} stuck in {instance.current.name}: {reason}")
+
+    def _fire(self, instance: WorkflowInstance, event: str, payload: Optional[Dict[str, Any]],
+              now: float, error: Optional[str] = None) -> None:
+        if instance.status not in (STATUS_ACTIVE, STATUS_STUCK):
+            raise InvalidTransitionError(f"Workflow {instance.id} is {instance.status}")
+
+        stage = instance.current
+        transition = None
+        target = None
+
+        if event == EVENT_SCORED and stage.score_guards:
+            score = int((payload or {}).get('score', -1))
+            transition = next((t for t in stage.score_guards if t.matches_score(score)), None)
+            if transition is None:
+                raise InvalidTransitionError(f"No transition from {stage.name} for score {score}")
+        elif event in stage.transitions:
+            transition = stage.transitions[event]
+        elif event == EVENT_RESUME and (stage.resume_to or (stage.resumes_paused and instance.paused)):
+            target = stage.resume_to or instance.paused
+            self._counters['resumes'] += 1
+        elif event == EVENT_FAILURE and stage.exit_on_failure:
+            target = stage.exit_on_failure
+        else:
+            raise InvalidTransitionError(
+                f"Event '{event}' not allowed in {instance.definition.name}/{stage.name} "
+                f"(allowed: {', '.join(sorted(stage.transitions)) or 'none'})"
+            )
+
+        instance.status = STATUS_ACTIVE
+        self._enter(instance, transition.target if transition else target, event, now, transition, error)
+
+    def _get(self, instance_id: str) -> WorkflowInstance:
+        instance = self._instances.get(instance_id)
+        if instance is None:
+            raise WorkflowError(f"Unknown workflow instance: {instance_id}")
+        return instance
+
+    def start(
+        self,
+        workflow: str,
+        lead_id: str,
+        brand: str,
+        trial_id: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Start a workflow instance in its first stage.
+
+        An active instance of the same workflow for the lead is returned
+        instead of starting a second one.
+
+        Returns:
+            dict: Instance snapshot
+
+        Raises:
+            WorkflowError: If the workflow is unknown or an id isn't a UUID
+        """
+        _require_uuid('lead_id', lead_id)
+        if trial_id is not None:
+            _require_uuid('trial_id', trial_id)
+        with self._lock:
+            return self._start(workflow, lead_id, brand, trial_id, time.time() if now is None else now).snapshot()
+
+    def _start(self, workflow: str, lead_id: str, brand: str, trial_id: Optional[str], now: float) -> WorkflowInstance:
+        definition = self.definitions.get(workflow) or self.by_type.get(workflow)
+        if definition is None:
+            raise WorkflowError(f"Unknown workflow: {workflow}")
+
+        existing = self._by_lead.get((definition.name, lead_id))
+        if existing:
+            return self._instances[existing]
+
+        instance = WorkflowInstance(str(uuid.uuid4()), definition, lead_id, brand, trial_id, now)
+        self._instances[instance.id] = instance
+        self._by_lead[(definition.name, lead_id)] = instance.id
+        self._counters['started'] += 1
+        self._enter(instance, definition.first_stage, EVENT_START, now)
+        return instance
+
+    def fire(
+        self,
+        instance_id: str,
+        event: str,
+        payload: Optional[Dict[str, Any]] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Apply an event to an instance.
+
+        Args:
+            instance_id: Workflow instance id
+            event: Transition name from the YAML (success, booked, ...),
+                'scored' with payload {'score': n}, 'resume' or 'failure'
+            payload: Event data
+            now: Event time (default: time.time())
+
+        Returns:
+            dict: Instance snapshot after the transition
+
+        Raises:
+            WorkflowError: If the instance is unknown
+            InvalidTransitionError: If the event isn't allowed in its stage
+        """
+        with self._lock:
+            instance = self._get(instance_id)
+            self._fire(instance, event, payload, time.time() if now is None else now,
+                       (payload or {}).get('error'))
+            return instance.snapshot()
+
+    def on_lead_captured(self, lead_id: str, brand: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Start a lead's lead-to-trial instance when the lead is created.
+
+        Returns:
+            dict: Instance snapshot, or None if lead-to-trial isn't loaded
+        """
+        if LEAD_TO_TRIAL not in self.definitions:
+            return None
+        with self._lock:
+            return self._start(LEAD_TO_TRIAL, lead_id, brand, None, time.time() if now is None else now).snapshot()
+
+    def on_scoring_started(self, lead_id: str, brand: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Move a lead's lead-to-trial instance out of its first stage
+        (lead_captured → cqi_started) when scoring begins.
+
+        Starts the instance if the lead has none. Instances already past
+        the first stage (e.g. a re-score) are left alone.
+
+        Returns:
+            dict: Instance snapshot, or None if lead-to-trial isn't loaded
+        """
+        definition = self.definitions.get(LEAD_TO_TRIAL)
+        if definition is None:
+            return None
+        now = time.time() if now is None else now
+
+        with self._lock:
+            instance = self._start(LEAD_TO_TRIAL, lead_id, brand, None, now)
+            if instance.stage == definition.first_stage and instance.status == STATUS_ACTIVE:
+                self._fire(instance, 'success', None, now)
+            return instance.snapshot()
+
+    def on_lead_scored(self, lead_id: str, brand: str, score: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Advance a lead's lead-to-trial instance past scoring.
+
+        Starts the instance if the lead has none, steps it along the
+        'success' path to the scoring stage, applies the score guards,
+        then follows stages whose only way out is 'success' (e.g.
+        decision_qualify → trial_scheduling). Instances already past
+        scoring are left alone.
+
+        Returns:
+            dict: Instance snapshot, or None if lead-to-trial isn't loaded
+        """
+        definition = self.definitions.get(LEAD_TO_TRIAL)
+        if definition is None or not definition.pre_scoring:
+            return None
+        now = time.time() if now is None else now
+
+        with self._lock:
+            instance = self._start(LEAD_TO_TRIAL, lead_id, brand, None, now)
+            if instance.stage not in definition.pre_scoring or instance.status != STATUS_ACTIVE:
+                return instance.snapshot()
+
+            while not instance.current.score_guards:
+                self._fire(instance, 'success', None, now)
+            self._fire(instance, EVENT_SCORED, {'score': score}, now)
+
+            while instance.status == STATUS_ACTIVE and list(instance.current.transitions) == ['success']:
+                self._fire(instance, 'success', None, now)
+            return instance.snapshot()
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        Fire every timer that is due.
+
+        A timer that fails is logged and its instance marked stuck; the
+        other due timers still fire.
+
+        Returns:
+            int: Timers handled
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            fired = self.wheel.advance(now)
+            for instance_id, (kind, seq) in fired:
+                instance = self._instances.get(instance_id)
+                if instance is None or instance.seq != seq:
+                    continue
+                try:
+                    self._advance_timer(instance, kind, now)
+                except Exception as e:
+                    self._counters['timer_errors'] += 1
+                    logger.error(f"❌ Workflow {instance_id}: {kind} timer failed: {e}")
+                    if instance.status == STATUS_ACTIVE:
+                        self._mark_stuck(instance, now, f"{kind} timer failed: {e}")
+            return len(fired)
+
+    def _advance_timer(self, instance: WorkflowInstance, kind: str, now: float) -> None:
+        if kind == EVENT_RESUME:
+            self._fire(instance, EVENT_RESUME, None, now)
+            return
+
+        self._counters['timeouts'] += 1
+        stage = instance.current
+        message = f"{stage.name} timed out after {stage.timeout_seconds:g}s"
+        if EVENT_TIMEOUT in stage.transitions:
+            self._fire(instance, EVENT_TIMEOUT, None, now, message)
+        elif EVENT_FAILURE in stage.transitions or stage.exit_on_failure:
+            self._fire(instance, EVENT_FAILURE, None, now, message)
+        else:
+            self._mark_stuck(instance, now, message)
+
+    def get(self, instance_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of an instance held in memory, or None."""
+        with self._lock:
+            instance = self._instances.get(instance_id)
+            return instance.snapshot() if instance else None
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._transitions)
+
+    def flush(self) -> int:
+        """
+        Write changed instances and new transitions in multi-row batches.
+
+        A chunk the database rejects is retried row by row; rows it still
+        rejects are dropped, along with an instance's transitions if its
+        own row was rejected. On any other failure (e.g. the database is
+        unreachable) everything not yet written is kept and retried on
+        the next flush; both writes are idempotent.
+
+        Returns:
+            int: Rows written
+        """
+        if not self.persist:
+            with self._lock:
+                self._dirty.clear()
+                self._transitions.clear()
+                self._drop_finished(self._finished)
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                transitions, self._transitions = self._transitions, []
+                finished = self._finished & dirty
+                rows = [self._instances[i].row() for i in dirty if i in self._instances]
+            if not rows and not transitions:
+                return 0
+
+            rejected: set = set()
+            written = 0
+            try:
+                supabase = get_supabase_client()
+                # Instances first: transitions reference them
+                for chunk in _chunks(rows, self.batch_size):
+                    written += self._write(supabase, 'workflow_instances', chunk, rejected)
+                transitions = [t for t in transitions if t['workflow_id'] not in rejected]
+                for chunk in _chunks(transitions, self.batch_size):
+                    written += self._write(supabase, 'workflow_stage_transitions', chunk, rejected)
+            except Exception as e:
+                with self._lock:
+                    self._dirty |= dirty - rejected
+                    self._transitions[:0] = [t for t in transitions if t['workflow_id'] not in rejected]
+                    self._forget(rejected)
+                    self._counters['flush_failures'] += 1
+                logger.warning(f"Workflow flush failed ({len(rows)} instances, {len(transitions)} transitions kept): {e}")
+                return 0
+
+            with self._lock:
+                self._forget(rejected)
+                self._drop_finished(finished - self._dirty)
+                self._counters['flushes'] += 1
+                self._counters['rows_written'] += written
+            return written
+
+    def _write(self, supabase: Any, table: str, chunk: List[Dict[str, Any]], rejected: set) -> int:
+        """
+        Upsert a chunk, falling back to one row at a time if the database
+        rejects it. Rejected instance rows add their id to `rejected`.
+        Errors other than a rejection propagate.
+        """
+        try:
+            self._upsert(supabase, table, chunk)
+            return len(chunk)
+        except APIError as e:
+            if len(chunk) == 1:
+                self._reject(table, chunk[0], e, rejected)
+                return 0
+
+        written = 0
+        for row in chunk:
+            try:
+                self._upsert(supabase, table, [row])
+                written += 1
+            except APIError as e:
+                self._reject(table, row, e, rejected)
+        return written
+
+    @staticmethod
+    def _upsert(supabase: Any, table: str, rows: List[Dict[str, Any]]) -> None:
+        if table == 'workflow_stage_transitions':
+            # Already-written transitions (a retried batch) are skipped
+            supabase.table(table).upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+        else:
+            supabase.table(table).upsert(rows).execute()
+
+    def _reject(self, table: str, row: Dict[str, Any], error: APIError, rejected: set) -> None:
+        if table == 'workflow_instances':
+            rejected.add(row['id'])
+        with self._lock:
+            self._counters['rows_rejected'] += 1
+        logger.error(f"❌ Dropped {table} row for workflow {row.get('workflow_id', row['id'])}: {error}")
+
+    def _forget(self, instance_ids: set) -> None:
+        """Stop tracking instances whose rows the database rejected."""
+        for instance_id in instance_ids:
+            instance = self._instances.pop(instance_id, None)
+            if instance is not None:
+                self._by_lead.pop((instance.definition.name, instance.lead_id), None)
+            self.wheel.cancel(instance_id)
+            self._dirty.discard(instance_id)
+            self._finished.discard(instance_id)
+
+    def _drop_finished(self, instance_ids: set) -> None:
+        """Forget finished instances once their final state is written."""
+        for instance_id in instance_ids:
+            self._instances.pop(instance_id, None)
+            self.wheel.cancel(instance_id)
+        self._finished -= instance_ids
+
+    def load_active(self, page_size: int = 1000) -> int:
+        """
+        Load active and stuck instances from workflow_instances and re-arm
+        their timers from stage_history (used on startup).
+
+        Returns:
+            int: Instances loaded
+        """
+        supabase = get_supabase_client()
+        loaded = 0
+        last_id = None
+
+        while True:
+            query = supabase.table('workflow_instances').select('*').in_('status', [STATUS_ACTIVE, STATUS_STUCK])
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(page_size).execute().data or []
+
+            with self._lock:
+                for row in rows:
+                    if self._restore(row):
+                        loaded += 1
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1]['id']
+
+        logger.info(f"✅ Loaded {loaded} active workflow instances ({len(self.wheel)} timers)")
+        return loaded
+
+    def _restore(self, row: Dict[str, Any]) -> bool:
+        definition = self.by_type.get(row.get('workflow_type'))
+        if definition is None or row['id'] in self._instances:
+            return False
+        key = definition.by_name.get(row.get('current_stage'))
+        if key is None:
+            logger.warning(f"Workflow {row['id']}: unknown stage '{row.get('current_stage')}', not loaded")
+            return False
+
+        history = row.get('stage_history') or []
+        last = history[-1] if history else {}
+        started = _epoch(row['started_at']) if row.get('started_at') else time.time()
+        instance = WorkflowInstance(row['id'], definition, row['lead_id'], row['brand'], row.get('trial_id'), started)
+        instance.stage = key
+        instance.status = row['status']
+        instance.entered_at = _epoch(last['entered_at']) if last.get('entered_at') else started
+        instance.history = list(history)
+        instance.error_log = list(row.get('error_log') or [])
+        instance.paused = definition.by_name.get(last.get('paused'))
+        for entry in history:
+            stage_key = definition.by_name.get(entry.get('stage'))
+            if stage_key and definition.stages[stage_key].is_retry:
+                counter = f"{stage_key}:{definition.by_name.get(entry.get('paused'))}"
+                instance.attempts[counter] = instance.attempts.get(counter, 0) + 1
+
+        self._instances[instance.id] = instance
+        self._by_lead[(definition.name, instance.lead_id)] = instance.id
+        for entry in history:
+            if entry.get('entered_at'):
+                self._notify(instance, entry['stage'], _epoch(entry['entered_at']), replay=True)
+
+        if instance.status == STATUS_ACTIVE:
+            stage = instance.current
+            if last.get('resume_at'):
+                self.wheel.schedule(instance.id, _epoch(last['resume_at']), (EVENT_RESUME, instance.seq))
+            elif stage.timeout_seconds:
+                self.wheel.schedule(instance.id, instance.entered_at + stage.timeout_seconds, (EVENT_TIMEOUT, instance.seq))
+        return True
+
+    # ------------------------------------------------------------------
+    # Runner
+    # ------------------------------------------------------------------
+
+    async def run(self) -> None:
+        """Advance timers every tick and flush writes until stop() is called."""
+        self._running = True
+        last_flush = time.monotonic()
+        try:
+            while self._running:
+                try:
+                    self.advance()
+                except Exception as e:
+                    # advance() guards each instance; this keeps the loop alive regardless
+                    logger.error(f"❌ Workflow timer pass failed: {e}")
+                if self.pending_writes >= self.batch_size or time.monotonic() - last_flush >= self.flush_seconds:
+                    await asyncio.to_thread(self.flush)
+                    last_flush = time.monotonic()
+                await asyncio.sleep(self.tick_seconds)
+        finally:
+            await asyncio.to_thread(self.flush)
+
+    def stop(self) -> None:
+        self._running = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters, instances in memory and pending timers/writes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['instances'] = len(self._instances)
+            stats['timers'] = len(self.wheel)
+            stats['pending_transitions'] = len(self._transitions)
+            stats['pending_instances'] = len(self._dirty)
+        return stats
+
+
+_engine: Optional[WorkflowEngine] = None
+_engine_lock = threading.Lock()
+
+
+def workflows_enabled() -> bool:
+    """True if CQI_WORKFLOWS_ENABLED is set."""
+    return os.getenv('CQI_WORKFLOWS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def start_workflow_engine() -> WorkflowEngine:
+    """
+    Create this process's workflow engine from the environment.
+
+    The caller runs engine.run() (and load_active() first, to pick up
+    where the last run stopped).
+
+    Returns:
+        WorkflowEngine: The process-wide engine
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = WorkflowEngine(
+                load_workflow_definitions(),
+                tick_seconds=float(os.getenv('CQI_WORKFLOW_TICK_SECONDS', '1')),
+                flush_seconds=float(os.getenv('CQI_WORKFLOW_FLUSH_SECONDS', '1')),
+                batch_size=int(os.getenv('CQI_WORKFLOW_BATCH_SIZE', '500'))
+            )
+    return _engine
+
+
+def get_workflow_engine() -> Optional[WorkflowEngine]:
+    """The engine started in this process, or None."""
+    return _engine
+
+
+def notify_lead_captured(lead_id: str, brand: str) -> None:
+    """
+    Start the lead's lead-to-trial workflow when the lead is created.
+
+    No-op unless this process runs the workflow engine. Never raises.
+    """
+    engine = _engine
+    if engine is None:
+        return
+    try:
+        engine.on_lead_captured(lead_id, brand)
+    except Exception as e:
+        logger.warning(f"Failed to start workflow for lead {lead_id}: {e}")
+
+
+def notify_scoring_started(lead_id: str, brand: str) -> None:
+    """
+    Move the lead's lead-to-trial workflow into cqi_started.
+
+    No-op unless this process runs the workflow engine. Never raises.
+    """
+    engine = _engine
+    if engine is None:
+        return
+    try:
+        engine.on_scoring_started(lead_id, brand)
+    except Exception as e:
+        logger.warning(f"Failed to advance workflow for lead {lead_id}: {e}")
+
+
+def notify_lead_scored(lead_id: str, brand: str, qualification_score: int, provisional: bool = False) -> None:
+    """
+    Advance the lead's lead-to-trial workflow after scoring.
+
+    No-op unless this process runs the workflow engine. Provisional
+    scores are skipped; the re-score that replaces them advances the
+    workflow. Never raises.
+    """
+    engine = _engine
+    if engine is None or provisional:
+        return
+    try:
+        engine.on_lead_scored(lead_id, brand, qualification_score)
+    except Exception as e:
+        logger.warning(f"Failed to advance workflow for lead {lead_id}: {e}")
+
+
+def _benchmark(count: int) -> None:
+    engine = WorkflowEngine(load_workflow_definitions(), persist=False)
+    now = time.time()
+    started = time.perf_counter()
+    for i in range(count):
+        engine.on_lead_scored(f"lead-{i}", 'sotsvc', (i * 37) % 100, now=now)
+    elapsed = time.perf_counter() - started
+    fired_started = time.perf_counter()
+    fired = engine.advance(now + 86400)
+    fired_elapsed = time.perf_counter() - fired_started
+    stats = engine.stats()
+    print(f"{count} leads, {stats['transitions']} transitions in {elapsed:.2f}s "
+          f"({stats['transitions'] / elapsed:,.0f}/s)")
+    print(f"{fired} timers fired in {fired_elapsed:.2f}s; {stats['stuck']} instances stuck, "
+          f"{stats['completed']} completed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CQI workflow engine')
+    parser.add_argument('--check', action='store_true', help='Compile the workflow YAML and print transition tables')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Run N leads through lead-to-trial in memory')
+    args = parser.parse_args()
+
+    if not args.check and not args.benchmark:
+        parser.error('choose --check or --benchmark')
+
+    try:
+        if args.check:
+            for name, definition in load_workflow_definitions().items():
+                print(f"\n{name} (v{definition.version}), starts at {definition.first_stage}")
+                for key, row in definition.table().items():
+                    stage = definition.stages[key]
+                    timeout = f", timeout {stage.timeout_seconds:g}s" if stage.timeout_seconds else ''
+                    print(f"  {key} [{stage.name}{timeout}]")
+                    for event, target in row.items():
+                        print(f"      {event:<22} → {target}")
+        if args.benchmark:
+            _benchmark(args.benchmark)
+    except WorkflowError as e:
+        print(f"\n❌ ERROR: {e}\n", file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
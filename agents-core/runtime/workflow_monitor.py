@@ -0,0 +1,628 @@
+"""
+CQI Workflow Monitor - Stage SLAs, breach alerts and stage latency histograms
+
+Implements the SLAs in agents-core/utils/workflow-monitor.yml. An entry
+such as "trial_scheduled: 5 minutes (from decision_made)" means an
+instance must reach trial_scheduled within 5 minutes of reaching
+decision_made. engine_stages maps each monitored stage to the workflow
+engine stages whose entry marks it.
+
+The monitor consumes stage transitions as a stream. It gets them from
+the in-process WorkflowEngine as they happen, or, with --tail, by
+following workflow_stage_transitions from a cursor. Each transition
+does a constant amount of work:
+
+- Reaching a stage arms the SLAs that start there. Each armed SLA puts
+  the instance's deadline into a heap.
+- Reaching an SLA's target disarms it and records the latency in that
+  stage's histogram.
+- check() pops only the deadlines that have passed. A deadline still
+  armed when popped emits a 'workflow_sla_breach' event. If the stage
+  is still not reached at the stuck_workflow multiple of the limit
+  (2x timeout), a 'workflow_stuck' event follows.
+
+History replayed when the engine restores instances after a restart
+only rebuilds each instance's state: it was counted, and its breaches
+reported, by the process that saw it happen. SLAs whose deadline passed
+before the restart are treated as already reported.
+
+Breach events are written to system_events in batches. Per-day counts
+go to workflow_metrics: started, completed, failed, SLA breaches, and
+total duration for the average. They are merged with
+increment_workflow_metrics() so several monitors can share the table.
+A failed write is retried on the next flush: events keep their ids
+(duplicates are skipped) and a metrics batch keeps its flush id, which
+the function records so a retry of a write that did commit isn't
+counted twice.
+
+Environment Variables:
+    CQI_WORKFLOW_MONITOR_ENABLED: 'false' to not monitor the workflow engine (default: true)
+    CQI_WORKFLOW_MONITOR_CONFIG: Monitor YAML, relative to the repo root
+        (default: agents-core/utils/workflow-monitor.yml)
+    CQI_WORKFLOW_MONITOR_FLUSH_SECONDS: Seconds between batched writes (default: 5)
+
+Usage:
+    python agents-core/runtime/workflow_monitor.py --check
+    python agents-core/runtime/workflow_monitor.py --tail
+"""
+
+import os
+import re
+import sys
+import time
+import heapq
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+from uuid import uuid4
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+import yaml
+
+from clients import get_async_supabase_client
+from metrics import Histogram
+from workflow_engine import (
+    STATUS_COMPLETED,
+    get_workflow_engine,
+    load_workflow_definitions,
+    parse_duration
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_MONITOR_CONFIG = os.path.join(REPO_ROOT, 'agents-core', 'utils', 'workflow-monitor.yml')
+
+EVENT_BREACH = 'workflow_sla_breach'
+EVENT_STUCK = 'workflow_stuck'
+
+_FROM = re.compile(r'\(\s*from\s+(\w+)\s*\)')
+
+
+class StageSLA:
+    """Target stage must be reached within limit_seconds of source stage."""
+
+    __slots__ = ('target', 'source', 'limit_seconds')
+
+    def __init__(self, target: str, source: str, limit_seconds: float):
+        self.target = target
+        self.source = source
+        self.limit_seconds = limit_seconds
+
+
+class MonitoredWorkflow:
+    """Stages, SLAs and engine stage mapping for one workflow type."""
+
+    def __init__(self, workflow_type: str, stages: List[str], slas: List[StageSLA],
+                 engine_stages: Dict[str, str], terminal: Dict[str, str]):
+        self.workflow_type = workflow_type
+        self.stages = stages
+        self.slas = slas
+        self.engine_stages = engine_stages          # engine stage name → [monitored stages]
+        self.terminal = terminal                    # engine stage name → final status
+        self.by_source: Dict[str, List[StageSLA]] = {}
+        self.by_target: Dict[str, StageSLA] = {}
+        for sla in slas:
+            self.by_source.setdefault(sla.source, []).append(sla)
+            self.by_target[sla.target] = sla
+
+
+def _resolve_stage(reference: str, stages: List[str], before: str) -> Optional[str]:
+    """
+    Resolve a "(from X)" reference: an exact stage name, else the one stage
+    containing X ("scheduled" → "closing_call_scheduled"), else the stage
+    listed before the target.
+    """
+    if reference in stages:
+        return reference
+    matches = [stage for stage in stages if reference in stage]
+    if len(matches) == 1:
+        return matches[0]
+    index = stages.index(before) if before in stages else 0
+    return stages[index - 1] if index > 0 else None
+
+
+def load_monitor_config(path: Optional[str] = None) -> Tuple[Dict[str, MonitoredWorkflow], float]:
+    """
+    Compile the monitor YAML into per-workflow SLAs.
+
+    Args:
+        path: Monitor YAML (default: CQI_WORKFLOW_MONITOR_CONFIG)
+
+    Returns:
+        tuple: ({workflow_type: MonitoredWorkflow}, stuck multiple)
+    """
+    path = path or os.getenv('CQI_WORKFLOW_MONITOR_CONFIG') or DEFAULT_MONITOR_CONFIG
+    if not os.path.isabs(path):
+        path = os.path.join(REPO_ROOT, path)
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    terminal: Dict[str, Dict[str, str]] = {}
+    for definition in load_workflow_definitions().values():
+        terminal[definition.workflow_type] = {
+            stage.name: stage.terminal_status
+            for stage in definition.stages.values() if stage.terminal_status
+        }
+
+    workflows = {}
+    for workflow_type, spec in (config.get('monitored_workflows') or {}).items():
+        stages = [next(iter(item)) for item in spec.get('stages') or [] if isinstance(item, dict)]
+        slas = []
+        for target, text in (spec.get('stage_timeouts') or {}).items():
+            limit = parse_duration(text)
+            match = _FROM.search(str(text))
+            source = _resolve_stage(match.group(1), stages, target) if match else None
+            if limit is None or source is None:
+                logger.warning(f"{workflow_type}: can't read SLA '{target}: {text}', skipping")
+                continue
+            slas.append(StageSLA(target, source, limit))
+
+        engine_stages: Dict[str, List[str]] = {}
+        mapping = spec.get('engine_stages') or {stage: [stage] for stage in stages}
+        for stage, names in mapping.items():
+            for name in names if isinstance(names, list) else [names]:
+                engine_stages.setdefault(name, []).append(stage)
+
+        workflows[workflow_type] = MonitoredWorkflow(
+            workflow_type, stages, slas, engine_stages, terminal.get(workflow_type, {})
+        )
+
+    trigger = str(((config.get('alerts') or {}).get('stuck_workflow') or {}).get('trigger', ''))
+    multiple = re.search(r'(\d+(?:\.\d+)?)\s*x', trigger)
+    return workflows, float(multiple.group(1)) if multiple else 2.0
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).date().isoformat()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class _InstanceState:
+    __slots__ = ('workflow_type', 'brand', 'started_at', 'stage', 'entered_at', 'reached', 'armed', 'breached')
+
+    def __init__(self, workflow_type: str, brand: str, started_at: float):
+        self.workflow_type = workflow_type
+        self.brand = brand
+        self.started_at = started_at
+        self.stage: Optional[str] = None
+        self.entered_at = started_at
+        self.reached: Dict[str, float] = {}
+        self.armed: Dict[str, float] = {}     # target stage → armed at (source reached)
+        self.breached: Dict[str, str] = {}    # target stage → last event emitted
+
+
+class WorkflowMonitor:
+    """
+    Tracks SLA deadlines for live workflow instances. Thread-safe.
+    """
+
+    def __init__(self, workflows: Dict[str, MonitoredWorkflow], stuck_multiple: float = 2.0,
+                 flush_seconds: float = 5.0):
+        """
+        Args:
+            workflows: Compiled SLAs by workflow type
+            stuck_multiple: Multiple of an SLA limit at which a still-missed
+                stage is reported stuck
+            flush_seconds: Seconds between batched writes in run()
+        """
+        self.workflows = workflows
+        self.stuck_multiple = stuck_multiple
+        self.flush_seconds = flush_seconds
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+
+        self._instances: Dict[str, _InstanceState] = {}
+        self._deadlines: List[Tuple[float, int, str, str, str]] = []
+        self._seq = itertools.count()
+        self._events: List[Dict[str, Any]] = []
+        self._metrics: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+        # Metrics batch whose flush failed, kept with its flush id until it goes through
+        self._unsent: Optional[Tuple[str, List[Dict[str, Any]]]] = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._counters = {'transitions': 0, 'breaches': 0, 'stuck': 0, 'met': 0, 'late': 0}
+
+    def _bump(self, state: _InstanceState, at: float, field: str, amount: int = 1) -> None:
+        key = (_day(at), state.workflow_type, state.brand)
+        row = self._metrics.setdefault(key, {
+            'total_started': 0, 'total_completed': 0, 'failure_count': 0,
+            'sla_breaches': 0, 'duration_sum_seconds': 0
+        })
+        row[field] += amount
+
+    def observe(self, workflow_type: str, instance_id: str, brand: str, stage: str, at: float,
+                replay: bool = False) -> None:
+        """
+        Record that an instance entered an engine stage (a TransitionListener).
+
+        With replay, the transition is restored history: it rebuilds the
+        instance's state without counting metrics or emitting breaches.
+        """
+        workflow = self.workflows.get(workflow_type)
+        if workflow is None:
+            return
+
+        with self._lock:
+            state = self._instances.get(instance_id)
+            if state is None:
+                state = _InstanceState(workflow_type, brand, at)
+                self._instances[instance_id] = state
+                if not replay:
+                    self._bump(state, at, 'total_started')
+            if replay:
+                self._replay(instance_id, state, workflow, stage, at)
+                return
+            self._counters['transitions'] += 1
+            state.stage = stage
+            state.entered_at = at
+
+            for reached in workflow.engine_stages.get(stage, ()):
+                if reached in state.reached:
+                    continue
+                state.reached[reached] = at
+
+                armed_at = state.armed.pop(reached, None)
+                if armed_at is not None:
+                    sla = workflow.by_target[reached]
+                    latency = at - armed_at
+                    self.histograms.setdefault((workflow_type, reached), Histogram()).observe(latency)
+                    if latency > sla.limit_seconds:
+                        self._counters['late'] += 1
+                        if reached not in state.breached:
+                            # Reached late before check() ran: still a breach
+                            self._breach(instance_id, state, sla, armed_at, at, EVENT_BREACH)
+                    else:
+                        self._counters['met'] += 1
+
+                for sla in workflow.by_source.get(reached, ()):
+                    if sla.target not in state.reached:
+                        state.armed[sla.target] = at
+                        heapq.heappush(
+                            self._deadlines,
+                            (at + sla.limit_seconds, next(self._seq), instance_id, sla.target, EVENT_BREACH)
+                        )
+
+            final = workflow.terminal.get(stage)
+            if final:
+                self._bump(state, at, 'total_completed' if final == STATUS_COMPLETED else 'failure_count')
+                if final == STATUS_COMPLETED:
+                    self._bump(state, at, 'duration_sum_seconds', int(at - state.started_at))
+                # Pending deadlines for this instance are skipped when popped
+                del self._instances[instance_id]
+
+    def _replay(self, instance_id: str, state: _InstanceState, workflow: MonitoredWorkflow,
+                stage: str, at: float) -> None:
+        """Apply one restored history entry to an instance's state."""
+        now = time.time()
+        state.stage = stage
+        state.entered_at = at
+        for reached in workflow.engine_stages.get(stage, ()):
+            if reached in state.reached:
+                continue
+            state.reached[reached] = at
+            state.armed.pop(reached, None)
+            for sla in workflow.by_source.get(reached, ()):
+                if sla.target in state.reached:
+                    continue
+                state.armed[sla.target] = at
+                state.breached.pop(sla.target, None)
+                if at + sla.limit_seconds * self.stuck_multiple <= now:
+                    # Both reported before the restart
+                    state.breached[sla.target] = EVENT_STUCK
+                    continue
+                if at + sla.limit_seconds <= now:
+                    state.breached[sla.target] = EVENT_BREACH
+                heapq.heappush(
+                    self._deadlines,
+                    (at + sla.limit_seconds, next(self._seq), instance_id, sla.target, EVENT_BREACH)
+                )
+        if workflow.terminal.get(stage):
+            del self._instances[instance_id]
+
+    def _breach(self, instance_id: str, state: _InstanceState, sla: StageSLA,
+                armed_at: float, now: float, kind: str) -> None:
+        state.breached[sla.target] = kind
+        self._counters['breaches' if kind == EVENT_BREACH else 'stuck'] += 1
+        if kind == EVENT_BREACH:
+            self._bump(state, now, 'sla_breaches')
+        self._events.append({
+            'id': str(uuid4()),
+            'brand': state.brand,
+            'event_type': kind,
+            'event_data': {
+                'workflow_id': instance_id,
+                'workflow_type': state.workflow_type,
+                'stage': sla.target,
+                'from_stage': sla.source,
+                'current_stage': state.stage,
+                'limit_seconds': int(sla.limit_seconds),
+                'elapsed_seconds': int(now - armed_at),
+                'armed_at': _iso(armed_at)
+            },
+            'severity': 'warning'
+        })
+        logger.warning(
+            f"⚠️  {state.workflow_type} {instance_id}: {sla.target} not reached "
+            f"{int(now - armed_at)}s after {sla.source} (SLA {int(sla.limit_seconds)}s)"
+            + (" - stuck" if kind == EVENT_STUCK else "")
+        )
+
+    def check(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Pop every deadline that has passed and emit breach / stuck events.
+
+        Returns:
+            list: Events emitted by this check
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            first = len(self._events)
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, instance_id, target, kind = heapq.heappop(self._deadlines)
+                state = self._instances.get(instance_id)
+                if state is None or target not in state.armed:
+                    continue
+                armed_at = state.armed[target]
+                sla = self.workflows[state.workflow_type].by_target[target]
+
+                if kind == EVENT_BREACH:
+                    if target not in state.breached:
+                        self._breach(instance_id, state, sla, armed_at, now, EVENT_BREACH)
+                    heapq.heappush(
+                        self._deadlines,
+                        (armed_at + sla.limit_seconds * self.stuck_multiple, next(self._seq),
+                         instance_id, target, EVENT_STUCK)
+                    )
+                elif state.breached.get(target) != EVENT_STUCK:
+                    self._breach(instance_id, state, sla, armed_at, now, EVENT_STUCK)
+            return self._events[first:]
+
+    def overdue(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Instances with a missed SLA they still haven't met, most overdue first.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            overdue = []
+            for instance_id, state in self._instances.items():
+                for target in state.breached:
+                    if target not in state.armed:
+                        continue
+                    sla = self.workflows[state.workflow_type].by_target[target]
+                    overdue.append({
+                        'workflow_id': instance_id,
+                        'type': state.workflow_type,
+                        'brand': state.brand,
+                        'current_stage': state.stage,
+                        'waiting_for': target,
+                        'stuck': state.breached[target] == EVENT_STUCK,
+                        'stuck_for': int((now - state.armed[target] - sla.limit_seconds) // 60)
+                    })
+        overdue.sort(key=lambda item: item['stuck_for'], reverse=True)
+        return overdue
+
+    def stage_latency(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage latency histograms: {workflow_type: {stage: histogram}}."""
+        with self._lock:
+            latency: Dict[str, Dict[str, Any]] = {}
+            for (workflow_type, stage), histogram in sorted(self.histograms.items()):
+                latency.setdefault(workflow_type, {})[stage] = histogram.to_dict()
+        return latency
+
+    async def flush(self) -> int:
+        """
+        Write pending breach events and workflow_metrics counters.
+
+        Failed writes are kept for the next flush: events go back in
+        front of newer ones, and a metrics batch is retried unchanged,
+        under the same flush id, before anything newer is sent.
+
+        Returns:
+            int: Events plus metric rows written
+        """
+        # Imported lazily: conductor imports workflow_engine, which this module needs
+        from conductor import log_system_events_bulk_async
+
+        written = 0
+        with self._lock:
+            events, self._events = self._events, []
+        if events:
+            try:
+                await log_system_events_bulk_async(events, raise_errors=True)
+                written += len(events)
+            except Exception as e:
+                with self._lock:
+                    self._events[:0] = events
+                logger.warning(f"Workflow event flush failed ({len(events)} events kept for retry): {e}")
+
+        # A retried batch, then whatever was counted since
+        for _ in range(2):
+            if self._unsent is None:
+                with self._lock:
+                    metrics, self._metrics = self._metrics, {}
+                if not metrics:
+                    return written
+                self._unsent = (str(uuid4()), [
+                    dict(row, date=day, workflow_type=workflow_type, brand=brand)
+                    for (day, workflow_type, brand), row in metrics.items()
+                ])
+
+            flush_id, deltas = self._unsent
+            try:
+                supabase = await get_async_supabase_client()
+                await supabase.rpc('increment_workflow_metrics', {'deltas': deltas, 'flush_id': flush_id}).execute()
+            except Exception as e:
+                logger.warning(f"Workflow metrics flush failed ({len(deltas)} rows kept for retry): {e}")
+                return written
+
+            self._unsent = None
+            written += len(deltas)
+        return written
+
+    async def run(self, tick_seconds: float = 1.0) -> None:
+        """check() every tick and flush() every flush_seconds until stop()."""
+        self._running = True
+        last_flush = time.monotonic()
+        try:
+            while self._running:
+                self.check()
+                if time.monotonic() - last_flush >= self.flush_seconds:
+                    await self.flush()
+                    last_flush = time.monotonic()
+                await asyncio.sleep(tick_seconds)
+        finally:
+            await self.flush()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters, tracked instances and pending deadlines."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['instances'] = len(self._instances)
+            stats['deadlines'] = len(self._deadlines)
+            stats['pending_events'] = len(self._events)
+        unsent = self._unsent
+        stats['unsent_metric_rows'] = len(unsent[1]) if unsent else 0
+        return stats
+
+
+_monitor: Optional[WorkflowMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def monitor_enabled() -> bool:
+    """False if CQI_WORKFLOW_MONITOR_ENABLED is turned off."""
+    return os.getenv('CQI_WORKFLOW_MONITOR_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+def start_workflow_monitor() -> WorkflowMonitor:
+    """
+    Create this process's monitor from the environment and subscribe it
+    to the workflow engine, if one is running. Start it before the
+    engine loads active instances so their history is replayed into it.
+
+    Returns:
+        WorkflowMonitor: The process-wide monitor
+    """
+    global _monitor
+
+    with _monitor_lock:
+        if _monitor is None:
+            workflows, stuck_multiple = load_monitor_config()
+            _monitor = WorkflowMonitor(
+                workflows,
+                stuck_multiple=stuck_multiple,
+                flush_seconds=float(os.getenv('CQI_WORKFLOW_MONITOR_FLUSH_SECONDS', '5'))
+            )
+            engine = get_workflow_engine()
+            if engine is not None:
+                engine.add_listener(_monitor.observe)
+    return _monitor
+
+
+def get_workflow_monitor() -> Optional[WorkflowMonitor]:
+    """The monitor started in this process, or None."""
+    return _monitor
+
+
+def _epoch(value: str) -> float:
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+async def tail_transitions_async(
+    monitor: WorkflowMonitor,
+    since: Optional[str] = None,
+    poll_seconds: float = 5.0,
+    page_size: int = 1000
+) -> None:
+    """
+    Feed workflow_stage_transitions into a monitor, for monitoring an
+    engine that runs in another process. Each poll reads only the rows
+    after the last (transitioned_at, id) seen.
+
+    Args:
+        monitor: Monitor to feed
+        since: Start at transitions after this ISO time (default: now)
+        poll_seconds: Seconds between polls once caught up
+        page_size: Rows per request
+    """
+    supabase = await get_async_supabase_client()
+    cursor: Tuple[str, str] = (since or _iso(time.time()), '')
+
+    while True:
+        created_at, row_id = cursor
+        response = await (
+            supabase.table('workflow_stage_transitions')
+            .select('id, workflow_id, from_stage, to_stage, transitioned_at, duration_in_stage, '
+                    'workflow_instances(workflow_type, brand)')
+            .or_(f'transitioned_at.gt."{created_at}",and(transitioned_at.eq."{created_at}",id.gt."{row_id}")')
+            .order('transitioned_at')
+            .order('id')
+            .limit(page_size)
+            .execute()
+        )
+        rows = response.data or []
+        for row in rows:
+            instance = row.get('workflow_instances') or {}
+            at = _epoch(row['transitioned_at'])
+            if row.get('from_stage') and row['workflow_id'] not in monitor._instances:
+                # First sighting: the stage it came from started the clock
+                monitor.observe(instance.get('workflow_type'), row['workflow_id'], instance.get('brand'),
+                                row['from_stage'], at - (row.get('duration_in_stage') or 0))
+            monitor.observe(instance.get('workflow_type'), row['workflow_id'], instance.get('brand'),
+                            row['to_stage'], at)
+        if rows:
+            cursor = (rows[-1]['transitioned_at'], rows[-1]['id'])
+
+        monitor.check()
+        await monitor.flush()
+        if len(rows) < page_size:
+            await asyncio.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CQI workflow SLA monitor')
+    parser.add_argument('--check', action='store_true', help='Print the compiled SLAs')
+    parser.add_argument('--tail', action='store_true', help='Follow workflow_stage_transitions and report breaches')
+    parser.add_argument('--since', help='With --tail: start after this ISO time (default: now)')
+    args = parser.parse_args()
+
+    if not args.check and not args.tail:
+        parser.error('choose --check or --tail')
+
+    try:
+        workflows, stuck_multiple = load_monitor_config()
+        if args.check:
+            for workflow_type, workflow in workflows.items():
+                print(f"\n{workflow_type} (stuck at {stuck_multiple:g}x)")
+                for sla in workflow.slas:
+                    print(f"  {sla.target:<24} within {sla.limit_seconds:>8g}s of {sla.source}")
+            sys.exit(0)
+
+        monitor = WorkflowMonitor(workflows, stuck_multiple)
+        asyncio.run(tail_transitions_async(monitor, args.since))
+    except KeyboardInterrupt:
+        print("\nStopping workflow monitor...")
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}\n", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
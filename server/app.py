@@ -5,14 +5,17 @@ Multi-brand automation platform with CQI (Client Qualification Interview) system
 
 import os
 import sys
+import json
+import asyncio
 import logging
-from typing import Optional
+import tempfile
+from typing import Optional, List
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 
 # Add the agents-core/runtime directory to Python path
 # This allows importing conductor and clients modules
@@ -20,7 +23,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agents-core', 'ru
 
 # Import CQI conductor (will be available after runtime files are in place)
 try:
-    from conductor import process_lead
+    from conductor import process_lead_async
+    from brand_registry import get_brand_registry
     CQI_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"CQI conductor not available: {e}")
@@ -28,12 +32,61 @@ except ImportError as e:
 
 # Import Supabase client
 try:
-    from clients import get_supabase_client
+    from clients import get_async_supabase_client, get_brand_config
+    from lead_io import RowStreamError, get_bulk_chunk_size, insert_leads_bulk_async, iter_rows
+    from session_export import EXPORT_FORMATS, export_sessions_async
+    from session_cache import get_sessions_async, is_session_id
+    from kpi_rollups import flush_kpi_rollups, get_kpis_async, observe_workflow_stage
     SUPABASE_AVAILABLE = True
 except ImportError:
     logging.warning("Supabase client not available")
     SUPABASE_AVAILABLE = False
 
+# Import background qualification queue
+try:
+    from job_queue import JobQueue, QualificationWorkerPool, queue_enabled
+    from conductor_service import queue_backpressure
+    QUEUE_AVAILABLE = CQI_AVAILABLE
+except ImportError as e:
+    logging.warning(f"CQI job queue not available: {e}")
+    QUEUE_AVAILABLE = False
+
+# Import workflow engine
+try:
+    from workflow_engine import (
+        InvalidTransitionError, WorkflowError, get_workflow_engine, notify_lead_captured, start_workflow_engine,
+        workflows_enabled
+    )
+    from workflow_monitor import get_workflow_monitor, monitor_enabled, start_workflow_monitor
+    WORKFLOWS_AVAILABLE = SUPABASE_AVAILABLE
+except ImportError as e:
+    logging.warning(f"Workflow engine not available: {e}")
+    WORKFLOWS_AVAILABLE = False
+
+# Import follow-up task scheduler
+try:
+    from follow_up_scheduler import followups_enabled, get_follow_up_scheduler, start_follow_up_scheduler
+    FOLLOWUPS_AVAILABLE = SUPABASE_AVAILABLE
+except ImportError as e:
+    logging.warning(f"Follow-up scheduler not available: {e}")
+    FOLLOWUPS_AVAILABLE = False
+
+# Import Prometheus metrics registry
+try:
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, get_metrics_registry, runtime_samples
+    METRICS_AVAILABLE = CQI_AVAILABLE
+except ImportError as e:
+    logging.warning(f"Metrics not available: {e}")
+    METRICS_AVAILABLE = False
+
+# Import request tracing
+try:
+    from tracing import flush_spans, start_span, tracing_enabled
+    TRACING_AVAILABLE = True
+except ImportError as e:
+    logging.warning(f"Tracing not available: {e}")
+    TRACING_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -48,6 +101,20 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Background queue state (set up on startup when CQI_QUEUE_ENABLED=true)
+job_queue: Optional["JobQueue"] = None
+worker_pool: Optional["QualificationWorkerPool"] = None
+
+# Workflow runner task (set up on startup when CQI_WORKFLOWS_ENABLED=true)
+workflow_task: Optional[asyncio.Task] = None
+monitor_task: Optional[asyncio.Task] = None
+
+# Follow-up scheduler task (set up on startup when CQI_FOLLOWUPS_ENABLED=true)
+follow_up_task: Optional[asyncio.Task] = None
+
+# Open while this worker holds the background services lock
+background_lock = None
+
 # CORS configuration
 # Add your production domains here
 origins = [
@@ -71,6 +138,34 @@ app.add_middleware(
 )
 
 
+async def trace_request(request: Request, call_next):
+    """
+    Open a server span per request (continuing an incoming traceparent).
+    Conductor steps and Supabase/Anthropic calls made while handling it
+    become its children, and the response carries the traceparent back.
+    """
+    with start_span(
+        f"{request.method} {request.url.path}",
+        'server',
+        traceparent=request.headers.get('traceparent'),
+        **{'http.method': request.method, 'http.path': request.url.path}
+    ) as span:
+        response = await call_next(request)
+        route = request.scope.get('route')
+        if route is not None:
+            # Name by route template so /api/cqi/session/{session_id} groups
+            span.name = f"{request.method} {route.path}"
+        span.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            span.set_error(f"HTTP {response.status_code}")
+        response.headers['traceparent'] = span.traceparent()
+        return response
+
+
+if TRACING_AVAILABLE and tracing_enabled():
+    app.middleware("http")(trace_request)
+
+
 # ================================================================
 # REQUEST/RESPONSE MODELS
 # ================================================================
@@ -102,23 +197,70 @@ class LeadResponse(BaseModel):
     success: bool
     lead_id: str
     session_id: Optional[str] = None
+    job_id: Optional[str] = None
     qualification_score: Optional[int] = None
     qualified: Optional[bool] = None
+    provisional: Optional[bool] = None
     message: str
 
 
+class JobStatusResponse(BaseModel):
+    """Response model for a queued CQI job"""
+    job_id: str
+    lead_id: str
+    brand: str
+    status: str
+    attempts: int
+    session_id: Optional[str] = None
+    qualification_score: Optional[int] = None
+    qualified: Optional[bool] = None
+    error: Optional[str] = None
+
+
+class BrandReloadResponse(BaseModel):
+    """Response model for a brand config reload"""
+    reloaded: list
+    versions: dict
+
+
 class CQISessionResponse(BaseModel):
     """Response model for CQI session details"""
     session_id: str
     lead_id: str
     brand: str
-    qualification_score: int
+    qualification_score: Optional[int] = None  # None until scored
     qualified: bool
     reasoning: str
     recommended_action: str
     session_state: str
 
 
+class CQISessionBatchRequest(BaseModel):
+    """Request model for fetching many CQI sessions at once"""
+    ids: List[str] = Field(..., min_length=1, max_length=500)
+
+
+class CQISessionBatchResponse(BaseModel):
+    """Response model for batched CQI session lookups"""
+    sessions: List[CQISessionResponse]
+    missing: List[str]
+    invalid: List[str] = []
+
+
+class WorkflowStartRequest(BaseModel):
+    """Request model for starting a workflow instance"""
+    workflow: str = Field(..., description="Workflow name, e.g. trial-to-paid")
+    lead_id: str
+    brand: str
+    trial_id: Optional[str] = None
+
+
+class WorkflowEventRequest(BaseModel):
+    """Request model for applying an event to a workflow instance"""
+    event: str = Field(..., description="Transition name from the workflow YAML, e.g. booked")
+    payload: Optional[dict] = None
+
+
 class HealthResponse(BaseModel):
     """Response model for health check"""
     status: str
@@ -144,11 +286,34 @@ def health_check():
         "services": {
             "api": "operational",
             "cqi_conductor": "operational" if CQI_AVAILABLE else "unavailable",
+            "cqi_queue": "operational" if job_queue is not None else "disabled",
             "supabase": "operational" if SUPABASE_AVAILABLE else "unavailable"
         }
     }
 
 
+def job_queue_samples():
+    """Metrics collector for the background queue's job counts."""
+    if job_queue is None:
+        return []
+    counts = job_queue.stats()
+    return [('cqi_queue_jobs', 'gauge', 'Background qualification jobs per status',
+             ('status',), {(status,): n for status, n in counts.items()})]
+
+
+@app.get("/metrics", tags=["Health"])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint.
+
+    Conductor step latency, Claude call latency/outcomes/tokens, HTTP
+    transport and retry counters, and the runtime components' stats.
+    """
+    if not METRICS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Metrics not available")
+    return Response(get_metrics_registry().render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/hello", tags=["Health"])
 def hello():
     """Simple hello endpoint for testing"""
@@ -162,6 +327,48 @@ def hello():
 # LEAD MANAGEMENT ENDPOINTS
 # ================================================================
 
+def lead_record(lead: LeadRequest) -> dict:
+    """Build the leads table row for a validated lead."""
+    return {
+        'name': lead.name,
+        'email': lead.email,
+        'phone': lead.phone,
+        'message': lead.message,
+        'brand': lead.brand,
+        'source': lead.source or 'website_contact_form'
+    }
+
+
+async def insert_lead(lead: LeadRequest) -> str:
+    """
+    Insert a lead into Supabase using the async client.
+
+    Args:
+        lead: Validated lead information
+
+    Returns:
+        str: UUID of the created lead
+
+    Raises:
+        HTTPException: If the insert returns no data
+    """
+    supabase = await get_async_supabase_client()
+
+    response = await supabase.table('leads').insert(lead_record(lead)).execute()
+
+    if not response.data or len(response.data) == 0:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to create lead - no data returned"
+        )
+
+    lead_id = response.data[0]['id']
+    logger.info(f"✅ Lead created: {lead_id}")
+    if WORKFLOWS_AVAILABLE:
+        notify_lead_captured(lead_id, lead.brand)
+    return lead_id
+
+
 @app.post("/lead", response_model=LeadResponse, tags=["Leads"])
 async def create_lead_basic(lead: LeadRequest):
     """
@@ -189,32 +396,8 @@ async def create_lead_basic(lead: LeadRequest):
         )
 
     try:
-        # Get Supabase client
-        supabase = get_supabase_client()
-
-        # Prepare lead data
-        lead_data = {
-            'name': lead.name,
-            'email': lead.email,
-            'phone': lead.phone,
-            'message': lead.message,
-            'brand': lead.brand,
-            'source': lead.source or 'website_contact_form'
-        }
-
         # Insert lead into database
-        response = supabase.table('leads').insert(lead_data).execute()
-
-        if not response.data or len(response.data) == 0:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to create lead - no data returned"
-            )
-
-        created_lead = response.data[0]
-        lead_id = created_lead['id']
-
-        logger.info(f"✅ Lead created: {lead_id}")
+        lead_id = await insert_lead(lead)
 
         return LeadResponse(
             success=True,
@@ -233,7 +416,7 @@ async def create_lead_basic(lead: LeadRequest):
 
 
 @app.post("/api/lead", response_model=LeadResponse, tags=["Leads", "CQI"])
-async def create_lead_with_cqi(lead: LeadRequest, background_tasks: BackgroundTasks):
+async def create_lead_with_cqi(lead: LeadRequest, response: Response):
     """
     Create a new lead and process through CQI (Client Qualification Interview).
 
@@ -246,9 +429,15 @@ async def create_lead_with_cqi(lead: LeadRequest, background_tasks: BackgroundTa
     The CQI processing uses Claude AI to analyze the lead and assign
     a qualification score from 0-100 based on brand-specific criteria.
 
+    When the job queue is enabled (CQI_QUEUE_ENABLED=true), step 3 is
+    deferred: the lead is queued and the endpoint returns 202 Accepted with
+    a job_id. Poll GET /api/cqi/jobs/{job_id} for the result. If the
+    queue backlog is over CQI_QUEUE_HIGH_WATERMARK the lead is refused with
+    429 Too Many Requests and a Retry-After header, before anything is saved.
+
     Args:
         lead: Lead information
-        background_tasks: FastAPI background tasks (for async processing)
+        response: Outgoing response (status set to 202 when queued)
 
     Returns:
         LeadResponse: Created lead and CQI session details
@@ -277,38 +466,44 @@ async def create_lead_with_cqi(lead: LeadRequest, background_tasks: BackgroundTa
             detail="CQI system unavailable - use POST /lead for basic lead creation"
         )
 
-    try:
-        # Step 1: Create lead in database
-        supabase = get_supabase_client()
-
-        lead_data = {
-            'name': lead.name,
-            'email': lead.email,
-            'phone': lead.phone,
-            'message': lead.message,
-            'brand': lead.brand,
-            'source': lead.source or 'website_contact_form'
-        }
-
-        response = supabase.table('leads').insert(lead_data).execute()
-
-        if not response.data or len(response.data) == 0:
+    # Queue mode: shed load before writing anything if workers are far behind
+    if job_queue is not None:
+        pressure = await asyncio.to_thread(queue_backpressure, job_queue, lead.brand)
+        if pressure is not None:
+            logger.warning(
+                f"Refusing lead: {pressure['pending']} jobs queued "
+                f"(high watermark {pressure['high_watermark']})"
+            )
             raise HTTPException(
-                status_code=500,
-                detail="Failed to create lead - no data returned"
+                status_code=429,
+                detail="CQI queue is full - retry later",
+                headers={"Retry-After": str(pressure['retry_after'])}
             )
 
-        created_lead = response.data[0]
-        lead_id = created_lead['id']
+    try:
+        # Step 1: Create lead in database
+        lead_id = await insert_lead(lead)
 
-        logger.info(f"✅ Lead created: {lead_id}")
+        # Queue mode: hand off to background workers and return immediately
+        if job_queue is not None:
+            job_id = await asyncio.to_thread(job_queue.enqueue, lead_id, lead.brand)
+            response.status_code = 202
+            return LeadResponse(
+                success=True,
+                lead_id=lead_id,
+                job_id=job_id,
+                message="Lead received - qualification queued"
+            )
 
         # Step 2: Process through CQI Conductor
+        # Uses the async conductor so the Claude call doesn't block the event loop
         try:
-            cqi_result = process_lead(lead_id=lead_id, brand=lead.brand)
+            cqi_result = await process_lead_async(lead_id=lead_id, brand=lead.brand)
 
             # Build success message based on qualification
-            if cqi_result['qualified']:
+            if cqi_result['provisional']:
+                message = f"Lead scored {cqi_result['qualification_score']}/100 provisionally - Claude unavailable, re-score queued"
+            elif cqi_result['qualified']:
                 message = f"Lead qualified with score {cqi_result['qualification_score']}/100 - recommended for {cqi_result['recommended_action']}"
             else:
                 message = f"Lead scored {cqi_result['qualification_score']}/100 - below qualification threshold"
@@ -319,6 +514,7 @@ async def create_lead_with_cqi(lead: LeadRequest, background_tasks: BackgroundTa
                 session_id=cqi_result['session_id'],
                 qualification_score=cqi_result['qualification_score'],
                 qualified=cqi_result['qualified'],
+                provisional=cqi_result['provisional'],
                 message=message
             )
 
@@ -341,11 +537,246 @@ async def create_lead_with_cqi(lead: LeadRequest, background_tasks: BackgroundTa
         )
 
 
+@app.post("/api/leads/bulk", tags=["Leads"])
+async def create_leads_bulk(request: Request, enqueue: bool = False):
+    """
+    Import many leads in one upload.
+
+    The body is a JSON array of lead objects, or NDJSON (one object per
+    line) with Content-Type: application/x-ndjson. Rows are parsed as they
+    stream in and are validated with LeadRequest. Valid rows are inserted
+    in chunked multi-row inserts (CQI_BULK_CHUNK_SIZE), so uploads of any
+    size use constant memory.
+
+    The response is NDJSON: one line per row (invalid rows are reported
+    before their chunk is inserted, so lines aren't in row order), then a
+    summary line.
+
+        {"row": 0, "status": "created", "lead_id": "...", "job_id": "..."}
+        {"row": 1, "status": "invalid", "errors": ["email: value is not a valid email address"]}
+        {"row": 2, "status": "failed", "error": "..."}
+        {"summary": {"rows": 3, "created": 1, "invalid": 1, "failed": 1, "queued": 1}}
+
+    If the body can't be parsed past some point (e.g. a syntax error in a
+    JSON array), an {"error": ...} line is sent before the summary. Rows
+    before it have already been imported. With enqueue, queue backpressure
+    is checked before every chunk; if the queue fills up mid-upload the
+    import stops the same way, with an error line naming the first row
+    that wasn't imported and a retry_after.
+
+    Args:
+        request: Incoming request (body is streamed)
+        enqueue: Queue created leads for CQI scoring (requires CQI_QUEUE_ENABLED)
+
+    Returns:
+        StreamingResponse: NDJSON per-row results
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Database connection unavailable"
+        )
+
+    if enqueue:
+        if job_queue is None:
+            raise HTTPException(
+                status_code=503,
+                detail="CQI queue is disabled - set CQI_QUEUE_ENABLED=true to enqueue imported leads"
+            )
+        pressure = await asyncio.to_thread(queue_backpressure, job_queue)
+        if pressure is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="CQI queue is full - retry later",
+                headers={"Retry-After": str(pressure['retry_after'])}
+            )
+
+    rows = iter_rows(request.stream(), request.headers.get('content-type'))
+    chunk_size = get_bulk_chunk_size()
+    counts = {'rows': 0, 'created': 0, 'invalid': 0, 'failed': 0, 'queued': 0}
+    chunk = []  # (row index, validated lead)
+
+    # Results are spooled (to disk past 1 MB) while the body is read, then
+    # streamed back; the body can't be read from inside a streaming response
+    out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    def write(item: dict) -> None:
+        out.write((json.dumps(item) + '\n').encode())
+
+    async def flush() -> bool:
+        if enqueue:
+            pressure = await asyncio.to_thread(queue_backpressure, job_queue)
+            if pressure is not None:
+                write({
+                    'error': f"CQI queue is full - rows from {chunk[0][0]} on were not imported",
+                    'retry_after': pressure['retry_after']
+                })
+                return False
+
+        batch = chunk[:]
+        chunk.clear()
+        outcomes = await insert_leads_bulk_async([lead_record(lead) for _, lead in batch])
+
+        created = [(lead_id, lead.brand) for (_, lead), (lead_id, _) in zip(batch, outcomes) if lead_id]
+        if WORKFLOWS_AVAILABLE:
+            for lead_id, brand in created:
+                notify_lead_captured(lead_id, brand)
+        job_ids = {}
+        if enqueue and created:
+            try:
+                ids = await asyncio.to_thread(job_queue.enqueue_many, created)
+                job_ids = {lead_id: job_id for (lead_id, _), job_id in zip(created, ids)}
+                counts['queued'] += len(ids)
+            except Exception as e:
+                logger.error(f"Failed to enqueue imported leads: {e}")
+
+        for (index, _), (lead_id, error) in zip(batch, outcomes):
+            if lead_id:
+                counts['created'] += 1
+                write({'row': index, 'status': 'created', 'lead_id': lead_id, 'job_id': job_ids.get(lead_id)})
+            else:
+                counts['failed'] += 1
+                write({'row': index, 'status': 'failed', 'error': error})
+        return True
+
+    queue_full = False
+    try:
+        async for index, row, error in rows:
+            counts['rows'] += 1
+            if error is None:
+                try:
+                    chunk.append((index, LeadRequest.model_validate(row)))
+                except ValidationError as e:
+                    error = [
+                        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+                        for err in e.errors()
+                    ]
+            if error is not None:
+                counts['invalid'] += 1
+                write({'row': index, 'status': 'invalid', 'errors': error if isinstance(error, list) else [error]})
+                continue
+
+            if len(chunk) >= chunk_size and not await flush():
+                queue_full = True
+                break
+    except RowStreamError as e:
+        write({'error': str(e)})
+
+    if chunk and not queue_full:
+        await flush()
+
+    logger.info(f"✅ Bulk import: {counts}")
+    write({'summary': counts})
+    out.seek(0)
+
+    def results():
+        try:
+            while True:
+                block = out.read(64 * 1024)
+                if not block:
+                    return
+                yield block
+        finally:
+            out.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/api/cqi/jobs/{job_id}", response_model=JobStatusResponse, tags=["CQI"])
+async def get_cqi_job(job_id: str):
+    """
+    Get the status of a queued CQI job.
+
+    Args:
+        job_id: Job ID returned by POST /api/lead in queue mode
+
+    Returns:
+        JobStatusResponse: Job status and, once finished, the score
+    """
+    if job_queue is None:
+        raise HTTPException(
+            status_code=503,
+            detail="CQI job queue is disabled"
+        )
+
+    job = await asyncio.to_thread(job_queue.get, job_id)
+
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"CQI job not found: {job_id}"
+        )
+
+    result = job.get('result') or {}
+
+    return JobStatusResponse(
+        job_id=job['id'],
+        lead_id=job['lead_id'],
+        brand=job['brand'],
+        status=job['status'],
+        attempts=job['attempts'],
+        session_id=job.get('session_id'),
+        qualification_score=result.get('qualification_score'),
+        qualified=result.get('qualified'),
+        error=job.get('error')
+    )
+
+
+@app.post("/api/cqi/brands/reload", response_model=BrandReloadResponse, tags=["CQI"])
+async def reload_brand_configs(brand: Optional[str] = None):
+    """
+    Reload brand configs from their YAML files without restarting.
+
+    Changed files are also picked up automatically by mtime; this endpoint
+    forces a reload, e.g. from a Supabase database webhook.
+
+    Args:
+        brand: Only reload this brand (default: all)
+
+    Returns:
+        BrandReloadResponse: Brands whose version changed, and all versions
+    """
+    if not CQI_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="CQI system not available"
+        )
+
+    registry = get_brand_registry()
+    reloaded = await asyncio.to_thread(registry.reload, brand, True)
+
+    return BrandReloadResponse(
+        reloaded=reloaded,
+        versions=registry.brands()
+    )
+
+
+def session_response(session: dict) -> CQISessionResponse:
+    """Build the API response for a cqi_sessions row, using the brand's threshold."""
+    session_data = session.get('session_data') or {}
+    score = session.get('qualification_score')
+    threshold = get_brand_config(session['brand'])['qualification_threshold']
+
+    return CQISessionResponse(
+        session_id=session['id'],
+        lead_id=session['lead_id'],
+        brand=session['brand'],
+        qualification_score=score,
+        qualified=score is not None and score >= threshold,
+        reasoning=session_data.get('reasoning', 'No reasoning available'),
+        recommended_action=session_data.get('recommended_action', 'unknown'),
+        session_state=session['session_state']
+    )
+
+
 @app.get("/api/cqi/session/{session_id}", response_model=CQISessionResponse, tags=["CQI"])
-def get_cqi_session(session_id: str):
+async def get_cqi_session(session_id: str):
     """
     Get CQI session details by session ID.
 
+    Reads through the session cache (see session_cache.py), so repeated
+    polling of the same session doesn't hit the database every time.
+
     Args:
         session_id: UUID of the CQI session
 
@@ -359,29 +790,15 @@ def get_cqi_session(session_id: str):
         )
 
     try:
-        supabase = get_supabase_client()
-
-        response = supabase.table('cqi_sessions').select('*').eq('id', session_id).execute()
+        sessions = await get_sessions_async([session_id])
 
-        if not response.data or len(response.data) == 0:
+        if session_id not in sessions:
             raise HTTPException(
                 status_code=404,
                 detail=f"CQI session not found: {session_id}"
             )
 
-        session = response.data[0]
-        session_data = session.get('session_data', {})
-
-        return CQISessionResponse(
-            session_id=session['id'],
-            lead_id=session['lead_id'],
-            brand=session['brand'],
-            qualification_score=session['qualification_score'],
-            qualified=session['qualification_score'] >= 70,  # Default threshold
-            reasoning=session_data.get('reasoning', 'No reasoning available'),
-            recommended_action=session_data.get('recommended_action', 'unknown'),
-            session_state=session['session_state']
-        )
+        return session_response(sessions[session_id])
 
     except HTTPException:
         raise
@@ -393,6 +810,284 @@ def get_cqi_session(session_id: str):
         )
 
 
+@app.post("/api/cqi/sessions:batchGet", response_model=CQISessionBatchResponse, tags=["CQI"])
+async def batch_get_cqi_sessions(request: CQISessionBatchRequest):
+    """
+    Get many CQI sessions in one call.
+
+    Cached sessions are answered from memory and the rest are fetched
+    with a single query, so a dashboard page needs one round trip.
+
+    Args:
+        request: Session IDs (up to 500)
+
+    Returns:
+        CQISessionBatchResponse: Found sessions in request order, the IDs
+            that don't exist, and the IDs that aren't UUIDs
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Database connection unavailable"
+        )
+
+    try:
+        sessions = await get_sessions_async(request.ids)
+    except Exception as e:
+        logger.error(f"Error fetching CQI sessions: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch CQI sessions: {str(e)}"
+        )
+
+    ids = list(dict.fromkeys(request.ids))
+    invalid = [session_id for session_id in ids if not is_session_id(session_id)]
+    return CQISessionBatchResponse(
+        sessions=[session_response(sessions[session_id]) for session_id in ids if session_id in sessions],
+        missing=[session_id for session_id in ids if session_id not in sessions and session_id not in invalid],
+        invalid=invalid
+    )
+
+
+@app.get("/api/cqi/sessions/export", tags=["CQI"])
+async def export_cqi_sessions(
+    brand: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    state: Optional[List[str]] = Query(None),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    format: str = 'ndjson',
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """
+    Export CQI sessions joined with their leads as NDJSON or CSV.
+
+    Rows are streamed in (created_at, id) order as they are paged out of
+    the database, so exports of any size use constant memory.
+
+    Args:
+        brand: Only this brand
+        since: Sessions created at or after this ISO date/time
+        until: Sessions created before this ISO date/time
+        state: Session states to include (repeatable)
+        min_score: Minimum qualification score
+        max_score: Maximum qualification score
+        format: 'ndjson' (default) or 'csv'
+        limit: Max rows to export
+
+    Returns:
+        StreamingResponse: application/x-ndjson or text/csv
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Database connection unavailable"
+        )
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown format '{format}' (choose from: {', '.join(EXPORT_FORMATS)})"
+        )
+
+    blocks = export_sessions_async(
+        format,
+        brand=brand,
+        since=since,
+        until=until,
+        states=state,
+        min_score=min_score,
+        max_score=max_score,
+        limit=limit
+    )
+
+    # Fetch the first page before responding so query errors still
+    # become a proper error status instead of a truncated stream
+    try:
+        first = await blocks.__anext__()
+    except StopAsyncIteration:
+        first = b''
+    except Exception as e:
+        logger.error(f"Error exporting CQI sessions: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to export CQI sessions: {str(e)}"
+        )
+
+    async def body():
+        yield first
+        async for block in blocks:
+            yield block
+
+    if format == 'csv':
+        filename = f"cqi_sessions_{brand or 'all'}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+        return StreamingResponse(
+            body(),
+            media_type='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    return StreamingResponse(body(), media_type='application/x-ndjson')
+
+
+@app.get("/api/dashboard/kpis", tags=["Dashboard"])
+async def get_dashboard_kpis(brand: Optional[str] = None, as_of: Optional[str] = None):
+    """
+    Get the dashboard KPIs (dashboard.yml) from the daily rollups.
+
+    Rolling windows are summed from per-brand, per-day counters, so the
+    cost grows with the window length in days, not with lead volume.
+
+    Args:
+        brand: Only this brand (default: all brands)
+        as_of: Last day of the rolling windows, YYYY-MM-DD (default: today)
+
+    Returns:
+        dict: KPI values with targets and window sizes, plus today's counters
+    """
+    if not SUPABASE_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Database connection unavailable"
+        )
+
+    try:
+        day = datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid as_of date (expected YYYY-MM-DD): {as_of}"
+        )
+
+    try:
+        return await get_kpis_async(brand, day)
+    except Exception as e:
+        logger.error(f"Error fetching KPIs: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch KPIs: {str(e)}"
+        )
+
+
+# ================================================================
+# WORKFLOW ENDPOINTS
+# ================================================================
+
+def require_workflow_engine():
+    """Return the running workflow engine or raise 503."""
+    engine = get_workflow_engine() if WORKFLOWS_AVAILABLE else None
+    if engine is None:
+        if WORKFLOWS_AVAILABLE and workflows_enabled():
+            detail = "Workflow engine runs in another worker process (run workflows with a single worker)"
+        else:
+            detail = "Workflow engine not running (set CQI_WORKFLOWS_ENABLED=true)"
+        raise HTTPException(status_code=503, detail=detail)
+    return engine
+
+
+@app.post("/api/workflows", tags=["Workflows"])
+async def start_workflow(request: WorkflowStartRequest):
+    """
+    Start a workflow instance (returns the lead's active one if it has one).
+
+    Lead-to-trial instances are also started automatically when a lead is
+    created in this process. The lead (and trial, if given) must exist:
+    the instance row references them, and a row the database rejects
+    is dropped when the engine flushes.
+    """
+    engine = require_workflow_engine()
+    for table, record_id in (('leads', request.lead_id), ('trials', request.trial_id)):
+        if record_id is not None and is_session_id(record_id) and not await record_exists(table, record_id):
+            raise HTTPException(status_code=404, detail=f"No {table[:-1]} found with id: {record_id}")
+    try:
+        return engine.start(request.workflow, request.lead_id, request.brand, request.trial_id)
+    except WorkflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def record_exists(table: str, record_id: str) -> bool:
+    """True if `table` has a row with this id."""
+    supabase = await get_async_supabase_client()
+    response = await supabase.table(table).select('id').eq('id', record_id).limit(1).execute()
+    return bool(response.data)
+
+
+@app.get("/api/workflows/stuck", tags=["Workflows"])
+async def get_stuck_workflows():
+    """
+    List workflows that missed a stage SLA (workflow-monitor.yml) and
+    still haven't reached that stage, most overdue first.
+    """
+    require_workflow_engine()
+    monitor = get_workflow_monitor()
+    if monitor is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Workflow monitor not running (CQI_WORKFLOW_MONITOR_ENABLED=false)"
+        )
+    return {'stuck_workflows': monitor.overdue(), 'monitor': monitor.stats()}
+
+
+@app.get("/api/workflows/sla", tags=["Workflows"])
+async def get_workflow_sla():
+    """
+    Get per-stage latency histograms (time from the SLA's start stage)
+    with p50/p95 estimates.
+    """
+    require_workflow_engine()
+    monitor = get_workflow_monitor()
+    if monitor is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Workflow monitor not running (CQI_WORKFLOW_MONITOR_ENABLED=false)"
+        )
+    return {'stage_latency': monitor.stage_latency(), 'monitor': monitor.stats()}
+
+
+@app.get("/api/workflows/{instance_id}", tags=["Workflows"])
+async def get_workflow(instance_id: str):
+    """
+    Get a workflow instance: from the engine while it is running, from
+    workflow_instances once it has finished.
+    """
+    engine = require_workflow_engine()
+    instance = engine.get(instance_id)
+    if instance is not None:
+        return instance
+
+    try:
+        supabase = await get_async_supabase_client()
+        response = await supabase.table('workflow_instances').select('*').eq('id', instance_id).execute()
+    except Exception as e:
+        logger.error(f"Error fetching workflow {instance_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch workflow: {str(e)}"
+        )
+
+    if not response.data:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Workflow {instance_id} not found"
+        )
+    return response.data[0]
+
+
+@app.post("/api/workflows/{instance_id}/events", tags=["Workflows"])
+async def fire_workflow_event(instance_id: str, request: WorkflowEventRequest):
+    """
+    Apply an event (booked, declined, call_completed, ...) to a workflow
+    instance. Returns 409 if the event isn't allowed in its current stage.
+    """
+    engine = require_workflow_engine()
+    try:
+        return engine.fire(instance_id, request.event, request.payload)
+    except InvalidTransitionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except WorkflowError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 # ================================================================
 # ERROR HANDLERS
 # ================================================================
@@ -428,6 +1123,47 @@ async def general_exception_handler(request, exc):
 # STARTUP/SHUTDOWN EVENTS
 # ================================================================
 
+def acquire_background_lock() -> bool:
+    """
+    Elect this worker to run the workflow engine, workflow monitor and
+    follow-up scheduler.
+
+    They keep their state in memory, so with several uvicorn workers only
+    one may run them: the worker holding an exclusive lock on
+    CQI_BACKGROUND_LOCK_PATH. The OS drops the lock when that worker
+    exits, even on a crash, so its replacement takes over. Workflow
+    endpoints on the other workers return 503, and leads they score
+    don't advance workflows; run workflows in a single-worker process
+    for full coverage.
+
+    Returns:
+        bool: True if this worker holds the lock
+    """
+    global background_lock
+
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): uvicorn runs a single worker there
+        return True
+
+    if background_lock is not None:
+        return True
+    path = os.getenv('CQI_BACKGROUND_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'cqi-background.lock'))
+    lock_file = open(path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    background_lock = lock_file
+    return True
+
+
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup"""
@@ -436,6 +1172,47 @@ async def startup_event():
     logger.info("="*60)
     logger.info(f"CQI Conductor: {'✅ Available' if CQI_AVAILABLE else '❌ Unavailable'}")
     logger.info(f"Supabase Client: {'✅ Available' if SUPABASE_AVAILABLE else '❌ Unavailable'}")
+
+    if METRICS_AVAILABLE:
+        registry = get_metrics_registry()
+        registry.register_collector(runtime_samples)
+        registry.register_collector(job_queue_samples)
+
+    global job_queue, worker_pool
+    if QUEUE_AVAILABLE and queue_enabled():
+        job_queue = JobQueue()
+        worker_pool = QualificationWorkerPool(
+            job_queue,
+            workers=int(os.getenv('CQI_QUEUE_WORKERS', '4'))
+        )
+        await worker_pool.start()
+    logger.info(f"CQI Job Queue: {'✅ Enabled' if job_queue is not None else '⏸️  Disabled'}")
+
+    # Engine, monitor and scheduler run in one worker only
+    wants_workflows = WORKFLOWS_AVAILABLE and workflows_enabled()
+    wants_followups = FOLLOWUPS_AVAILABLE and followups_enabled()
+    leader = False
+    if wants_workflows or wants_followups:
+        leader = acquire_background_lock()
+        if not leader:
+            logger.info("Background services: ⏸️  Running in another worker process")
+
+    global workflow_task, monitor_task
+    if wants_workflows and leader:
+        engine = start_workflow_engine()
+        # Trial bookings, completions and conversions feed the KPI rollups
+        engine.add_listener(observe_workflow_stage)
+        # Subscribed before load_active() so restored instances are replayed into it
+        if monitor_enabled():
+            monitor_task = asyncio.create_task(start_workflow_monitor().run(engine.tick_seconds))
+        await asyncio.to_thread(engine.load_active)
+        workflow_task = asyncio.create_task(engine.run())
+    logger.info(f"Workflow Engine: {'✅ Running' if workflow_task is not None else '⏸️  Disabled'}")
+
+    global follow_up_task
+    if wants_followups and leader:
+        follow_up_task = asyncio.create_task(start_follow_up_scheduler().run())
+    logger.info(f"Follow-up Scheduler: {'✅ Running' if follow_up_task is not None else '⏸️  Disabled'}")
     logger.info("="*60)
 
 
@@ -444,6 +1221,31 @@ async def shutdown_event():
     """Run on application shutdown"""
     logger.info("AI Command Lab API - Shutting Down")
 
+    if worker_pool is not None:
+        await worker_pool.stop()
+
+    # Before the workflow engine: automated tasks may still fire workflow events
+    if follow_up_task is not None:
+        get_follow_up_scheduler().stop()
+        await follow_up_task
+
+    if workflow_task is not None:
+        get_workflow_engine().stop()
+        await workflow_task
+
+    if monitor_task is not None:
+        get_workflow_monitor().stop()
+        await monitor_task
+
+    if SUPABASE_AVAILABLE:
+        await asyncio.to_thread(flush_kpi_rollups)
+
+    if TRACING_AVAILABLE:
+        await asyncio.to_thread(flush_spans)
+
+    if background_lock is not None:
+        background_lock.close()
+
 
 if __name__ == '__main__':
     import uvicorn
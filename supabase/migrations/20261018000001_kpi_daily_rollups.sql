@@ -0,0 +1,89 @@
+-- ============================================================================
+-- KPI DAILY ROLLUPS
+-- Per-brand, per-day counters behind the dashboard KPIs (dashboard.yml).
+-- Maintained incrementally by agents-core/runtime/kpi_rollups.py as CQI
+-- events are logged, so rolling 7/30-day KPIs read O(days) rows instead
+-- of scanning cqi_sessions and trials.
+-- Date: 2026-10-18
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.kpi_daily_rollups (
+  brand TEXT NOT NULL,
+  day DATE NOT NULL,
+  sessions INTEGER NOT NULL DEFAULT 0,          -- scored leads (final scores)
+  qualified INTEGER NOT NULL DEFAULT 0,
+  provisional INTEGER NOT NULL DEFAULT 0,       -- fallback scores awaiting re-score
+  score_sum BIGINT NOT NULL DEFAULT 0,
+  trials_booked INTEGER NOT NULL DEFAULT 0,
+  trials_completed INTEGER NOT NULL DEFAULT 0,
+  paid_conversions INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (brand, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_daily_rollups_day ON public.kpi_daily_rollups(day);
+
+ALTER TABLE public.kpi_daily_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Authenticated users can read KPI rollups"
+  ON public.kpi_daily_rollups FOR SELECT
+  TO authenticated
+  USING (true);
+
+-- Flush ids already applied by increment_kpi_rollups(), so a retried
+-- flush whose first attempt committed isn't counted twice
+CREATE TABLE IF NOT EXISTS public.kpi_rollup_flushes (
+  flush_id UUID PRIMARY KEY,
+  applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_rollup_flushes_applied_at ON public.kpi_rollup_flushes(applied_at);
+
+ALTER TABLE public.kpi_rollup_flushes ENABLE ROW LEVEL SECURITY;
+
+-- Atomically add a batch of counter deltas, once per flush_id:
+-- [{"brand": "sotsvc", "day": "2026-10-18", "sessions": 3, "qualified": 2, ...}, ...]
+-- Returns FALSE if this flush_id was already applied.
+CREATE OR REPLACE FUNCTION public.increment_kpi_rollups(deltas JSONB, flush_id UUID DEFAULT NULL)
+RETURNS BOOLEAN AS $$
+BEGIN
+  IF flush_id IS NOT NULL THEN
+    INSERT INTO public.kpi_rollup_flushes (flush_id)
+    VALUES (increment_kpi_rollups.flush_id)
+    ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+      RETURN FALSE;
+    END IF;
+    -- Retries come within seconds; a day of ids is plenty
+    DELETE FROM public.kpi_rollup_flushes WHERE applied_at < NOW() - INTERVAL '1 day';
+  END IF;
+
+  INSERT INTO public.kpi_daily_rollups AS r
+    (brand, day, sessions, qualified, provisional, score_sum, trials_booked, trials_completed, paid_conversions)
+  SELECT
+    d.brand,
+    d.day,
+    COALESCE(d.sessions, 0),
+    COALESCE(d.qualified, 0),
+    COALESCE(d.provisional, 0),
+    COALESCE(d.score_sum, 0),
+    COALESCE(d.trials_booked, 0),
+    COALESCE(d.trials_completed, 0),
+    COALESCE(d.paid_conversions, 0)
+  FROM jsonb_to_recordset(deltas) AS d(
+    brand TEXT, day DATE, sessions INTEGER, qualified INTEGER, provisional INTEGER,
+    score_sum BIGINT, trials_booked INTEGER, trials_completed INTEGER, paid_conversions INTEGER
+  )
+  ON CONFLICT (brand, day) DO UPDATE SET
+    sessions = r.sessions + EXCLUDED.sessions,
+    qualified = r.qualified + EXCLUDED.qualified,
+    provisional = r.provisional + EXCLUDED.provisional,
+    score_sum = r.score_sum + EXCLUDED.score_sum,
+    trials_booked = r.trials_booked + EXCLUDED.trials_booked,
+    trials_completed = r.trials_completed + EXCLUDED.trials_completed,
+    paid_conversions = r.paid_conversions + EXCLUDED.paid_conversions,
+    updated_at = NOW();
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,57 @@
+-- ============================================================================
+-- FOLLOW-UP TASK LEASING
+-- Lets several follow-up schedulers (agents-core/runtime/follow_up_scheduler.py)
+-- share follow_up_tasks: due tasks are claimed with a time-limited lease
+-- using FOR UPDATE SKIP LOCKED, so each task runs exactly once and a
+-- crashed scheduler's tasks are picked up when the lease expires.
+-- Date: 2026-10-18
+-- ============================================================================
+
+ALTER TABLE public.follow_up_tasks
+  ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+  ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS last_error TEXT;
+
+-- 'announced': handed off as a follow_up_due system event, not yet
+-- delivered to the lead (no delivery handler for the task type)
+ALTER TABLE public.follow_up_tasks
+  DROP CONSTRAINT IF EXISTS follow_up_tasks_status_check;
+ALTER TABLE public.follow_up_tasks
+  ADD CONSTRAINT follow_up_tasks_status_check
+  CHECK (status IN ('pending', 'announced', 'sent', 'failed', 'cancelled'));
+
+-- Window loads and claims only look at pending tasks in due order
+CREATE INDEX IF NOT EXISTS idx_follow_up_tasks_pending_due
+  ON public.follow_up_tasks(scheduled_for, id)
+  WHERE status = 'pending';
+
+-- Lease up to p_limit due, pending, unleased (or lease-expired) tasks,
+-- optionally only among p_ids. Rows locked by another claim are skipped.
+CREATE OR REPLACE FUNCTION public.claim_follow_up_tasks(
+  p_owner TEXT,
+  p_lease_seconds INTEGER,
+  p_limit INTEGER,
+  p_ids UUID[] DEFAULT NULL
+)
+RETURNS SETOF public.follow_up_tasks AS $$
+  UPDATE public.follow_up_tasks AS t
+  SET
+    lease_owner = p_owner,
+    lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+    attempts = t.attempts + 1
+  WHERE t.id IN (
+    SELECT c.id
+    FROM public.follow_up_tasks AS c
+    WHERE c.status = 'pending'
+      AND c.scheduled_for <= NOW()
+      AND (c.lease_expires_at IS NULL OR c.lease_expires_at < NOW())
+      AND (p_ids IS NULL OR c.id = ANY(p_ids))
+    ORDER BY c.scheduled_for
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING t.*;
+$$ LANGUAGE sql;
+
+COMMENT ON FUNCTION public.claim_follow_up_tasks IS 'Lease due follow-up tasks for one scheduler (SKIP LOCKED)';
@@ -0,0 +1,97 @@
+-- ============================================================================
+-- WORKFLOW METRICS
+-- Per-day, per-workflow-type, per-brand workflow counters described in
+-- agents-core/utils/workflow-monitor.yml. Maintained incrementally by
+-- agents-core/runtime/workflow_monitor.py as stage transitions stream in.
+-- Date: 2026-10-18
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS public.workflow_metrics (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  date DATE NOT NULL,
+  workflow_type TEXT NOT NULL CHECK (workflow_type IN ('lead_to_trial', 'trial_to_paid')),
+  brand TEXT NOT NULL,
+  total_started INTEGER NOT NULL DEFAULT 0,
+  total_completed INTEGER NOT NULL DEFAULT 0,
+  completion_rate DECIMAL(5,4),
+  avg_duration_seconds INTEGER,
+  failure_count INTEGER NOT NULL DEFAULT 0,
+  sla_breaches INTEGER NOT NULL DEFAULT 0,
+  duration_sum_seconds BIGINT NOT NULL DEFAULT 0,   -- of completed workflows, for the average
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  UNIQUE (date, workflow_type, brand)
+);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_metrics_date ON public.workflow_metrics(date);
+
+ALTER TABLE public.workflow_metrics ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Authenticated users can read workflow metrics"
+  ON public.workflow_metrics FOR SELECT
+  TO authenticated
+  USING (true);
+
+-- Flush ids already applied by increment_workflow_metrics(), so a
+-- retried flush whose first attempt committed isn't counted twice
+CREATE TABLE IF NOT EXISTS public.workflow_metrics_flushes (
+  flush_id UUID PRIMARY KEY,
+  applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_metrics_flushes_applied_at ON public.workflow_metrics_flushes(applied_at);
+
+ALTER TABLE public.workflow_metrics_flushes ENABLE ROW LEVEL SECURITY;
+
+-- Atomically add a batch of counter deltas and recompute the derived
+-- columns, once per flush_id:
+-- [{"date": "2026-10-18", "workflow_type": "lead_to_trial", "brand": "sotsvc",
+--   "total_started": 3, "total_completed": 1, ...}, ...]
+-- Returns FALSE if this flush_id was already applied.
+CREATE OR REPLACE FUNCTION public.increment_workflow_metrics(deltas JSONB, flush_id UUID DEFAULT NULL)
+RETURNS BOOLEAN AS $$
+BEGIN
+  IF flush_id IS NOT NULL THEN
+    INSERT INTO public.workflow_metrics_flushes (flush_id)
+    VALUES (increment_workflow_metrics.flush_id)
+    ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+      RETURN FALSE;
+    END IF;
+    -- Retries come within seconds; a day of ids is plenty
+    DELETE FROM public.workflow_metrics_flushes WHERE applied_at < NOW() - INTERVAL '1 day';
+  END IF;
+
+  INSERT INTO public.workflow_metrics AS m
+    (date, workflow_type, brand, total_started, total_completed, failure_count, sla_breaches,
+     duration_sum_seconds, completion_rate, avg_duration_seconds)
+  SELECT
+    d.date,
+    d.workflow_type,
+    d.brand,
+    COALESCE(d.total_started, 0),
+    COALESCE(d.total_completed, 0),
+    COALESCE(d.failure_count, 0),
+    COALESCE(d.sla_breaches, 0),
+    COALESCE(d.duration_sum_seconds, 0),
+    ROUND(COALESCE(d.total_completed, 0)::NUMERIC / NULLIF(d.total_started, 0), 4),
+    COALESCE(d.duration_sum_seconds, 0) / NULLIF(d.total_completed, 0)
+  FROM jsonb_to_recordset(deltas) AS d(
+    date DATE, workflow_type TEXT, brand TEXT, total_started INTEGER, total_completed INTEGER,
+    failure_count INTEGER, sla_breaches INTEGER, duration_sum_seconds BIGINT
+  )
+  ON CONFLICT (date, workflow_type, brand) DO UPDATE SET
+    total_started = m.total_started + EXCLUDED.total_started,
+    total_completed = m.total_completed + EXCLUDED.total_completed,
+    failure_count = m.failure_count + EXCLUDED.failure_count,
+    sla_breaches = m.sla_breaches + EXCLUDED.sla_breaches,
+    duration_sum_seconds = m.duration_sum_seconds + EXCLUDED.duration_sum_seconds,
+    completion_rate = ROUND(
+      (m.total_completed + EXCLUDED.total_completed)::NUMERIC
+        / NULLIF(m.total_started + EXCLUDED.total_started, 0), 4),
+    avg_duration_seconds = (m.duration_sum_seconds + EXCLUDED.duration_sum_seconds)
+      / NULLIF(m.total_completed + EXCLUDED.total_completed, 0),
+    updated_at = NOW();
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
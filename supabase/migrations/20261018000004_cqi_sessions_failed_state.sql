@@ -0,0 +1,13 @@
+-- ============================================================================
+-- CQI SESSION 'failed' STATE
+-- A background qualification job that runs out of attempts
+-- (agents-core/runtime/job_queue.py) moves its pending session from
+-- 'initiated' to 'failed', so it no longer looks like it is still scoring.
+-- Date: 2026-10-18
+-- ============================================================================
+
+ALTER TABLE public.cqi_sessions
+  DROP CONSTRAINT IF EXISTS cqi_sessions_session_state_check;
+ALTER TABLE public.cqi_sessions
+  ADD CONSTRAINT cqi_sessions_session_state_check
+  CHECK (session_state IN ('initiated', 'scored', 'actioned', 'documented', 'closed', 'archived', 'failed'));
@@ -0,0 +1,12 @@
+-- ============================================================================
+-- CQI SESSION EXPORT INDEXES
+-- Keyset pagination for GET /api/cqi/sessions/export (session_export.py)
+-- pages on (created_at, id); these let every page be an index range scan.
+-- Date: 2026-10-18
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_cqi_sessions_created_id
+  ON public.cqi_sessions(created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_cqi_sessions_brand_created_id
+  ON public.cqi_sessions(brand, created_at, id);